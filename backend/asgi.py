@@ -5,6 +5,10 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
+
+El stream en vivo (api/tournament/data/stream/, Server-Sent Events) necesita servirse
+por ASGI, p. ej. `uvicorn backend.asgi:application`: bajo WSGI cada conexión abierta
+ocuparía un hilo del servidor.
 """
 
 import os
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -81,6 +82,9 @@ if DEBUG:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            # Base de tests en fichero (no en memoria): los workers de la puntuación en paralelo
+            # son otros procesos y tienen que poder abrirla
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
         }
     }
 else:
@@ -97,6 +101,46 @@ else:
     }
 
 
+# Caché
+# El snapshot de tournament/data/ se cachea por torneo y versión (ver tournaments/snapshot.py).
+# En producción la caché DEBE ser compartida entre procesos (workers web/ASGI y comandos como
+# update_hltv_matches): las versiones del leaderboard y las generaciones de los perfiles cacheados
+# se invalidan escribiendo en ella, y con una caché local a cada proceso esas invalidaciones no
+# llegan al resto. Con REDIS_URL definido se usa Redis (requiere el paquete redis); la caché en
+# memoria local solo sirve para desarrollo con un único proceso. También vale una caché en disco:
+#   'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+#   'LOCATION': BASE_DIR / 'cache',
+
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'cs2majorcalculator',
+        }
+    }
+
+TOURNAMENT_SNAPSHOT_CACHE_TIMEOUT = 60 * 60
+
+# Stream en vivo (SSE). El reparto local solo llega a los clientes conectados al mismo proceso;
+# los cambios hechos en otros procesos (update_hltv_matches, otros workers) los recogen los streams
+# sondeando la versión del torneo en la BD cada TOURNAMENT_LIVE_POLL_SECONDS. Con una implementación
+# de tournaments.live.BaseBroadcaster respaldada por un broker compartido el sondeo puede desactivarse (None).
+TOURNAMENT_LIVE_BROADCASTER = 'tournaments.live.LocalBroadcaster'
+TOURNAMENT_LIVE_POLL_SECONDS = 5
+
+# Los jobs de puntos fantasy lanzados desde el admin y las reconstrucciones del leaderboard global
+# tras cambiar los puntos de un perfil se ejecutan en un hilo en segundo plano (ver
+# tournaments/fantasy_jobs.py y tournaments/leaderboard.py). Con False se ejecutan dentro de la petición.
+FANTASY_JOBS_IN_BACKGROUND = True
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -145,6 +189,7 @@ CORS_ALLOWED_ORIGINS = [
     "http://10.0.2.15", 
 ]
 CORS_ALLOW_CREDENTIALS = True # Permitir cookies en las solicitudes CORS
+CORS_EXPOSE_HEADERS = ['ETag', 'X-Tournament-Version'] # Versión del snapshot para pedir tournament/data/changes/
 
 # Orígenes de confianza para CSRF
 CSRF_TRUSTED_ORIGINS = ['http://localhost:3000']
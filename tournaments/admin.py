@@ -1,9 +1,57 @@
 from django.contrib import admin
+from django.utils import timezone
 from .models import (
     Tournament, Team, Stage, StageTeam, Match, HLTVUpdateSettings,
-    UserProfile, FantasyPhasePick, FantasyPlayoffPick
+    UserProfile, FantasyPhasePick, FantasyPlayoffPick, FantasyFinalizationJob
 )
-from .fantasy_logic import finalize_fantasy_stage_picks, finalize_fantasy_playoff_picks # Importar ambas
+from .fantasy_jobs import get_or_create_finalization_job, launch_finalization_job
+from .fantasy_logic import rebuild_provisional_scores
+from .feasibility import refresh_role_feasibility_for_stages
+from .leaderboard import schedule_sorted_leaderboard_refresh
+from .pick_counts import rebuild_pick_counts
+from .profile_cache import bump_stage_generation
+from .results import rebuild_stage_records
+from .snapshot import bump_tournament_version, bump_versions_for_stages, get_tournament_ids_for_stages
+
+
+class TournamentSnapshotAdminMixin:
+    """
+    Incrementa la versión de los torneos afectados cuando se crea, edita o borra un objeto
+    desde el admin, para que el snapshot cacheado de tournament/data/ se reconstruya.
+    Con `refreshes_role_feasibility` (objetos con `stage_id`), recalcula además la tabla de roles
+    posibles de sus fases.
+    """
+    refreshes_role_feasibility = False
+
+    def get_snapshot_tournament_ids(self, objs) -> set[int]:
+        return get_tournament_ids_for_stages(obj.stage_id for obj in objs)
+
+    def _bump_snapshot_versions(self, tournament_ids):
+        for tournament_id in sorted(tournament_ids):
+            bump_tournament_version(tournament_id)
+
+    def _role_feasibility_stage_ids(self, objs) -> set[int]:
+        return {obj.stage_id for obj in objs} if self.refreshes_role_feasibility else set()
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        self._bump_snapshot_versions(self.get_snapshot_tournament_ids([obj]))
+        refresh_role_feasibility_for_stages(self._role_feasibility_stage_ids([obj]))
+
+    def delete_model(self, request, obj):
+        tournament_ids = self.get_snapshot_tournament_ids([obj])
+        stage_ids = self._role_feasibility_stage_ids([obj])
+        super().delete_model(request, obj)
+        self._bump_snapshot_versions(tournament_ids)
+        refresh_role_feasibility_for_stages(stage_ids)
+
+    def delete_queryset(self, request, queryset):
+        tournament_ids = self.get_snapshot_tournament_ids(queryset)
+        stage_ids = self._role_feasibility_stage_ids(queryset)
+        super().delete_queryset(request, queryset)
+        self._bump_snapshot_versions(tournament_ids)
+        refresh_role_feasibility_for_stages(stage_ids)
+
 
 @admin.register(Tournament)
 class TournamentAdmin(admin.ModelAdmin):
@@ -13,7 +61,7 @@ class TournamentAdmin(admin.ModelAdmin):
     list_filter = ('is_live', 'tournament_type')
 
 @admin.register(Team)
-class TeamAdmin(admin.ModelAdmin):
+class TeamAdmin(TournamentSnapshotAdminMixin, admin.ModelAdmin):
     list_display = ('name', 'region', 'hltv_team_id')
     list_filter = ('region',)
     search_fields = ('name', 'hltv_team_id')
@@ -29,8 +77,14 @@ class TeamAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_snapshot_tournament_ids(self, objs) -> set[int]:
+        # Nombre y logo del equipo aparecen en el snapshot de cada torneo en el que participa
+        team_ids = [obj.pk for obj in objs]
+        return set(Stage.objects.filter(stage_teams__team_id__in=team_ids).values_list('tournament_id', flat=True))
+
 @admin.register(Match)
-class MatchAdmin(admin.ModelAdmin):
+class MatchAdmin(TournamentSnapshotAdminMixin, admin.ModelAdmin):
+    refreshes_role_feasibility = True
     list_display = ('__str__', 'stage', 'round_number', 'status', 'winner', 'hltv_match_id')
     list_filter = ('stage', 'status', 'round_number', 'format')
     search_fields = ('team1__name', 'team2__name', 'hltv_match_id')
@@ -54,13 +108,21 @@ class MatchAdmin(admin.ModelAdmin):
         }),
     )
 
+    def _after_status_change(self, queryset):
+        # queryset.update() no pasa por save_model: versión del snapshot y roles posibles de sus fases
+        stage_ids = set(queryset.values_list('stage_id', flat=True))
+        bump_versions_for_stages(stage_ids)
+        refresh_role_feasibility_for_stages(stage_ids)
+
     def mark_as_pending(self, request, queryset):
-        updated_count = queryset.update(status='PENDING')
+        updated_count = queryset.update(status='PENDING', updated_at=timezone.now())
+        self._after_status_change(queryset)
         self.message_user(request, f"{updated_count} partidos marcados como Pendientes.")
     mark_as_pending.short_description = "Marcar seleccionados como: Pendiente"
 
     def mark_as_live(self, request, queryset):
-        updated_count = queryset.update(status='LIVE')
+        updated_count = queryset.update(status='LIVE', updated_at=timezone.now())
+        self._after_status_change(queryset)
         self.message_user(request, f"{updated_count} partidos marcados como En Vivo.")
     mark_as_live.short_description = "Marcar seleccionados como: En Vivo"
 
@@ -69,7 +131,8 @@ class MatchAdmin(admin.ModelAdmin):
             if not obj.winner and obj.status != 'CANCELED': # Un partido finalizado (no cancelado) debería tener un ganador
                  self.message_user(request, f"Error: El partido {obj} no tiene un ganador asignado y no puede marcarse como FINALIZADO. Asigne un ganador o cancélelo.", level='error')
                  return
-        updated_count = queryset.update(status='FINISHED')
+        updated_count = queryset.update(status='FINISHED', updated_at=timezone.now())
+        self._after_status_change(queryset)
         self.message_user(request, f"{updated_count} partidos marcados como Finalizados.")
     mark_as_finished.short_description = "Marcar seleccionados como: Finalizado"
 
@@ -138,17 +201,62 @@ class FantasyPlayoffPickAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at', 'updated_at')
     filter_horizontal = ('quarter_final_winners', 'semi_final_winners')
 
+@admin.register(FantasyFinalizationJob)
+class FantasyFinalizationJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'stage', 'kind', 'status', 'progress', 'picks_per_second_display', 'started_at', 'finished_at')
+    list_filter = ('status', 'kind', 'stage__tournament')
+    readonly_fields = ('stage', 'kind', 'status', 'total_picks', 'processed_picks', 'last_pick_id', 'run_processed_picks',
+                       'error', 'started_at', 'finished_at', 'created_at', 'updated_at')
+    actions = ['resume_jobs']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.display(description='Progreso')
+    def progress(self, obj):
+        percent = f" ({obj.processed_picks / obj.total_picks:.0%})" if obj.total_picks else ''
+        return f"{obj.processed_picks}/{obj.total_picks}{percent}"
+
+    @admin.display(description='Picks/s')
+    def picks_per_second_display(self, obj):
+        rate = obj.picks_per_second
+        return f"{rate:.0f}" if rate is not None else '-'
+
+    def resume_jobs(self, request, queryset):
+        # Un job RUNNING cuyo proceso murió se reanuda desde su checkpoint
+        resumed = 0
+        for job in queryset.exclude(status='COMPLETED'):
+            try:
+                launched = launch_finalization_job(job, resume_running=True)
+            except Exception as e:
+                # Solo en línea (FANTASY_JOBS_IN_BACKGROUND = False): el job quedó FAILED
+                self.message_user(request, f"El job #{job.pk} falló: {e}", level='error')
+                continue
+            if launched:
+                resumed += 1
+        self.message_user(request, f"{resumed} job(s) reanudado(s) desde su último checkpoint.")
+    resume_jobs.short_description = "Reanudar jobs desde su checkpoint"
+
 @admin.register(Stage)
-class StageAdmin(admin.ModelAdmin):
+class StageAdmin(TournamentSnapshotAdminMixin, admin.ModelAdmin):
     list_display = ('name', 'tournament', 'type', 'order', 'fantasy_status')
     list_filter = ('tournament', 'type', 'fantasy_status')
     search_fields = ('name',)
-    actions = ['set_fantasy_status_open','set_fantasy_status_locked', 'finalize_all_fantasy_picks_for_stage']
+    actions = ['set_fantasy_status_open','set_fantasy_status_locked', 'finalize_all_fantasy_picks_for_stage', 'project_fantasy_points_action', 'rebuild_stage_records_action', 'rebuild_pick_counts_action']
+
+    def get_snapshot_tournament_ids(self, objs) -> set[int]:
+        return {obj.tournament_id for obj in objs}
 
     def set_fantasy_status_open(self, request, queryset):
-        updated_count = queryset.update(fantasy_status='OPEN')
+        was_locked = queryset.filter(fantasy_status='LOCKED').exists()
+        updated_count = queryset.update(fantasy_status='OPEN', updated_at=timezone.now())
+        if was_locked:
+            # Sus puntos provisionales y su proyección dejan de contar en las columnas en vivo y proyectada
+            schedule_sorted_leaderboard_refresh('live', 'projected')
+        bump_versions_for_stages(queryset.values_list('id', flat=True))
         for stage_obj in queryset:
             FantasyPhasePick.objects.filter(stage=stage_obj, is_finalized=False).update(is_locked=False)
+            bump_stage_generation(stage_obj.pk)
         self.message_user(request, f"{updated_count} fase(s) marcada(s) como 'Open for Picks' y elecciones desbloqueadas.")
     set_fantasy_status_open.short_description = "Fantasy: Marcar como ABIERTA para elecciones" 
 
@@ -158,54 +266,80 @@ class StageAdmin(admin.ModelAdmin):
             stage_obj.fantasy_status = 'LOCKED'
             stage_obj.save()
             FantasyPhasePick.objects.filter(stage=stage_obj, is_finalized=False).update(is_locked=True)
+            if stage_obj.type == 'SWISS':
+                # Con los picks cerrados se generan los puntos provisionales; después se ajustan con cada resultado
+                rebuild_provisional_scores(stage_obj)
             updated_count += 1
         if updated_count > 0:
+            # Las proyecciones de las fases bloqueadas pasan a contar en la columna proyectada
+            schedule_sorted_leaderboard_refresh('projected')
             self.message_user(request, f"{updated_count} fase(s) marcada(s) como 'Picks Locked' y elecciones bloqueadas.")
         else:
             self.message_user(request, "No se bloquearon fases (podrían no estar en estado 'OPEN').", level='warning')
     set_fantasy_status_locked.short_description = "Fantasy: Marcar como BLOQUEADA para elecciones"
 
     def finalize_all_fantasy_picks_for_stage(self, request, queryset):
-        processed_stages_phase = 0
-        processed_tournaments_playoff = 0
+        # Los puntos se calculan en jobs por lotes en segundo plano; el progreso se ve en "Fantasy finalization jobs"
+        launched_jobs = 0
 
         for stage_obj in queryset.filter(fantasy_status='LOCKED'):
             FantasyPhasePick.objects.filter(stage=stage_obj, is_finalized=False, is_locked=False).update(is_locked=True)
-            
-            if stage_obj.type == 'SWISS':
-                result_phase = finalize_fantasy_stage_picks(stage_obj.id)
-                if result_phase.get('success'):
-                    stage_obj.fantasy_status = 'FINALIZED'
-                    stage_obj.save()
-                    self.message_user(request, f"Puntos Fantasy de FASE para '{stage_obj.name}' procesados y fase marcada como FINALIZED: {result_phase.get('message')}")
-                    processed_stages_phase += 1
-                else:
-                    self.message_user(request, f"Error procesando puntos Fantasy de FASE para '{stage_obj.name}': {result_phase.get('message')}", level='error')
-            elif stage_obj.type == 'PLAYOFF':
-                stage_obj.fantasy_status = 'FINALIZED'
-                stage_obj.save()
-                self.message_user(request, f"Fase de PLAYOFF '{stage_obj.name}' marcada como FINALIZED.")
-                
-                result_playoff = finalize_fantasy_playoff_picks(stage_obj.tournament.id)
-                if result_playoff.get('success'):
-                    self.message_user(request, f"Puntos Fantasy de PLAYOFFS para el torneo '{stage_obj.tournament.name}' procesados: {result_playoff.get('message')}")
-                    processed_tournaments_playoff +=1
-                else:
-                    self.message_user(request, f"Error procesando puntos Fantasy de PLAYOFFS para '{stage_obj.tournament.name}': {result_playoff.get('message')}", level='error')
+
+            if stage_obj.type in ('SWISS', 'PLAYOFF'):
+                job = get_or_create_finalization_job(stage_obj)
+                try:
+                    launched = launch_finalization_job(job)
+                except Exception as e:
+                    # Solo en línea (FANTASY_JOBS_IN_BACKGROUND = False): el job quedó FAILED y se puede reanudar
+                    self.message_user(request, f"El job #{job.pk} de puntos Fantasy de '{stage_obj.name}' falló: {e}. Revise el error en la lista de jobs y use 'Reanudar'.", level='error')
+                    continue
+                if not launched:
+                    job.refresh_from_db()
+                    self.message_user(request, f"El job #{job.pk} de '{stage_obj.name}' ya está en curso ({job.processed_picks}/{job.total_picks}). Si su proceso se detuvo, use 'Reanudar' en la lista de jobs.", level='warning')
+                    continue
+                launched_jobs += 1
+                self.message_user(request, f"Job #{job.pk} de puntos Fantasy ({job.get_kind_display()}) lanzado para '{stage_obj.name}'. La fase se marcará como FINALIZED al terminar.")
             else:
                 stage_obj.fantasy_status = 'FINALIZED'
                 stage_obj.save()
                 self.message_user(request, f"Fase '{stage_obj.name}' (tipo: {stage_obj.type}) marcada como FINALIZED (sin picks de fase/playoff asociados directamente a esta acción).", level='info')
 
-        if processed_stages_phase == 0 and processed_tournaments_playoff == 0 and queryset.exists():
-             self.message_user(request, "No se procesaron puntos para ninguna fase/playoff (verifique que estén en estado 'LOCKED' y errores previos).", level='warning')
+        if launched_jobs == 0 and queryset.exists():
+             self.message_user(request, "No se lanzó ningún cálculo de puntos (verifique que las fases estén en estado 'LOCKED').", level='warning')
         elif not queryset.exists():
             self.message_user(request, "No se seleccionaron fases para procesar.", level='info')
             
     finalize_all_fantasy_picks_for_stage.short_description = "Fantasy: FINALIZAR Fase y Calcular Puntos (Fase/Playoffs)"
 
+    def project_fantasy_points_action(self, request, queryset):
+        try:
+            from .fantasy_projection import PROJECTION_SIMULATIONS, project_phase_picks
+        except ImportError:
+            self.message_user(request, "La proyección requiere NumPy, que no está instalado.", level='error')
+            return
+        for stage_obj in queryset.filter(type='SWISS'):
+            projected = project_phase_picks(stage_obj)
+            self.message_user(request, f"'{stage_obj.name}': {projected} pick(s) proyectado(s) con {PROJECTION_SIMULATIONS} simulaciones.")
+    project_fantasy_points_action.short_description = "Fantasy: proyectar puntos esperados (simulación Monte Carlo)"
+
+    def rebuild_stage_records_action(self, request, queryset):
+        stage_ids = []
+        for stage_obj in queryset:
+            updated_count = rebuild_stage_records(stage_obj)
+            stage_ids.append(stage_obj.id)
+            self.message_user(request, f"'{stage_obj.name}': {updated_count} StageTeam(s) corregido(s).")
+        bump_versions_for_stages(stage_ids)
+    rebuild_stage_records_action.short_description = "Reparar: reconstruir W/L y Buchholz desde los partidos"
+
+    def rebuild_pick_counts_action(self, request, queryset):
+        for stage_obj in queryset:
+            rows = rebuild_pick_counts(stage_obj)
+            self.message_user(request, f"'{stage_obj.name}': {rows} contador(es) de pick rates recalculado(s).")
+    rebuild_pick_counts_action.short_description = "Reparar: recontar los pick rates desde los picks"
+
 @admin.register(StageTeam)
-class StageTeamAdmin(admin.ModelAdmin):
+class StageTeamAdmin(TournamentSnapshotAdminMixin, admin.ModelAdmin):
+    refreshes_role_feasibility = True
     list_display = ('team', 'stage', 'wins', 'losses', 'initial_seed', 'buchholz_score')
     list_filter = ('stage',)
     search_fields = ('team__name',)
@@ -1,17 +1,39 @@
+import math
+
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.exceptions import NotAuthenticated, NotFound
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 from django.shortcuts import get_object_or_404
-from django.db.models import F # Para LeaderboardUserSerializer si es necesario ordenar por campos de User
+from django.db.models import F, FloatField, OuterRef, Subquery, Value # Para LeaderboardUserSerializer si es necesario ordenar por campos de User
 from django.contrib.auth.models import User # Para buscar por username
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.functions import Coalesce
 
-from .models import UserProfile, Stage, FantasyPhasePick, Team, StageTeam, Tournament, FantasyPlayoffPick
+from .models import (
+    UserProfile, Stage, FantasyPhasePick, Team, StageTeam, Tournament, FantasyPlayoffPick,
+    ScopedLeaderboardEntry, LeaderboardEntry, SortedLeaderboardEntry,
+)
 from .serializers import (
     FantasyPhasePickSerializer, FantasyPlayoffPickSerializer,
-    LeaderboardUserSerializer, PublicFantasyProfileSerializer, UserProfileSerializer,
+    LeaderboardEntrySerializer, LeaderboardUserSerializer, PublicFantasyProfileSerializer, ScopedLeaderboardEntrySerializer, UserProfileSerializer,
     TournamentFantasyPlayoffInfoSerializer, StageFantasyInfoSerializer
 )
+from .leaderboard import (
+    LEADERBOARD_PAGE_SIZE, cached_scoped_page, get_user_rank, leaderboard_page, leaderboard_percentile, leaderboard_size,
+    leaderboard_window,
+)
+from .fantasy_logic import get_low_seed_bonus_teams_ids
+from .fast_serializers import fast_serializers_enabled, playoff_user_pick, stage_fantasy_info
+from .pick_counts import phase_pick_choices, playoff_pick_choices, record_pick_changes
+from .pick_optimizer import optimal_phase_pick, phase_choice_values
+from .profile_cache import cache_profile, get_cached_profile, profile_dependencies, read_generations
+from .snapshot import SNAPSHOT_CACHE_TIMEOUT
+
+MAX_PROBABILITY_SIMULATIONS = 200_000
 
 class ManageFantasyPhasePicksView(APIView):
     permission_classes = [IsAuthenticated]
@@ -105,7 +127,12 @@ class ManageFantasyPhasePicksView(APIView):
                 
                 # Guardar y asegurar que user_profile y stage están correctamente asignados
                 # serializer.save() ya se encarga de esto si el objeto es nuevo o si se pasan en el save()
-                saved_pick = serializer.save(user_profile=user_profile, stage=stage)
+                with transaction.atomic():
+                    # Con la fila del pick bloqueada, el "antes" de los pick rates no puede quedar obsoleto
+                    FantasyPhasePick.objects.select_for_update().filter(pk=picks_instance.pk).exists()
+                    choices_before = phase_pick_choices(picks_instance)
+                    saved_pick = serializer.save(user_profile=user_profile, stage=stage)
+                    record_pick_changes(stage, choices_before, phase_pick_choices(saved_pick))
                 return Response(FantasyPhasePickSerializer(saved_pick, context={'request': request, 'stage': stage}).data, 
                                 status=status.HTTP_200_OK if not created else status.HTTP_201_CREATED)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -126,9 +153,116 @@ class StageFantasyInfoView(APIView):
 
     def get(self, request, stage_id, format=None):
         stage = get_object_or_404(Stage, pk=stage_id)
+        if fast_serializers_enabled():
+            # Mismo JSON que StageFantasyInfoSerializer construido con dicts planos (ver fast_serializers)
+            return Response(stage_fantasy_info(stage, request), status=status.HTTP_200_OK)
         serializer = StageFantasyInfoSerializer(stage, context={'request': request})
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+class StageProbabilitiesView(APIView):
+    """
+    Probabilidades de 3-0, clasificación y 0-3 (y de cada récord final) de los equipos de una fase suiza.
+    Parámetros opcionales:
+    - method: "montecarlo" (por defecto, estimación) o "exact" (recorre todas las rondas restantes;
+      pensado para las últimas rondas, responde 422 si quedan demasiados estados).
+    - simulations: número de simulaciones de Monte Carlo (máximo MAX_PROBABILITY_SIMULATIONS).
+    - seed: semilla del generador para resultados reproducibles.
+    - strengths: fuerzas por equipo, "teamId:valor,teamId:valor"; el resto se deriva del seed.
+    El resultado se cachea por versión de datos del torneo y parámetros.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request, stage_id, format=None):
+        stage = get_object_or_404(Stage.objects.select_related('tournament'), pk=stage_id)
+        payload, error = self.get_probabilities(request, stage)
+        return error or Response(payload, status=status.HTTP_200_OK)
+
+    def get_probabilities(self, request, stage):
+        """Devuelve (payload, None) con las probabilidades de la fase o (None, Response de error)."""
+        if stage.type != 'SWISS':
+            return None, Response({"error": "Las probabilidades solo están disponibles para fases suizas."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            from .swiss.montecarlo import DEFAULT_SIMULATIONS, simulate_stage_probabilities
+            from .swiss.exact import TooManyStates, exact_stage_probabilities
+        except ImportError:
+            return None, Response({"error": "El simulador requiere NumPy, que no está instalado."}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        method = request.query_params.get('method', 'montecarlo')
+        if method not in ('montecarlo', 'exact'):
+            return None, Response({"error": "'method' debe ser 'montecarlo' o 'exact'."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            simulations = int(request.query_params.get('simulations', DEFAULT_SIMULATIONS))
+            seed = request.query_params.get('seed')
+            seed = int(seed) if seed not in (None, '') else None
+            strengths = self._parse_strengths(request.query_params.get('strengths', ''))
+        except ValueError:
+            return None, Response({"error": "Parámetros 'simulations', 'seed' o 'strengths' inválidos."}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= simulations <= MAX_PROBABILITY_SIMULATIONS:
+            return None, Response({"error": f"'simulations' debe estar entre 1 y {MAX_PROBABILITY_SIMULATIONS}."}, status=status.HTTP_400_BAD_REQUEST)
+        if method == 'exact':
+            simulations = seed = None
+
+        # La versión de datos del torneo llega con la fase (select_related): recién leída de la BD
+        version = stage.tournament.data_version
+        strengths_key = ','.join(f'{team_id}:{value!r}' for team_id, value in sorted(strengths.items()))
+        cache_key = f'stage-probabilities:{stage.pk}:{version}:{method}:{simulations}:{seed}:{strengths_key}'
+        payload = cache.get(cache_key)
+        if payload is None:
+            try:
+                if method == 'exact':
+                    teams = exact_stage_probabilities(stage, strengths)
+                else:
+                    teams = simulate_stage_probabilities(stage, simulations, strengths, rng=seed)
+            except TooManyStates as e:
+                return None, Response({"error": f"Demasiado pronto para el cálculo exacto: {e} Usa method=montecarlo."},
+                                      status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            payload = {
+                'stage_id': stage.pk,
+                'version': version,
+                'method': method,
+                'simulations': simulations,
+                'teams': teams,
+            }
+            cache.set(cache_key, payload, SNAPSHOT_CACHE_TIMEOUT)
+        return payload, None
+
+    @staticmethod
+    def _parse_strengths(raw):
+        strengths = {}
+        for item in filter(None, raw.split(',')):
+            team_id, value = item.split(':')
+            value = float(value)
+            if not (value > 0 and math.isfinite(value)):
+                raise ValueError(item)
+            strengths[int(team_id)] = value
+        return strengths
+
+class StageOptimalPicksView(StageProbabilitiesView):
+    """
+    Pick de fase con más puntos esperados según las probabilidades de la fase (mismos parámetros
+    y caché que StageProbabilitiesView) y las reglas de puntuación del fantasy, para sugerirlo en la UI.
+    """
+
+    def get(self, request, stage_id, format=None):
+        stage = get_object_or_404(Stage.objects.select_related('tournament'), pk=stage_id)
+        payload, error = self.get_probabilities(request, stage)
+        if error:
+            return error
+        picks, expected_points = optimal_phase_pick(
+            phase_choice_values(payload['teams'], get_low_seed_bonus_teams_ids(stage))
+        )
+        return Response({
+            'stage_id': stage.pk,
+            'version': payload['version'],
+            'method': payload['method'],
+            'simulations': payload['simulations'],
+            'expected_points': round(expected_points, 2),
+            'teams_3_0_ids': picks['3-0'],
+            'teams_advance_ids': picks['advance'],
+            'teams_0_3_ids': picks['0-3'],
+        }, status=status.HTTP_200_OK)
+
 class ManageFantasyPlayoffPicksView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -219,7 +353,11 @@ class ManageFantasyPlayoffPicksView(APIView):
                     if team_obj.id not in playoff_stage_team_ids:
                          return Response({"error": f"El equipo de QF '{team_obj.name}' no participa en los playoffs de este torneo."}, status=status.HTTP_400_BAD_REQUEST)
 
-                saved_pick = serializer.save(user_profile=user_profile, tournament=tournament)
+                with transaction.atomic():
+                    FantasyPlayoffPick.objects.select_for_update().filter(pk=picks_instance.pk).exists()
+                    choices_before = playoff_pick_choices(picks_instance)
+                    saved_pick = serializer.save(user_profile=user_profile, tournament=tournament)
+                    record_pick_changes(playoff_stage, choices_before, playoff_pick_choices(saved_pick))
                 return Response(FantasyPlayoffPickSerializer(saved_pick, context={'request': request, 'tournament': tournament}).data, 
                                 status=status.HTTP_200_OK if not created else status.HTTP_201_CREATED)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -234,32 +372,161 @@ class ManageFantasyPlayoffPicksView(APIView):
             traceback.print_exc()
             return Response({"error": "Ocurrió un error inesperado en el servidor."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+def _leaderboard_page_number(request) -> int:
+    try:
+        page_number = int(request.query_params.get('page', 1))
+    except ValueError:
+        raise NotFound("Página inválida.")
+    if page_number < 1:
+        raise NotFound("Página inválida.")
+    return page_number
+
+def _ranked_page_response(request, page_number, count, results):
+    # Mismo formato que PageNumberPagination (count, next, previous, results)
+    if not results and page_number > 1:
+        raise NotFound("Página inválida.")
+    url = request.build_absolute_uri()
+    next_url = replace_query_param(url, 'page', page_number + 1) if page_number * LEADERBOARD_PAGE_SIZE < count else None
+    if page_number == 1:
+        previous_url = None
+    elif page_number == 2:
+        previous_url = remove_query_param(url, 'page')
+    else:
+        previous_url = replace_query_param(url, 'page', page_number - 1)
+    return Response({'count': count, 'next': next_url, 'previous': previous_url, 'results': results})
+
 class FantasyLeaderboardView(APIView):
     permission_classes = [AllowAny] # El leaderboard es público
+    # ?sort= materializados en SortedLeaderboardEntry y el atributo de la fila que ordenan
+    SORTED_COLUMNS = {
+        'live': 'provisional_points',
+        'projected': 'projected_points',
+    }
+
+    @staticmethod
+    def _sorted_points(sort, default):
+        # Total ya materializado del perfil (búsqueda por el índice único (sort, user_profile))
+        entry = SortedLeaderboardEntry.objects.filter(sort=sort, user_profile=OuterRef('pk'))
+        return Coalesce(Subquery(entry.values('points')[:1]), default, output_field=FloatField())
+
+    def _profiles(self):
+        return UserProfile.objects.select_related('user').annotate(
+            rank=F('leaderboard_entry__rank'),
+            # Columna en vivo: puntos ya asegurados en las fases bloqueadas que aún se están jugando
+            provisional_points=self._sorted_points('live', Value(0.0)),
+            # Puntos finales esperados: los ya cerrados más la proyección de las fases en juego
+            projected_points=self._sorted_points('projected', F('total_fantasy_points')),
+        )
+
+    def _ranked_page(self, request, entries, entry_points, profile_points):
+        """
+        Página de un leaderboard materializado: un rango del índice de `position`, sin ordenar ni
+        contar todos los perfiles. Cada fila muestra los puntos de su entrada (`entry_points`) en
+        `profile_points`: los que dan el orden de la página.
+        """
+        page_number = _leaderboard_page_number(request)
+        count = leaderboard_size(entries)
+        page_entries = leaderboard_page(page_number, LEADERBOARD_PAGE_SIZE, entries)
+        profiles = self._profiles().in_bulk([entry.user_profile_id for entry in page_entries])
+        page = []
+        for entry in page_entries:
+            profile = profiles.get(entry.user_profile_id)
+            if profile is not None:
+                setattr(profile, profile_points, getattr(entry, entry_points))
+                page.append(profile)
+        serializer = LeaderboardUserSerializer(page, many=True)
+        return _ranked_page_response(request, page_number, count, serializer.data)
 
     def get(self, request, format=None):
-        # Obtener todos los UserProfile, ordenados por total_fantasy_points descendente
-        # y luego por el username del usuario ascendente como desempate.
-        leaderboard_users = UserProfile.objects.select_related('user').order_by('-total_fantasy_points', 'user__username')
-        
-        # Podríamos paginar aquí si esperamos muchos usuarios
-        from rest_framework.pagination import PageNumberPagination
-        paginator = PageNumberPagination()
-        paginator.page_size = 25 # o el tamaño que desees
-        result_page = paginator.paginate_queryset(leaderboard_users, request)
-        serializer = LeaderboardUserSerializer(result_page, many=True)
-        return paginator.get_paginated_response(serializer.data)
-    
+        sort = request.query_params.get('sort')
+        # ?sort=live y ?sort=projected ordenan por su columna materializada (reconstruida con cada
+        # resultado y con cada proyección)
+        if sort in self.SORTED_COLUMNS:
+            return self._ranked_page(request, SortedLeaderboardEntry.objects.filter(sort=sort), 'points', self.SORTED_COLUMNS[sort])
+        # Por puntos totales (desempate por antigüedad del perfil)
+        return self._ranked_page(request, LeaderboardEntry.objects.all(), 'total_fantasy_points', 'total_fantasy_points')
+
+class LeaderboardAroundView(APIView):
+    """
+    Puesto, percentil y los `k` usuarios por encima y por debajo de uno (el autenticado en
+    /around-me/ o el de la URL), desde el leaderboard materializado: consultas por índice,
+    sin recorrer la clasificación. Pensado para overlays que se refrescan continuamente.
+    """
+    permission_classes = [AllowAny]
+    DEFAULT_K = 5
+    MAX_K = 50
+
+    def get(self, request, username=None, format=None):
+        if username is None:
+            if not request.user.is_authenticated:
+                raise NotAuthenticated()
+            entries = LeaderboardEntry.objects.filter(user_profile__user=request.user)
+        else:
+            entries = LeaderboardEntry.objects.filter(user_profile__user__username=username)
+        entry = entries.select_related('user_profile__user').first()
+        if entry is None:
+            raise NotFound("El usuario aún no figura en el leaderboard.")
+        try:
+            k = min(max(int(request.query_params.get('k', self.DEFAULT_K)), 0), self.MAX_K)
+        except ValueError:
+            k = self.DEFAULT_K
+
+        size = leaderboard_size()
+        above, below = leaderboard_window(entry, k)
+        return Response({
+            'count': size,
+            'percentile': round(leaderboard_percentile(entry, size), 2),
+            'me': LeaderboardEntrySerializer(entry).data,
+            'above': LeaderboardEntrySerializer(above, many=True).data,
+            'below': LeaderboardEntrySerializer(below, many=True).data,
+        })
+
+class ScopedLeaderboardView(APIView):
+    """Clasificación de una fase o de un torneo, precalculada al finalizar y cacheada hasta la siguiente finalización."""
+    permission_classes = [AllowAny]
+    scope = None  # 'stage' o 'tournament'
+
+    def get(self, request, scope_id, format=None):
+        model = Stage if self.scope == 'stage' else Tournament
+        get_object_or_404(model, pk=scope_id)
+        page_number = _leaderboard_page_number(request)
+
+        def build():
+            entries = ScopedLeaderboardEntry.objects.filter(**{f'{self.scope}_id': scope_id})
+            page = leaderboard_page(page_number, LEADERBOARD_PAGE_SIZE, entries.select_related('user_profile__user'))
+            return {'count': leaderboard_size(entries), 'results': ScopedLeaderboardEntrySerializer(page, many=True).data}
+
+        payload = cached_scoped_page(self.scope, scope_id, page_number, build)
+        return _ranked_page_response(request, page_number, payload['count'], payload['results'])
+
 class UserFantasyProfileView(APIView):
+    """
+    Perfil fantasy público. El JSON se cachea por username y se invalida por generaciones del perfil
+    y de sus fases (ver profile_cache); la cabecera X-Profile-Cache indica HIT o MISS.
+    """
     permission_classes = [AllowAny] # Perfil público
 
     def get(self, request, username, format=None):
-        # Encontrar el User por username, luego el UserProfile
-        target_user = get_object_or_404(User, username=username)
-        user_profile = get_object_or_404(UserProfile, user=target_user)
-
-        serializer = PublicFantasyProfileSerializer(user_profile, context={'request': request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        payload = get_cached_profile(username)
+        if payload is not None:
+            return Response(payload, status=status.HTTP_200_OK, headers={'X-Profile-Cache': 'HIT'})
+
+        dependencies = profile_dependencies(username)
+        if dependencies is None:
+            raise NotFound()
+        # Generaciones leídas antes que los datos: lo que cambie desde aquí invalida la entrada
+        generations = read_generations(*dependencies)
+
+        # UserProfile con su User en una consulta; los picks se cargan en bloque (prefetch_profile_picks)
+        user_profile = get_object_or_404(UserProfile.objects.select_related('user'), user__username=username)
+
+        context = {'request': request}
+        payload = PublicFantasyProfileSerializer(user_profile, context=context).data
+        # Solo si las fases que aparecen (las que cargó prefetch_profile_picks) tienen su generación
+        # en la entrada; si no, los picks cambiaron entre medias y ya hay un bump del perfil en camino
+        if user_profile.pk == dependencies[0] and set(context.get('stage_facts', {})) <= dependencies[1]:
+            cache_profile(username, payload, generations)
+        return Response(payload, status=status.HTTP_200_OK, headers={'X-Profile-Cache': 'MISS'})
 
 class CurrentUserProfileView(APIView):
     permission_classes = [IsAuthenticated]
@@ -267,7 +534,8 @@ class CurrentUserProfileView(APIView):
     def get(self, request, format=None):
         user_profile = get_object_or_404(UserProfile, user=request.user)
         serializer = UserProfileSerializer(user_profile)
-        return Response(serializer.data)
+        entry = get_user_rank(user_profile)
+        return Response({**serializer.data, 'rank': entry.rank if entry else None})
 
 class TournamentFantasyPlayoffInfoView(APIView):
     permission_classes = [AllowAny] # Información pública
@@ -295,7 +563,9 @@ class TournamentFantasyPlayoffInfoView(APIView):
 
         # Obtener el user_pick si el usuario está autenticado
         user_pick_data = None
-        if request.user.is_authenticated:
+        if fast_serializers_enabled():
+            user_pick_data = playoff_user_pick(request.user, tournament, {'request': request, 'playoff_stages': {tournament.pk: playoff_stage}})
+        elif request.user.is_authenticated:
             try:
                 user_profile = UserProfile.objects.get(user=request.user)
                 user_fantasy_playoff_pick = FantasyPlayoffPick.objects.filter(user_profile=user_profile, tournament=tournament).first()
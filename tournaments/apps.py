@@ -13,4 +13,6 @@ class TournamentsConfig(AppConfig):
         # Si necesitas alguna inicialización al arrancar la app (que no sea de tareas programadas),
         # puedes ponerla aquí.
         logger.debug("TournamentsConfig.ready() llamada.")
-        pass
+        from .live import publish_tournament_changes
+        from .signals import tournament_data_changed
+        tournament_data_changed.connect(publish_tournament_changes, dispatch_uid='tournaments.live.publish_tournament_changes')
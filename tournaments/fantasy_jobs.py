@@ -0,0 +1,138 @@
+"""
+Jobs de finalización fantasy: puntúan los picks pendientes de una fase por lotes con
+`fantasy_logic.score_*_picks_in_bulk` y guardan el progreso en `FantasyFinalizationJob`.
+
+El checkpoint de cada lote se escribe en la misma transacción que sus picks y sus UserProfile:
+si el proceso muere a mitad, `run_finalization_job` sobre el mismo job continúa desde el último
+lote confirmado. El admin los lanza en un hilo en segundo plano; el comando los ejecuta en primer plano.
+"""
+import copy
+import logging
+import threading
+from functools import partial
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .fantasy_logic import PHASE_SCORING_CHUNK_SIZE, score_phase_picks_in_bulk, score_playoff_picks_in_bulk
+from .leaderboard import refresh_finalization_leaderboards
+from .models import FantasyFinalizationJob, FantasyPhasePick, FantasyPlayoffPick
+
+logger = logging.getLogger(__name__)
+
+def get_or_create_finalization_job(stage, chunk_size: int | None = None) -> FantasyFinalizationJob:
+    """Devuelve el job sin completar de la fase (para reanudarlo) o crea uno nuevo."""
+    job = FantasyFinalizationJob.objects.filter(stage=stage).exclude(status='COMPLETED').order_by('-created_at').first()
+    if job is None:
+        job = FantasyFinalizationJob.objects.create(
+            stage=stage,
+            kind='PLAYOFF' if stage.type == 'PLAYOFF' else 'PHASE',
+            chunk_size=chunk_size or PHASE_SCORING_CHUNK_SIZE,
+        )
+    elif chunk_size and chunk_size != job.chunk_size:
+        job.chunk_size = chunk_size
+        job.save(update_fields=['chunk_size', 'updated_at'])
+    return job
+
+
+def _pending_picks(job: FantasyFinalizationJob):
+    if job.kind == 'PLAYOFF':
+        return FantasyPlayoffPick.objects.filter(tournament_id=job.stage.tournament_id, is_finalized=False)
+    return FantasyPhasePick.objects.filter(stage=job.stage, is_finalized=False)
+
+
+def run_finalization_job(job: FantasyFinalizationJob, progress=None, workers: int = 1) -> FantasyFinalizationJob:
+    """
+    Ejecuta (o reanuda) el job hasta terminar. `progress(job)` se llama tras cada lote confirmado.
+    Con `workers` > 1 los lotes se puntúan en paralelo en otros procesos (ver `fantasy_logic`).
+    Si falla, el job queda FAILED con el error y la excepción se propaga.
+    """
+    stage = job.stage
+    now = timezone.now()
+    job.status = 'RUNNING'
+    job.error = ''
+    job.started_at = now
+    job.finished_at = None
+    job.run_processed_picks = 0
+    job.total_picks = job.processed_picks + _pending_picks(job).count()
+    job.save(update_fields=['status', 'error', 'started_at', 'finished_at', 'run_processed_picks', 'total_picks', 'updated_at'])
+
+    def checkpoint(last_pk: int, count: int) -> None:
+        # Dentro de la transacción del lote: el checkpoint y los puntos se confirman juntos
+        FantasyFinalizationJob.objects.filter(pk=job.pk).update(
+            last_pick_id=last_pk,
+            processed_picks=F('processed_picks') + count,
+            run_processed_picks=F('run_processed_picks') + count,
+            updated_at=timezone.now(),
+        )
+        job.refresh_from_db(fields=['last_pick_id', 'processed_picks', 'run_processed_picks', 'updated_at'])
+        if progress is not None:
+            # Copia con el progreso de este lote, que se informa cuando el lote se confirma
+            transaction.on_commit(partial(progress, copy.copy(job)))
+
+    try:
+        if job.kind == 'PLAYOFF':
+            # Los puntos de playoffs se calculan con la fase marcada como FINALIZED (igual que antes)
+            if stage.fantasy_status != 'FINALIZED':
+                stage.fantasy_status = 'FINALIZED'
+                stage.save()
+            score_playoff_picks_in_bulk(stage, job.chunk_size, job.last_pick_id, checkpoint, workers)
+        else:
+            score_phase_picks_in_bulk(stage, job.chunk_size, job.last_pick_id, checkpoint, workers)
+            stage.fantasy_status = 'FINALIZED'
+            stage.save()
+    except Exception as e:
+        FantasyFinalizationJob.objects.filter(pk=job.pk).update(status='FAILED', error=str(e), updated_at=timezone.now())
+        job.refresh_from_db()
+        raise
+
+    refresh_finalization_leaderboards(stage)
+    job.status = 'COMPLETED'
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'finished_at', 'updated_at'])
+    return job
+
+
+def _run_in_thread(job_id: int) -> None:
+    try:
+        run_finalization_job(FantasyFinalizationJob.objects.select_related('stage').get(pk=job_id))
+    except Exception:
+        # El error del lote queda además en el job; los de leerlo o marcarlo FAILED solo quedan aquí
+        logger.exception("Falló el job de finalización fantasy #%s", job_id)
+    finally:
+        connection.close()  # Cada hilo abre su propia conexión
+
+
+def claim_finalization_job(job: FantasyFinalizationJob, resume_running: bool = False) -> bool:
+    """
+    Pasa el job a RUNNING con un UPDATE condicional: de dos peticiones simultáneas solo una
+    actualiza la fila, y solo esa debe lanzarlo. Con `resume_running` también se reclama un job
+    RUNNING cuyo proceso murió, siempre que siga con el `updated_at` leído (se reanuda una vez).
+    """
+    claimable = Q(status__in=['PENDING', 'FAILED'])
+    if resume_running and job.status == 'RUNNING':
+        claimable |= Q(status='RUNNING', updated_at=job.updated_at)
+    now = timezone.now()
+    if FantasyFinalizationJob.objects.filter(claimable, pk=job.pk).update(status='RUNNING', updated_at=now) != 1:
+        return False
+    job.status = 'RUNNING'
+    job.updated_at = now
+    return True
+
+
+def launch_finalization_job(job: FantasyFinalizationJob, resume_running: bool = False) -> bool:
+    """
+    Ejecuta el job en un hilo en segundo plano una vez confirmada la transacción actual, para no
+    bloquear la petición del admin. Con FANTASY_JOBS_IN_BACKGROUND = False se ejecuta en línea y,
+    si falla, la excepción se propaga (el job queda FAILED, ver `run_finalization_job`).
+    Devuelve False (sin lanzar nada) si otro ya lo reclamó (ver `claim_finalization_job`).
+    """
+    if not claim_finalization_job(job, resume_running):
+        return False
+    if not getattr(settings, 'FANTASY_JOBS_IN_BACKGROUND', True):
+        run_finalization_job(job)
+        return True
+    transaction.on_commit(lambda: threading.Thread(target=_run_in_thread, args=(job.pk,), daemon=True).start())
+    return True
@@ -1,6 +1,11 @@
-from .models import FantasyPhasePick, Stage, StageTeam, Team, UserProfile, FantasyPlayoffPick, Tournament, Match
+from decimal import Decimal
+
+from .leaderboard import refresh_finalization_leaderboards, schedule_sorted_leaderboard_refresh
+from .models import FantasyPhasePick, Stage, StageTeam, Team, UserProfile, FantasyPlayoffPick, Tournament, Match, ProvisionalPhaseScore
+from .profile_cache import bump_profile_generations
 from django.db.models import F, Q
-from django.db import transaction
+from django.db import connection, transaction
+from django.utils import timezone
 
 # --- Constantes de Puntuación ---
 # Fase de Grupos (Suiza)
@@ -9,6 +14,10 @@ POINTS_CORRECT_0_3 = 10
 POINTS_CORRECT_ADVANCE = 5
 SEED_BONUS_MULTIPLIER = 1.5
 NUM_WORST_SEEDING_TEAMS_FOR_BONUS = 8
+# Equipos que se eligen en cada categoría de un pick de fase
+PHASE_PICK_SLOTS = {'3-0': 2, 'advance': 6, '0-3': 2}
+# Picks de fantasy puntuados por lote (una transacción y un UPDATE de picks y otro de UserProfile)
+PHASE_SCORING_CHUNK_SIZE = 2000
 
 # Playoffs
 POINTS_CORRECT_QF_WINNER = 20
@@ -16,47 +25,53 @@ POINTS_CORRECT_SF_WINNER = 35
 POINTS_CORRECT_FINAL_WINNER = 50
 # --- Fin Constantes de Puntuación ---
 
+def low_seed_bonus_team_ids(seeds) -> set[int]:
+    """
+    Los N equipos con el peor (más alto numéricamente) initial_seed entre los pares
+    (team_id, initial_seed) ya cargados de una fase. A igual seed gana el team_id más alto,
+    así el resultado no depende del orden en que la base de datos devuelva las filas.
+    """
+    ranked = sorted(seeds, key=lambda team_seed: (team_seed[1], team_seed[0]), reverse=True)
+    return {team_id for team_id, _ in ranked[:NUM_WORST_SEEDING_TEAMS_FOR_BONUS]}
+
 def get_low_seed_bonus_teams_ids(stage: Stage) -> set[int]:
     """
     Identifica los IDs de los N equipos con el peor (más alto numéricamente) initial_seed 
-    que son elegibles para el bonus de underdog.
+    que son elegibles para el bonus de underdog (ver `low_seed_bonus_team_ids`).
     """
-    stage_teams_for_bonus = StageTeam.objects.filter(stage=stage).order_by('-initial_seed')[:NUM_WORST_SEEDING_TEAMS_FOR_BONUS]
-    return set(st.team_id for st in stage_teams_for_bonus)
-
-def calculate_phase_pick_points(fantasy_pick_id: int) -> bool:
-    try:
-        fantasy_pick = FantasyPhasePick.objects.select_related('user_profile', 'stage')\
-                                             .prefetch_related('teams_3_0', 'teams_advance', 'teams_0_3')\
-                                             .get(pk=fantasy_pick_id)
-    except FantasyPhasePick.DoesNotExist:
-        print(f"Error: FantasyPhasePick con ID {fantasy_pick_id} no encontrado.")
-        return False
-
-    if fantasy_pick.is_finalized:
-        print(f"Info: Los puntos para FantasyPhasePick ID {fantasy_pick.id} ya han sido calculados.")
-        return True
-
-    stage = fantasy_pick.stage
-    user_profile = fantasy_pick.user_profile
+    return low_seed_bonus_team_ids(StageTeam.objects.filter(stage=stage).values_list('team_id', 'initial_seed'))
 
+def get_stage_actual_results(stage: Stage) -> dict[str, set[int]]:
+    """
+    Resultados reales de una fase suiza que puntúan en el fantasy: equipos 3-0, que avanzan
+    sin 3-0, 0-3 y los elegibles para el bonus de underdog. Se calcula una vez por fase.
+    """
+    actual_teams_3_0_ids = set()
+    actual_teams_0_3_ids = set()
+    teams_with_3_wins_ids = set()
+    for team_id, wins, losses in StageTeam.objects.filter(stage=stage).values_list('team_id', 'wins', 'losses'):
+        if wins == 3:
+            teams_with_3_wins_ids.add(team_id)
+            if losses == 0:
+                actual_teams_3_0_ids.add(team_id)
+        elif wins == 0 and losses == 3:
+            actual_teams_0_3_ids.add(team_id)
+    return {
+        '3-0': actual_teams_3_0_ids,
+        'advance': teams_with_3_wins_ids - actual_teams_3_0_ids,
+        '0-3': actual_teams_0_3_ids,
+        'low_seed_bonus': get_low_seed_bonus_teams_ids(stage),
+    }
+
+def score_phase_pick(user_picked_3_0_ids: set[int], user_picked_advance_ids: set[int],
+                     user_picked_0_3_ids: set[int], actual_results: dict[str, set[int]]) -> tuple[int, dict[str, int]]:
+    """Puntos totales y desglose por equipo de un pick de fase frente a `get_stage_actual_results`."""
+    low_seed_bonus_ids = actual_results['low_seed_bonus']
     total_points_for_phase = 0
-
-    # Obtener los resultados reales de la fase
-    actual_teams_3_0_ids = set(StageTeam.objects.filter(stage=stage, wins=3, losses=0).values_list('team_id', flat=True))
-    actual_teams_0_3_ids = set(StageTeam.objects.filter(stage=stage, wins=0, losses=3).values_list('team_id', flat=True))
-       
-    teams_with_3_wins_ids = set(StageTeam.objects.filter(stage=stage, wins=3).values_list('team_id', flat=True))
-    
-    actual_teams_advance_ids = teams_with_3_wins_ids - actual_teams_3_0_ids
-
-    low_seed_bonus_ids = get_low_seed_bonus_teams_ids(stage)
-    
     current_pick_team_points_breakdown = {} # Nuevo diccionario para el desglose
 
     # --- Calcular puntos para equipos 3-0 ---
-    user_picked_3_0_ids = set(fantasy_pick.teams_3_0.values_list('id', flat=True))
-    correct_3_0_picks = user_picked_3_0_ids.intersection(actual_teams_3_0_ids)
+    correct_3_0_picks = user_picked_3_0_ids.intersection(actual_results['3-0'])
     for team_id in correct_3_0_picks:
         points = POINTS_CORRECT_3_0
         if team_id in low_seed_bonus_ids:
@@ -65,24 +80,45 @@ def calculate_phase_pick_points(fantasy_pick_id: int) -> bool:
         current_pick_team_points_breakdown[str(team_id)] = round(current_pick_team_points_breakdown.get(str(team_id), 0) + points) # Acumular por si un equipo está en múltiples categorías (no debería pasar con buena lógica de pick)
 
     # --- Calcular puntos para equipos 0-3 ---
-    user_picked_0_3_ids = set(fantasy_pick.teams_0_3.values_list('id', flat=True))
-    correct_0_3_picks = user_picked_0_3_ids.intersection(actual_teams_0_3_ids)
+    correct_0_3_picks = user_picked_0_3_ids.intersection(actual_results['0-3'])
     for team_id in correct_0_3_picks: # Iterar para guardar en breakdown
         points = POINTS_CORRECT_0_3
         total_points_for_phase += points
         current_pick_team_points_breakdown[str(team_id)] = round(current_pick_team_points_breakdown.get(str(team_id), 0) + points)
 
     # --- Calcular puntos para equipos que avanzan (que no fueron 3-0) ---
-    user_picked_advance_ids = set(fantasy_pick.teams_advance.values_list('id', flat=True))
-    correct_advance_picks = user_picked_advance_ids.intersection(actual_teams_advance_ids)
+    correct_advance_picks = user_picked_advance_ids.intersection(actual_results['advance'])
     for team_id in correct_advance_picks:
         points = POINTS_CORRECT_ADVANCE
         if team_id in low_seed_bonus_ids:
             points *= SEED_BONUS_MULTIPLIER
         total_points_for_phase += points
         current_pick_team_points_breakdown[str(team_id)] = round(current_pick_team_points_breakdown.get(str(team_id), 0) + points)
-    
-    total_points_for_phase = round(total_points_for_phase)
+
+    return round(total_points_for_phase), current_pick_team_points_breakdown
+
+def calculate_phase_pick_points(fantasy_pick_id: int) -> bool:
+    try:
+        fantasy_pick = FantasyPhasePick.objects.select_related('user_profile', 'stage')\
+                                             .prefetch_related('teams_3_0', 'teams_advance', 'teams_0_3')\
+                                             .get(pk=fantasy_pick_id)
+    except FantasyPhasePick.DoesNotExist:
+        print(f"Error: FantasyPhasePick con ID {fantasy_pick_id} no encontrado.")
+        return False
+
+    if fantasy_pick.is_finalized:
+        print(f"Info: Los puntos para FantasyPhasePick ID {fantasy_pick.id} ya han sido calculados.")
+        return True
+
+    stage = fantasy_pick.stage
+    user_profile = fantasy_pick.user_profile
+
+    total_points_for_phase, current_pick_team_points_breakdown = score_phase_pick(
+        set(fantasy_pick.teams_3_0.values_list('id', flat=True)),
+        set(fantasy_pick.teams_advance.values_list('id', flat=True)),
+        set(fantasy_pick.teams_0_3.values_list('id', flat=True)),
+        get_stage_actual_results(stage),
+    )
 
     fantasy_pick.points_earned = total_points_for_phase
     fantasy_pick.team_points_breakdown = current_pick_team_points_breakdown # Guardar el desglose
@@ -90,6 +126,8 @@ def calculate_phase_pick_points(fantasy_pick_id: int) -> bool:
     fantasy_pick.save()
 
     # Actualizar el total de puntos del usuario
+    # Sin reconstruir el leaderboard por cada pick: quien puntúa un lote lo refresca una vez al final
+    # (como refresh_finalization_leaderboards)
     UserProfile.objects.filter(pk=user_profile.pk).update(total_fantasy_points=F('total_fantasy_points') + total_points_for_phase)
     
     print(f"Puntos calculados para FantasyPick ID {fantasy_pick.id} ({user_profile.user.username} - {stage.name}): {total_points_for_phase}")
@@ -129,33 +167,327 @@ def finalize_fantasy_stage_picks(stage_id: int) -> dict:
         return {'success': True, 'message': f'No hay picks pendientes para la fase {stage.name}.'}
 
     print(f"Finalizando {pending_picks.count()} picks de fantasy para la fase {stage.name}...")
-    successful_calculations = 0
-    failed_calculations = 0
-
-    with transaction.atomic(): # Para asegurar que o todos los picks se procesan o ninguno
-        for pick in pending_picks:
-            # Restar puntos previamente asignados si se está recalculando (si pick.points_earned > 0 y se fuerza recálculo)
-            if pick.points_earned != 0: # Si ya tenía puntos, es un recálculo.
-                 UserProfile.objects.filter(pk=pick.user_profile_id).update(total_fantasy_points=F('total_fantasy_points') - pick.points_earned)
-                 pick.points_earned = 0 # Resetear antes de recalcular
-
-            if calculate_phase_pick_points(pick.id):
-                successful_calculations += 1
-            else:
-                failed_calculations += 1
-                # Si un cálculo falla, la transacción se revertirá, así que los UserProfile.total_fantasy_points
-    
-    if failed_calculations > 0:
-        message = f"Proceso de finalización para {stage.name} falló para {failed_calculations} picks. {successful_calculations} éxitos. La transacción fue revertida."
-        print(message)
-        return {'success': False, 'message': message, 'successful': successful_calculations, 'failed': failed_calculations}
-    else:
-        # Marcar la fase como finalizada en términos de fantasy si todos los cálculos fueron exitosos
-        stage.fantasy_status = 'FINALIZED'
-        stage.save()
-        message = f"Proceso de finalización de picks para {stage.name} completado. Éxitos: {successful_calculations}."
-        print(message)
-        return {'success': True, 'message': message, 'successful': successful_calculations, 'failed': 0}
+    successful_calculations = score_phase_picks_in_bulk(stage)
+
+    # Marcar la fase como finalizada en términos de fantasy
+    stage.fantasy_status = 'FINALIZED'
+    stage.save()
+    refresh_finalization_leaderboards(stage)
+    message = f"Proceso de finalización de picks para {stage.name} completado. Éxitos: {successful_calculations}."
+    print(message)
+    return {'success': True, 'message': message, 'successful': successful_calculations, 'failed': 0}
+
+
+# --- Puntos provisionales (fase en juego) ---
+# Categoría del pick -> campo M2M de FantasyPhasePick
+PHASE_PICK_FIELDS = {'3-0': 'teams_3_0', 'advance': 'teams_advance', '0-3': 'teams_0_3'}
+PROVISIONAL_BATCH_SIZE = 2000
+
+def classify_phase_choice(category: str, wins: int, losses: int) -> str:
+    """'earned', 'possible' o 'dead' para un equipo elegido en `category` con su récord actual."""
+    if category == '3-0':
+        if losses == 0:
+            return 'earned' if wins == 3 else 'possible'
+        return 'dead'
+    if category == '0-3':
+        if wins == 0:
+            return 'earned' if losses == 3 else 'possible'
+        return 'dead'
+    # advance: 3-1 o 3-2
+    if wins == 3:
+        return 'earned' if losses > 0 else 'dead'
+    return 'dead' if losses >= 3 else 'possible'
+
+def _phase_choice_points(category: str, team_id: int, low_seed_bonus_ids: set[int]) -> Decimal:
+    if category == '0-3':
+        return Decimal(POINTS_CORRECT_0_3)
+    points = POINTS_CORRECT_3_0 if category == '3-0' else POINTS_CORRECT_ADVANCE
+    if team_id in low_seed_bonus_ids:
+        points *= SEED_BONUS_MULTIPLIER
+    return Decimal(str(points))
+
+def _provisional_contribution(category: str, team_id: int, record: tuple[int, int], low_seed_bonus_ids: set[int]) -> dict:
+    """Aporte de un equipo elegido a los campos de ProvisionalPhaseScore con el récord `record`."""
+    status = classify_phase_choice(category, *record)
+    points = _phase_choice_points(category, team_id, low_seed_bonus_ids)
+    return {
+        'earned_points': points if status == 'earned' else Decimal(0),
+        'max_points': points if status != 'dead' else Decimal(0),
+        'earned_picks': int(status == 'earned'),
+        'possible_picks': int(status == 'possible'),
+        'dead_picks': int(status == 'dead'),
+    }
+
+def rebuild_provisional_scores(stage: Stage) -> int:
+    """
+    Reconstruye desde cero los ProvisionalPhaseScore de todos los picks de la fase con los récords
+    actuales (al bloquear la fase o para reparar). Devuelve el número de filas creadas.
+    """
+    records = {team_id: (wins, losses) for team_id, wins, losses in StageTeam.objects.filter(stage=stage).values_list('team_id', 'wins', 'losses')}
+    low_seed_bonus_ids = get_low_seed_bonus_teams_ids(stage)
+    scores = {
+        pick_id: ProvisionalPhaseScore(pick_id=pick_id, stage=stage, user_profile_id=profile_id)
+        for pick_id, profile_id in FantasyPhasePick.objects.filter(stage=stage).values_list('pk', 'user_profile_id')
+    }
+    for category, field in PHASE_PICK_FIELDS.items():
+        through = getattr(FantasyPhasePick, field).through
+        for pick_id, team_id in through.objects.filter(fantasyphasepick__stage=stage).values_list('fantasyphasepick_id', 'team_id'):
+            if team_id not in records:
+                continue
+            score = scores[pick_id]
+            for name, value in _provisional_contribution(category, team_id, records[team_id], low_seed_bonus_ids).items():
+                setattr(score, name, getattr(score, name) + value)
+
+    with transaction.atomic():
+        ProvisionalPhaseScore.objects.filter(stage=stage).delete()
+        ProvisionalPhaseScore.objects.bulk_create(scores.values(), batch_size=PROVISIONAL_BATCH_SIZE)
+    schedule_sorted_leaderboard_refresh('live')
+    return len(scores)
+
+def update_provisional_scores(stage: Stage, record_changes: dict[int, tuple[tuple[int, int], tuple[int, int]]]) -> None:
+    """
+    Ajusta los puntos provisionales tras un cambio de récord: `record_changes` es
+    {team_id: (récord anterior, récord nuevo)}. Como el aporte de cada equipo elegido solo depende
+    de su propio récord, basta un UPDATE con F() por equipo y categoría sobre los picks que lo
+    eligieron, sin recalcular los picks uno a uno. Si la fase no tiene puntos provisionales no hace nada.
+    """
+    if not ProvisionalPhaseScore.objects.filter(stage=stage).exists():
+        return
+    low_seed_bonus_ids = get_low_seed_bonus_teams_ids(stage)
+    now = timezone.now()
+    with transaction.atomic():
+        for team_id, (old_record, new_record) in sorted(record_changes.items()):
+            for category, field in PHASE_PICK_FIELDS.items():
+                old = _provisional_contribution(category, team_id, old_record, low_seed_bonus_ids)
+                new = _provisional_contribution(category, team_id, new_record, low_seed_bonus_ids)
+                deltas = {name: new[name] - old[name] for name in new if new[name] != old[name]}
+                if deltas:
+                    ProvisionalPhaseScore.objects.filter(stage=stage, **{f'pick__{field}': team_id}).update(
+                        updated_at=now, **{name: F(name) + delta for name, delta in deltas.items()},
+                    )
+    # Los totales por perfil de la columna en vivo se reordenan una vez, fuera de la petición
+    schedule_sorted_leaderboard_refresh('live')
+# --- Fin puntos provisionales ---
+
+
+def get_playoff_actual_results(playoff_stage: Stage) -> dict:
+    """Ganadores reales de cuartos, semifinales y final de la fase de playoffs (una consulta)."""
+    actual_results = {'qf': set(), 'sf': set(), 'final': None}
+    matches = Match.objects.filter(stage=playoff_stage, round_number__in=[1, 2, 3], winner__isnull=False).order_by('pk')
+    for round_number, winner_id in matches.values_list('round_number', 'winner_id'):
+        if round_number == 1:
+            actual_results['qf'].add(winner_id)
+        elif round_number == 2:
+            actual_results['sf'].add(winner_id)
+        elif actual_results['final'] is None:
+            actual_results['final'] = winner_id
+    return actual_results
+
+def score_playoff_pick(user_picked_qf_ids: set[int], user_picked_sf_ids: set[int], user_picked_final_id: int | None,
+                       actual_results: dict) -> tuple[int, dict[str, int]]:
+    """Puntos totales y desglose por equipo de un pick de playoffs frente a `get_playoff_actual_results`."""
+    total_points_for_playoffs = 0
+    current_playoff_team_points_breakdown = {} # Nuevo diccionario para el desglose
+
+    # Calcular puntos para QF
+    correct_qf_picks = user_picked_qf_ids.intersection(actual_results['qf'])
+    for team_id in correct_qf_picks:
+        points = POINTS_CORRECT_QF_WINNER
+        total_points_for_playoffs += points
+        current_playoff_team_points_breakdown[str(team_id)] = round(current_playoff_team_points_breakdown.get(str(team_id), 0) + points)
+
+    # Calcular puntos para SF
+    correct_sf_picks = user_picked_sf_ids.intersection(actual_results['sf'])
+    for team_id in correct_sf_picks:
+        points = POINTS_CORRECT_SF_WINNER
+        total_points_for_playoffs += points
+        current_playoff_team_points_breakdown[str(team_id)] = round(current_playoff_team_points_breakdown.get(str(team_id), 0) + points)
+
+    # Calcular puntos para la Final
+    if user_picked_final_id and user_picked_final_id == actual_results['final']:
+        points = POINTS_CORRECT_FINAL_WINNER
+        total_points_for_playoffs += points
+        current_playoff_team_points_breakdown[str(user_picked_final_id)] = round(current_playoff_team_points_breakdown.get(str(user_picked_final_id), 0) + points)
+
+    return round(total_points_for_playoffs), current_playoff_team_points_breakdown
+
+def _scoring_plan(kind: str, stage: Stage):
+    """
+    Picks de la fase (`kind` PHASE) o de los playoffs de su torneo (PLAYOFF), sus campos M2M por
+    categoría y la función `score(fila, elecciones) -> (puntos, desglose)` con los resultados reales.
+    """
+    if kind == 'PLAYOFF':
+        actual_results = get_playoff_actual_results(stage)
+        return (
+            FantasyPlayoffPick.objects.filter(tournament_id=stage.tournament_id),
+            {'qf': 'quarter_final_winners', 'sf': 'semi_final_winners'},
+            lambda row, choices: score_playoff_pick(choices['qf'], choices['sf'], row['final_winner_id'], actual_results),
+        )
+    actual_results = get_stage_actual_results(stage)
+    return (
+        FantasyPhasePick.objects.filter(stage=stage),
+        PHASE_PICK_FIELDS,
+        lambda row, choices: score_phase_pick(choices['3-0'], choices['advance'], choices['0-3'], actual_results),
+    )
+
+
+def _pick_rows(picks):
+    fields = ['pk', 'user_profile_id', 'points_earned']
+    if picks.model is FantasyPlayoffPick:
+        fields.append('final_winner_id')
+    return picks.order_by('pk').values(*fields)
+
+
+def _score_rows(model, rows, choice_fields: dict[str, str], score) -> list[tuple]:
+    """
+    Puntúa las filas de picks leyendo sus elecciones directamente de las tablas intermedias M2M
+    (una consulta por categoría). Devuelve [(pick_id, user_profile_id, puntos, desglose)].
+    """
+    pick_column = f'{model._meta.model_name}_id'
+    picked = {row['pk']: {category: set() for category in choice_fields} for row in rows}
+    for category, field in choice_fields.items():
+        through = getattr(model, field).through
+        for pick_id, team_id in through.objects.filter(**{f'{pick_column}__in': picked}).values_list(pick_column, 'team_id'):
+            picked[pick_id][category].add(team_id)
+    return [(row['pk'], row['user_profile_id'], *score(row, picked[row['pk']])) for row in rows]
+
+
+def _write_scored_picks(model, scored, previous_points: dict[int, int]) -> None:
+    """
+    Guarda los picks puntuados y suma a cada UserProfile la diferencia con los puntos que ya tenía
+    el pick (`previous_points`). Son dos UPDATE parametrizados con executemany: bulk_update arma
+    una expresión CASE por fila y campo, y construirla costaba más que todo el cálculo de puntos.
+    """
+    now = timezone.now()
+    fields = [model._meta.get_field(name) for name in ('points_earned', 'team_points_breakdown', 'is_finalized', 'updated_at')]
+    profile_deltas = {}
+    pick_rows = []
+    for pick_id, profile_id, points, breakdown in scored:
+        pick_rows.append([field.get_db_prep_save(value, connection) for field, value in zip(fields, (points, breakdown, True, now))] + [pick_id])
+        # Si el pick ya tenía puntos es un recálculo: se descuentan los anteriores
+        profile_deltas[profile_id] = profile_deltas.get(profile_id, 0) + points - previous_points[pick_id]
+
+    quote = connection.ops.quote_name
+    profile_updated_at = UserProfile._meta.get_field('updated_at').get_db_prep_save(now, connection)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"UPDATE {quote(model._meta.db_table)} SET "
+            + ', '.join(f"{quote(field.column)} = %s" for field in fields)
+            + f" WHERE {quote(model._meta.pk.column)} = %s",
+            pick_rows,
+        )
+        profile_rows = [(delta, profile_updated_at, profile_id) for profile_id, delta in profile_deltas.items() if delta]
+        if profile_rows:
+            total = quote(UserProfile._meta.get_field('total_fantasy_points').column)
+            cursor.executemany(
+                f"UPDATE {quote(UserProfile._meta.db_table)} SET {total} = {total} + %s, "
+                f"{quote(UserProfile._meta.get_field('updated_at').column)} = %s WHERE {quote(UserProfile._meta.pk.column)} = %s",
+                profile_rows,
+            )
+    # executemany no pasa por save(): se invalidan a mano los perfiles públicos cacheados
+    bump_profile_generations(profile_deltas)
+
+
+def score_pick_shard(kind: str, stage_id: int, first_pk: int, last_pk: int) -> list[tuple]:
+    """
+    Puntúa (sin escribir) los picks pendientes con pk en [first_pk, last_pk]. Se ejecuta en los
+    procesos worker de `_score_picks_in_bulk`, cada uno con su propia conexión a la base de datos.
+    """
+    stage = Stage.objects.get(pk=stage_id)
+    picks, choice_fields, score = _scoring_plan(kind, stage)
+    rows = list(_pick_rows(picks.filter(is_finalized=False, pk__gte=first_pk, pk__lte=last_pk)))
+    return _score_rows(picks.model, rows, choice_fields, score)
+
+
+def _init_scoring_worker(database_name) -> None:
+    # Con spawn/forkserver el worker arranca sin Django configurado; con fork ya lo está
+    import django
+    django.setup()
+    # La misma base que el coordinador (p. ej. la de tests, que no es la de settings)
+    connection.settings_dict['NAME'] = database_name
+
+
+def _score_picks_in_bulk(kind: str, stage: Stage, chunk_size: int, after_pk: int = 0,
+                         on_chunk=None, workers: int = 1) -> int:
+    """
+    Motor por lotes común a picks de fase y de playoffs. Los lotes avanzan por pk a partir de
+    `after_pk` y cada uno se guarda en una transacción; `on_chunk(last_pk, count)` se ejecuta dentro
+    de ella, así que un checkpoint guardado ahí nunca queda desalineado con los puntos sumados.
+
+    Con `workers` > 1 los picks pendientes se reparten en rangos de pk de `chunk_size` que se
+    puntúan en paralelo en otros procesos; este proceso (coordinador) escribe los resultados en
+    orden y suma las diferencias a los UserProfile, con el mismo resultado que en serie.
+    Dentro de una transacción abierta se puntúa en serie: los workers no verían sus cambios sin
+    confirmar y cerrar las conexiones la rompería.
+    """
+    picks, choice_fields, score = _scoring_plan(kind, stage)
+    model = picks.model
+    if workers > 1 and not connection.in_atomic_block:
+        return _score_picks_in_parallel(kind, stage, picks, chunk_size, after_pk, on_chunk, workers)
+
+    scored_count = 0
+    last_pk = after_pk
+    while True:
+        with transaction.atomic():
+            rows = list(_pick_rows(picks.select_for_update().filter(is_finalized=False, pk__gt=last_pk))[:chunk_size])
+            if not rows:
+                return scored_count
+            last_pk = rows[-1]['pk']
+            _write_scored_picks(model, _score_rows(model, rows, choice_fields, score),
+                                {row['pk']: row['points_earned'] for row in rows})
+            scored_count += len(rows)
+            if on_chunk is not None:
+                on_chunk(last_pk, len(rows))
+
+
+def _score_picks_in_parallel(kind, stage, picks, chunk_size, after_pk, on_chunk, workers) -> int:
+    from concurrent.futures import ProcessPoolExecutor
+    from django.db import connections
+
+    pending = list(picks.filter(is_finalized=False, pk__gt=after_pk).order_by('pk').values_list('pk', flat=True))
+    shards = [(pending[i], pending[min(i + chunk_size, len(pending)) - 1]) for i in range(0, len(pending), chunk_size)]
+    if not shards:
+        return 0
+
+    # Los procesos hijos no deben heredar conexiones abiertas del coordinador
+    connections.close_all()
+    scored_count = 0
+    with ProcessPoolExecutor(max_workers=min(workers, len(shards)), initializer=_init_scoring_worker,
+                             initargs=(connection.settings_dict['NAME'],)) as pool:
+        results = pool.map(score_pick_shard, [kind] * len(shards), [stage.pk] * len(shards),
+                           [first for first, _ in shards], [last for _, last in shards])
+        for (_, shard_last_pk), scored in zip(shards, results):
+            with transaction.atomic():
+                # Solo se escriben los picks que siguen pendientes, con sus puntos previos bloqueados
+                previous_points = dict(picks.select_for_update().filter(pk__in=[pick_id for pick_id, *_ in scored], is_finalized=False)
+                                       .values_list('pk', 'points_earned'))
+                scored = [row for row in scored if row[0] in previous_points]
+                if scored:
+                    _write_scored_picks(picks.model, scored, previous_points)
+                scored_count += len(scored)
+                if on_chunk is not None:
+                    on_chunk(shard_last_pk, len(scored))
+    return scored_count
+
+
+def score_phase_picks_in_bulk(stage: Stage, chunk_size: int = PHASE_SCORING_CHUNK_SIZE,
+                              after_pk: int = 0, on_chunk=None, workers: int = 1) -> int:
+    """
+    Calcula los puntos de todos los picks pendientes de una fase por lotes de `chunk_size`, con el
+    mismo resultado que `calculate_phase_pick_points` pick a pick. Los resultados reales se leen una
+    vez; cada lote lee sus elecciones directamente de las tablas intermedias M2M y guarda los picks
+    y los UserProfile con un UPDATE por tabla (ver `_write_scored_picks`).
+    Cada lote es una transacción: si el proceso se interrumpe, los lotes ya guardados quedan
+    finalizados y una nueva ejecución continúa con los picks pendientes.
+    Devuelve el número de picks puntuados.
+    """
+    return _score_picks_in_bulk('PHASE', stage, chunk_size, after_pk, on_chunk, workers)
+
+
+def score_playoff_picks_in_bulk(playoff_stage: Stage, chunk_size: int = PHASE_SCORING_CHUNK_SIZE,
+                                after_pk: int = 0, on_chunk=None, workers: int = 1) -> int:
+    """Como `score_phase_picks_in_bulk`, para los picks de playoffs del torneo de `playoff_stage`."""
+    return _score_picks_in_bulk('PLAYOFF', playoff_stage, chunk_size, after_pk, on_chunk, workers)
 
 
 def calculate_playoff_pick_points(fantasy_playoff_pick_id: int):
@@ -181,55 +513,20 @@ def calculate_playoff_pick_points(fantasy_playoff_pick_id: int):
         print(f"Error: No se encontró una fase de PLAYOFF para el torneo {tournament.name}. No se pueden calcular puntos.")
         return False
 
-    total_points_for_playoffs = 0
-    
-    actual_qf_winners_ids = set()
-    actual_sf_winners_ids = set()
-    actual_final_winner_id = None
-
-    current_playoff_team_points_breakdown = {} # Nuevo diccionario para el desglose
-
-    qf_matches = Match.objects.filter(stage=playoff_stage, round_number=1, winner__isnull=False)
-    for match in qf_matches: actual_qf_winners_ids.add(match.winner_id)
-    
-    sf_matches = Match.objects.filter(stage=playoff_stage, round_number=2, winner__isnull=False)
-    for match in sf_matches: actual_sf_winners_ids.add(match.winner_id)
-
-    final_match = Match.objects.filter(stage=playoff_stage, round_number=3, winner__isnull=False).first()
-    if final_match: actual_final_winner_id = final_match.winner_id
-
-    # Elecciones del usuario
-    user_picked_qf_ids = set(playoff_pick.quarter_final_winners.values_list('id', flat=True))
-    user_picked_sf_ids = set(playoff_pick.semi_final_winners.values_list('id', flat=True))
-    user_picked_final_id = playoff_pick.final_winner_id
-
-    # Calcular puntos para QF
-    correct_qf_picks = user_picked_qf_ids.intersection(actual_qf_winners_ids)
-    for team_id in correct_qf_picks:
-        points = POINTS_CORRECT_QF_WINNER
-        total_points_for_playoffs += points
-        current_playoff_team_points_breakdown[str(team_id)] = round(current_playoff_team_points_breakdown.get(str(team_id), 0) + points)
-
-    # Calcular puntos para SF
-    correct_sf_picks = user_picked_sf_ids.intersection(actual_sf_winners_ids)
-    for team_id in correct_sf_picks:
-        points = POINTS_CORRECT_SF_WINNER
-        total_points_for_playoffs += points
-        current_playoff_team_points_breakdown[str(team_id)] = round(current_playoff_team_points_breakdown.get(str(team_id), 0) + points)
-
-    # Calcular puntos para la Final
-    if user_picked_final_id and user_picked_final_id == actual_final_winner_id:
-        points = POINTS_CORRECT_FINAL_WINNER
-        total_points_for_playoffs += points
-        current_playoff_team_points_breakdown[str(user_picked_final_id)] = round(current_playoff_team_points_breakdown.get(str(user_picked_final_id), 0) + points)
-    
-    total_points_for_playoffs = round(total_points_for_playoffs)
+    total_points_for_playoffs, current_playoff_team_points_breakdown = score_playoff_pick(
+        set(playoff_pick.quarter_final_winners.values_list('id', flat=True)),
+        set(playoff_pick.semi_final_winners.values_list('id', flat=True)),
+        playoff_pick.final_winner_id,
+        get_playoff_actual_results(playoff_stage),
+    )
 
     playoff_pick.points_earned = total_points_for_playoffs
     playoff_pick.team_points_breakdown = current_playoff_team_points_breakdown # Guardar el desglose
     playoff_pick.is_finalized = True
     playoff_pick.save()
 
+    # Sin reconstruir el leaderboard por cada pick: quien puntúa un lote lo refresca una vez al final
+    # (como refresh_finalization_leaderboards)
     UserProfile.objects.filter(pk=user_profile.pk).update(total_fantasy_points=F('total_fantasy_points') + total_points_for_playoffs)
 
     print(f"Puntos de Playoffs calculados para Pick ID {playoff_pick.id} ({user_profile.user.username} - {tournament.name}): {total_points_for_playoffs}")
@@ -263,26 +560,8 @@ def finalize_fantasy_playoff_picks(tournament_id: int):
         return {'success': True, 'message': f'No hay picks de playoffs pendientes para {tournament.name}.'}
 
     print(f"Finalizando {pending_playoff_picks.count()} picks de playoffs para el torneo {tournament.name}...")
-    successful_calculations = 0
-    failed_calculations = 0
-
-    with transaction.atomic():
-        for pick in pending_playoff_picks:
-            if pick.points_earned != 0:
-                 UserProfile.objects.filter(pk=pick.user_profile_id).update(total_fantasy_points=F('total_fantasy_points') - pick.points_earned)
-                 pick.points_earned = 0 
-                 # pick.is_finalized la maneja la función de cálculo
-
-            if calculate_playoff_pick_points(pick.id): # Aquí se podría pasar force_recalculate=True
-                successful_calculations += 1
-            else:
-                failed_calculations += 1
-            
-    if failed_calculations > 0:
-        message = f"Proceso de finalización de picks de playoffs para {tournament.name} falló para {failed_calculations} picks. {successful_calculations} éxitos. La transacción fue revertida."
-        print(message)
-        return {'success': False, 'message': message, 'successful': successful_calculations, 'failed': failed_calculations}
-    else:
-        message = f"Proceso de finalización de picks de playoffs para {tournament.name} completado. Éxitos: {successful_calculations}."
-        print(message)
-        return {'success': True, 'message': message, 'successful': successful_calculations, 'failed': failed_calculations} 
\ No newline at end of file
+    successful_calculations = score_playoff_picks_in_bulk(playoff_stage)
+    refresh_finalization_leaderboards(playoff_stage)
+    message = f"Proceso de finalización de picks de playoffs para {tournament.name} completado. Éxitos: {successful_calculations}."
+    print(message)
+    return {'success': True, 'message': message, 'successful': successful_calculations, 'failed': 0}
@@ -0,0 +1,106 @@
+"""
+Proyección de puntos fantasy de los picks de fase con el simulador Monte Carlo de fases suizas.
+
+Se juega una sola vez un lote de simulaciones del resto de la fase (`swiss.montecarlo.play_swiss_stage`)
+y se comparte entre todos los picks: cada simulación se reduce a los puntos que da cada
+(categoría, equipo) y cada pick a una fila 0/1 sobre esas mismas columnas, así que los puntos de
+todos los picks en todas las simulaciones son un producto de matrices picks × resultados.
+De ahí salen la media y los percentiles 10/90 de cada pick, que se guardan en PhasePickProjection.
+
+Requiere NumPy; las vistas, el admin y los comandos lo importan de forma diferida.
+"""
+import numpy as np
+from django.db import transaction
+
+from .fantasy_logic import (
+    PHASE_PICK_FIELDS, POINTS_CORRECT_0_3, POINTS_CORRECT_3_0, POINTS_CORRECT_ADVANCE, SEED_BONUS_MULTIPLIER,
+    get_low_seed_bonus_teams_ids,
+)
+from .leaderboard import refresh_sorted_leaderboard
+from .models import FantasyPhasePick, PhasePickProjection
+from .profile_cache import bump_stage_generation
+from .swiss.engine import MAX_WINS_LOSSES
+from .swiss.montecarlo import load_stage_strengths, play_swiss_stage, win_probability_matrix
+
+PROJECTION_SIMULATIONS = 2000
+# Picks por bloque del producto de matrices: acota la memoria a PROJECTION_CHUNK_SIZE × simulaciones
+PROJECTION_CHUNK_SIZE = 2000
+PROJECTION_PERCENTILES = (10, 90)
+CATEGORIES = list(PHASE_PICK_FIELDS)
+
+
+def outcome_points(wins: np.ndarray, losses: np.ndarray, low_seed_bonus: np.ndarray) -> np.ndarray:
+    """
+    Puntos que da cada (categoría, equipo) en cada simulación a partir de los récords finales
+    simulados (S, n). Devuelve (S, 3n) con las columnas en el orden de CATEGORIES y, dentro de
+    cada categoría, de los índices de equipo. `low_seed_bonus` es una máscara (n,) del bonus de underdog.
+    """
+    bonus = np.where(low_seed_bonus, SEED_BONUS_MULTIPLIER, 1.0)
+    three_wins = wins == MAX_WINS_LOSSES
+    indicators = {
+        '3-0': three_wins & (losses == 0),
+        'advance': three_wins & (losses > 0),
+        '0-3': (wins == 0) & (losses == MAX_WINS_LOSSES),
+    }
+    points = {
+        '3-0': POINTS_CORRECT_3_0 * bonus,
+        'advance': POINTS_CORRECT_ADVANCE * bonus,
+        '0-3': np.full(len(bonus), float(POINTS_CORRECT_0_3)),
+    }
+    return np.concatenate([indicators[category] * points[category] for category in CATEGORIES], axis=1).astype(np.float32)
+
+
+def project_points(pick_matrix: np.ndarray, outcomes: np.ndarray, percentiles=PROJECTION_PERCENTILES,
+                   chunk_size: int = PROJECTION_CHUNK_SIZE) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Media y percentiles de los puntos finales de cada pick. `pick_matrix` (picks, 3n) marca con 1
+    las elecciones de cada pick; `outcomes` (S, 3n) viene de `outcome_points`. Como en el cálculo
+    definitivo, el total de cada simulación se redondea. Devuelve (expected (picks,), bands (picks, len(percentiles))).
+    """
+    expected = np.empty(len(pick_matrix))
+    bands = np.empty((len(pick_matrix), len(percentiles)))
+    for start in range(0, len(pick_matrix), chunk_size):
+        block = np.rint(pick_matrix[start:start + chunk_size] @ outcomes.T)
+        expected[start:start + chunk_size] = block.mean(axis=1, dtype=np.float64)
+        bands[start:start + chunk_size] = np.percentile(block, percentiles, axis=1).T
+    return expected, bands
+
+
+def project_phase_picks(stage, simulations: int = PROJECTION_SIMULATIONS, rng=None) -> int:
+    """
+    Simula `simulations` veces el resto de la fase suiza desde su estado actual y guarda la
+    proyección de todos sus picks (sustituye la anterior). Devuelve el número de picks proyectados.
+    """
+    state, _, strengths = load_stage_strengths(stage)
+    batch = play_swiss_stage(state, simulations, win_probability_matrix(strengths), np.random.default_rng(rng))
+
+    index_by_team = {team_id: i for i, team_id in enumerate(state.team_ids)}
+    n = len(index_by_team)
+    bonus_ids = get_low_seed_bonus_teams_ids(stage)
+    low_seed_bonus = np.array([team_id in bonus_ids for team_id in state.team_ids])
+    outcomes = outcome_points(batch.wins, batch.losses, low_seed_bonus)
+
+    picks = list(FantasyPhasePick.objects.filter(stage=stage).order_by('pk').values_list('pk', 'user_profile_id'))
+    row_by_pick = {pick_id: row for row, (pick_id, _) in enumerate(picks)}
+    pick_matrix = np.zeros((len(picks), len(CATEGORIES) * n), dtype=np.float32)
+    for offset, category in enumerate(CATEGORIES):
+        through = getattr(FantasyPhasePick, PHASE_PICK_FIELDS[category]).through
+        for pick_id, team_id in through.objects.filter(fantasyphasepick__stage=stage).values_list('fantasyphasepick_id', 'team_id'):
+            if team_id in index_by_team:
+                pick_matrix[row_by_pick[pick_id], offset * n + index_by_team[team_id]] = 1
+
+    expected, bands = project_points(pick_matrix, outcomes)
+    projections = [
+        PhasePickProjection(
+            pick_id=pick_id, stage=stage, user_profile_id=profile_id, simulations=simulations,
+            expected_points=float(expected[row]), p10_points=float(bands[row, 0]), p90_points=float(bands[row, 1]),
+        )
+        for row, (pick_id, profile_id) in enumerate(picks)
+    ]
+    with transaction.atomic():
+        PhasePickProjection.objects.filter(stage=stage).delete()
+        PhasePickProjection.objects.bulk_create(projections, batch_size=PROJECTION_CHUNK_SIZE)
+        # Total proyectado de cada perfil, ya ordenado para ?sort=projected
+        refresh_sorted_leaderboard('projected')
+    bump_stage_generation(stage.pk)
+    return len(projections)
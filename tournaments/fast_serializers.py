@@ -0,0 +1,172 @@
+"""
+Serializadores de lectura escritos a mano para los GET de fantasy más consultados
+(StageFantasyInfoView y el user_pick de TournamentFantasyPlayoffInfoView).
+
+Construyen dicts planos a partir de filas de `.values()` en lugar de instancias de modelo y
+ModelSerializer/SerializerMethodField, que dominan el tiempo de CPU de esas vistas. El JSON
+resultante es idéntico byte a byte al de StageFantasyInfoSerializer, FantasyPhasePickSerializer y
+FantasyPlayoffPickSerializer: mismas claves en el mismo orden y mismos valores, con la lógica por
+equipo compartida en StageFacts. Se activan con el setting FANTASY_FAST_SERIALIZERS; el comando
+`fantasy_serializer_benchmark` compara ambos caminos.
+"""
+from django.conf import settings
+from django.db.models import F, Value
+from rest_framework import serializers
+
+from .models import FantasyPhasePick, FantasyPlayoffPick, Stage, StageTeam, Tournament
+from .pick_counts import stage_pick_counts
+from .serializers import PICKED_TEAM_FIELDS, StageFacts, get_playoff_stage, stage_pick_rules
+
+# Mismo formato que los DateTimeField de los ModelSerializer (ISO 8601 en la zona horaria actual)
+_datetime = serializers.DateTimeField(read_only=True)
+
+PROFILE_VALUES = (
+    'user_profile__user__id', 'user_profile__user__username', 'user_profile__user__email',
+    'user_profile__twitch_id', 'user_profile__twitch_username', 'user_profile__twitch_profile_image_url',
+    'user_profile__total_fantasy_points',
+)
+PICK_VALUES = ('id', 'points_earned', 'is_locked', 'is_finalized', 'updated_at', 'team_points_breakdown') + PROFILE_VALUES
+PHASE_PICK_VALUES = PICK_VALUES + (
+    'stage__name', 'projection__pk', 'projection__expected_points', 'projection__p10_points',
+    'projection__p90_points', 'projection__simulations', 'projection__updated_at',
+)
+PLAYOFF_PICK_VALUES = PICK_VALUES + ('tournament__name', 'final_winner_id', 'final_winner__name', 'final_winner__logo')
+
+
+def fast_serializers_enabled() -> bool:
+    return getattr(settings, 'FANTASY_FAST_SERIALIZERS', False)
+
+
+def team_detail(team_id: int, name: str, logo: str, facts: StageFacts | None, role: str | None, pick: dict | None = None) -> dict:
+    """Como FantasyTeamDetailSerializer; `facts` es el de la fase del contexto (None si no hay fase)."""
+    wins, losses = facts.current_record(team_id) if facts else (None, None)
+    points_earned = None
+    if pick and pick['is_finalized']:
+        points_earned = pick['team_points_breakdown'].get(str(team_id))
+    return {
+        'id': team_id,
+        'name': name,
+        'logo': logo,
+        'seed': facts.seed(team_id) if facts else None,
+        'points_earned': points_earned,
+        'current_wins': wins,
+        'current_losses': losses,
+        'is_role_impossible': facts.is_role_impossible(team_id, role) if facts and role else False,
+        'is_bonus_active': facts.is_bonus_active(team_id, role) if facts else False,
+    }
+
+
+def _user_profile(row: dict) -> dict:
+    """Como UserProfileSerializer, desde las columnas PROFILE_VALUES de un pick."""
+    return {
+        'user': {
+            'id': row['user_profile__user__id'],
+            'username': row['user_profile__user__username'],
+            'email': row['user_profile__user__email'],
+        },
+        'twitch_id': row['user_profile__twitch_id'],
+        'twitch_username': row['user_profile__twitch_username'],
+        'twitch_profile_image_url': row['user_profile__twitch_profile_image_url'],
+        'total_fantasy_points': row['user_profile__total_fantasy_points'],
+    }
+
+
+def _picked_team_rows(model, pick_id: int) -> dict[str, list[tuple]]:
+    """{campo M2M: [(team_id, name, logo), ...]} de un pick en una sola consulta (UNION de las tablas intermedias)."""
+    source = f'{model._meta.model_name}_id'
+    branches = [
+        getattr(model, field).through.objects.filter(**{source: pick_id})
+        .annotate(field=Value(field), team_ref=F('team_id'), team_name=F('team__name'), team_logo=F('team__logo'))
+        .values_list('field', 'team_ref', 'team_name', 'team_logo')
+        for field in PICKED_TEAM_FIELDS[model]
+    ]
+    rows = {field: [] for field in PICKED_TEAM_FIELDS[model]}
+    # Por team_id dentro de cada M2M, como serializers.picked_teams
+    for field, team_id, name, logo in sorted(branches[0].union(*branches[1:], all=True)):
+        rows[field].append((team_id, name, logo))
+    return rows
+
+
+def phase_pick(row: dict, stage: Stage, context: dict) -> dict:
+    """Como FantasyPhasePickSerializer, desde una fila con PHASE_PICK_VALUES."""
+    facts = StageFacts.for_stage(context, stage)
+    teams = _picked_team_rows(FantasyPhasePick, row['id'])
+    projection = None
+    if row['projection__pk'] is not None:
+        projection = {
+            'expected_points': round(row['projection__expected_points'], 1),
+            'p10_points': round(row['projection__p10_points']),
+            'p90_points': round(row['projection__p90_points']),
+            'simulations': row['projection__simulations'],
+            'updated_at': row['projection__updated_at'],
+        }
+    return {
+        'id': row['id'],
+        'user_profile': _user_profile(row),
+        'stage_name': row['stage__name'],
+        **{
+            f'{field}_details': [team_detail(*team, facts, role, row) for team in teams[field]]
+            for field, role in (('teams_3_0', '3-0'), ('teams_advance', 'advance'), ('teams_0_3', '0-3'))
+        },
+        'points_earned': row['points_earned'],
+        'is_locked': row['is_locked'],
+        'is_finalized': row['is_finalized'],
+        'updated_at': _datetime.to_representation(row['updated_at']),
+        'team_points_breakdown': row['team_points_breakdown'],
+        'projection': projection,
+    }
+
+
+def playoff_pick(row: dict, playoff_stage: Stage | None, context: dict) -> dict:
+    """Como FantasyPlayoffPickSerializer, desde una fila con PLAYOFF_PICK_VALUES."""
+    facts = StageFacts.for_stage(context, playoff_stage) if playoff_stage else None
+    teams = _picked_team_rows(FantasyPlayoffPick, row['id'])
+    final_winner = None
+    if row['final_winner_id'] is not None:
+        final_winner = team_detail(row['final_winner_id'], row['final_winner__name'], row['final_winner__logo'], facts, 'final_winner', row)
+    return {
+        'id': row['id'],
+        'user_profile': _user_profile(row),
+        'tournament_name': row['tournament__name'],
+        'quarter_final_winners_details': [team_detail(*team, facts, 'qf_winner', row) for team in teams['quarter_final_winners']],
+        'semi_final_winners_details': [team_detail(*team, facts, 'sf_winner', row) for team in teams['semi_final_winners']],
+        'final_winner_details': final_winner,
+        'points_earned': row['points_earned'],
+        'is_locked': row['is_locked'],
+        'is_finalized': row['is_finalized'],
+        'updated_at': _datetime.to_representation(row['updated_at']),
+        'team_points_breakdown': row['team_points_breakdown'],
+    }
+
+
+def stage_fantasy_info(stage: Stage, request) -> dict:
+    """Como StageFantasyInfoSerializer(stage, context={'request': request}).data."""
+    context = {'request': request}
+    facts = StageFacts.for_stage(context, stage)
+    teams = [
+        team_detail(team_id, name, logo, facts, 'available')
+        for team_id, name, logo in StageTeam.objects.filter(stage=stage).values_list('team_id', 'team__name', 'team__logo')
+    ]
+    user_pick = None
+    if request.user.is_authenticated:
+        row = FantasyPhasePick.objects.filter(user_profile__user=request.user, stage=stage).values(*PHASE_PICK_VALUES).first()
+        if row:
+            user_pick = phase_pick(row, stage, context)
+    return {
+        'id': stage.id,
+        'name': stage.name,
+        'fantasy_status': stage.fantasy_status,
+        'teams': sorted(teams, key=lambda x: x['seed'] or 999), # Ordenar por seed
+        'rules': stage_pick_rules(stage),
+        'user_pick': user_pick,
+        'underdog_bonus_team_ids': facts.bonus_ids,
+        'pick_counts': stage_pick_counts(stage),
+    }
+
+
+def playoff_user_pick(user, tournament: Tournament, context: dict) -> dict | None:
+    """user_pick de TournamentFantasyPlayoffInfoView: el pick de playoffs de `user` en `tournament`, o None."""
+    if not user.is_authenticated:
+        return None
+    row = FantasyPlayoffPick.objects.filter(user_profile__user=user, tournament=tournament).values(*PLAYOFF_PICK_VALUES).first()
+    return playoff_pick(row, get_playoff_stage(context, tournament), context) if row else None
@@ -0,0 +1,141 @@
+"""
+Tabla precalculada de roles posibles por equipo y fase (RoleFeasibility).
+
+Si un equipo aún puede ir 3-0, avanzar o ir 0-3, o ganar una ronda de playoffs, solo cambia cuando
+cambia un partido o un StageTeam de la fase, así que se recalcula entonces (desde `results`, el
+admin y la actualización desde HLTV) y FantasyTeamDetailSerializer solo hace búsquedas en un
+diccionario. Las fases sin filas (p. ej. anteriores a la tabla) se calculan al vuelo sin guardarse.
+"""
+from django.db import transaction
+
+from .models import Match, RoleFeasibility, Stage, StageTeam
+from .profile_cache import bump_stage_generation
+
+SWISS_ROLES = ('3-0', 'advance', '0-3')
+# Rol de playoffs -> ronda que hay que ganar
+PLAYOFF_ROLE_ROUNDS = {'qf_winner': 1, 'sf_winner': 2, 'final_winner': 3}
+# Fila de playoffs que no es un rol de pick: el equipo aún no ha perdido ningún partido de la fase
+PLAYOFF_ALIVE_ROLE = 'in_playoffs'
+
+
+def _swiss_feasibility(wins: int, losses: int) -> dict[str, bool]:
+    # Basado en Major de CS: 3 victorias para avanzar, 3 derrotas para eliminar.
+    return {
+        '3-0': not (losses > 0 or wins == 3), # Si ya es 3-X también es "imposible" para este rol estricto.
+        'advance': losses < 3,
+        '0-3': not (wins > 0 or losses == 3),
+    }
+
+
+def _playoff_feasibility(team_ids: set[int], matches) -> dict[int, dict[str, bool]]:
+    """Tabla de una fase de playoffs a partir de sus partidos (round_number, team1_id, team2_id, winner_id)."""
+    team_ids = set(team_ids)
+    losers, winners, pending_rounds = set(), {}, set()
+    for round_number, team1_id, team2_id, winner_id in matches:
+        team_ids.update((team1_id, team2_id))
+        if winner_id is None:
+            pending_rounds.add(round_number)
+            continue
+        winners.setdefault(round_number, set()).add(winner_id)
+        losers.update({team1_id, team2_id} - {winner_id})
+
+    feasibility = {}
+    for team_id in team_ids:
+        roles = {PLAYOFF_ALIVE_ROLE: team_id not in losers}
+        for role, round_number in PLAYOFF_ROLE_ROUNDS.items():
+            if team_id in losers:
+                roles[role] = False
+            # Mientras queden partidos sin decidir hasta esa ronda, aún es posible
+            elif any(pending <= round_number for pending in pending_rounds):
+                roles[role] = True
+            else:
+                roles[role] = team_id in winners.get(round_number, set())
+        feasibility[team_id] = roles
+    return feasibility
+
+
+def compute_role_feasibility(stage: Stage) -> dict[int, dict[str, bool]]:
+    """{team_id: {rol: aún posible}} de los equipos de la fase (1 o 2 consultas)."""
+    if stage.type == 'SWISS':
+        return {
+            team_id: _swiss_feasibility(wins, losses)
+            for team_id, wins, losses in StageTeam.objects.filter(stage=stage).values_list('team_id', 'wins', 'losses')
+        }
+    return _playoff_feasibility(
+        set(StageTeam.objects.filter(stage=stage).values_list('team_id', flat=True)),
+        Match.objects.filter(stage=stage).values_list('round_number', 'team1_id', 'team2_id', 'winner_id'),
+    )
+
+
+def refresh_role_feasibility(stage: Stage, team_ids=None) -> int:
+    """
+    Recalcula y guarda la tabla de la fase. Devuelve el número de filas escritas.
+
+    Con `team_ids` en una fase suiza solo se reescriben esos equipos: sus roles dependen únicamente de
+    su propio récord, así que un resultado cambia las filas de sus dos equipos y no las del resto.
+    En playoffs se reescribe siempre entera: decidir el último partido pendiente de una ronda cambia
+    los roles de todos los equipos, y la tabla tiene pocas filas (3 roles y 'in_playoffs' por equipo).
+    """
+    with transaction.atomic():
+        # Recálculos concurrentes de la misma fase se ordenan con el bloqueo de su fila,
+        # así el último en escribir es también el último en leer los partidos
+        Stage.objects.select_for_update().filter(pk=stage.pk).exists()
+        existing = RoleFeasibility.objects.filter(stage=stage)
+        # Una tabla a medias desactivaría el cálculo al vuelo de las fases sin filas
+        if team_ids is not None and stage.type == 'SWISS' and existing.exists():
+            feasibility = {
+                team_id: _swiss_feasibility(wins, losses)
+                for team_id, wins, losses in StageTeam.objects.filter(stage=stage, team_id__in=list(team_ids)).values_list('team_id', 'wins', 'losses')
+            }
+            existing = existing.filter(team_id__in=list(team_ids))
+        else:
+            feasibility = compute_role_feasibility(stage)
+        rows = [
+            RoleFeasibility(stage=stage, team_id=team_id, role=role, is_possible=is_possible)
+            for team_id, roles in feasibility.items()
+            for role, is_possible in roles.items()
+        ]
+        existing.delete()
+        RoleFeasibility.objects.bulk_create(rows)
+    # Cambió un resultado: los perfiles públicos cacheados con esta fase dejan de valer
+    bump_stage_generation(stage.pk)
+    return len(rows)
+
+
+def refresh_role_feasibility_for_stages(stage_ids) -> None:
+    for stage in Stage.objects.filter(pk__in=set(stage_ids)).order_by('pk'):
+        refresh_role_feasibility(stage)
+
+
+def stage_role_feasibility(stage: Stage) -> dict[int, dict[str, bool]]:
+    """La tabla guardada de la fase (una consulta), o calculada al vuelo si aún no tiene filas."""
+    feasibility = {}
+    for team_id, role, is_possible in RoleFeasibility.objects.filter(stage=stage).values_list('team_id', 'role', 'is_possible'):
+        feasibility.setdefault(team_id, {})[role] = is_possible
+    return feasibility or compute_role_feasibility(stage)
+
+
+def stages_role_feasibility(stages, records_by_stage: dict[int, dict[int, tuple[int, int, int]]]) -> dict[int, dict]:
+    """
+    Como `stage_role_feasibility` para varias fases a la vez, en una consulta (dos si alguna fase de
+    playoffs aún no tiene filas). `records_by_stage` son los {team_id: (seed, wins, losses)} ya
+    cargados de cada fase, con los que se calculan al vuelo las fases sin filas.
+    """
+    stages = {stage.pk: stage for stage in stages}
+    feasibility = {stage_id: {} for stage_id in stages}
+    for stage_id, team_id, role, is_possible in RoleFeasibility.objects.filter(stage_id__in=stages).values_list('stage_id', 'team_id', 'role', 'is_possible'):
+        feasibility[stage_id].setdefault(team_id, {})[role] = is_possible
+
+    missing = [stage_id for stage_id, table in feasibility.items() if not table]
+    matches = {}
+    missing_playoffs = [stage_id for stage_id in missing if stages[stage_id].type == 'PLAYOFF']
+    if missing_playoffs:
+        for stage_id, *match in Match.objects.filter(stage_id__in=missing_playoffs).values_list('stage_id', 'round_number', 'team1_id', 'team2_id', 'winner_id'):
+            matches.setdefault(stage_id, []).append(match)
+    for stage_id in missing:
+        records = records_by_stage.get(stage_id, {})
+        if stages[stage_id].type == 'SWISS':
+            feasibility[stage_id] = {team_id: _swiss_feasibility(wins, losses) for team_id, (_, wins, losses) in records.items()}
+        else:
+            feasibility[stage_id] = _playoff_feasibility(set(records), matches.get(stage_id, []))
+    return feasibility
@@ -4,7 +4,9 @@ import time # Para el delay simulado
 from django.utils import timezone
 # from HLTV import HLTV # Esto es conceptual, se necesita una librería Python o un wrapper
 # from python_hltv import HLTV # Ejemplo de librería Python que podrías usar
+from .feasibility import refresh_role_feasibility
 from .models import Match, Team, HLTVUpdateSettings
+from .snapshot import bump_versions_for_stages
 
 logger = logging.getLogger(__name__)
 
@@ -200,6 +202,8 @@ def update_single_match_from_hltv(match_id: int):
     if changed:
         match.last_hltv_update = timezone.now()
         match.save()
+        bump_versions_for_stages([match.stage_id])
+        refresh_role_feasibility(match.stage)
         logger.info(f"Partido {match.id} actualizado con datos de HLTV.")
     else:
         logger.info(f"No se detectaron cambios necesarios para el partido {match.id} desde HLTV.")
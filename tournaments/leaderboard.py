@@ -0,0 +1,314 @@
+"""
+Leaderboards fantasy materializados: el global en LeaderboardEntry y los de cada fase y torneo en
+ScopedLeaderboardEntry.
+
+Cada uno se reconstruye con un único INSERT ... SELECT con funciones de ventana (DENSE_RANK para el
+puesto y ROW_NUMBER para el orden del listado). El global se reconstruye al terminar una finalización
+fantasy y, cuando se guarda un UserProfile con otro total, una vez en segundo plano tras confirmar
+(`schedule_leaderboard_refresh`). Un perfil nuevo nunca lo reconstruye: se añade al final
+(`sync_leaderboard_entry`), que es su sitio porque los empates se ordenan por antigüedad del perfil.
+Los de fase y torneo, al finalizar los picks de esa fase (`refresh_finalization_leaderboards`).
+La columna en vivo (?sort=live) y la proyectada (?sort=projected) se materializan igual en
+SortedLeaderboardEntry: la primera se reconstruye en segundo plano cuando cambian los puntos
+provisionales (`schedule_sorted_leaderboard_refresh`) y la segunda al guardar cada proyección.
+Las páginas son rangos de `position` (índice único) en lugar de ORDER BY + OFFSET sobre todos los
+perfiles, y el total sale del máximo del índice en lugar de un COUNT.
+"""
+import logging
+import threading
+import uuid
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.db.models import CharField, Exists, F, FloatField, IntegerField, Max, OuterRef, Subquery, Sum, Value, Window
+from django.db.models.functions import Cast, Coalesce, DenseRank, RowNumber
+
+from .models import (
+    FantasyPhasePick, FantasyPlayoffPick, LeaderboardEntry, PhasePickProjection, ProvisionalPhaseScore,
+    ScopedLeaderboardEntry, SortedLeaderboardEntry, UserProfile,
+)
+from .profile_cache import bump_stage_generation
+
+logger = logging.getLogger(__name__)
+
+LEADERBOARD_PAGE_SIZE = 25
+# Las páginas de fase y torneo se cachean hasta la siguiente finalización (o hasta este timeout)
+LEADERBOARD_CACHE_TIMEOUT = getattr(settings, 'FANTASY_LEADERBOARD_CACHE_TIMEOUT', 60 * 60)
+# Marca de reconstrucción pendiente de cada leaderboard: varios cambios seguidos comparten una sola
+REFRESH_PENDING_TIMEOUT = 10 * 60
+# Intentos de añadir un perfil nuevo al final si otro ocupa la misma posición a la vez
+APPEND_ATTEMPTS = 5
+
+
+def _ranked(queryset, points, tie_break, **constants):
+    """Añade puesto denso y posición (desempate por `tie_break`) ordenando por `points` descendente."""
+    return queryset.annotate(
+        **{f'lb_{name}': Value(value, output_field=IntegerField()) for name, value in constants.items()},
+        lb_points=points,
+        lb_rank=Window(DenseRank(), order_by=F('lb_points').desc()),
+        lb_position=Window(RowNumber(), order_by=[F('lb_points').desc(), F(tie_break).asc()]),
+    )
+
+
+def _insert_ranked(model, ranked, points_field: str = 'points', scope: str | None = None) -> int:
+    """INSERT ... SELECT de las anotaciones `lb_*` de `ranked` en la tabla de `model`."""
+    columns = {'user_profile': 'lb_user_profile', points_field: 'lb_points', 'rank': 'lb_rank', 'position': 'lb_position'}
+    if scope:
+        columns = {scope: f'lb_{scope}', **columns}
+    select_sql, params = ranked.values_list(*columns.values()).query.sql_with_params()
+    quote = connection.ops.quote_name
+    column_sql = ', '.join(quote(model._meta.get_field(name).column) for name in columns)
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {quote(model._meta.db_table)} ({column_sql}) {select_sql}", params)
+        return cursor.rowcount
+
+
+def _lock_table(model) -> None:
+    # Dos reconstrucciones a la vez insertarían las mismas filas; en SQLite las escrituras ya van en serie
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(f"LOCK TABLE {connection.ops.quote_name(model._meta.db_table)} IN SHARE ROW EXCLUSIVE MODE")
+
+
+def refresh_leaderboard() -> int:
+    """
+    Reconstruye LeaderboardEntry desde los UserProfile. Devuelve el número de entradas.
+    Los empates se ordenan por pk (antigüedad del perfil), así un perfil nuevo siempre va al final.
+    """
+    ranked = _ranked(UserProfile.objects.annotate(lb_user_profile=F('pk')), F('total_fantasy_points'), 'pk')
+    with transaction.atomic():
+        _lock_table(LeaderboardEntry)
+        # Sin relaciones inversas, delete() es un único DELETE
+        LeaderboardEntry.objects.all().delete()
+        return _insert_ranked(LeaderboardEntry, ranked, points_field='total_fantasy_points')
+
+
+def _locked_stage_sum(model, field):
+    # Subconsulta por usuario (y no un JOIN) para que las columnas no se multipliquen entre sí
+    rows = model.objects.filter(user_profile=OuterRef('pk'), stage__fantasy_status='LOCKED')
+    return Subquery(rows.values('user_profile').annotate(total=Sum(field)).values('total'))
+
+
+def sorted_points(sort: str):
+    """Total por perfil de la columna `sort` de SortedLeaderboardEntry, como expresión sobre UserProfile."""
+    if sort == 'projected':
+        # Puntos finales esperados: los ya cerrados más la proyección de las fases en juego
+        return Cast(F('total_fantasy_points'), FloatField()) + Coalesce(
+            _locked_stage_sum(PhasePickProjection, 'expected_points'), Value(0.0),
+        )
+    # Puntos ya asegurados en las fases bloqueadas que aún se están jugando
+    return Cast(Coalesce(_locked_stage_sum(ProvisionalPhaseScore, 'earned_points'), Value(Decimal(0))), FloatField())
+
+
+def refresh_sorted_leaderboard(sort: str) -> int:
+    """Reconstruye las SortedLeaderboardEntry de `sort` (desempate por pk, como el global). Devuelve el número de entradas."""
+    profiles = UserProfile.objects.annotate(lb_user_profile=F('pk'), lb_sort=Value(sort, output_field=CharField()))
+    ranked = _ranked(profiles, sorted_points(sort), 'pk')
+    with transaction.atomic():
+        _lock_table(SortedLeaderboardEntry)
+        SortedLeaderboardEntry.objects.filter(sort=sort).delete()
+        return _insert_ranked(SortedLeaderboardEntry, ranked, scope='sort')
+
+
+def _refresh_pending_key(board: str) -> str:
+    return f'fantasy-leaderboard:{board}:refresh-pending'
+
+
+def _run_refresh(board: str, refresh, *args) -> None:
+    # Se borra la marca antes de leer los perfiles: un cambio confirmado después programa otra
+    cache.delete(_refresh_pending_key(board))
+    refresh(*args)
+
+
+def _refresh_in_thread(board: str, refresh, *args) -> None:
+    try:
+        _run_refresh(board, refresh, *args)
+    except Exception:
+        logger.exception("No se pudo reconstruir el leaderboard %s", board)
+    finally:
+        connection.close()  # Cada hilo abre su propia conexión
+
+
+def _schedule_refresh(board: str, refresh, *args) -> None:
+    """
+    Ejecuta `refresh(*args)` tras confirmar la transacción actual, en un hilo en segundo plano (en
+    línea con FANTASY_JOBS_IN_BACKGROUND = False). Si ya hay una pendiente de `board` que aún no ha
+    empezado, esa verá también este cambio y no se programa otra.
+    """
+    def schedule():
+        if not cache.add(_refresh_pending_key(board), True, REFRESH_PENDING_TIMEOUT):
+            return
+        if getattr(settings, 'FANTASY_JOBS_IN_BACKGROUND', True):
+            threading.Thread(target=_refresh_in_thread, args=(board, refresh, *args), daemon=True).start()
+        else:
+            _run_refresh(board, refresh, *args)
+    transaction.on_commit(schedule)
+
+
+def schedule_leaderboard_refresh() -> None:
+    """Reconstruye el leaderboard global tras confirmar, en segundo plano (ver `_schedule_refresh`)."""
+    _schedule_refresh('global', refresh_leaderboard)
+
+
+def schedule_sorted_leaderboard_refresh(*sorts: str) -> None:
+    """Reconstruye las SortedLeaderboardEntry de `sorts` tras confirmar, en segundo plano (ver `_schedule_refresh`)."""
+    for sort in sorts:
+        _schedule_refresh(sort, refresh_sorted_leaderboard, sort)
+
+
+def sync_leaderboard_entry(profile) -> None:
+    """
+    Tras guardar `profile` (UserProfile.save). Un perfil sin entrada (nuevo) se añade al final con
+    un INSERT: los empates se ordenan por antigüedad y un perfil nuevo tiene los puntos por defecto,
+    así que ese es su sitio; si trae más puntos que el último se deja para la próxima reconstrucción.
+    Si su total ya no coincide con su entrada se programa una reconstrucción en segundo plano.
+    Nunca reconstruye dentro de save().
+    """
+    points = LeaderboardEntry.objects.filter(pk=profile.pk).values_list('total_fantasy_points', flat=True).first()
+    if points is not None:
+        if points != profile.total_fantasy_points:
+            schedule_leaderboard_refresh()
+            # Los puntos proyectados parten del total
+            schedule_sorted_leaderboard_refresh('projected')
+        return
+
+    for _ in range(APPEND_ATTEMPTS):
+        last = LeaderboardEntry.objects.order_by('-position').values_list('position', 'rank', 'total_fantasy_points').first()
+        if last is None:
+            position, rank = 1, 1
+        else:
+            last_position, last_rank, last_points = last
+            if profile.total_fantasy_points > last_points:
+                schedule_leaderboard_refresh()
+                return
+            position = last_position + 1
+            rank = last_rank if profile.total_fantasy_points == last_points else last_rank + 1
+        try:
+            with transaction.atomic():
+                LeaderboardEntry.objects.create(user_profile=profile, total_fantasy_points=profile.total_fantasy_points,
+                                                rank=rank, position=position)
+            return
+        except IntegrityError:
+            # Otro perfil nuevo (o una reconstrucción) tomó la misma posición a la vez: se lee de nuevo el final
+            if LeaderboardEntry.objects.filter(pk=profile.pk).exists():
+                return
+    # Sigue sin sitio tras varios intentos: figurará tras la próxima reconstrucción
+    schedule_leaderboard_refresh()
+
+
+def refresh_stage_leaderboard(stage) -> int:
+    """Reconstruye la clasificación de una fase con sus picks finalizados (los de playoffs si es PLAYOFF)."""
+    if stage.type == 'PLAYOFF':
+        picks = FantasyPlayoffPick.objects.filter(tournament_id=stage.tournament_id, is_finalized=True)
+    else:
+        picks = FantasyPhasePick.objects.filter(stage=stage, is_finalized=True)
+    ranked = _ranked(picks.annotate(lb_user_profile=F('user_profile_id')), F('points_earned'),
+                     'user_profile__user__username', stage=stage.pk)
+    with transaction.atomic():
+        ScopedLeaderboardEntry.objects.filter(stage=stage).delete()
+        created = _insert_ranked(ScopedLeaderboardEntry, ranked, scope='stage')
+    _bump_cache_version('stage', stage.pk)
+    return created
+
+
+def refresh_tournament_leaderboard(tournament_id: int) -> int:
+    """Reconstruye la clasificación de un torneo: suma de los picks finalizados de sus fases y playoffs."""
+    def points_subquery(model, **filters):
+        rows = model.objects.filter(user_profile=OuterRef('pk'), is_finalized=True, **filters)
+        return Coalesce(Subquery(rows.values('user_profile').annotate(total=Sum('points_earned')).values('total')), 0)
+
+    phase_filter = {'stage__tournament_id': tournament_id}
+    playoff_filter = {'tournament_id': tournament_id}
+    profiles = UserProfile.objects.filter(
+        Exists(FantasyPhasePick.objects.filter(user_profile=OuterRef('pk'), is_finalized=True, **phase_filter))
+        | Exists(FantasyPlayoffPick.objects.filter(user_profile=OuterRef('pk'), is_finalized=True, **playoff_filter))
+    ).annotate(lb_user_profile=F('pk'))
+    points = points_subquery(FantasyPhasePick, **phase_filter) + points_subquery(FantasyPlayoffPick, **playoff_filter)
+    ranked = _ranked(profiles, points, 'user__username', tournament=tournament_id)
+    with transaction.atomic():
+        ScopedLeaderboardEntry.objects.filter(tournament_id=tournament_id).delete()
+        created = _insert_ranked(ScopedLeaderboardEntry, ranked, scope='tournament')
+    _bump_cache_version('tournament', tournament_id)
+    return created
+
+
+def refresh_finalization_leaderboards(stage) -> None:
+    """
+    Tras finalizar los picks de `stage`: leaderboard global, de la fase y de su torneo, e invalida
+    los perfiles públicos cacheados con esa fase (muestran los puntos recién calculados).
+    """
+    refresh_leaderboard()
+    # La fase deja de estar bloqueada: sus puntos provisionales y su proyección salen de las columnas
+    # en vivo y proyectada, que pasan a contar los puntos finales en el total
+    refresh_sorted_leaderboard('live')
+    refresh_sorted_leaderboard('projected')
+    refresh_stage_leaderboard(stage)
+    refresh_tournament_leaderboard(stage.tournament_id)
+    bump_stage_generation(stage.pk)
+
+
+def _cache_version_key(scope: str, scope_id: int) -> str:
+    return f'fantasy-leaderboard:{scope}:{scope_id}:version'
+
+
+def _bump_cache_version(scope: str, scope_id: int) -> None:
+    # Las páginas cacheadas con la versión anterior dejan de leerse y expiran solas
+    transaction.on_commit(lambda: cache.set(_cache_version_key(scope, scope_id), uuid.uuid4().hex, None))
+
+
+def cached_scoped_page(scope: str, scope_id: int, page_number: int, build):
+    """
+    Página `page_number` del leaderboard de una fase o torneo desde la caché, o `build()` si no está.
+    La clave incluye una versión que cambia con cada reconstrucción (si se pierde, se genera otra).
+    """
+    version = cache.get(_cache_version_key(scope, scope_id))
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(_cache_version_key(scope, scope_id), version, None):
+            version = cache.get(_cache_version_key(scope, scope_id), version)
+    key = f'fantasy-leaderboard:{scope}:{scope_id}:{version}:page:{page_number}'
+    payload = cache.get(key)
+    if payload is None:
+        payload = build()
+        cache.set(key, payload, LEADERBOARD_CACHE_TIMEOUT)
+    return payload
+
+
+def leaderboard_size(entries=None) -> int:
+    """Número de entradas: la mayor `position` (se lee del índice, sin COUNT)."""
+    entries = LeaderboardEntry.objects.all() if entries is None else entries
+    return entries.aggregate(size=Max('position'))['size'] or 0
+
+
+def leaderboard_page(page_number: int, page_size: int = LEADERBOARD_PAGE_SIZE, entries=None) -> list:
+    """Entradas de la página `page_number` (desde 1) por rango de `position` (global si `entries` es None)."""
+    entries = LeaderboardEntry.objects.all() if entries is None else entries
+    first = (page_number - 1) * page_size
+    return list(entries.filter(position__gt=first, position__lte=first + page_size).order_by('position'))
+
+
+def get_user_rank(user_profile) -> LeaderboardEntry | None:
+    """Entrada del usuario en el leaderboard (puesto y posición), o None si aún no figura."""
+    return LeaderboardEntry.objects.filter(user_profile=user_profile).first()
+
+
+def leaderboard_window(entry: LeaderboardEntry, k: int) -> tuple[list[LeaderboardEntry], list[LeaderboardEntry]]:
+    """Las `k` entradas por encima y por debajo de `entry` (un rango del índice de `position`)."""
+    window = list(
+        LeaderboardEntry.objects.select_related('user_profile__user')
+        .filter(position__gte=entry.position - k, position__lte=entry.position + k)
+        .order_by('position')
+    )
+    return ([other for other in window if other.position < entry.position],
+            [other for other in window if other.position > entry.position])
+
+
+def leaderboard_percentile(entry: LeaderboardEntry, size: int) -> float:
+    """
+    Porcentaje de usuarios con menos puntos que `entry`. Los empatados con él ocupan posiciones
+    consecutivas, así que basta la última posición de su puesto (índice (rank, position)).
+    """
+    last_tied = LeaderboardEntry.objects.filter(rank=entry.rank).aggregate(last=Max('position'))['last']
+    return 100 * (size - last_tied) / size if size else 0.0
@@ -0,0 +1,262 @@
+"""
+Difusión en tiempo real de los cambios de tournament/data/ (Server-Sent Events).
+
+Cada cambio de versión de un torneo se convierte en un único evento (el delta de
+`get_major_data_changes`, calculado una sola vez) que se reparte a todos los navegadores
+suscritos. La capa de reparto es intercambiable con el setting TOURNAMENT_LIVE_BROADCASTER;
+por defecto se usa `LocalBroadcaster`, que funciona dentro del proceso sin broker externo.
+
+Los cambios confirmados en otro proceso (el comando update_hltv_matches, otro worker) no pasan
+por el broadcaster de este: como respaldo, los streams abiertos sondean la versión del torneo en
+la BD cada TOURNAMENT_LIVE_POLL_SECONDS (una consulta por proceso y torneo, no por cliente) y, si
+cambió, publican el delta a los suscriptores locales como si el cambio se hubiera hecho aquí.
+"""
+import asyncio
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Eventos pendientes por suscriptor. Si un cliente lento llena su cola se descartan sus eventos
+# y se le marca para resincronizar: la memoria por suscriptor está acotada.
+SUBSCRIBER_QUEUE_SIZE = getattr(settings, 'TOURNAMENT_LIVE_QUEUE_SIZE', 8)
+# Comentario SSE periódico para que proxies y navegadores no cierren las conexiones inactivas
+KEEPALIVE_SECONDS = getattr(settings, 'TOURNAMENT_LIVE_KEEPALIVE_SECONDS', 25)
+# Sondeo de respaldo de la versión en la BD (None lo desactiva, p. ej. con un broadcaster entre procesos)
+POLL_SECONDS = getattr(settings, 'TOURNAMENT_LIVE_POLL_SECONDS', 5)
+
+
+@dataclass(frozen=True)
+class LiveEvent:
+    since: int
+    version: int
+    full: bool
+    body: bytes  # JSON de get_major_data_changes, compartido por todos los suscriptores
+
+
+RESYNC = object()  # Marca en la cola: el suscriptor perdió eventos y debe pedir los cambios otra vez
+
+
+class Subscription:
+    __slots__ = ('channel', 'loop', 'queue')
+
+    def __init__(self, channel: str, loop: asyncio.AbstractEventLoop):
+        self.channel = channel
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def offer(self, event) -> None:
+        """Encola un evento. Solo se llama desde el event loop del suscriptor."""
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+    async def get(self, timeout: float | None = None):
+        """Espera el siguiente evento; None si vence el timeout."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class BaseBroadcaster:
+    """
+    Interfaz de la capa de reparto. `publish` se llama desde código síncrono (vistas, admin,
+    servicio HLTV) en cualquier hilo; `subscribe`/`unsubscribe` desde el event loop del stream.
+    """
+
+    def __init__(self):
+        # Última versión publicada por canal en este proceso, para publicar deltas encadenados
+        self.last_published: dict[str, int] = {}
+        self._poll_lock = threading.Lock()
+        self._last_polled: dict[str, float] = {}
+
+    def claim_poll(self, channel: str, interval: float) -> bool:
+        """True si toca sondear la versión del canal: como mucho una vez cada `interval` segundos por proceso."""
+        now = time.monotonic()
+        with self._poll_lock:
+            last_polled = self._last_polled.get(channel)
+            if last_polled is not None and now - last_polled < interval:
+                return False
+            self._last_polled[channel] = now
+            return True
+
+    def subscribe(self, channel: str) -> Subscription:
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        raise NotImplementedError
+
+    def has_subscribers(self, channel: str) -> bool:
+        # Un broker externo no sabe si hay suscriptores en otros procesos
+        return True
+
+    def publish(self, channel: str, event: LiveEvent) -> None:
+        raise NotImplementedError
+
+
+class LocalBroadcaster(BaseBroadcaster):
+    """Reparto en memoria para los suscriptores conectados a este proceso."""
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._subscriptions: dict[str, set[Subscription]] = {}
+
+    def subscribe(self, channel: str) -> Subscription:
+        subscription = Subscription(channel, asyncio.get_running_loop())
+        with self._lock:
+            self._subscriptions.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.channel)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.channel]
+
+    def has_subscribers(self, channel: str) -> bool:
+        with self._lock:
+            return bool(self._subscriptions.get(channel))
+
+    def subscriber_count(self, channel: str | None = None) -> int:
+        with self._lock:
+            if channel is not None:
+                return len(self._subscriptions.get(channel, ()))
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def publish(self, channel: str, event: LiveEvent) -> None:
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        # Un único callback por event loop (no uno por suscriptor): despertar el loop es lo caro
+        by_loop: dict[asyncio.AbstractEventLoop, list[Subscription]] = {}
+        for subscription in subscriptions:
+            by_loop.setdefault(subscription.loop, []).append(subscription)
+        for loop, loop_subscriptions in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(_offer_all, loop_subscriptions, event)
+            except RuntimeError:
+                # El loop de estos suscriptores ya se cerró
+                for subscription in loop_subscriptions:
+                    self.unsubscribe(subscription)
+
+
+def _offer_all(subscriptions: list[Subscription], event) -> None:
+    for subscription in subscriptions:
+        subscription.offer(event)
+
+
+@lru_cache(maxsize=None)
+def get_broadcaster() -> BaseBroadcaster:
+    path = getattr(settings, 'TOURNAMENT_LIVE_BROADCASTER', 'tournaments.live.LocalBroadcaster')
+    return import_string(path)()
+
+
+def publish_tournament_changes(sender, tournament_id, slug, version, **kwargs):
+    """
+    Receptor de `tournament_data_changed`: calcula el delta una sola vez por cambio
+    y lo publica para todos los suscriptores del torneo.
+    """
+    from .snapshot import get_major_data_changes
+
+    broadcaster = get_broadcaster()
+    if not broadcaster.has_subscribers(slug):
+        return
+    last_published = broadcaster.last_published.get(slug)
+    if last_published is not None and version <= last_published:
+        # Varios bumps en la misma transacción: el primer evento ya incluyó la última versión
+        return
+    since = last_published if last_published is not None else -1
+    changes = get_major_data_changes(slug, since)
+    if changes is None:
+        return
+    broadcaster.last_published[slug] = changes['version']
+    broadcaster.publish(slug, _event_from_changes(changes, since))
+
+
+def poll_tournament_changes(slug: str) -> None:
+    """
+    Sondeo de respaldo: lee la versión del torneo en la BD y, si es posterior a la última publicada
+    en este proceso (un cambio hecho en otro proceso), publica el delta a los suscriptores locales.
+    """
+    from .models import Tournament
+    from .snapshot import get_tournament_version
+
+    row = get_tournament_version(slug)
+    if row is not None:
+        tournament_id, version = row
+        publish_tournament_changes(Tournament, tournament_id=tournament_id, slug=slug, version=version)
+
+
+def _event_from_changes(changes: dict, since: int) -> LiveEvent:
+    return LiveEvent(-1 if changes['full'] else since, changes['version'], changes['full'], changes['body'])
+
+
+def format_sse(event: LiveEvent) -> bytes:
+    return b'id: %d\nevent: %s\ndata: %s\n\n' % (
+        event.version, b'snapshot' if event.full else b'changes', event.body,
+    )
+
+
+async def stream_tournament_events(slug: str, since: int | None = None):
+    """
+    Generador asíncrono del stream SSE de un torneo.
+
+    Primero envía la puesta al día desde `since` (o el snapshot completo si no se indica)
+    y después reenvía los eventos publicados. Si el cliente perdió eventos, pide los cambios
+    desde la última versión que recibió; normalmente se sirven desde la caché con una sola consulta (la versión).
+    """
+    from .snapshot import get_major_data_changes
+
+    broadcaster = get_broadcaster()
+    # Suscribirse antes de leer el estado inicial para no perder cambios intermedios
+    subscription = broadcaster.subscribe(slug)
+    try:
+        start = since if since is not None else -1
+        changes = await sync_to_async(get_major_data_changes)(slug, start)
+        if changes is None:
+            return
+        version = changes['version']
+        # El primer stream del proceso fija la versión desde la que se publicarán los deltas
+        broadcaster.last_published.setdefault(slug, version)
+        if changes['full'] or version != start:
+            yield format_sse(_event_from_changes(changes, start))
+
+        wait_seconds = min(POLL_SECONDS, KEEPALIVE_SECONDS) if POLL_SECONDS else KEEPALIVE_SECONDS
+        idle_since = time.monotonic()
+        while True:
+            event = await subscription.get(wait_seconds)
+            if event is None:
+                if POLL_SECONDS and broadcaster.claim_poll(slug, POLL_SECONDS):
+                    # Lo que encuentre llega a la cola de todos los suscriptores, este incluido
+                    await sync_to_async(poll_tournament_changes)(slug)
+                if time.monotonic() - idle_since >= KEEPALIVE_SECONDS:
+                    idle_since = time.monotonic()
+                    yield b': keepalive\n\n'
+                continue
+            if event is not RESYNC and event.version <= version:
+                continue
+            if event is RESYNC or (not event.full and event.since != version):
+                changes = await sync_to_async(get_major_data_changes)(slug, version)
+                if changes is None:
+                    return
+                if changes['version'] <= version:
+                    continue
+                event = _event_from_changes(changes, version)
+            yield format_sse(event)
+            version = event.version
+            idle_since = time.monotonic()
+    finally:
+        broadcaster.unsubscribe(subscription)
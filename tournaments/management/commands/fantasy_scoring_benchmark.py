@@ -0,0 +1,99 @@
+import datetime
+import random
+import time
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from tournaments.fantasy_logic import PHASE_SCORING_CHUNK_SIZE, score_phase_picks_in_bulk
+from tournaments.models import FantasyPhasePick, Stage, StageTeam, Team, Tournament, UserProfile
+
+BATCH_SIZE = 5000
+# Récords finales de una fase suiza de 16 equipos
+FINAL_RECORDS = [(3, 0), (3, 0), (3, 1), (3, 1), (3, 1), (3, 2), (3, 2), (3, 2),
+                 (2, 3), (2, 3), (2, 3), (1, 3), (1, 3), (1, 3), (0, 3), (0, 3)]
+
+
+class Command(BaseCommand):
+    help = ('Mide picks/s del cálculo de puntos fantasy de una fase según el número de workers, sobre un '
+            'conjunto sintético de usuarios con picks (SQLite en modo WAL). Los datos se borran al terminar.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100_000, help='Usuarios sintéticos, cada uno con un pick de fase.')
+        parser.add_argument('--workers', default='1,2,4', help='Números de workers a comparar, separados por comas.')
+        parser.add_argument('--chunk_size', type=int, default=PHASE_SCORING_CHUNK_SIZE, help='Picks por lote.')
+        parser.add_argument('--seed', type=int, default=0, help='Semilla para generar los picks.')
+        parser.add_argument('--keep', action='store_true', help='No borrar los datos sintéticos al terminar.')
+
+    def handle(self, *args, **options):
+        try:
+            worker_counts = [int(value) for value in options['workers'].split(',')]
+        except ValueError:
+            raise CommandError("--workers debe ser una lista de enteros separados por comas, p. ej. 1,2,4.")
+
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode=WAL')
+                self.stdout.write(f"SQLite journal_mode={cursor.fetchone()[0]}")
+
+        prefix = f"bench-{uuid.uuid4().hex[:8]}"
+        started = time.perf_counter()
+        stage = self._create_dataset(prefix, options['users'], random.Random(options['seed']))
+        self.stdout.write(f"{options['users']} usuarios sintéticos creados en {time.perf_counter() - started:.1f}s")
+
+        try:
+            self.stdout.write(f"{'Workers':>7} {'Tiempo':>9} {'Picks/s':>9} {'Total puntos':>13}")
+            reference_total = None
+            for workers in worker_counts:
+                self._reset(stage, prefix)
+                started = time.perf_counter()
+                scored = score_phase_picks_in_bulk(stage, options['chunk_size'], workers=workers)
+                elapsed = time.perf_counter() - started
+                total = sum(UserProfile.objects.filter(user__username__startswith=prefix).values_list('total_fantasy_points', flat=True))
+                reference_total = total if reference_total is None else reference_total
+                check = '' if total == reference_total else '  ¡distinto!'
+                self.stdout.write(f"{workers:>7} {elapsed:>8.2f}s {scored / elapsed:>9.0f} {total:>13}{check}")
+        finally:
+            if not options['keep']:
+                User.objects.filter(username__startswith=prefix).delete()
+                stage.tournament.delete()
+                Team.objects.filter(name__startswith=prefix).delete()
+
+    @staticmethod
+    def _create_dataset(prefix, num_users, rng):
+        with transaction.atomic():
+            tournament = Tournament.objects.create(
+                name=f"{prefix} Major", start_date=datetime.date.today(), end_date=datetime.date.today(), location='Benchmark',
+            )
+            stage = Stage.objects.create(tournament=tournament, name='Stage 1', type='SWISS', order=1, fantasy_status='LOCKED')
+            teams = Team.objects.bulk_create([Team(name=f"{prefix} Team {i}", region='EU') for i in range(16)])
+            StageTeam.objects.bulk_create([
+                StageTeam(stage=stage, team=team, initial_seed=seed, wins=wins, losses=losses)
+                for seed, (team, (wins, losses)) in enumerate(zip(teams, rng.sample(FINAL_RECORDS, 16)), start=1)
+            ])
+
+        through = {field: getattr(FantasyPhasePick, field).through for field in ('teams_3_0', 'teams_advance', 'teams_0_3')}
+        team_ids = [team.pk for team in teams]
+        for offset in range(0, num_users, BATCH_SIZE):
+            with transaction.atomic():
+                size = min(BATCH_SIZE, num_users - offset)
+                User.objects.bulk_create([User(username=f"{prefix}-{offset + i}") for i in range(size)])
+                users = User.objects.filter(username__startswith=f"{prefix}-").order_by('-pk')[:size]
+                profiles = UserProfile.objects.bulk_create([UserProfile(user=user) for user in users])
+                FantasyPhasePick.objects.bulk_create([FantasyPhasePick(user_profile=profile, stage=stage, is_locked=True) for profile in profiles])
+                picks = FantasyPhasePick.objects.filter(stage=stage, user_profile__in=profiles).values_list('pk', flat=True)
+                rows = {field: [] for field in through}
+                for pick_id in picks:
+                    chosen = rng.sample(team_ids, 10)
+                    for field, team_slice in (('teams_3_0', chosen[:2]), ('teams_advance', chosen[2:8]), ('teams_0_3', chosen[8:])):
+                        rows[field].extend(through[field](fantasyphasepick_id=pick_id, team_id=team_id) for team_id in team_slice)
+                for field, model in through.items():
+                    model.objects.bulk_create(rows[field])
+        return stage
+
+    @staticmethod
+    def _reset(stage, prefix):
+        FantasyPhasePick.objects.filter(stage=stage).update(is_finalized=False, points_earned=0, team_points_breakdown={})
+        UserProfile.objects.filter(user__username__startswith=prefix).update(total_fantasy_points=0)
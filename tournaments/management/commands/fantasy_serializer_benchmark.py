@@ -0,0 +1,103 @@
+import datetime
+import statistics
+import time
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+
+from tournaments.fast_serializers import playoff_user_pick, stage_fantasy_info
+from tournaments.feasibility import refresh_role_feasibility
+from tournaments.models import FantasyPhasePick, FantasyPlayoffPick, Stage, StageTeam, Team, Tournament, UserProfile
+from tournaments.serializers import FantasyPlayoffPickSerializer, StageFantasyInfoSerializer
+
+
+class Command(BaseCommand):
+    help = ('Compara el tiempo de renderizado (serializar + JSONRenderer) de StageFantasyInfoSerializer y '
+            'FantasyPlayoffPickSerializer frente a fast_serializers sobre una fase sintética con --items '
+            'equipos, todos elegidos en el pick del usuario. Comprueba que ambos JSON son idénticos. '
+            'Los datos se borran al terminar.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=10_000, help='Equipos de la fase (y del pick) sintéticos.')
+        parser.add_argument('--repeat', type=int, default=5, help='Renderizados por caso; se muestra la mediana.')
+        parser.add_argument('--keep', action='store_true', help='No borrar los datos sintéticos al terminar.')
+
+    def handle(self, *args, **options):
+        prefix = f"bench-{uuid.uuid4().hex[:8]}"
+        started = time.perf_counter()
+        swiss_stage, playoff_stage, user = self._create_dataset(prefix, options['items'])
+        self.stdout.write(f"{options['items']} equipos sintéticos creados en {time.perf_counter() - started:.1f}s")
+
+        request = RequestFactory().get('/')
+        request.user = user
+        tournament = swiss_stage.tournament
+        pick = FantasyPlayoffPick.objects.get(user_profile__user=user, tournament=tournament)
+        cases = [
+            ('Fase (StageFantasyInfo)',
+             lambda: StageFantasyInfoSerializer(swiss_stage, context={'request': request}).data,
+             lambda: stage_fantasy_info(swiss_stage, request)),
+            ('Pick de playoffs',
+             lambda: FantasyPlayoffPickSerializer(pick, context={'request': request, 'tournament': tournament}).data,
+             lambda: playoff_user_pick(user, tournament, {'request': request, 'playoff_stages': {tournament.pk: playoff_stage}})),
+        ]
+
+        renderer = JSONRenderer()
+        try:
+            self.stdout.write(f"{'Caso':<24} {'DRF':>9} {'Rápido':>9} {'Mejora':>7}")
+            for name, drf, fast in cases:
+                drf_time, drf_json = self._measure(lambda: renderer.render(drf()), options['repeat'])
+                fast_time, fast_json = self._measure(lambda: renderer.render(fast()), options['repeat'])
+                check = '' if drf_json == fast_json else '  ¡JSON distinto!'
+                self.stdout.write(f"{name:<24} {drf_time:>8.3f}s {fast_time:>8.3f}s {drf_time / fast_time:>6.1f}x{check}")
+        finally:
+            if not options['keep']:
+                User.objects.filter(username__startswith=prefix).delete()
+                tournament.delete()
+                Team.objects.filter(name__startswith=prefix).delete()
+
+    @staticmethod
+    def _measure(render, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            content = render()
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings), content
+
+    @staticmethod
+    def _create_dataset(prefix, num_items):
+        with transaction.atomic():
+            tournament = Tournament.objects.create(
+                name=f"{prefix} Major", start_date=datetime.date.today(), end_date=datetime.date.today(), location='Benchmark',
+            )
+            swiss_stage = Stage.objects.create(tournament=tournament, name='Stage 1', type='SWISS', order=1, fantasy_status='OPEN')
+            playoff_stage = Stage.objects.create(tournament=tournament, name='Playoffs', type='PLAYOFF', order=2, fantasy_status='OPEN')
+            teams = Team.objects.bulk_create([
+                Team(name=f"{prefix} Team {i}", region='EU', logo=f"https://example.com/{prefix}/{i}.png") for i in range(num_items)
+            ])
+            for stage in (swiss_stage, playoff_stage):
+                StageTeam.objects.bulk_create([
+                    StageTeam(stage=stage, team=team, initial_seed=seed, wins=seed % 3, losses=seed % 2)
+                    for seed, team in enumerate(teams, start=1)
+                ])
+
+            user = User.objects.create(username=f"{prefix}-user", email=f"{prefix}@example.com")
+            profile = UserProfile.objects.create(user=user, twitch_username=prefix)
+            breakdown = {str(team.pk): team.pk % 7 for team in teams}
+            phase_pick = FantasyPhasePick.objects.create(user_profile=profile, stage=swiss_stage, is_finalized=True, team_points_breakdown=breakdown)
+            third = num_items // 3
+            phase_pick.teams_3_0.set(teams[:third])
+            phase_pick.teams_advance.set(teams[third:2 * third])
+            phase_pick.teams_0_3.set(teams[2 * third:])
+            playoff_pick = FantasyPlayoffPick.objects.create(user_profile=profile, tournament=tournament, final_winner=teams[0],
+                                                             is_finalized=True, team_points_breakdown=breakdown)
+            playoff_pick.quarter_final_winners.set(teams[:num_items // 2])
+            playoff_pick.semi_final_winners.set(teams[num_items // 2:])
+            # Roles posibles precalculados, como en producción (si no, ambos caminos los recalcularían)
+            refresh_role_feasibility(swiss_stage)
+            refresh_role_feasibility(playoff_stage)
+        return swiss_stage, playoff_stage, user
@@ -0,0 +1,86 @@
+import statistics
+import time
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from tournaments.leaderboard import LEADERBOARD_PAGE_SIZE, leaderboard_page, leaderboard_size, refresh_leaderboard
+from tournaments.models import UserProfile
+
+BATCH_SIZE = 10_000
+
+
+class Command(BaseCommand):
+    help = ('Compara la latencia de una página del leaderboard global con ORDER BY + OFFSET + COUNT sobre '
+            'UserProfile (paginación anterior) y con el leaderboard materializado (rango de position), '
+            'sobre perfiles sintéticos. Los datos se borran al terminar.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', type=int, default=1_000_000, help='Perfiles sintéticos a crear.')
+        parser.add_argument('--offsets', default='0,10000,500000', help='Offsets de página a medir, separados por comas.')
+        parser.add_argument('--repeat', type=int, default=5, help='Repeticiones por medición (se informa la mediana).')
+        parser.add_argument('--keep', action='store_true', help='No borrar los datos sintéticos al terminar.')
+
+    def handle(self, *args, **options):
+        try:
+            offsets = [int(value) for value in options['offsets'].split(',')]
+        except ValueError:
+            raise CommandError("--offsets debe ser una lista de enteros separados por comas, p. ej. 0,10000,500000.")
+
+        prefix = f"lb-bench-{uuid.uuid4().hex[:8]}"
+        started = time.perf_counter()
+        self._create_profiles(prefix, options['profiles'])
+        self.stdout.write(f"{options['profiles']} perfiles sintéticos creados en {time.perf_counter() - started:.1f}s")
+
+        try:
+            started = time.perf_counter()
+            entries = refresh_leaderboard()
+            self.stdout.write(f"Leaderboard materializado ({entries} entradas) en {time.perf_counter() - started:.2f}s")
+
+            self.stdout.write(f"{'Offset':>9} {'Anterior':>10} {'Materializado':>14} {'Mejora':>8}")
+            for offset in offsets:
+                page_number = offset // LEADERBOARD_PAGE_SIZE + 1
+                old = self._median(lambda: self._offset_page(offset), options['repeat'])
+                new = self._median(lambda: self._ranked_page(page_number), options['repeat'])
+                self.stdout.write(f"{offset:>9} {old * 1000:>8.1f}ms {new * 1000:>12.2f}ms {old / new:>7.0f}x")
+        finally:
+            if not options['keep']:
+                User.objects.filter(username__startswith=prefix).delete()
+                refresh_leaderboard()
+
+    @staticmethod
+    def _create_profiles(prefix, num_profiles):
+        for offset in range(0, num_profiles, BATCH_SIZE):
+            size = min(BATCH_SIZE, num_profiles - offset)
+            with transaction.atomic():
+                users = User.objects.bulk_create([User(username=f"{prefix}-{offset + i:07d}") for i in range(size)])
+                # Puntos con muchos empates, como en un leaderboard real
+                UserProfile.objects.bulk_create([
+                    UserProfile(user=user, total_fantasy_points=(offset + i) * 7919 % 500)
+                    for i, user in enumerate(users)
+                ])
+
+    @staticmethod
+    def _offset_page(offset):
+        # Lo que hacía FantasyLeaderboardView con PageNumberPagination: COUNT y ORDER BY + OFFSET
+        profiles = UserProfile.objects.select_related('user').order_by('-total_fantasy_points', 'user__username')
+        profiles.count()
+        return list(profiles[offset:offset + LEADERBOARD_PAGE_SIZE])
+
+    @staticmethod
+    def _ranked_page(page_number):
+        leaderboard_size()
+        entries = leaderboard_page(page_number)
+        profiles = UserProfile.objects.select_related('user').in_bulk([entry.user_profile_id for entry in entries])
+        return [profiles[entry.user_profile_id] for entry in entries]
+
+    @staticmethod
+    def _median(func, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings)
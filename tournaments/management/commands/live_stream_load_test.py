@@ -0,0 +1,70 @@
+import asyncio
+import gc
+import json
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from tournaments.live import LocalBroadcaster, LiveEvent
+
+
+class Command(BaseCommand):
+    help = ('Prueba de carga del reparto en vivo (SSE): mantiene miles de suscriptores inactivos '
+            'en un LocalBroadcaster, publica eventos y mide la memoria.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscribers', type=int, default=5000, help='Número de suscriptores simultáneos.')
+        parser.add_argument('--events', type=int, default=500, help='Número de eventos a publicar.')
+        parser.add_argument('--consume', action='store_true', help='Los suscriptores leen los eventos (por defecto quedan inactivos).')
+
+    def handle(self, *args, **options):
+        asyncio.run(self._run(options['subscribers'], options['events'], options['consume']))
+
+    async def _run(self, num_subscribers, num_events, consume):
+        broadcaster = LocalBroadcaster()
+        body = json.dumps({"matches": [{"id": i, "status": "LIVE", "team1Score": 1, "team2Score": 0} for i in range(8)]}).encode()
+        received = 0
+
+        async def consumer(subscription):
+            nonlocal received
+            while True:
+                if await subscription.get() is not None:
+                    received += 1
+
+        tracemalloc.start()
+        baseline = self._memory()
+        subscriptions = [broadcaster.subscribe('load-test') for _ in range(num_subscribers)]
+        tasks = [asyncio.create_task(consumer(s)) for s in subscriptions] if consume else []
+        await asyncio.sleep(0)
+        after_subscribe = self._memory()
+        self.stdout.write(f"{num_subscribers} suscriptores: {(after_subscribe - baseline) / 1024:.0f} KiB "
+                          f"({(after_subscribe - baseline) / max(num_subscribers, 1):.0f} B/suscriptor)")
+
+        checkpoints = sorted({max(num_events // 4, 1), max(num_events // 2, 1), num_events})
+        start = time.perf_counter()
+        for version in range(1, num_events + 1):
+            broadcaster.publish('load-test', LiveEvent(version - 1, version, False, body))
+            await asyncio.sleep(0)
+            if version in checkpoints:
+                memory = self._memory()
+                self.stdout.write(f"  tras {version} eventos: {(memory - baseline) / 1024:.0f} KiB "
+                                  f"(+{(memory - after_subscribe) / 1024:.0f} KiB desde la suscripción)")
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f"{num_events} eventos x {num_subscribers} suscriptores en {elapsed:.2f}s "
+                          f"({num_events * num_subscribers / elapsed:,.0f} entregas/s)")
+        if consume:
+            self.stdout.write(f"Eventos recibidos: {received}")
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for subscription in subscriptions:
+            broadcaster.unsubscribe(subscription)
+        tracemalloc.stop()
+        self.stdout.write(self.style.SUCCESS("Prueba de carga finalizada."))
+
+    @staticmethod
+    def _memory():
+        gc.collect()
+        return tracemalloc.get_traced_memory()[0]
@@ -1,13 +1,15 @@
 from django.core.management.base import BaseCommand, CommandError
 from tournaments.models import Stage, Tournament
-from tournaments.fantasy_logic import finalize_fantasy_stage_picks, finalize_fantasy_playoff_picks
+from tournaments.fantasy_jobs import get_or_create_finalization_job, run_finalization_job
 
 class Command(BaseCommand):
-    help = 'Finaliza los picks de fantasy y calcula los puntos para una fase o torneo.'
+    help = 'Finaliza los picks de fantasy y calcula los puntos para una fase o torneo (por lotes y reanudable).'
 
     def add_arguments(self, parser):
         parser.add_argument('--stage_id', type=int, help='ID de la fase (no playoff) a procesar.')
         parser.add_argument('--tournament_id', type=int, help='ID del torneo para procesar picks de playoffs.')
+        parser.add_argument('--chunk_size', type=int, default=None, help='Picks por lote (cada lote es una transacción con su checkpoint).')
+        parser.add_argument('--workers', type=int, default=1, help='Procesos que puntúan lotes en paralelo (rangos de id de picks).')
 
     def handle(self, *args, **options):
         stage_id = options['stage_id']
@@ -20,12 +22,7 @@ class Command(BaseCommand):
                 if stage.type == 'PLAYOFF':
                     self.stderr.write(self.style.ERROR(f"Error: La fase ID {stage_id} es de tipo PLAYOFF. Use --tournament_id para playoffs."))
                     return
-                
-                result = finalize_fantasy_stage_picks(stage_id)
-                if result['success']:
-                    self.stdout.write(self.style.SUCCESS(f"Resultado para fase ID {stage_id}: {result['message']}"))
-                else:
-                    self.stderr.write(self.style.ERROR(f"Resultado para fase ID {stage_id}: {result['message']}"))
+                self._run_job(stage, options['chunk_size'], options['workers'])
             except Stage.DoesNotExist:
                 self.stderr.write(self.style.ERROR(f"Error: Fase con ID {stage_id} no encontrada."))
             except Exception as e:
@@ -37,20 +34,37 @@ class Command(BaseCommand):
             try:
                 tournament = Tournament.objects.get(pk=tournament_id)
                 playoff_stage = tournament.stages.filter(type='PLAYOFF').order_by('-order').first()
-                
+
                 if not playoff_stage:
                     self.stderr.write(self.style.ERROR(f"Error: No se encontró fase de PLAYOFF para el torneo ID {tournament_id}."))
                     return
-
-                result = finalize_fantasy_playoff_picks(tournament_id)
-                if result['success']:
-                    self.stdout.write(self.style.SUCCESS(f"Resultado para playoffs del torneo ID {tournament_id}: {result['message']}"))
-                else:
-                    self.stderr.write(self.style.ERROR(f"Resultado para playoffs del torneo ID {tournament_id}: {result['message']}"))
+                if playoff_stage.fantasy_status != 'FINALIZED':
+                    self.stderr.write(self.style.ERROR(f"Error: La fase de Playoffs ({playoff_stage.name}) no está marcada como FINALIZED."))
+                    return
+                self._run_job(playoff_stage, options['chunk_size'], options['workers'])
             except Tournament.DoesNotExist:
                 self.stderr.write(self.style.ERROR(f"Error: Torneo con ID {tournament_id} no encontrado."))
             except Exception as e:
                  self.stderr.write(self.style.ERROR(f"Error inesperado procesando torneo ID {tournament_id}: {e}"))
 
         else:
-            self.stdout.write(self.style.NOTICE("Debe especificar --stage_id o --tournament_id.")) 
\ No newline at end of file
+            self.stdout.write(self.style.NOTICE("Debe especificar --stage_id o --tournament_id."))
+
+    def _run_job(self, stage, chunk_size, workers):
+        job = get_or_create_finalization_job(stage, chunk_size)
+        if job.processed_picks:
+            self.stdout.write(f"Reanudando job #{job.pk} desde el pick {job.last_pick_id} ({job.processed_picks} ya procesados).")
+        job = run_finalization_job(job, progress=self._write_progress, workers=workers)
+        self.stdout.write(self.style.SUCCESS(
+            f"Job #{job.pk} completado para '{stage.name}': {job.processed_picks}/{job.total_picks} picks"
+            f"{self._rate(job)}."
+        ))
+
+    def _write_progress(self, job):
+        percent = job.processed_picks / job.total_picks if job.total_picks else 1
+        self.stdout.write(f"  {job.processed_picks}/{job.total_picks} ({percent:.0%}){self._rate(job)}")
+
+    @staticmethod
+    def _rate(job):
+        rate = job.picks_per_second
+        return f", {rate:.0f} picks/s" if rate is not None else ''
@@ -0,0 +1,19 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from tournaments.profile_cache import STATS_KEYS, profile_cache_stats
+
+
+class Command(BaseCommand):
+    help = 'Muestra los aciertos y fallos de la caché de perfiles fantasy públicos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Pone los contadores a cero después de mostrarlos.')
+
+    def handle(self, *args, **options):
+        stats = profile_cache_stats()
+        total = stats['hits'] + stats['misses']
+        ratio = f"{100 * stats['hits'] / total:.1f}%" if total else '-'
+        self.stdout.write(f"Aciertos: {stats['hits']}  Fallos: {stats['misses']}  Tasa de acierto: {ratio}")
+        if options['reset']:
+            cache.delete_many(list(STATS_KEYS.values()))
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from tournaments.models import Stage
+
+
+class Command(BaseCommand):
+    help = 'Proyecta los puntos fantasy esperados (y la banda p10-p90) de todos los picks de una fase suiza con el simulador Monte Carlo.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stage_id', type=int, required=True, help='ID de la fase suiza a proyectar.')
+        parser.add_argument('--sims', type=int, default=None, help='Número de simulaciones compartidas por todos los picks (por defecto 2000).')
+        parser.add_argument('--seed', type=int, default=None, help='Semilla del generador para resultados reproducibles.')
+
+    def handle(self, *args, **options):
+        try:
+            from tournaments.fantasy_projection import PROJECTION_SIMULATIONS, project_phase_picks
+        except ImportError:
+            raise CommandError("La proyección requiere NumPy, que no está instalado.")
+
+        try:
+            stage = Stage.objects.get(pk=options['stage_id'])
+        except Stage.DoesNotExist:
+            raise CommandError(f"Fase con ID {options['stage_id']} no encontrada.")
+        if stage.type != 'SWISS':
+            raise CommandError(f"La fase ID {stage.pk} no es de tipo SWISS.")
+
+        simulations = options['sims'] or PROJECTION_SIMULATIONS
+        started = time.perf_counter()
+        projected = project_phase_picks(stage, simulations, rng=options['seed'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"{projected} picks de '{stage.name}' proyectados con {simulations} simulaciones en {elapsed:.2f}s"
+        ))
@@ -0,0 +1,55 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from tournaments.models import Team, Tournament
+
+
+class Command(BaseCommand):
+    help = ('Proyecta un torneo completo (fases suizas y playoffs) con Monte Carlo en varios procesos: '
+            'probabilidades de campeón, de clasificar de cada fase y distribución de seeds en playoffs.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tournament_id', type=int, required=True, help='ID del torneo a proyectar.')
+        parser.add_argument('--sims', type=int, default=100_000, help='Número de torneos simulados.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Procesos en paralelo (por defecto, uno por núcleo).')
+        parser.add_argument('--seed', type=int, default=None, help='Semilla para resultados reproducibles.')
+        parser.add_argument('--chunk', type=int, default=None, help='Simulaciones por lote (por defecto 5000).')
+
+    def handle(self, *args, **options):
+        try:
+            from tournaments.swiss.projection import DEFAULT_CHUNK_SIZE, load_tournament_plan, simulate_tournament
+        except ImportError:
+            raise CommandError("El simulador requiere NumPy, que no está instalado.")
+
+        try:
+            tournament = Tournament.objects.get(pk=options['tournament_id'])
+        except Tournament.DoesNotExist:
+            raise CommandError(f"Torneo con ID {options['tournament_id']} no encontrado.")
+        try:
+            plan = load_tournament_plan(tournament)
+        except ValueError as e:
+            raise CommandError(str(e))
+        if not plan.swiss and plan.playoff is None:
+            raise CommandError(f"El torneo {tournament.name} no tiene fases que simular.")
+
+        started = time.perf_counter()
+        projection = simulate_tournament(plan, options['sims'], workers=options['workers'], seed=options['seed'],
+                                         chunk_size=options['chunk'] or DEFAULT_CHUNK_SIZE)
+        elapsed = time.perf_counter() - started
+
+        names = dict(Team.objects.filter(pk__in=plan.team_ids).values_list('id', 'name'))
+        stage_names = [stage.name for stage in plan.swiss]
+        self.stdout.write(f"{'Equipo':<24} " + ' '.join(f'{name[:10]:>10}' for name in stage_names) +
+                          f" {'Playoffs':>9} {'Semis':>7} {'Final':>7} {'Campeón':>8}   Seeds en playoffs (1-8)")
+        for team in projection.teams_payload():
+            seeds = ' '.join(f'{value:>5.1%}' for value in team['playoff_seeds'])
+            self.stdout.write(
+                f"{names.get(team['team_id'], team['team_id'])!s:<24.24} " +
+                ' '.join(f"{team['stages'][stage.stage_id]:>10.1%}" for stage in plan.swiss) +
+                f" {team['playoffs']:>9.1%} {team['semifinal']:>7.1%} {team['final']:>7.1%} {team['champion']:>8.1%}   {seeds}"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"{projection.simulations} torneos en {elapsed:.2f}s con {options['workers']} workers "
+            f"({projection.simulations / elapsed:,.0f} torneos/s)"
+        ))
@@ -0,0 +1,74 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tournaments.swiss import SwissState
+
+
+class Command(BaseCommand):
+    help = ('Compara el cálculo exacto de probabilidades suizas (rondas en lote y última ronda cerrada) con la '
+            'enumeración ingenua de todas las secuencias de resultados, desde el inicio de las rondas 3, 4 y 5.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--teams', type=int, default=16, help='Equipos de la fase simulada.')
+        parser.add_argument('--stages', type=int, default=5, help='Fases aleatorias distintas por ronda.')
+        parser.add_argument('--seed', type=int, default=0, help='Semilla para generar las fases.')
+
+    def handle(self, *args, **options):
+        try:
+            import numpy as np
+            from tournaments.swiss.exact import exact_swiss_stage, naive_swiss_probabilities
+        except ImportError:
+            raise CommandError("El cálculo exacto requiere NumPy, que no está instalado.")
+
+        rng = random.Random(options['seed'])
+        self.stdout.write(f"{'Ronda':>5} {'Estados':>8} {'Hojas ingenua':>14} {'Exacto':>10} {'Ingenuo':>10} {'Mejora':>8} {'Error máx':>10}")
+        for start_round in (3, 4, 5):
+            exact_time = naive_time = 0.0
+            states = leaves = 0
+            max_error = 0.0
+            for _ in range(options['stages']):
+                state = self._random_state(options['teams'], start_round - 1, rng)
+                exact_swiss_stage(state)  # Calienta la tabla de emparejamientos por patrón
+
+                started = time.perf_counter()
+                result = exact_swiss_stage(state)
+                exact_time += time.perf_counter() - started
+
+                started = time.perf_counter()
+                naive = naive_swiss_probabilities(state)
+                naive_time += time.perf_counter() - started
+
+                states += result.states
+                leaves += self._count_leaves(state)
+                max_error = max(max_error, float(np.abs(result.record_probabilities - naive).max()))
+
+            count = options['stages']
+            self.stdout.write(
+                f"{start_round:>5} {states // count:>8} {leaves // count:>14} "
+                f"{exact_time / count * 1000:>8.2f}ms {naive_time / count * 1000:>8.2f}ms "
+                f"{naive_time / exact_time:>7.0f}x {max_error:>10.1e}"
+            )
+
+    @staticmethod
+    def _random_state(num_teams, rounds, rng):
+        state = SwissState.empty(list(range(1, num_teams + 1)))
+        for _ in range(rounds):
+            for team1, team2, _ in state.next_round_pairings():
+                state.record_result(*((team1, team2) if rng.random() < 0.5 else (team2, team1)))
+        return state
+
+    @staticmethod
+    def _count_leaves(state):
+        """
+        Secuencias de resultados que recorre la enumeración ingenua: 2^(partidos restantes). Con grupos
+        pares el número de partidos no depende de los resultados, así que basta seguir un camino.
+        """
+        state = state.copy()
+        matches = 0
+        while pairings := state.next_round_pairings():
+            matches += len(pairings)
+            for team1, team2, _ in pairings:
+                state.record_result(team1, team2)
+        return 1 << matches
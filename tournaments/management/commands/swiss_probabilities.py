@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from tournaments.models import Stage
+
+
+class Command(BaseCommand):
+    help = 'Probabilidades de 3-0, clasificación y 0-3 de cada equipo de una fase suiza (Monte Carlo o cálculo exacto).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stage_id', type=int, required=True, help='ID de la fase suiza a simular.')
+        parser.add_argument('--sims', type=int, default=None, help='Número de simulaciones (por defecto 100000).')
+        parser.add_argument('--seed', type=int, default=None, help='Semilla del generador para resultados reproducibles.')
+        parser.add_argument('--exact', action='store_true', help='Cálculo exacto en vez de Monte Carlo (para las últimas rondas).')
+
+    def handle(self, *args, **options):
+        try:
+            from tournaments.swiss.montecarlo import DEFAULT_SIMULATIONS, FINAL_RECORDS, simulate_stage_probabilities
+            from tournaments.swiss.exact import TooManyStates, exact_stage_probabilities
+        except ImportError:
+            raise CommandError("El simulador requiere NumPy, que no está instalado.")
+
+        try:
+            stage = Stage.objects.get(pk=options['stage_id'])
+        except Stage.DoesNotExist:
+            raise CommandError(f"Fase con ID {options['stage_id']} no encontrada.")
+        if stage.type != 'SWISS':
+            raise CommandError(f"La fase ID {stage.pk} no es de tipo SWISS.")
+
+        simulations = options['sims'] or DEFAULT_SIMULATIONS
+        started = time.perf_counter()
+        if options['exact']:
+            try:
+                teams = exact_stage_probabilities(stage)
+            except TooManyStates as e:
+                raise CommandError(f"{e} Usa Monte Carlo (sin --exact).")
+        else:
+            teams = simulate_stage_probabilities(stage, simulations, rng=options['seed'])
+        elapsed = time.perf_counter() - started
+
+        names = dict(stage.stage_teams.values_list('team_id', 'team__name'))
+        records = [f'{w}-{l}' for w, l in FINAL_RECORDS]
+        self.stdout.write(f"{'Seed':>4}  {'Equipo':<24} {'W-L':>5} {'3-0':>7} {'Avanza':>7} {'0-3':>7}  " +
+                          ' '.join(f'{record:>6}' for record in records))
+        for team in teams:
+            probabilities = team['probabilities']
+            self.stdout.write(
+                f"{team['seed']:>4}  {names.get(team['team_id'], team['team_id'])!s:<24.24} "
+                f"{team['wins']}-{team['losses']:<3} "
+                f"{probabilities['3-0']:>7.1%} {probabilities['advance']:>7.1%} {probabilities['0-3']:>7.1%}  " +
+                ' '.join(f"{team['records'][record]:>6.1%}" for record in records)
+            )
+        summary = "Cálculo exacto" if options['exact'] else f"{simulations} simulaciones"
+        self.stdout.write(self.style.SUCCESS(f"{summary} en {elapsed:.2f}s"))
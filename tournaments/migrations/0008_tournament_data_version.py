@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournaments', '0007_fantasyphasepick_team_points_breakdown_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tournament',
+            name='data_version',
+            field=models.PositiveBigIntegerField(default=0, editable=False, help_text='Versión monotónica de los datos del torneo. Se incrementa con cada cambio de partidos/equipos.'),
+        ),
+    ]
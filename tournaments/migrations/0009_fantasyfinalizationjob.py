@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournaments', '0008_tournament_data_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FantasyFinalizationJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('PHASE', 'Phase Picks'), ('PLAYOFF', 'Playoff Picks')], max_length=7)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('RUNNING', 'Running'), ('COMPLETED', 'Completed'), ('FAILED', 'Failed')], default='PENDING', max_length=9)),
+                ('chunk_size', models.PositiveIntegerField(default=2000)),
+                ('total_picks', models.PositiveIntegerField(default=0)),
+                ('processed_picks', models.PositiveIntegerField(default=0)),
+                ('last_pick_id', models.PositiveBigIntegerField(default=0, help_text='Checkpoint: último pick procesado.')),
+                ('run_processed_picks', models.PositiveIntegerField(default=0, help_text='Picks procesados en la ejecución actual (para picks/s).')),
+                ('error', models.TextField(blank=True)),
+                ('started_at', models.DateTimeField(blank=True, help_text='Inicio de la ejecución actual.', null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('stage', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fantasy_jobs', to='tournaments.stage')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
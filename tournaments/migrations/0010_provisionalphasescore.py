@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournaments', '0009_fantasyfinalizationjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProvisionalPhaseScore',
+            fields=[
+                ('pick', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='provisional_score', serialize=False, to='tournaments.fantasyphasepick')),
+                ('earned_points', models.DecimalField(decimal_places=1, default=0, help_text='Puntos ya asegurados.', max_digits=7)),
+                ('max_points', models.DecimalField(decimal_places=1, default=0, help_text='Puntos asegurados más los todavía posibles.', max_digits=7)),
+                ('earned_picks', models.PositiveSmallIntegerField(default=0)),
+                ('possible_picks', models.PositiveSmallIntegerField(default=0)),
+                ('dead_picks', models.PositiveSmallIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('stage', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='provisional_scores', to='tournaments.stage')),
+                ('user_profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='provisional_scores', to='tournaments.userprofile')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['stage', '-earned_points'], name='tournaments_stage_i_c6b9b6_idx')],
+            },
+        ),
+    ]
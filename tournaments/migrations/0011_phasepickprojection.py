@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournaments', '0010_provisionalphasescore'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PhasePickProjection',
+            fields=[
+                ('pick', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='projection', serialize=False, to='tournaments.fantasyphasepick')),
+                ('expected_points', models.FloatField(default=0.0)),
+                ('p10_points', models.FloatField(default=0.0, help_text='Percentil 10 de los puntos finales simulados.')),
+                ('p90_points', models.FloatField(default=0.0, help_text='Percentil 90 de los puntos finales simulados.')),
+                ('simulations', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('stage', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pick_projections', to='tournaments.stage')),
+                ('user_profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pick_projections', to='tournaments.userprofile')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['stage', '-expected_points'], name='tournaments_stage_i_68e4dd_idx')],
+            },
+        ),
+    ]
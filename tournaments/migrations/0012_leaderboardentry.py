@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournaments', '0011_phasepickprojection'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('user_profile', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='leaderboard_entry', serialize=False, to='tournaments.userprofile')),
+                ('total_fantasy_points', models.IntegerField()),
+                ('rank', models.PositiveIntegerField(db_index=True)),
+                ('position', models.PositiveIntegerField(unique=True)),
+            ],
+            options={
+                'ordering': ['position'],
+            },
+        ),
+    ]
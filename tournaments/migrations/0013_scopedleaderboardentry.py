@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournaments', '0012_leaderboardentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScopedLeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('points', models.IntegerField()),
+                ('rank', models.PositiveIntegerField()),
+                ('position', models.PositiveIntegerField()),
+                ('stage', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to='tournaments.stage')),
+                ('tournament', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to='tournaments.tournament')),
+                ('user_profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scoped_leaderboard_entries', to='tournaments.userprofile')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['stage', 'rank'], name='tournaments_stage_i_f246ea_idx'), models.Index(fields=['tournament', 'rank'], name='tournaments_tournam_acae35_idx'), models.Index(fields=['user_profile', 'stage'], name='tournaments_user_pr_d9882d_idx'), models.Index(fields=['user_profile', 'tournament'], name='tournaments_user_pr_c39911_idx')],
+                'constraints': [models.UniqueConstraint(fields=('stage', 'position'), name='unique_stage_leaderboard_position'), models.UniqueConstraint(fields=('tournament', 'position'), name='unique_tournament_leaderboard_position')],
+            },
+        ),
+    ]
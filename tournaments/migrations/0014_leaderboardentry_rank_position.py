@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournaments', '0013_scopedleaderboardentry'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='leaderboardentry',
+            name='rank',
+            field=models.PositiveIntegerField(),
+        ),
+        migrations.AddIndex(
+            model_name='leaderboardentry',
+            index=models.Index(fields=['rank', 'position'], name='tournaments_rank_27be6a_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_pick_counts(apps, schema_editor):
+    # Recuento inicial desde las tablas M2M; a partir de aquí se mantiene con deltas al guardar picks
+    Stage = apps.get_model('tournaments', 'Stage')
+    TeamPickCount = apps.get_model('tournaments', 'TeamPickCount')
+    FantasyPhasePick = apps.get_model('tournaments', 'FantasyPhasePick')
+    FantasyPlayoffPick = apps.get_model('tournaments', 'FantasyPlayoffPick')
+    phase_fields = {'3-0': 'teams_3_0', 'advance': 'teams_advance', '0-3': 'teams_0_3'}
+    playoff_fields = {'qf': 'quarter_final_winners', 'sf': 'semi_final_winners'}
+
+    counts = []
+    for stage in Stage.objects.all():
+        if stage.type == 'PLAYOFF':
+            if stage.pk != Stage.objects.filter(tournament_id=stage.tournament_id, type='PLAYOFF').order_by('-order').values_list('pk', flat=True).first():
+                continue
+            model, fields, prefix, lookup = FantasyPlayoffPick, playoff_fields, 'fantasyplayoffpick', {'tournament_id': stage.tournament_id}
+        else:
+            model, fields, prefix, lookup = FantasyPhasePick, phase_fields, 'fantasyphasepick', {'stage_id': stage.pk}
+        for role, field in fields.items():
+            through = getattr(model, field).through
+            rows = through.objects.filter(**{f'{prefix}__{key}': value for key, value in lookup.items()}).values('team_id').annotate(total=models.Count('pk'))
+            counts.extend(TeamPickCount(stage_id=stage.pk, team_id=row['team_id'], role=role, count=row['total']) for row in rows)
+        if model is FantasyPlayoffPick:
+            rows = model.objects.filter(final_winner__isnull=False, **lookup).values('final_winner_id').annotate(total=models.Count('pk'))
+            counts.extend(TeamPickCount(stage_id=stage.pk, team_id=row['final_winner_id'], role='final', count=row['total']) for row in rows)
+    TeamPickCount.objects.bulk_create(counts, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournaments', '0014_leaderboardentry_rank_position'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TeamPickCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('3-0', '3-0'), ('advance', 'Avanza'), ('0-3', '0-3'), ('qf', 'Ganador de cuartos'), ('sf', 'Ganador de semifinal'), ('final', 'Campeón')], max_length=10)),
+                ('count', models.IntegerField(default=0)),
+                ('stage', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='team_pick_counts', to='tournaments.stage')),
+                ('team', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pick_counts', to='tournaments.team')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('stage', 'team', 'role'), name='unique_team_pick_count')],
+            },
+        ),
+        migrations.RunPython(backfill_pick_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournaments', '0015_teampickcount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoleFeasibility',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('3-0', '3-0'), ('advance', 'Avanza'), ('0-3', '0-3'), ('qf_winner', 'Ganador de cuartos'), ('sf_winner', 'Ganador de semifinal'), ('final_winner', 'Campeón')], max_length=12)),
+                ('is_possible', models.BooleanField()),
+                ('stage', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='role_feasibility', to='tournaments.stage')),
+                ('team', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='role_feasibility', to='tournaments.team')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('stage', 'team', 'role'), name='unique_role_feasibility')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournaments', '0016_rolefeasibility'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SortedLeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sort', models.CharField(choices=[('live', 'Puntos en vivo')], max_length=10)),
+                ('points', models.FloatField()),
+                ('rank', models.PositiveIntegerField()),
+                ('position', models.PositiveIntegerField()),
+                ('user_profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sorted_leaderboard_entries', to='tournaments.userprofile')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('sort', 'position'), name='unique_sorted_leaderboard_position'), models.UniqueConstraint(fields=('sort', 'user_profile'), name='unique_sorted_leaderboard_profile')],
+            },
+        ),
+    ]
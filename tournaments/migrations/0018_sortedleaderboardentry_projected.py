@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournaments', '0017_sortedleaderboardentry'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sortedleaderboardentry',
+            name='sort',
+            field=models.CharField(choices=[('live', 'Puntos en vivo'), ('projected', 'Puntos proyectados')], max_length=10),
+        ),
+    ]
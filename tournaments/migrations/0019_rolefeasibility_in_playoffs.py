@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:04
+
+from django.db import migrations, models
+
+
+def forget_playoff_tables(apps, schema_editor):
+    # Las tablas de playoffs guardadas no tienen la fila 'in_playoffs': sin filas se calculan al
+    # vuelo (con ella) hasta que el siguiente resultado de la fase las vuelva a guardar
+    RoleFeasibility = apps.get_model('tournaments', 'RoleFeasibility')
+    RoleFeasibility.objects.filter(stage__type='PLAYOFF').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournaments', '0018_sortedleaderboardentry_projected'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='rolefeasibility',
+            name='role',
+            field=models.CharField(choices=[('3-0', '3-0'), ('advance', 'Avanza'), ('0-3', '0-3'), ('qf_winner', 'Ganador de cuartos'), ('sf_winner', 'Ganador de semifinal'), ('final_winner', 'Campeón'), ('in_playoffs', 'Sigue en playoffs')], max_length=12),
+        ),
+        migrations.RunPython(forget_playoff_tables, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils.text import slugify
 from django.contrib.auth.models import User
 
@@ -39,13 +39,43 @@ class Tournament(models.Model):
         help_text="Marca si este es el torneo activo principal que se muestra en Home."
     )
 
+    data_version = models.PositiveBigIntegerField(
+        default=0,
+        editable=False,
+        help_text="Versión monotónica de los datos del torneo. Se incrementa con cada cambio de partidos/equipos."
+    )
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Slug con el que se leyó: si se guarda con otro, save() olvida los dos
+        instance._loaded_slug = values[field_names.index('slug')] if 'slug' in field_names else None
+        return instance
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
-        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        is_update = not self._state.adding
+
+        from .snapshot import bump_tournament_version, forget_tournament_slugs
+        with transaction.atomic(savepoint=False):
+            if is_update and not kwargs.get('force_insert') and (update_fields is None or 'data_version' in update_fields):
+                # data_version solo avanza con bump_tournament_version (F()): se relee bloqueando la fila
+                # para no escribir una versión anterior desde una instancia en memoria
+                current = Tournament.objects.select_for_update().filter(pk=self.pk).values_list('data_version', flat=True).first()
+                if current is not None:
+                    self.data_version = current
+            super().save(*args, **kwargs)
+            if is_update:
+                self.data_version = bump_tournament_version(self.pk) or self.data_version
+
+        if update_fields is None or {'slug', 'is_live'} & set(update_fields):
+            forget_tournament_slugs([getattr(self, '_loaded_slug', None), self.slug])
+            self._loaded_slug = self.slug
 
     def __str__(self):
         return self.name
@@ -98,6 +128,15 @@ class Stage(models.Model):
     class Meta:
         ordering = ['order']
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # El nombre, el orden y el fantasy_status forman parte del snapshot de tournament/data/
+        from .snapshot import bump_tournament_version
+        bump_tournament_version(self.tournament_id)
+        # ...y del perfil público cacheado de quienes la eligieron
+        from .profile_cache import bump_stage_generation
+        bump_stage_generation(self.pk)
+
     def __str__(self):
         return f"{self.tournament.name} - {self.name}"
 
@@ -186,6 +225,15 @@ class UserProfile(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Invalida su perfil público cacheado (también al guardar sus picks, con sus M2M en la misma transacción)
+        from .profile_cache import bump_profile_generation
+        bump_profile_generation(self.pk)
+        # Perfil nuevo o total de puntos cambiado: el leaderboard materializado no puede quedarse atrás
+        from .leaderboard import sync_leaderboard_entry
+        sync_leaderboard_entry(self)
+
     def __str__(self):
         return self.user.username
 
@@ -215,6 +263,11 @@ class FantasyPhasePick(models.Model):
         help_text="Puntos otorgados por cada equipo en este pick. Ej: {'team_123': 15, 'team_456': 5}"
     )
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        from .profile_cache import bump_profile_generation
+        bump_profile_generation(self.user_profile_id)
+
     def __str__(self):
         return f"{self.user_profile.user.username}'s picks for {self.stage.name}"
 
@@ -244,5 +297,236 @@ class FantasyPlayoffPick(models.Model):
         help_text="Puntos otorgados por cada equipo en este pick de playoffs. Ej: {'team_123': 20}"
     )
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        from .profile_cache import bump_profile_generation
+        bump_profile_generation(self.user_profile_id)
+
     def __str__(self):
         return f"{self.user_profile.user.username}'s playoff picks for {self.tournament.name}"
+
+
+class ProvisionalPhaseScore(models.Model):
+    """
+    Puntos provisionales de un pick de fase con los récords actuales de los StageTeam, mientras la
+    fase está en juego. Se construye al bloquear la fase y se ajusta con deltas en cada resultado
+    (ver `fantasy_logic.update_provisional_scores`); nunca se calcula por petición.
+    """
+    pick = models.OneToOneField(FantasyPhasePick, on_delete=models.CASCADE, primary_key=True, related_name='provisional_score')
+    stage = models.ForeignKey(Stage, on_delete=models.CASCADE, related_name='provisional_scores')
+    user_profile = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name='provisional_scores')
+    # Con decimales: el bonus de underdog da medios puntos y el total se redondea al final, como en el cálculo definitivo
+    earned_points = models.DecimalField(max_digits=7, decimal_places=1, default=0, help_text="Puntos ya asegurados.")
+    max_points = models.DecimalField(max_digits=7, decimal_places=1, default=0, help_text="Puntos asegurados más los todavía posibles.")
+    earned_picks = models.PositiveSmallIntegerField(default=0)
+    possible_picks = models.PositiveSmallIntegerField(default=0)
+    dead_picks = models.PositiveSmallIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['stage', '-earned_points'])]
+
+    def __str__(self):
+        return f"Provisional {self.earned_points} pts for pick {self.pick_id}"
+
+
+class PhasePickProjection(models.Model):
+    """
+    Puntos esperados de un pick de fase y su banda del percentil 10 al 90, según un lote de
+    simulaciones Monte Carlo del resto de la fase compartido por todos los picks
+    (ver `fantasy_projection.project_phase_picks`).
+    """
+    pick = models.OneToOneField(FantasyPhasePick, on_delete=models.CASCADE, primary_key=True, related_name='projection')
+    stage = models.ForeignKey(Stage, on_delete=models.CASCADE, related_name='pick_projections')
+    user_profile = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name='pick_projections')
+    expected_points = models.FloatField(default=0.0)
+    p10_points = models.FloatField(default=0.0, help_text="Percentil 10 de los puntos finales simulados.")
+    p90_points = models.FloatField(default=0.0, help_text="Percentil 90 de los puntos finales simulados.")
+    simulations = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['stage', '-expected_points'])]
+
+    def __str__(self):
+        return f"Projection {self.expected_points:.1f} pts for pick {self.pick_id}"
+
+
+class LeaderboardEntry(models.Model):
+    """
+    Clasificación global materializada (ver `leaderboard.refresh_leaderboard`), reconstruida cada vez
+    que cambian los puntos. `rank` es el ranking denso por `total_fantasy_points` (los empates
+    comparten puesto) y `position` el orden único del leaderboard (desempate por antigüedad del perfil), de modo
+    que una página es un rango de `position` y el puesto de un usuario es una búsqueda por clave primaria.
+    """
+    user_profile = models.OneToOneField(UserProfile, on_delete=models.CASCADE, primary_key=True, related_name='leaderboard_entry')
+    total_fantasy_points = models.IntegerField()
+    rank = models.PositiveIntegerField()
+    position = models.PositiveIntegerField(unique=True)
+
+    class Meta:
+        ordering = ['position']
+        # (rank, position): la última posición de un puesto (para el percentil) es un salto en el índice
+        indexes = [models.Index(fields=['rank', 'position'])]
+
+    def __str__(self):
+        return f"#{self.rank} {self.user_profile_id} ({self.total_fantasy_points} pts)"
+
+
+class SortedLeaderboardEntry(models.Model):
+    """
+    Clasificación global materializada por una columna que cambia mientras se juegan las fases
+    (`sort`): 'live' ordena por los puntos provisionales ya asegurados en las fases bloqueadas y
+    'projected' por los puntos finales esperados (los totales más la proyección de esas fases).
+    Se reconstruye cuando cambian esos totales (ver `leaderboard.refresh_sorted_leaderboard`), así
+    una página de ?sort= es un rango de `position` como en LeaderboardEntry. Los perfiles creados
+    después figuran tras la siguiente.
+    """
+    SORT_CHOICES = [
+        ('live', 'Puntos en vivo'),
+        ('projected', 'Puntos proyectados'),
+    ]
+    sort = models.CharField(max_length=10, choices=SORT_CHOICES)
+    user_profile = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name='sorted_leaderboard_entries')
+    points = models.FloatField()
+    rank = models.PositiveIntegerField()
+    position = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['sort', 'position'], name='unique_sorted_leaderboard_position'),
+            models.UniqueConstraint(fields=['sort', 'user_profile'], name='unique_sorted_leaderboard_profile'),
+        ]
+
+    def __str__(self):
+        return f"{self.sort} #{self.rank} {self.user_profile_id} ({self.points} pts)"
+
+
+class ScopedLeaderboardEntry(models.Model):
+    """
+    Clasificación materializada de una fase (`stage`) o de un torneo (`tournament`); solo uno de los
+    dos está informado. Se reconstruye al finalizar los picks (ver `leaderboard.refresh_stage_leaderboard`
+    y `leaderboard.refresh_tournament_leaderboard`) con los `points_earned` de los picks finalizados.
+    `rank` y `position` como en LeaderboardEntry.
+    """
+    stage = models.ForeignKey(Stage, on_delete=models.CASCADE, null=True, blank=True, related_name='leaderboard_entries')
+    tournament = models.ForeignKey(Tournament, on_delete=models.CASCADE, null=True, blank=True, related_name='leaderboard_entries')
+    user_profile = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name='scoped_leaderboard_entries')
+    points = models.IntegerField()
+    rank = models.PositiveIntegerField()
+    position = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['stage', 'position'], name='unique_stage_leaderboard_position'),
+            models.UniqueConstraint(fields=['tournament', 'position'], name='unique_tournament_leaderboard_position'),
+        ]
+        indexes = [
+            models.Index(fields=['stage', 'rank']),
+            models.Index(fields=['tournament', 'rank']),
+            models.Index(fields=['user_profile', 'stage']),
+            models.Index(fields=['user_profile', 'tournament']),
+        ]
+
+    def __str__(self):
+        scope = f"stage {self.stage_id}" if self.stage_id else f"tournament {self.tournament_id}"
+        return f"#{self.rank} {self.user_profile_id} in {scope} ({self.points} pts)"
+
+
+class TeamPickCount(models.Model):
+    """
+    Cuántos usuarios eligieron cada equipo en cada rol de una fase ("pick rates"). Los picks de
+    playoffs cuentan en la fase PLAYOFF de su torneo. Se mantiene con deltas al guardar picks
+    (ver `pick_counts.record_pick_changes`) en lugar de agrupar las tablas M2M en cada petición.
+    """
+    ROLE_CHOICES = [
+        ('3-0', '3-0'),
+        ('advance', 'Avanza'),
+        ('0-3', '0-3'),
+        ('qf', 'Ganador de cuartos'),
+        ('sf', 'Ganador de semifinal'),
+        ('final', 'Campeón'),
+    ]
+    stage = models.ForeignKey(Stage, on_delete=models.CASCADE, related_name='team_pick_counts')
+    team = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='pick_counts')
+    role = models.CharField(max_length=10, choices=ROLE_CHOICES)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['stage', 'team', 'role'], name='unique_team_pick_count')]
+
+    def __str__(self):
+        return f"{self.team_id} as {self.role} in stage {self.stage_id}: {self.count}"
+
+
+class RoleFeasibility(models.Model):
+    """
+    Si cada equipo de una fase aún puede cumplir cada rol de pick (3-0, avanza, 0-3 o ganar una
+    ronda de playoffs) y, en playoffs, si aún no ha perdido ningún partido. Se recalcula al cambiar un partido o un StageTeam de la fase
+    (`feasibility.refresh_role_feasibility`) para que los serializers solo consulten un diccionario.
+    """
+    ROLE_CHOICES = [
+        ('3-0', '3-0'),
+        ('advance', 'Avanza'),
+        ('0-3', '0-3'),
+        ('qf_winner', 'Ganador de cuartos'),
+        ('sf_winner', 'Ganador de semifinal'),
+        ('final_winner', 'Campeón'),
+        ('in_playoffs', 'Sigue en playoffs'),
+    ]
+    stage = models.ForeignKey(Stage, on_delete=models.CASCADE, related_name='role_feasibility')
+    team = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='role_feasibility')
+    role = models.CharField(max_length=12, choices=ROLE_CHOICES)
+    is_possible = models.BooleanField()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['stage', 'team', 'role'], name='unique_role_feasibility')]
+
+    def __str__(self):
+        return f"{self.team_id} as {self.role} in stage {self.stage_id}: {'possible' if self.is_possible else 'impossible'}"
+
+
+class FantasyFinalizationJob(models.Model):
+    """
+    Cálculo por lotes de los puntos fantasy de una fase (o de los playoffs de su torneo).
+    Cada lote se guarda en la misma transacción que su checkpoint (`last_pick_id`), así que un job
+    interrumpido se reanuda desde ahí sin sumar dos veces los puntos a `total_fantasy_points`.
+    """
+    KIND_CHOICES = [
+        ('PHASE', 'Phase Picks'),
+        ('PLAYOFF', 'Playoff Picks'),
+    ]
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('RUNNING', 'Running'),
+        ('COMPLETED', 'Completed'),
+        ('FAILED', 'Failed'),
+    ]
+
+    stage = models.ForeignKey(Stage, on_delete=models.CASCADE, related_name='fantasy_jobs')
+    kind = models.CharField(max_length=7, choices=KIND_CHOICES)
+    status = models.CharField(max_length=9, choices=STATUS_CHOICES, default='PENDING')
+    chunk_size = models.PositiveIntegerField(default=2000)
+    total_picks = models.PositiveIntegerField(default=0)
+    processed_picks = models.PositiveIntegerField(default=0)
+    last_pick_id = models.PositiveBigIntegerField(default=0, help_text="Checkpoint: último pick procesado.")
+    run_processed_picks = models.PositiveIntegerField(default=0, help_text="Picks procesados en la ejecución actual (para picks/s).")
+    error = models.TextField(blank=True)
+    started_at = models.DateTimeField(null=True, blank=True, help_text="Inicio de la ejecución actual.")
+    finished_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.get_kind_display()} job #{self.pk} for {self.stage.name} ({self.status})"
+
+    @property
+    def picks_per_second(self) -> float | None:
+        if not self.started_at or not self.run_processed_picks:
+            return None
+        elapsed = ((self.finished_at or self.updated_at) - self.started_at).total_seconds()
+        return self.run_processed_picks / elapsed if elapsed > 0 else None
+
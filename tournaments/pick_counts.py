@@ -0,0 +1,85 @@
+"""
+Conteo de elecciones por equipo y rol de cada fase ("pick rates") en TeamPickCount.
+
+Al guardar un pick se comparan sus elecciones antes y después y solo se aplican los deltas (±1)
+con UPDATEs atómicos de F(), siempre en el mismo orden de (rol, equipo) para que dos guardados
+concurrentes no se bloqueen mutuamente. Las vistas bloquean la fila del pick mientras tanto, así
+que dos guardados del mismo pick no leen el mismo "antes" y el conteo no deriva.
+`rebuild_pick_counts` recuenta una fase desde las tablas M2M, para reparar.
+"""
+from django.db import transaction
+from django.db.models import Count, F
+
+from .fantasy_logic import PHASE_PICK_FIELDS
+from .models import FantasyPhasePick, FantasyPlayoffPick, TeamPickCount
+
+# Rol -> campo M2M de FantasyPlayoffPick; el campeón ('final') es la FK final_winner
+PLAYOFF_PICK_FIELDS = {'qf': 'quarter_final_winners', 'sf': 'semi_final_winners'}
+
+
+def _m2m_choices(model, fields: dict[str, str], pick_id: int) -> set[tuple[str, int]]:
+    choices = set()
+    for role, field in fields.items():
+        through = getattr(model, field).through
+        source = f'{model._meta.model_name}_id'
+        choices.update((role, team_id) for team_id in through.objects.filter(**{source: pick_id}).values_list('team_id', flat=True))
+    return choices
+
+
+def phase_pick_choices(pick: FantasyPhasePick) -> set[tuple[str, int]]:
+    """Elecciones (rol, team_id) guardadas de un pick de fase (3 consultas)."""
+    return _m2m_choices(FantasyPhasePick, PHASE_PICK_FIELDS, pick.pk)
+
+
+def playoff_pick_choices(pick: FantasyPlayoffPick) -> set[tuple[str, int]]:
+    """Elecciones (rol, team_id) guardadas de un pick de playoffs (3 consultas)."""
+    choices = _m2m_choices(FantasyPlayoffPick, PLAYOFF_PICK_FIELDS, pick.pk)
+    final_winner_id = FantasyPlayoffPick.objects.filter(pk=pick.pk).values_list('final_winner_id', flat=True).first()
+    if final_winner_id:
+        choices.add(('final', final_winner_id))
+    return choices
+
+
+def record_pick_changes(stage, before: set, after: set) -> None:
+    """Aplica a los contadores de `stage` la diferencia entre las elecciones `before` y `after`."""
+    changes = {key: 1 for key in after - before}
+    changes.update({key: -1 for key in before - after})
+    if not changes:
+        return
+    TeamPickCount.objects.bulk_create(
+        [TeamPickCount(stage=stage, team_id=team_id, role=role) for (role, team_id), delta in changes.items() if delta > 0],
+        ignore_conflicts=True,
+    )
+    for (role, team_id), delta in sorted(changes.items()):
+        TeamPickCount.objects.filter(stage=stage, team_id=team_id, role=role).update(count=F('count') + delta)
+
+
+def rebuild_pick_counts(stage) -> int:
+    """Recuenta desde cero los contadores de una fase. Devuelve el número de filas creadas."""
+    if stage.type == 'PLAYOFF':
+        model, fields, picks = FantasyPlayoffPick, PLAYOFF_PICK_FIELDS, {'tournament_id': stage.tournament_id}
+    else:
+        model, fields, picks = FantasyPhasePick, PHASE_PICK_FIELDS, {'stage': stage}
+    counts = []
+    for role, field in fields.items():
+        through = getattr(model, field).through
+        prefix = model._meta.model_name
+        rows = (through.objects.filter(**{f'{prefix}__{lookup}': value for lookup, value in picks.items()})
+                .values('team_id').annotate(total=Count('pk')))
+        counts.extend(TeamPickCount(stage=stage, team_id=row['team_id'], role=role, count=row['total']) for row in rows)
+    if model is FantasyPlayoffPick:
+        rows = (FantasyPlayoffPick.objects.filter(final_winner__isnull=False, **picks)
+                .values('final_winner_id').annotate(total=Count('pk')))
+        counts.extend(TeamPickCount(stage=stage, team_id=row['final_winner_id'], role='final', count=row['total']) for row in rows)
+    with transaction.atomic():
+        TeamPickCount.objects.filter(stage=stage).delete()
+        TeamPickCount.objects.bulk_create(counts)
+    return len(counts)
+
+
+def stage_pick_counts(stage) -> dict[str, dict[str, int]]:
+    """{team_id (str): {rol: usuarios}} de una fase, en una consulta."""
+    counts = {}
+    for team_id, role, count in TeamPickCount.objects.filter(stage=stage, count__gt=0).values_list('team_id', 'role', 'count'):
+        counts.setdefault(str(team_id), {})[role] = count
+    return counts
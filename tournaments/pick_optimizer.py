@@ -0,0 +1,74 @@
+"""
+Pick de fase con la máxima puntuación esperada.
+
+Los puntos esperados de un pick son la suma de los de cada elección (linealidad de la esperanza),
+así que basta el valor esperado de cada (equipo, categoría) y repartir los huecos de PHASE_PICK_SLOTS
+sin repetir equipo. Se resuelve exactamente con programación dinámica sobre los equipos con estado
+(elegidos en 3-0, en advance, en 0-3): 16 equipos × 3·7·3 estados × 4 opciones, unos pocos miles de
+operaciones. El redondeo del total que hace la puntuación real se ignora.
+
+Python puro: no depende de NumPy (las probabilidades sí, y las calcula la vista).
+"""
+from .fantasy_logic import (
+    PHASE_PICK_SLOTS, POINTS_CORRECT_0_3, POINTS_CORRECT_3_0, POINTS_CORRECT_ADVANCE, SEED_BONUS_MULTIPLIER,
+)
+
+CATEGORIES = list(PHASE_PICK_SLOTS)
+
+
+def phase_choice_values(teams: list[dict], low_seed_bonus_ids: set[int]) -> dict[int, dict[str, float]]:
+    """
+    Puntos esperados de elegir cada equipo en cada categoría, a partir de la lista `teams` de
+    `stage_probabilities_payload`. "advance" solo puntúa si el equipo clasifica sin 3-0.
+    """
+    values = {}
+    for team in teams:
+        probabilities = team['probabilities']
+        bonus = SEED_BONUS_MULTIPLIER if team['team_id'] in low_seed_bonus_ids else 1
+        values[team['team_id']] = {
+            '3-0': probabilities['3-0'] * POINTS_CORRECT_3_0 * bonus,
+            'advance': max(probabilities['advance'] - probabilities['3-0'], 0.0) * POINTS_CORRECT_ADVANCE * bonus,
+            '0-3': probabilities['0-3'] * POINTS_CORRECT_0_3,
+        }
+    return values
+
+
+def optimal_phase_pick(values: dict[int, dict[str, float]],
+                       slots: dict[str, int] = PHASE_PICK_SLOTS) -> tuple[dict[str, list[int]], float]:
+    """
+    Reparto de equipos en categorías (como mucho `slots[categoría]` en cada una, un equipo en una
+    sola) que maximiza la suma de `values`. A igual valor se prefiere el pick con más elecciones.
+    Devuelve ({categoría: [team_id, ...]}, puntos esperados).
+    """
+    team_ids = list(values)
+    start = (0,) * len(CATEGORIES)
+    best = {start: 0.0}
+    # Por equipo: estado alcanzado -> (estado anterior, categoría elegida o None)
+    parents = []
+    for team_id in team_ids:
+        team_values = values[team_id]
+        following = {}
+        parent = {}
+        for state, total in best.items():
+            if total > following.get(state, -1.0):
+                following[state], parent[state] = total, (state, None)
+            for i, category in enumerate(CATEGORIES):
+                if state[i] == slots[category]:
+                    continue
+                chosen = state[:i] + (state[i] + 1,) + state[i + 1:]
+                candidate = total + team_values[category]
+                if candidate > following.get(chosen, -1.0):
+                    following[chosen], parent[chosen] = candidate, (state, category)
+        best = following
+        parents.append(parent)
+
+    state = max(best, key=lambda key: (best[key], sum(key)))
+    expected_points = best[state]
+    picks = {category: [] for category in CATEGORIES}
+    for team_id, parent in zip(reversed(team_ids), reversed(parents)):
+        state, category = parent[state]
+        if category:
+            picks[category].append(team_id)
+    for chosen in picks.values():
+        chosen.reverse()
+    return picks, expected_points
@@ -0,0 +1,126 @@
+"""
+Caché del JSON de los perfiles fantasy públicos (UserFantasyProfileView) por username.
+
+Cada entrada guarda, junto al payload, la generación de cada dato del que depende: la del perfil
+(cambia al guardar el UserProfile o uno de sus picks) y la de cada fase que aparece en él (cambia con
+su fantasy_status, sus resultados, la proyección o la finalización de sus puntos). Invalidar una fase
+es cambiar una sola clave, sin recorrer los perfiles de quienes la eligieron: la entrada deja de
+valer al leerla. Un acierto son dos operaciones de caché y ninguna consulta.
+
+Las generaciones son tokens aleatorios (como las versiones de `leaderboard`) y nunca se guarda una
+ausente: las que no existen se siembran con un token nuevo (`cache.add`) antes de leer los datos, así
+que si una se expulsa de la caché la siguiente nunca coincide con la guardada en una entrada. Se leen
+antes de renderizar y la entrada se guarda con esas: un cambio confirmado durante el renderizado
+cambia alguna y la entrada nunca llega a valer.
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, When
+
+from .models import UserProfile
+
+PROFILE_CACHE_TIMEOUT = getattr(settings, 'FANTASY_PROFILE_CACHE_TIMEOUT', 10 * 60)
+STATS_KEYS = {'hits': 'fantasy-profile-cache:hits', 'misses': 'fantasy-profile-cache:misses'}
+
+
+def _profile_key(username: str) -> str:
+    return f'fantasy-profile:{username}'
+
+
+def _generation_key(scope: str, scope_id: int) -> str:
+    return f'fantasy-profile:{scope}:{scope_id}:generation'
+
+
+def _bump(scope: str, scope_id: int) -> None:
+    key = _generation_key(scope, scope_id)
+    transaction.on_commit(lambda: cache.set(key, uuid.uuid4().hex, None))
+
+
+def bump_profile_generation(profile_id: int) -> None:
+    """Invalida el perfil cacheado de `profile_id` (al confirmarse la transacción)."""
+    _bump('profile', profile_id)
+
+
+def bump_profile_generations(profile_ids) -> None:
+    """Como bump_profile_generation para muchos perfiles (escrituras en bloque que no pasan por save())."""
+    keys = [_generation_key('profile', profile_id) for profile_id in profile_ids]
+    if keys:
+        transaction.on_commit(lambda: cache.set_many({key: uuid.uuid4().hex for key in keys}, None))
+
+
+def bump_stage_generation(stage_id: int) -> None:
+    """Invalida los perfiles cacheados que muestran la fase `stage_id` (al confirmarse la transacción)."""
+    _bump('stage', stage_id)
+
+
+def _count(outcome: str) -> None:
+    key = STATS_KEYS[outcome]
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def profile_cache_stats() -> dict[str, int]:
+    """Aciertos y fallos acumulados de la caché de perfiles (compartidos entre procesos)."""
+    values = cache.get_many(list(STATS_KEYS.values()))
+    return {outcome: values.get(key, 0) for outcome, key in STATS_KEYS.items()}
+
+
+def _is_current(generations: dict) -> bool:
+    current = cache.get_many(list(generations))
+    return all(current.get(key) == generation for key, generation in generations.items())
+
+
+def get_cached_profile(username: str):
+    """Payload cacheado de `username` si sus generaciones siguen vigentes, o None."""
+    entry = cache.get(_profile_key(username))
+    if entry is not None and _is_current(entry['generations']):
+        _count('hits')
+        return entry['payload']
+    _count('misses')
+    return None
+
+
+def profile_dependencies(username: str) -> tuple[int, set[int]] | None:
+    """
+    (profile_id, fases que puede mostrar el perfil) en una consulta, antes de cargar sus datos: las
+    de sus picks de fase y las de playoffs de los torneos con pick de playoffs. None si no existe.
+    """
+    rows = UserProfile.objects.filter(user__username=username).values_list(
+        'pk', 'phase_picks__stage_id',
+        Case(When(playoff_picks__tournament__stages__type='PLAYOFF', then=F('playoff_picks__tournament__stages__id'))),
+    )
+    profile_id, stage_ids = None, set()
+    for profile_id, *row_stage_ids in rows:
+        stage_ids.update(stage_id for stage_id in row_stage_ids if stage_id is not None)
+    return (profile_id, stage_ids) if profile_id is not None else None
+
+
+def read_generations(profile_id: int, stage_ids) -> dict:
+    """
+    Generaciones del perfil y de las fases `stage_ids`, a leer ANTES de cargar los datos del perfil.
+    Las ausentes se siembran con un token nuevo: nunca se devuelve None.
+    """
+    keys = [_generation_key('profile', profile_id)] + [_generation_key('stage', stage_id) for stage_id in sorted(stage_ids)]
+    generations = cache.get_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in generations}
+    if missing:
+        for key, token in missing.items():
+            cache.add(key, token, None)
+        # Si otro proceso la sembró antes gana la suya; si ya se expulsó, el token propio nunca coincidirá
+        generations.update({**missing, **cache.get_many(list(missing))})
+    return {key: generations[key] for key in keys}
+
+
+def cache_profile(username: str, payload, generations: dict) -> None:
+    """
+    Guarda el payload de `username` con las `generations` leídas antes de renderizarlo. Si alguna ya
+    cambió (un cambio confirmado durante el renderizado) no se guarda: la entrada nacería caducada.
+    """
+    if _is_current(generations):
+        cache.set(_profile_key(username), {'payload': payload, 'generations': generations}, PROFILE_CACHE_TIMEOUT)
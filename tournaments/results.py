@@ -0,0 +1,131 @@
+"""
+Aplicación de resultados de partidos a los récords (W/L) de los StageTeam.
+
+`record_match_winner` aplica solo la diferencia que introduce un partido (nuevo ganador o ganador
+cambiado) con UPDATEs atómicos de F() sobre los dos StageTeam implicados, así que dos admins que
+cargan resultados de partidos distintos a la vez no se bloquean entre sí ni pierden actualizaciones.
+El Buchholz, los puntos fantasy provisionales y la tabla de roles posibles (datos derivados) se
+ajustan después, en transacciones cortas aparte.
+`rebuild_stage_records` recalcula toda la fase desde los partidos, para reparar datos inconsistentes.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .fantasy_logic import rebuild_provisional_scores, update_provisional_scores
+from .feasibility import refresh_role_feasibility
+from .models import Match, ProvisionalPhaseScore, StageTeam
+from .swiss.loader import recalculate_buchholz_scores
+
+
+def _counted_result(match) -> tuple | None:
+    """(ganador, perdedor) con el que el partido cuenta para los W/L de la fase, o None si no cuenta."""
+    if match.status != 'FINISHED' or not match.winner_id:
+        return None
+    if match.winner_id == match.team1_id:
+        return match.winner_id, match.team2_id
+    if match.winner_id == match.team2_id:
+        return match.winner_id, match.team1_id
+    return match.winner_id, None
+
+
+def _record_deltas(previous, current) -> dict:
+    """Cambios {team_id: (victorias, derrotas)} al pasar del resultado `previous` a `current`."""
+    deltas = {}
+    for result, sign in ((previous, -1), (current, 1)):
+        if result is None:
+            continue
+        winner_id, loser_id = result
+        wins, losses = deltas.get(winner_id, (0, 0))
+        deltas[winner_id] = (wins + sign, losses)
+        if loser_id is not None:
+            wins, losses = deltas.get(loser_id, (0, 0))
+            deltas[loser_id] = (wins, losses + sign)
+    return {team_id: delta for team_id, delta in deltas.items() if delta != (0, 0)}
+
+
+def record_match_winner(stage, match_id: int, winner_id: int) -> Match:
+    """
+    Marca el partido como FINISHED con `winner_id` y ajusta solo los StageTeam afectados.
+    Solo se bloquea la fila del partido (select_for_update): clics concurrentes sobre el mismo
+    partido se ordenan y los de partidos distintos avanzan en paralelo.
+    Repetir el mismo ganador no modifica ningún StageTeam.
+    """
+    with transaction.atomic():
+        match = Match.objects.select_for_update().get(pk=match_id, stage=stage)
+        previous = _counted_result(match)
+        match.winner_id = winner_id
+        match.status = 'FINISHED'
+        match.save(update_fields=['winner', 'status', 'updated_at'])
+
+        deltas = _record_deltas(previous, _counted_result(match))
+        now = timezone.now()
+        # Orden fijo de team_id para que dos transacciones no se bloqueen mutuamente
+        for team_id, (wins, losses) in sorted(deltas.items()):
+            StageTeam.objects.filter(stage=stage, team_id=team_id).update(
+                wins=F('wins') + wins, losses=F('losses') + losses, updated_at=now,
+            )
+        record_changes = {}
+        if deltas and stage.type == 'SWISS':
+            # Con las filas bloqueadas por el UPDATE, el récord leído es exactamente el resultante
+            for team_id, wins, losses in StageTeam.objects.filter(stage=stage, team_id__in=deltas).values_list('team_id', 'wins', 'losses'):
+                delta_wins, delta_losses = deltas[team_id]
+                record_changes[team_id] = ((wins - delta_wins, losses - delta_losses), (wins, losses))
+    if record_changes:
+        refresh_stage_buchholz(stage)
+        update_provisional_scores(stage, record_changes)
+    if stage.type == 'SWISS':
+        # Solo cambian los roles de los equipos cuyo récord cambió (ninguno si se repite el ganador)
+        if deltas:
+            refresh_role_feasibility(stage, team_ids=deltas)
+    else:
+        # En playoffs cuenta el ganador aunque no cambie ningún récord
+        refresh_role_feasibility(stage)
+    return match
+
+
+def refresh_stage_buchholz(stage) -> int:
+    """
+    Recalcula el Buchholz de la fase con los W/L ya confirmados. Bloquea los StageTeam de la fase
+    (siempre en orden de id) para que, con resultados concurrentes, el último recálculo lea los W/L
+    de todos y no se escriban valores obsoletos.
+    """
+    with transaction.atomic():
+        list(StageTeam.objects.select_for_update().filter(stage=stage).order_by('id').values_list('id', flat=True))
+        return recalculate_buchholz_scores(stage)
+
+
+def rebuild_stage_records(stage) -> int:
+    """
+    Recalcula desde cero los W/L (y el Buchholz y los puntos provisionales en fases suizas) de una
+    fase a partir de sus partidos FINISHED. Solo escribe los StageTeam que cambian; devuelve cuántos
+    se actualizaron.
+    """
+    with transaction.atomic():
+        stage_teams = {st.team_id: st for st in StageTeam.objects.select_for_update().filter(stage=stage).order_by('id')}
+        records = {team_id: [0, 0] for team_id in stage_teams}
+        for match in Match.objects.filter(stage=stage, status='FINISHED').only('team1_id', 'team2_id', 'winner_id', 'status'):
+            result = _counted_result(match)
+            if result is None:
+                continue
+            winner_id, loser_id = result
+            if winner_id in records:
+                records[winner_id][0] += 1
+            if loser_id in records:
+                records[loser_id][1] += 1
+
+        now = timezone.now()
+        changed = []
+        for team_id, (wins, losses) in records.items():
+            stage_team = stage_teams[team_id]
+            if (stage_team.wins, stage_team.losses) != (wins, losses):
+                stage_team.wins, stage_team.losses, stage_team.updated_at = wins, losses, now
+                changed.append(stage_team)
+        if changed:
+            StageTeam.objects.bulk_update(changed, ['wins', 'losses', 'updated_at'])
+        if stage.type == 'SWISS':
+            recalculate_buchholz_scores(stage)
+            if ProvisionalPhaseScore.objects.filter(stage=stage).exists():
+                rebuild_provisional_scores(stage)
+    refresh_role_feasibility(stage)
+    return len(changed)
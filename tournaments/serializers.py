@@ -1,10 +1,16 @@
+from functools import cached_property
+
 from rest_framework import serializers
 from .models import (
     Tournament, Team, Stage, StageTeam, Match, HLTVUpdateSettings,
-    UserProfile, FantasyPhasePick, FantasyPlayoffPick
+    UserProfile, FantasyPhasePick, FantasyPlayoffPick, PhasePickProjection, ScopedLeaderboardEntry,
+    LeaderboardEntry
 )
 from django.contrib.auth.models import User
-from .fantasy_logic import get_low_seed_bonus_teams_ids # Importar para bonus
+from django.db.models import F, Value
+from .fantasy_logic import low_seed_bonus_team_ids # Importar para bonus
+from .feasibility import PLAYOFF_ALIVE_ROLE, stage_role_feasibility, stages_role_feasibility
+from .pick_counts import stage_pick_counts
 
 # Serializer para el modelo User de Django (simplificado)
 class UserSerializer(serializers.ModelSerializer):
@@ -36,16 +42,212 @@ class LeaderboardUserSerializer(serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
     # twitch_username y twitch_profile_image_url ya son campos directos del modelo UserProfile,
     # por lo que no necesitan 'source' si los nombres coinciden.
+    rank = serializers.IntegerField(read_only=True, default=None) # Anotado desde LeaderboardEntry
+    provisional_points = serializers.SerializerMethodField()
+    projected_points = serializers.SerializerMethodField()
 
     class Meta:
         model = UserProfile
         fields = [
+            'rank',                     # Puesto (ranking denso) en el leaderboard materializado
             'username',                 # De User (via UserProfile.user)
             'twitch_username',          # De UserProfile
             'twitch_profile_image_url', # De UserProfile
-            'total_fantasy_points'      # De UserProfile
+            'total_fantasy_points',     # De UserProfile
+            'provisional_points',       # Anotado en FantasyLeaderboardView (SortedLeaderboardEntry 'live')
+            'projected_points'          # Anotado en FantasyLeaderboardView (SortedLeaderboardEntry 'projected')
         ]
 
+    def get_provisional_points(self, obj):
+        return round(getattr(obj, 'provisional_points', 0) or 0)
+
+    def get_projected_points(self, obj):
+        return round(getattr(obj, 'projected_points', obj.total_fantasy_points), 1)
+
+# Fila del leaderboard global materializado (LeaderboardEntry)
+class LeaderboardEntrySerializer(serializers.ModelSerializer):
+    username = serializers.CharField(source='user_profile.user.username', read_only=True)
+    twitch_username = serializers.CharField(source='user_profile.twitch_username', read_only=True)
+    twitch_profile_image_url = serializers.CharField(source='user_profile.twitch_profile_image_url', read_only=True)
+
+    class Meta:
+        model = LeaderboardEntry
+        fields = ['rank', 'position', 'username', 'twitch_username', 'twitch_profile_image_url', 'total_fantasy_points']
+
+# Fila de la clasificación de una fase o torneo (ScopedLeaderboardEntry)
+class ScopedLeaderboardEntrySerializer(serializers.ModelSerializer):
+    username = serializers.CharField(source='user_profile.user.username', read_only=True)
+    twitch_username = serializers.CharField(source='user_profile.twitch_username', read_only=True)
+    twitch_profile_image_url = serializers.CharField(source='user_profile.twitch_profile_image_url', read_only=True)
+
+    class Meta:
+        model = ScopedLeaderboardEntry
+        fields = ['rank', 'username', 'twitch_username', 'twitch_profile_image_url', 'points']
+
+class StageFacts:
+    """
+    Datos de una fase que consultan los equipos de FantasyTeamDetailSerializer (seed y récord por
+    equipo, equipos con bonus de underdog y roles aún posibles), cargados una sola vez por
+    petición y compartidos vía el contexto (`stage_facts`) en lugar de una consulta por equipo y campo.
+    """
+
+    def __init__(self, stage: Stage):
+        self.stage = stage
+
+    @classmethod
+    def for_stage(cls, context: dict, stage: Stage) -> 'StageFacts':
+        facts_by_stage = context.setdefault('stage_facts', {})
+        if stage.pk not in facts_by_stage:
+            facts_by_stage[stage.pk] = cls(stage)
+        return facts_by_stage[stage.pk]
+
+    @cached_property
+    def records(self) -> dict[int, tuple[int, int, int]]:
+        """{team_id: (initial_seed, wins, losses)} de los equipos de la fase."""
+        return {
+            team_id: (seed, wins, losses)
+            for team_id, seed, wins, losses in StageTeam.objects.filter(stage=self.stage).values_list('team_id', 'initial_seed', 'wins', 'losses')
+        }
+
+    @cached_property
+    def bonus_ids(self) -> set[int]:
+        return low_seed_bonus_team_ids((team_id, seed) for team_id, (seed, _, _) in self.records.items())
+
+    @cached_property
+    def role_feasibility(self) -> dict[int, dict[str, bool]]:
+        """{team_id: {rol: aún posible}} precalculado (ver feasibility.RoleFeasibility)."""
+        return stage_role_feasibility(self.stage)
+
+    # Campos por equipo de FantasyTeamDetailSerializer (y de fast_serializers.team_detail)
+    def seed(self, team_id: int) -> int | None:
+        record = self.records.get(team_id)
+        return record[0] if record else None
+
+    def current_record(self, team_id: int) -> tuple[int | None, int | None]:
+        """(victorias, derrotas) en fases suizas; en playoffs no aplica (None, None)."""
+        if self.stage.type != 'SWISS':
+            return None, None
+        record = self.records.get(team_id)
+        return (record[1], record[2]) if record else (0, 0)
+
+    def is_bonus_active(self, team_id: int, role: str | None) -> bool:
+        # Solo en fases suizas y para equipos de bajo seed: el bonus se activa eligiéndolos en 3-0 o
+        # advance, y en la lista de disponibles ('available') se muestra que TIENEN potencial de bonus.
+        # En '0-3' (o cualquier otro rol) no hay bonus activo, y en playoffs aún no hay bonus definido.
+        if self.stage.type != 'SWISS' or role not in ('3-0', 'advance', 'available'):
+            return False
+        return team_id in self.bonus_ids
+
+    def is_role_impossible(self, team_id: int, role: str) -> bool:
+        team_roles = self.role_feasibility.get(team_id)
+        if team_roles is None:
+            # En suizas, si no está en StageTeam es imposible para cualquier rol de esa fase;
+            # en playoffs, un equipo sin StageTeam ni partidos aún no ha perdido ninguno
+            return self.stage.type == 'SWISS'
+        if role in team_roles:
+            return not team_roles[role]
+        if self.stage.type == 'PLAYOFF':
+            # Otros roles (p. ej. 'playoff_participant'): imposible solo si ya perdió un partido de la fase
+            return not team_roles.get(PLAYOFF_ALIVE_ROLE, True)
+        return False
+
+
+def stage_pick_rules(stage: Stage) -> dict:
+    """Reglas del pick de una fase suiza (StageFantasyInfoSerializer.rules)."""
+    # Estas reglas deberían ser más dinámicas o configurables por Stage
+    return {
+        'num_teams_3_0': 2,
+        'num_teams_advance': stage.tournament.stages.get(name='Opening Stage').stage_teams.count() -4 if stage.name == 'Opening Stage' else 8-4, # Ejemplo placeholder, necesita lógica real
+        'num_teams_0_3': 2,
+    }
+
+
+def get_playoff_stage(context: dict, tournament: Tournament) -> Stage | None:
+    """Última fase de playoffs del torneo, una consulta por torneo y petición."""
+    playoff_stages = context.setdefault('playoff_stages', {})
+    if tournament.pk not in playoff_stages:
+        playoff_stages[tournament.pk] = tournament.stages.filter(type='PLAYOFF').order_by('-order').first()
+    return playoff_stages[tournament.pk]
+
+
+def picked_teams(context: dict, pick, field: str):
+    """Equipos del M2M `field` de un pick: los precargados por `prefetch_profile_picks` o una consulta."""
+    preloaded = context.get('picked_teams', {}).get((pick._meta.model_name, pick.pk, field))
+    return getattr(pick, field).order_by('pk') if preloaded is None else preloaded
+
+
+PICKED_TEAM_FIELDS = {
+    FantasyPhasePick: ('teams_3_0', 'teams_advance', 'teams_0_3'),
+    FantasyPlayoffPick: ('quarter_final_winners', 'semi_final_winners'),
+}
+
+
+def prefetch_profile_picks(profile: UserProfile, context: dict) -> tuple[list, list]:
+    """
+    Carga en un número fijo de consultas (como mucho 7, más la de `profile`) todo lo que renderiza
+    un perfil público: sus picks de fase y de playoffs, los equipos de sus M2M (una UNION de las
+    cinco tablas intermedias), la fase de playoffs de cada torneo y, de todas las fases implicadas,
+    los StageTeam y la tabla de roles posibles. Lo deja en `context` (`picked_teams`, `stage_facts`,
+    `playoff_stages`) para que los serializers anidados no consulten nada más.
+    Devuelve (picks de fase, picks de playoffs).
+    """
+    phase_picks = list(FantasyPhasePick.objects.filter(user_profile=profile).select_related('stage', 'projection').order_by('stage__order'))
+    playoff_picks = list(FantasyPlayoffPick.objects.filter(user_profile=profile).select_related('tournament', 'final_winner').order_by('tournament__start_date'))
+
+    picked = context.setdefault('picked_teams', {})
+    branches = []
+    for model, picks in ((FantasyPhasePick, phase_picks), (FantasyPlayoffPick, playoff_picks)):
+        if not picks:
+            continue
+        kind, source = model._meta.model_name, f'{model._meta.model_name}_id'
+        for pick in picks:
+            pick.user_profile = profile
+        for field in PICKED_TEAM_FIELDS[model]:
+            picked.update({(kind, pick.pk, field): [] for pick in picks})
+            through = getattr(model, field).through
+            branches.append(
+                through.objects.filter(**{f'{source}__in': [pick.pk for pick in picks]})
+                .annotate(kind=Value(kind), field=Value(field), pick=F(source), team_ref=F('team_id'),
+                          team_name=F('team__name'), team_logo=F('team__logo'))
+                .values_list('kind', 'field', 'pick', 'team_ref', 'team_name', 'team_logo')
+            )
+    if branches:
+        # Por team_id dentro de cada M2M, como en picked_teams sin precarga
+        for kind, field, pick_id, team_id, name, logo in sorted(branches[0].union(*branches[1:], all=True)):
+            picked[(kind, pick_id, field)].append(Team(id=team_id, name=name, logo=logo))
+
+    playoff_stages = context.setdefault('playoff_stages', {})
+    tournament_ids = {pick.tournament_id for pick in playoff_picks} - set(playoff_stages)
+    if tournament_ids:
+        playoff_stages.update(dict.fromkeys(tournament_ids))
+        for stage in Stage.objects.filter(tournament_id__in=tournament_ids, type='PLAYOFF').order_by('tournament_id', '-order'):
+            if playoff_stages[stage.tournament_id] is None:
+                playoff_stages[stage.tournament_id] = stage
+
+    stages = {pick.stage.pk: pick.stage for pick in phase_picks}
+    stages.update({stage.pk: stage for stage in playoff_stages.values() if stage})
+    stages = {stage_id: stage for stage_id, stage in stages.items() if stage_id not in context.get('stage_facts', {})}
+    if stages:
+        records = {stage_id: {} for stage_id in stages}
+        for stage_id, team_id, seed, wins, losses in StageTeam.objects.filter(stage_id__in=stages).values_list('stage_id', 'team_id', 'initial_seed', 'wins', 'losses'):
+            records[stage_id][team_id] = (seed, wins, losses)
+        feasibility = stages_role_feasibility(stages.values(), records)
+        for stage_id, stage in stages.items():
+            facts = StageFacts.for_stage(context, stage)
+            facts.records = records[stage_id]
+            facts.role_feasibility = feasibility[stage_id]
+    return phase_picks, playoff_picks
+
+
+def team_detail_context(context: dict, **extra) -> dict:
+    """Contexto de FantasyTeamDetailSerializer que comparte las cachés por petición de `context`."""
+    return {
+        'request': context.get('request'),
+        'stage_facts': context.setdefault('stage_facts', {}),
+        'playoff_stages': context.setdefault('playoff_stages', {}),
+        **extra,
+    }
+
 # Serializer DETALLADO para un equipo dentro de un pick de Fantasy (fase o playoffs)
 class FantasyTeamDetailSerializer(serializers.ModelSerializer):
     seed = serializers.SerializerMethodField()
@@ -59,14 +261,13 @@ class FantasyTeamDetailSerializer(serializers.ModelSerializer):
         model = Team
         fields = ['id', 'name', 'logo', 'seed', 'points_earned', 'current_wins', 'current_losses', 'is_role_impossible', 'is_bonus_active']
 
+    def _facts(self, stage: Stage) -> StageFacts:
+        return StageFacts.for_stage(self.context, stage)
+
     def get_seed(self, obj: Team) -> int | None:
         stage = self.context.get('stage')
         if stage:
-            try:
-                stage_team = StageTeam.objects.get(team=obj, stage=stage)
-                return stage_team.initial_seed
-            except StageTeam.DoesNotExist:
-                return None
+            return self._facts(stage).seed(obj.id)
         if hasattr(obj, 'initial_seed_annotation'):
             return obj.initial_seed_annotation
         return None
@@ -79,53 +280,16 @@ class FantasyTeamDetailSerializer(serializers.ModelSerializer):
 
     def get_current_wins(self, obj: Team) -> int | None:
         stage = self.context.get('stage')
-        if stage and stage.type == 'SWISS':
-            try:
-                stage_team = StageTeam.objects.get(team=obj, stage=stage)
-                return stage_team.wins
-            except StageTeam.DoesNotExist:
-                return 0
-        return None # No aplica o no disponible para playoffs en este campo
+        return self._facts(stage).current_record(obj.id)[0] if stage else None
 
     def get_current_losses(self, obj: Team) -> int | None:
         stage = self.context.get('stage')
-        if stage and stage.type == 'SWISS':
-            try:
-                stage_team = StageTeam.objects.get(team=obj, stage=stage)
-                return stage_team.losses
-            except StageTeam.DoesNotExist:
-                return 0
-        return None # No aplica o no disponible para playoffs en este campo
+        return self._facts(stage).current_record(obj.id)[1] if stage else None
 
     def get_is_bonus_active(self, obj: Team) -> bool:
         stage = self.context.get('stage')
         role = self.context.get('role') # 'available', '3-0', '0-3', 'advance', 'playoff_participant', 'qf_winner', etc.
-
-        if stage and stage.type == 'SWISS':
-            bonus_ids = get_low_seed_bonus_teams_ids(stage)
-            is_low_seed_team = obj.id in bonus_ids
-
-            if not is_low_seed_team:
-                return False # Si no es de bajo seed, nunca tiene bonus
-
-            # Si es un equipo de bajo seed, el bonus se activa o no según el rol:
-            if role in ['3-0', 'advance']: # Roles que SÍ activan bonus
-                return True
-            if role == 'available': # Para la lista de equipos disponibles, mostrar que TIENE potencial de bonus
-                return True 
-            # Para '0-3' y cualquier otro rol en SWISS (o si el rol no está definido aquí),
-            # un equipo de bajo seed NO recibe bonus activo.
-            return False
-        
-        # Lógica para playoffs (actualmente no hay bonus definido para playoffs)
-        # if stage and stage.type == 'PLAYOFF':
-        #     # Ejemplo: si los campeones de QF tuvieran bonus y el equipo es de bajo seed y es qf_winner
-        #     if role == 'qf_winner':
-        #         # Aquí necesitaríamos una forma de saber si los qf_winners tienen bonus y si este equipo es de bajo seed para el torneo
-        #         # Esto es un placeholder, la lógica real de bonus de playoff necesitaría más definición.
-        #         pass 
-
-        return False # Por defecto, no hay bonus para otros tipos de fase o si no se cumplen condiciones SWISS
+        return self._facts(stage).is_bonus_active(obj.id, role) if stage else False
 
     def get_is_role_impossible(self, obj: Team) -> bool:
         role = self.context.get('role')
@@ -135,67 +299,12 @@ class FantasyTeamDetailSerializer(serializers.ModelSerializer):
         if not role or not stage:
              # Si es un pick de playoff, stage podría no ser el contexto directo, sino el playoff_stage del torneo.
             if role and parent_pick and isinstance(parent_pick, FantasyPlayoffPick):
-                stage = parent_pick.tournament.stages.filter(type='PLAYOFF').order_by('-order').first()
+                stage = get_playoff_stage(self.context, parent_pick.tournament)
                 if not stage: return False # No se puede determinar
             else:
                 return False # No se puede determinar sin rol o fase
 
-        if stage.type == 'SWISS':
-            try:
-                stage_team = StageTeam.objects.get(team=obj, stage=stage)
-                wins, losses = stage_team.wins, stage_team.losses
-                # Asumimos reglas estándar de eliminación suiza (ej. a 3 derrotas)
-                # Esto podría necesitar ser más configurable si las reglas de eliminación varían
-                # Por ejemplo, si una fase tiene X rondas y se necesitan Y victorias para avanzar.
-                # Basado en Major de CS: 3 victorias para avanzar, 3 derrotas para eliminar.
-                if role == '3-0': return losses > 0 or wins == 3 # Si ya es 3-X (y no 3-0) también es "imposible" para este rol estricto.
-                if role == '0-3': return wins > 0 or losses == 3
-                if role == 'advance': return losses >= 3 # Si tiene 3 derrotas, no puede avanzar.
-            except StageTeam.DoesNotExist:
-                return True # Si no está en StageTeam, es imposible para cualquier rol de esa fase
-
-        elif stage.type == 'PLAYOFF':
-            # Para playoffs, necesitamos ver si el equipo ha sido eliminado antes de alcanzar el rol pickeado.
-            # Esta lógica puede ser compleja y depende de cómo se estructuren las rondas de playoffs.
-            # Ejemplo simplificado: si el equipo no está en la lista de ganadores de la ronda anterior (si aplica).
-            
-            # Primero, verificar si el equipo ha sido eliminado del torneo en esta fase de playoffs.
-            # Esto se podría hacer viendo si tiene un partido perdido en esta fase de playoffs.
-            # O si no está en la lista de equipos que aún compiten.
-            lost_match_in_playoffs = Match.objects.filter(
-                stage=stage, 
-                winner__isnull=False
-            ).filter(Q(team1=obj) | Q(team2=obj)).exclude(winner=obj).exists()
-
-            if lost_match_in_playoffs: return True
-
-            if role == 'qf_winner':
-                # Si el equipo está en un partido de QF (round_number=1) y no ha perdido, es posible.
-                # Si ya pasó QF, y el equipo no fue ganador, es imposible.
-                qf_winners_ids = set(Match.objects.filter(stage=stage, round_number=1, winner__isnull=False).values_list('winner_id', flat=True))
-                if Match.objects.filter(stage=stage, round_number=1, winner__isnull=True).exists(): # Si QF no han terminado
-                    pass # Aún posible si el equipo está en QF y no ha perdido
-                elif obj.id not in qf_winners_ids: # Si QF terminaron y no es ganador
-                    return True
-            
-            elif role == 'sf_winner':
-                sf_winners_ids = set(Match.objects.filter(stage=stage, round_number=2, winner__isnull=False).values_list('winner_id', flat=True))
-                if Match.objects.filter(stage=stage, round_number__lt=2, winner__isnull=True).exists(): # Si QF no han terminado
-                     pass # Aún posible si puede llegar a SF
-                elif Match.objects.filter(stage=stage, round_number=2, winner__isnull=True).exists(): # Si SF no han terminado
-                    pass # Aún posible si está en SF y no ha perdido
-                elif obj.id not in sf_winners_ids: # Si SF terminaron y no es ganador
-                    return True
-            
-            elif role == 'final_winner':
-                final_winner_id = Match.objects.filter(stage=stage, round_number=3, winner__isnull=False).values_list('winner_id', flat=True).first()
-                if Match.objects.filter(stage=stage, round_number__lt=3, winner__isnull=True).exists(): # Si rondas previas no han terminado
-                    pass
-                elif Match.objects.filter(stage=stage, round_number=3, winner__isnull=True).exists(): # Si la final no ha terminado
-                    pass
-                elif obj.id != final_winner_id:
-                    return True
-        return False
+        return self._facts(stage).is_role_impossible(obj.id, role)
 
 # Serializer para FantasyPhasePick (MODIFICADO PARA USAR FantasyTeamDetailSerializer)
 class FantasyPhasePickSerializer(serializers.ModelSerializer):
@@ -206,6 +315,7 @@ class FantasyPhasePickSerializer(serializers.ModelSerializer):
     teams_3_0_details = serializers.SerializerMethodField()
     teams_advance_details = serializers.SerializerMethodField()
     teams_0_3_details = serializers.SerializerMethodField()
+    projection = serializers.SerializerMethodField()
 
     teams_3_0_ids = serializers.PrimaryKeyRelatedField(queryset=Team.objects.all(), source='teams_3_0', many=True, write_only=True)
     teams_advance_ids = serializers.PrimaryKeyRelatedField(queryset=Team.objects.all(), source='teams_advance', many=True, write_only=True)
@@ -217,30 +327,40 @@ class FantasyPhasePickSerializer(serializers.ModelSerializer):
             'id', 'user_profile', 'stage_id', 'stage_name', 
             'teams_3_0_ids', 'teams_advance_ids', 'teams_0_3_ids',
             'teams_3_0_details', 'teams_advance_details', 'teams_0_3_details',
-            'points_earned', 'is_locked', 'is_finalized', 'updated_at', 'team_points_breakdown' # Añadir team_points_breakdown
+            'points_earned', 'is_locked', 'is_finalized', 'updated_at', 'team_points_breakdown', # Añadir team_points_breakdown
+            'projection'
         ]
         read_only_fields = fields # Hacer todo read_only para el perfil, la edición de picks es por otro lado
 
     def _get_detailed_teams(self, teams_queryset, pick_instance, role, stage_instance):
         detailed_teams = []
         for team in teams_queryset:
-            serializer_context = {
-                'request': self.context.get('request'),
-                'parent_pick_instance': pick_instance,
-                'role': role,
-                'stage': stage_instance
-            }
+            serializer_context = team_detail_context(self.context, parent_pick_instance=pick_instance, role=role, stage=stage_instance)
             detailed_teams.append(FantasyTeamDetailSerializer(team, context=serializer_context).data)
         return detailed_teams
 
     def get_teams_3_0_details(self, obj: FantasyPhasePick):
-        return self._get_detailed_teams(obj.teams_3_0.all(), obj, "3-0", obj.stage)
+        return self._get_detailed_teams(picked_teams(self.context, obj, 'teams_3_0'), obj, "3-0", obj.stage)
 
     def get_teams_advance_details(self, obj: FantasyPhasePick):
-        return self._get_detailed_teams(obj.teams_advance.all(), obj, "advance", obj.stage)
+        return self._get_detailed_teams(picked_teams(self.context, obj, 'teams_advance'), obj, "advance", obj.stage)
 
     def get_teams_0_3_details(self, obj: FantasyPhasePick):
-        return self._get_detailed_teams(obj.teams_0_3.all(), obj, "0-3", obj.stage)
+        return self._get_detailed_teams(picked_teams(self.context, obj, 'teams_0_3'), obj, "0-3", obj.stage)
+
+    def get_projection(self, obj: FantasyPhasePick):
+        # Puntos esperados según la última simulación de la fase (PhasePickProjection), si la hay
+        try:
+            projection = obj.projection
+        except PhasePickProjection.DoesNotExist:
+            return None
+        return {
+            'expected_points': round(projection.expected_points, 1),
+            'p10_points': round(projection.p10_points),
+            'p90_points': round(projection.p90_points),
+            'simulations': projection.simulations,
+            'updated_at': projection.updated_at,
+        }
 
 # Serializer para FantasyPlayoffPick (MODIFICADO PARA USAR FantasyTeamDetailSerializer)
 class FantasyPlayoffPickSerializer(serializers.ModelSerializer):
@@ -269,32 +389,23 @@ class FantasyPlayoffPickSerializer(serializers.ModelSerializer):
     def _get_detailed_teams_playoffs(self, teams_queryset, pick_instance, role, playoff_stage):
         detailed_teams = []
         for team in teams_queryset:
-            serializer_context = {
-                'request': self.context.get('request'),
-                'parent_pick_instance': pick_instance,
-                'role': role,
-                'stage': playoff_stage # Pasamos la fase de playoff
-            }
+            serializer_context = team_detail_context(self.context, parent_pick_instance=pick_instance, role=role,
+                                                     stage=playoff_stage) # Pasamos la fase de playoff
             detailed_teams.append(FantasyTeamDetailSerializer(team, context=serializer_context).data)
         return detailed_teams
 
     def get_quarter_final_winners_details(self, obj: FantasyPlayoffPick):
-        playoff_stage = obj.tournament.stages.filter(type='PLAYOFF').order_by('-order').first()
-        return self._get_detailed_teams_playoffs(obj.quarter_final_winners.all(), obj, "qf_winner", playoff_stage)
+        playoff_stage = get_playoff_stage(self.context, obj.tournament)
+        return self._get_detailed_teams_playoffs(picked_teams(self.context, obj, 'quarter_final_winners'), obj, "qf_winner", playoff_stage)
 
     def get_semi_final_winners_details(self, obj: FantasyPlayoffPick):
-        playoff_stage = obj.tournament.stages.filter(type='PLAYOFF').order_by('-order').first()
-        return self._get_detailed_teams_playoffs(obj.semi_final_winners.all(), obj, "sf_winner", playoff_stage)
+        playoff_stage = get_playoff_stage(self.context, obj.tournament)
+        return self._get_detailed_teams_playoffs(picked_teams(self.context, obj, 'semi_final_winners'), obj, "sf_winner", playoff_stage)
 
     def get_final_winner_details(self, obj: FantasyPlayoffPick):
-        playoff_stage = obj.tournament.stages.filter(type='PLAYOFF').order_by('-order').first()
+        playoff_stage = get_playoff_stage(self.context, obj.tournament)
         if obj.final_winner:
-            serializer_context = {
-                'request': self.context.get('request'),
-                'parent_pick_instance': obj,
-                'role': "final_winner",
-                'stage': playoff_stage
-            }
+            serializer_context = team_detail_context(self.context, parent_pick_instance=obj, role="final_winner", stage=playoff_stage)
             return FantasyTeamDetailSerializer(obj.final_winner, context=serializer_context).data
         return None
 
@@ -306,10 +417,11 @@ class StageFantasyInfoSerializer(serializers.ModelSerializer):
     rules = serializers.SerializerMethodField()
     user_pick = serializers.SerializerMethodField()
     underdog_bonus_team_ids = serializers.SerializerMethodField()
+    pick_counts = serializers.SerializerMethodField()
 
     class Meta:
         model = Stage
-        fields = ['id', 'name', 'fantasy_status', 'teams', 'rules', 'user_pick', 'underdog_bonus_team_ids']
+        fields = ['id', 'name', 'fantasy_status', 'teams', 'rules', 'user_pick', 'underdog_bonus_team_ids', 'pick_counts']
 
     def get_teams(self, obj: Stage):
         # Anotar initial_seed para que FantasyTeamDetailSerializer pueda accederlo fácilmente
@@ -317,17 +429,12 @@ class StageFantasyInfoSerializer(serializers.ModelSerializer):
         teams_with_seed = []
         for st in stage_teams:
             # Pasamos el stage en el contexto por si FantasyTeamDetailSerializer lo necesita para algo más que el seed directo
-            serializer = FantasyTeamDetailSerializer(st.team, context={'stage': obj, 'role': 'available'}) # 'available' como rol genérico
+            serializer = FantasyTeamDetailSerializer(st.team, context=team_detail_context(self.context, stage=obj, role='available')) # 'available' como rol genérico
             teams_with_seed.append(serializer.data)
         return sorted(teams_with_seed, key=lambda x: x.get('seed') or 999) # Ordenar por seed
     
     def get_rules(self, obj: Stage):
-        # Estas reglas deberían ser más dinámicas o configurables por Stage
-        return {
-            'num_teams_3_0': 2,
-            'num_teams_advance': obj.tournament.stages.get(name='Opening Stage').stage_teams.count() -4 if obj.name == 'Opening Stage' else 8-4, # Ejemplo placeholder, necesita lógica real
-            'num_teams_0_3': 2,
-        }
+        return stage_pick_rules(obj)
 
     def get_user_pick(self, obj: Stage):
         user = self.context['request'].user
@@ -341,7 +448,11 @@ class StageFantasyInfoSerializer(serializers.ModelSerializer):
         return None
 
     def get_underdog_bonus_team_ids(self, obj: Stage):
-        return get_low_seed_bonus_teams_ids(obj)
+        return StageFacts.for_stage(self.context, obj).bonus_ids
+
+    def get_pick_counts(self, obj: Stage):
+        # Usuarios que eligieron cada equipo en cada rol: {team_id: {'3-0': n, 'advance': n, '0-3': n}}
+        return stage_pick_counts(obj)
 
 # Serializer para la información de la fase de Playoffs de un Torneo para Fantasy
 class TournamentFantasyPlayoffInfoSerializer(serializers.Serializer):
@@ -354,7 +465,7 @@ class TournamentFantasyPlayoffInfoSerializer(serializers.Serializer):
 
     def get_fantasy_status(self, obj) -> str:
         # obj es el torneo. Necesitamos encontrar su fase de playoff.
-        playoff_stage = obj.stages.filter(type='PLAYOFF').order_by('-order').first()
+        playoff_stage = get_playoff_stage(self.context, obj)
         if playoff_stage:
             # Cambiar para devolver el valor clave en lugar del display name
             return playoff_stage.fantasy_status 
@@ -364,13 +475,13 @@ class TournamentFantasyPlayoffInfoSerializer(serializers.Serializer):
         # Equipos para playoffs podrían ser todos los del torneo o un subconjunto específico
         # Aquí, por simplicidad, tomamos todos los equipos del torneo. Idealmente, serían los que avanzaron a playoffs.
         # O los equipos de la fase de PLAYOFF si ya está poblada.
-        playoff_stage = obj.stages.filter(type='PLAYOFF').order_by('-order').first()
+        playoff_stage = get_playoff_stage(self.context, obj)
         if playoff_stage:
             stage_teams = StageTeam.objects.filter(stage=playoff_stage).select_related('team')
             teams_data = []
             for st in stage_teams:
                  # Usamos FantasyTeamDetailSerializer para consistencia, aunque algunos campos no apliquen (wins/losses)
-                serializer = FantasyTeamDetailSerializer(st.team, context={'stage': playoff_stage, 'role': 'playoff_participant'})
+                serializer = FantasyTeamDetailSerializer(st.team, context=team_detail_context(self.context, stage=playoff_stage, role='playoff_participant'))
                 teams_data.append(serializer.data)
             return sorted(teams_data, key=lambda x: x.get('seed') or 999)
         return FantasyTeamDetailSerializer(Team.objects.filter(stageteam__stage__tournament=obj).distinct(), many=True, context={'stage': None}).data
@@ -413,10 +524,14 @@ class PublicFantasyProfileSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = fields
 
+    def _picks(self, obj: UserProfile) -> tuple[list, list]:
+        profile_picks = self.context.setdefault('profile_picks', {})
+        if obj.pk not in profile_picks:
+            profile_picks[obj.pk] = prefetch_profile_picks(obj, self.context)
+        return profile_picks[obj.pk]
+
     def get_phase_picks(self, obj: UserProfile):
-        picks = FantasyPhasePick.objects.filter(user_profile=obj).select_related('stage').order_by('stage__order')
-        return FantasyPhasePickSerializer(picks, many=True, context=self.context).data
+        return FantasyPhasePickSerializer(self._picks(obj)[0], many=True, context=self.context).data
 
     def get_playoff_picks(self, obj: UserProfile):
-        picks = FantasyPlayoffPick.objects.filter(user_profile=obj).select_related('tournament').order_by('tournament__start_date')
-        return FantasyPlayoffPickSerializer(picks, many=True, context=self.context).data
+        return FantasyPlayoffPickSerializer(self._picks(obj)[1], many=True, context=self.context).data
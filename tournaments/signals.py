@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# Se envía al hacer commit de una escritura que incrementa la versión de datos de un torneo
+# (ver snapshot.bump_tournament_version). Argumentos: tournament_id, slug, version.
+tournament_data_changed = Signal()
@@ -0,0 +1,475 @@
+import hashlib
+import json
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Tournament, Stage, StageTeam, Match
+from .signals import tournament_data_changed
+
+logger = logging.getLogger(__name__)
+
+# Los payloads cacheados expiran solos; la versión se lee siempre de la base de datos.
+SNAPSHOT_CACHE_TIMEOUT = getattr(settings, 'TOURNAMENT_SNAPSHOT_CACHE_TIMEOUT', 60 * 60)
+LIVE_SLUG_CACHE_KEY = 'tournament-snapshot:live-slug'
+
+
+def _serialize_stage_team(st: StageTeam) -> dict:
+    return {
+        "id": st.team.id,
+        "name": st.team.name,
+        "logo": st.team.logo,
+        "seed": st.initial_seed,
+        "region": st.team.region,
+        "wins": st.wins,
+        "losses": st.losses,
+        "buchholzScore": st.buchholz_score,
+    }
+
+
+def _serialize_match(match: Match) -> dict:
+    # Solo se usan los *_id de las FK: no hace falta cargar los objetos Team del partido
+    return {
+        "id": match.id,
+        "team1Id": match.team1_id or 0,
+        "team2Id": match.team2_id or 0,
+        "winner": match.winner_id,
+        "team1Score": match.team1_score if match.team1_score is not None else 0,
+        "team2Score": match.team2_score if match.team2_score is not None else 0,
+        "format": match.format,
+        "status": match.status,
+        "map1_team1_score": match.map1_team1_score,
+        "map1_team2_score": match.map1_team2_score,
+        "map2_team1_score": match.map2_team1_score,
+        "map2_team2_score": match.map2_team2_score,
+        "map3_team1_score": match.map3_team1_score,
+        "map3_team2_score": match.map3_team2_score,
+        "hltvMatchId": match.hltv_match_id,
+    }
+
+
+def compute_round_statuses(rounds: list) -> None:
+    """
+    Asigna 'completed' / 'active' / 'pending' a cada ronda (in place) según el estado de sus partidos.
+    """
+    for rd_idx, round_detail in enumerate(rounds):
+        all_matches_in_round_finished = True
+        any_match_live = False
+        has_populated_matches = False
+
+        if not round_detail["matches"]:
+            all_matches_in_round_finished = False
+        else:
+            has_populated_matches = True
+            for m_data in round_detail["matches"]:
+                if m_data['status'] != 'FINISHED':
+                    all_matches_in_round_finished = False
+                if m_data['status'] == 'LIVE':
+                    any_match_live = True
+
+        if all_matches_in_round_finished and has_populated_matches:
+            round_detail["status"] = 'completed'
+        elif any_match_live:
+            round_detail["status"] = 'active'
+        else:
+            # Si es la primera ronda con partidos y no está live/completed, debería ser active
+            if rd_idx == 0 and has_populated_matches:
+                round_detail["status"] = 'active'
+            # Si una ronda anterior no está completada, las siguientes deben ser pending
+            elif rd_idx > 0 and rounds[rd_idx - 1]["status"] != 'completed':
+                round_detail["status"] = 'pending'
+            # Si tiene partidos y no cumple otra condición, por defecto active (si no es la primera)
+            elif has_populated_matches and rd_idx > 0:
+                round_detail["status"] = 'active'
+            # Si no tiene partidos o es la primera ronda sin partidos, se mantiene 'pending'
+            else:
+                round_detail["status"] = 'pending'
+
+
+def determine_current_position(stages_data: dict, sorted_stage_keys: list) -> tuple:
+    """
+    Determina (currentStage, currentRound) globales del torneo a partir de los estados de ronda.
+    """
+    determined_current_stage_key = None
+    determined_current_round_number = 1
+
+    for stage_key_iter in sorted_stage_keys:
+        if stage_key_iter not in stages_data:
+            continue
+
+        stage_info_iter = stages_data[stage_key_iter]
+        is_stage_fully_completed = True  # Asumir que sí hasta encontrar una ronda no completada
+
+        found_active_round_in_this_stage = False
+        for round_detail_iter in stage_info_iter["rounds"]:
+            if round_detail_iter["status"] == 'active':
+                determined_current_stage_key = stage_key_iter
+                determined_current_round_number = round_detail_iter["roundNumber"]
+                found_active_round_in_this_stage = True
+                break
+            if round_detail_iter["status"] != 'completed':
+                is_stage_fully_completed = False
+
+        if found_active_round_in_this_stage:
+            break  # Ya encontramos la fase y ronda activa global
+
+        # Si no hay ronda activa pero la fase no está completa, esta es la fase actual
+        if not is_stage_fully_completed and not determined_current_stage_key:
+            determined_current_stage_key = stage_key_iter
+            # Tomar la primera ronda no completada de esta fase como la actual
+            first_round_in_stage_found = False
+            for rd_detail_iter_for_num in stage_info_iter["rounds"]:
+                if rd_detail_iter_for_num["status"] != 'completed':
+                    determined_current_round_number = rd_detail_iter_for_num["roundNumber"]
+                    first_round_in_stage_found = True
+                    break
+            if not first_round_in_stage_found and stage_info_iter["rounds"]:  # Todos completados, tomar el último
+                determined_current_round_number = stage_info_iter["rounds"][-1]["roundNumber"]
+            elif not stage_info_iter["rounds"]:  # Sin rondas, default a 1
+                determined_current_round_number = 1
+
+    if not determined_current_stage_key and sorted_stage_keys:  # Si no se encontró activa, y hay fases
+        determined_current_stage_key = sorted_stage_keys[0]  # Tomar la primera fase
+        if stages_data[determined_current_stage_key]["rounds"]:
+            determined_current_round_number = stages_data[determined_current_stage_key]["rounds"][0]["roundNumber"]
+        else:  # Sin rondas en la primera fase
+            determined_current_round_number = 1
+    elif not sorted_stage_keys:  # No hay fases en absoluto
+        determined_current_stage_key = "phase1"  # Fallback
+        determined_current_round_number = 1
+
+    return determined_current_stage_key, determined_current_round_number
+
+
+def build_major_data(tournament) -> dict:
+    """
+    Construye el payload de `tournament/data/` para un torneo.
+
+    Carga todas las fases, StageTeams y partidos del torneo en un número fijo de consultas
+    (3, independientemente del número de fases y rondas) y los agrupa en memoria
+    en la estructura `phaseN` que espera el frontend.
+    """
+    response_data = {
+        "name": tournament.name,
+        "tournamentType": tournament.tournament_type,
+        "swissRulesType": tournament.swiss_rules_type,
+        "isLive": tournament.is_live,
+        "stages": {},
+    }
+
+    stages_ordered = list(Stage.objects.filter(tournament=tournament).order_by('order'))
+    stage_ids = [stage.id for stage in stages_ordered]
+
+    teams_by_stage = {stage_id: [] for stage_id in stage_ids}
+    stage_teams = StageTeam.objects.filter(stage_id__in=stage_ids).select_related('team').order_by('stage_id', 'initial_seed')
+    for st in stage_teams:
+        teams_by_stage[st.stage_id].append(_serialize_stage_team(st))
+
+    matches_by_stage = {stage_id: [] for stage_id in stage_ids}
+    matches = Match.objects.filter(stage_id__in=stage_ids).order_by('stage_id', 'round_number', 'id')
+    for match in matches:
+        matches_by_stage[match.stage_id].append(match)
+
+    for stage in stages_ordered:
+        stage_data = {
+            "id": stage.id,
+            "name": stage.name,
+            "type": stage.type,
+            "fantasyStatus": stage.fantasy_status,
+            "teams": teams_by_stage[stage.id],
+            "rounds": [],
+            "order": stage.order
+        }
+
+        rounds = stage_data["rounds"]
+        for match in matches_by_stage[stage.id]:
+            # Asegurarse de que existe el array para esta ronda
+            while len(rounds) < match.round_number:
+                rounds.append({
+                    "roundNumber": len(rounds) + 1,
+                    "matches": [],
+                    "status": "pending"  # Default status
+                })
+            rounds[match.round_number - 1]["matches"].append(_serialize_match(match))
+
+        compute_round_statuses(rounds)
+        response_data["stages"][f"phase{stage.order}"] = stage_data
+
+    sorted_stage_keys = [f"phase{s.order}" for s in stages_ordered]
+    current_stage, current_round = determine_current_position(response_data["stages"], sorted_stage_keys)
+    response_data["currentStage"] = current_stage
+    response_data["currentRound"] = current_round
+
+    return response_data
+
+
+# --- Caché versionada del snapshot ---
+
+def _payload_cache_key(slug: str, tournament_id: int, version: int) -> str:
+    return f"tournament-snapshot:payload:{slug}:{tournament_id}:{version}"
+
+
+def bump_tournament_version(tournament_id: int) -> int | None:
+    """
+    Incrementa la versión de datos del torneo. Debe llamarse después de cualquier escritura
+    que cambie el payload de `tournament/data/` (partidos, StageTeams, fases).
+    Los suscriptores de `tournament_data_changed` se notifican al hacer commit de la transacción en curso.
+    """
+    Tournament.objects.filter(pk=tournament_id).update(data_version=F('data_version') + 1)
+    row = Tournament.objects.filter(pk=tournament_id).values_list('slug', 'data_version').first()
+    if row is None:
+        return None
+    slug, version = row
+    transaction.on_commit(lambda: _publish_version(slug, tournament_id, version))
+    return version
+
+
+def _publish_version(slug: str, tournament_id: int, version: int) -> None:
+    # send_robust: un fallo al notificar (p. ej. el stream en vivo) no debe romper la escritura ya confirmada
+    for receiver, result in tournament_data_changed.send_robust(
+        sender=Tournament, tournament_id=tournament_id, slug=slug, version=version
+    ):
+        if isinstance(result, Exception):
+            logger.error(f"Error notificando el cambio de versión {version} del torneo '{slug}': {result}")
+
+
+def get_tournament_ids_for_stages(stage_ids) -> set[int]:
+    return set(Stage.objects.filter(pk__in=list(stage_ids)).values_list('tournament_id', flat=True))
+
+
+def bump_versions_for_stages(stage_ids) -> None:
+    for tournament_id in sorted(get_tournament_ids_for_stages(stage_ids)):
+        bump_tournament_version(tournament_id)
+
+
+def forget_tournament_slugs(slugs) -> None:
+    """Olvida el slug cacheado del torneo live (los slugs indicados pueden haber dejado de serlo)."""
+    cache.delete(LIVE_SLUG_CACHE_KEY)
+
+
+def resolve_tournament_slug(slug: str | None = None) -> str | None:
+    """Devuelve el slug pedido o, si no se indica, el del torneo live (cacheado)."""
+    if slug:
+        return slug
+    live_slug = cache.get(LIVE_SLUG_CACHE_KEY)
+    if live_slug is None:
+        live_slug = Tournament.objects.filter(is_live=True).order_by('-created_at').values_list('slug', flat=True).first()
+        if live_slug is None:
+            return None
+        cache.add(LIVE_SLUG_CACHE_KEY, live_slug, SNAPSHOT_CACHE_TIMEOUT)
+    return live_slug
+
+
+def get_tournament_version(slug: str) -> tuple | None:
+    """
+    Devuelve (tournament_id, version) del torneo con ese slug, o None si no existe.
+
+    Se lee siempre de la base de datos (una consulta por el índice único de slug) y no de la caché:
+    la versión la incrementan también otros procesos (el comando update_hltv_matches, otros workers)
+    y, con una caché local a cada proceso, una versión cacheada no vería sus bumps. Lo cacheado es
+    el payload, por versión, así que la siguiente lectura tras cualquier escritura ya ve el dato nuevo.
+    """
+    return Tournament.objects.filter(slug=slug).values_list('id', 'data_version').first()
+
+
+def _latest_updated_at(model, tournament_lookup: str) -> Subquery:
+    rows = model.objects.filter(**{tournament_lookup: OuterRef('pk')}).order_by('-updated_at')
+    return Subquery(rows.values('updated_at')[:1])
+
+
+def _row_count(model, tournament_lookup: str) -> Coalesce:
+    rows = (model.objects.filter(**{tournament_lookup: OuterRef('pk')})
+            .order_by().values(tournament_lookup).annotate(total=Count('pk')).values('total'))
+    return Coalesce(Subquery(rows, output_field=IntegerField()), 0)
+
+
+def _load_tournament_with_validators(slug: str):
+    """
+    Carga el torneo junto con los datos de sus validadores HTTP en una sola consulta:
+    el updated_at más reciente de fases, StageTeams y partidos, y cuántas filas hay de cada uno
+    (los conteos detectan borrados, que no cambian ningún updated_at).
+    """
+    return Tournament.objects.filter(slug=slug).annotate(
+        stages_updated_at=_latest_updated_at(Stage, 'tournament'),
+        stage_teams_updated_at=_latest_updated_at(StageTeam, 'stage__tournament'),
+        matches_updated_at=_latest_updated_at(Match, 'stage__tournament'),
+        num_stages=_row_count(Stage, 'tournament'),
+        num_stage_teams=_row_count(StageTeam, 'stage__tournament'),
+        num_matches=_row_count(Match, 'stage__tournament'),
+    ).first()
+
+
+def _validators_for(tournament) -> dict:
+    timestamps = [
+        tournament.updated_at,
+        tournament.stages_updated_at,
+        tournament.stage_teams_updated_at,
+        tournament.matches_updated_at,
+    ]
+    fingerprint = [tournament.id, tournament.data_version, tournament.num_stages,
+                   tournament.num_stage_teams, tournament.num_matches]
+    fingerprint += [ts.isoformat() if ts else '' for ts in timestamps]
+    digest = hashlib.sha1('|'.join(str(part) for part in fingerprint).encode()).hexdigest()
+    return {
+        'tournament_id': tournament.id,
+        'version': tournament.data_version,
+        'etag': f'"{tournament.data_version}-{digest[:16]}"',
+        'last_modified': int(max(ts for ts in timestamps if ts).timestamp()),
+    }
+
+
+def get_major_data_validators(slug: str) -> dict | None:
+    """
+    Calcula los validadores HTTP (ETag y Last-Modified) del torneo con una única consulta agregada,
+    sin construir el payload. None si el torneo no existe.
+    """
+    tournament = _load_tournament_with_validators(slug)
+    if tournament is None:
+        return None
+    return _validators_for(tournament)
+
+
+def get_major_data_snapshot(slug: str, validators: dict | None = None) -> dict | None:
+    """
+    Devuelve el snapshot cacheado del torneo:
+    {'tournament_id': int, 'version': int, 'body': bytes (JSON), 'etag': str, 'last_modified': int (timestamp)}.
+
+    Mientras la versión del torneo no cambie, las lecturas se sirven desde la caché
+    con una sola consulta (la de la versión). Si se pasan `validators` recién calculados y no coinciden
+    con los del snapshot cacheado, este se reconstruye. None si el torneo no existe.
+    """
+    if validators is None:
+        version_info = get_tournament_version(slug)
+        if version_info is None:
+            return None
+    else:
+        version_info = (validators['tournament_id'], validators['version'])
+    tournament_id, version = version_info
+    snapshot = cache.get(_payload_cache_key(slug, tournament_id, version))
+    if snapshot is not None and (validators is None or snapshot['etag'] == validators['etag']):
+        return snapshot
+
+    # Se busca por slug (no por id) por si el torneo se recreó con el mismo slug
+    tournament = _load_tournament_with_validators(slug)
+    if tournament is None:
+        forget_tournament_slugs([slug])
+        return None
+    # La versión y los validadores se leen antes de construir el payload: el payload
+    # siempre es al menos tan reciente como la versión con la que se guarda.
+    snapshot_validators = _validators_for(tournament)
+    version = tournament.data_version
+    snapshot = {
+        'tournament_id': tournament.id,
+        'version': version,
+        'body': json.dumps(build_major_data(tournament)).encode(),
+        'etag': snapshot_validators['etag'],
+        'last_modified': snapshot_validators['last_modified'],
+    }
+    cache.set(_payload_cache_key(tournament.slug, tournament.id, version), snapshot, SNAPSHOT_CACHE_TIMEOUT)
+    return snapshot
+
+
+# --- Cambios incrementales entre versiones ---
+
+def _delta_cache_key(slug: str, tournament_id: int, since: int, version: int) -> str:
+    return f"tournament-snapshot:delta:{slug}:{tournament_id}:{since}:{version}"
+
+
+_TOURNAMENT_STRUCTURE_KEYS = ("name", "tournamentType", "swissRulesType", "isLive")
+_STAGE_STRUCTURE_KEYS = ("id", "name", "type", "fantasyStatus", "order")
+
+
+def diff_major_data(old: dict, new: dict) -> dict | None:
+    """
+    Calcula los partidos, StageTeams y estados de ronda que cambiaron entre dos payloads de
+    `tournament/data/`. Los partidos de rondas nuevas se devuelven como cambios.
+
+    Devuelve None si cambió la estructura (datos del torneo o de las fases, fases o equipos
+    añadidos/quitados, partidos borrados o movidos de ronda): en ese caso hay que enviar
+    el snapshot completo.
+    """
+    if any(old.get(key) != new.get(key) for key in _TOURNAMENT_STRUCTURE_KEYS):
+        return None
+    if old["stages"].keys() != new["stages"].keys():
+        return None
+
+    changed_matches, changed_teams, changed_rounds = [], [], []
+    for stage_key, new_stage in new["stages"].items():
+        old_stage = old["stages"][stage_key]
+        if any(old_stage[key] != new_stage[key] for key in _STAGE_STRUCTURE_KEYS):
+            return None
+
+        old_teams = {team["id"]: team for team in old_stage["teams"]}
+        if old_teams.keys() != {team["id"] for team in new_stage["teams"]}:
+            return None
+        for team in new_stage["teams"]:
+            if old_teams[team["id"]] != team:
+                changed_teams.append({"stage": stage_key, **team})
+
+        old_rounds = old_stage["rounds"]
+        if len(old_rounds) > len(new_stage["rounds"]):
+            return None
+        old_matches = {
+            match["id"]: (round_detail["roundNumber"], match)
+            for round_detail in old_rounds for match in round_detail["matches"]
+        }
+        seen_match_ids = set()
+        for round_index, round_detail in enumerate(new_stage["rounds"]):
+            round_number = round_detail["roundNumber"]
+            if round_index >= len(old_rounds) or old_rounds[round_index]["status"] != round_detail["status"]:
+                changed_rounds.append({"stage": stage_key, "roundNumber": round_number, "status": round_detail["status"]})
+            for match in round_detail["matches"]:
+                seen_match_ids.add(match["id"])
+                previous = old_matches.get(match["id"])
+                if previous is not None and previous[0] != round_number:
+                    return None
+                if previous is None or previous[1] != match:
+                    changed_matches.append({"stage": stage_key, "roundNumber": round_number, **match})
+        if old_matches.keys() - seen_match_ids:
+            return None
+
+    return {
+        "matches": changed_matches,
+        "teams": changed_teams,
+        "rounds": changed_rounds,
+        "currentStage": new["currentStage"],
+        "currentRound": new["currentRound"],
+    }
+
+
+def get_major_data_changes(slug: str, since: int) -> dict | None:
+    """
+    Devuelve los cambios del torneo desde la versión `since`: {'version': int, 'full': bool, 'body': bytes}.
+
+    El delta se calcula comparando el snapshot cacheado de `since` (el que recibió el cliente)
+    con el actual, y se cachea por pareja de versiones para que todos los clientes que sondean
+    desde la misma versión compartan el cálculo. Si el snapshot de `since` ya no está en la caché
+    o la estructura del torneo cambió, `full` es True y `body` incluye el snapshot completo en `data`.
+    None si el torneo no existe.
+    """
+    snapshot = get_major_data_snapshot(slug)
+    if snapshot is None:
+        return None
+    tournament_id, version = snapshot['tournament_id'], snapshot['version']
+
+    if since <= version:
+        delta_key = _delta_cache_key(slug, tournament_id, since, version)
+        body = cache.get(delta_key)
+        if body is not None:
+            return {'version': version, 'full': False, 'body': body}
+
+        previous = snapshot if since == version else cache.get(_payload_cache_key(slug, tournament_id, since))
+        if previous is not None:
+            delta = diff_major_data(json.loads(previous['body']), json.loads(snapshot['body']))
+            if delta is not None:
+                body = json.dumps({"full": False, "since": since, "version": version, **delta}).encode()
+                cache.set(delta_key, body, SNAPSHOT_CACHE_TIMEOUT)
+                return {'version': version, 'full': False, 'body': body}
+
+    # El cuerpo completo se compone sin volver a serializar el snapshot
+    body = b'{"full": true, "version": %d, "data": %s}' % (version, snapshot['body'])
+    return {'version': version, 'full': True, 'body': body}
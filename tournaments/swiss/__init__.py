@@ -0,0 +1,11 @@
+"""
+Sistema suizo en el servidor: motor de emparejamientos y Buchholz (`engine`, Python puro)
+y carga desde la base de datos (`loader`).
+
+Los módulos de probabilidades (`montecarlo`, `exact`, `projection`) requieren NumPy y no se
+importan aquí.
+"""
+from .engine import (
+    MAX_WINS_LOSSES, Pairing, SwissState,
+    buchholz_scores, first_round_pairings, next_round_pairings,
+)
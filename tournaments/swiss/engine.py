@@ -0,0 +1,160 @@
+"""
+Motor suizo (Buchholz) en Python puro, sin dependencias de Django.
+
+Trabaja sobre arrays compactos de enteros: los equipos se indexan 0..n-1 en orden de seed
+(el mismo orden en que tournament/data/ devuelve `teams`), los récords son vectores de
+victorias/derrotas y los rivales de cada equipo son una máscara de bits (bit j = ha jugado contra j).
+
+Reproduce exactamente `updateBuchholzScores` y `generateFirstRoundMatches` /
+`generateNextRoundMatches` de `frontend/src/services/tournament/matchService.ts`,
+para que servidor y frontend generen los mismos emparejamientos.
+"""
+from dataclasses import dataclass, field
+
+# Victorias para clasificar / derrotas para quedar eliminado en una fase suiza
+MAX_WINS_LOSSES = 3
+
+# (índice equipo 1, índice equipo 2, es BO3)
+Pairing = tuple[int, int, bool]
+
+
+def buchholz_scores(wins: list[int], losses: list[int], played: list[int]) -> list[int]:
+    """
+    Buchholz de cada equipo: suma de (victorias - derrotas) de los rivales contra los que
+    ya hay resultado (`played[i]` es la máscara de esos rivales).
+    """
+    diffs = [w - l for w, l in zip(wins, losses)]
+    scores = []
+    for mask in played:
+        total = 0
+        while mask:
+            low = mask & -mask
+            total += diffs[low.bit_length() - 1]
+            mask ^= low
+        scores.append(total)
+    return scores
+
+
+def first_round_pairings(seeds: list[int]) -> list[Pairing]:
+    """Primera ronda: mitad superior contra mitad inferior por seed (1v9, 2v10, ..., 8v16), todo BO1."""
+    order = sorted(range(len(seeds)), key=seeds.__getitem__)
+    half = len(order) // 2
+    return [(order[i], order[i + half], False) for i in range(half)]
+
+
+def next_round_pairings(wins: list[int], losses: list[int], seeds: list[int],
+                        opponents: list[int], buchholz: list[int]) -> list[Pairing]:
+    """
+    Emparejamientos de la siguiente ronda entre los equipos que siguen activos.
+
+    Dentro de cada grupo de récord (primero los grupos pares) el mejor sembrado juega contra el peor
+    sembrado con el que no haya jugado, evitando si puede dejar una última pareja que sea revancha.
+    Los equipos sobrantes se emparejan entre sí por seeding global. `opponents[i]` es la máscara de
+    todos los rivales que ya tuvo el equipo i (con o sin resultado).
+    """
+    limit = MAX_WINS_LOSSES
+    active = [i for i in range(len(wins)) if wins[i] < limit and losses[i] < limit]
+    if len(active) < 2:
+        return []
+
+    def seeding_key(i):
+        return (losses[i] - wins[i], -buchholz[i], seeds[i])
+
+    # Los grupos conservan el orden de aparición (orden de seed), y sorted() es estable
+    groups: dict[tuple[int, int], list[int]] = {}
+    for i in active:
+        groups.setdefault((wins[i], losses[i]), []).append(i)
+
+    pairings = []
+    paired = 0
+    for group in sorted(groups.values(), key=lambda g: len(g) % 2):
+        available = sorted(group, key=seeding_key)
+        while len(available) >= 2:
+            team1 = available.pop(0)
+            met = opponents[team1]
+            non_rematch = [c for c in available if not met >> c & 1]
+            if non_rematch:
+                opponent = non_rematch[-1]
+                if len(available) == 3:
+                    # Preferir un rival que no deje como última pareja del grupo una revancha
+                    avoiding = []
+                    for candidate in non_rematch:
+                        a, b = [t for t in available if t != candidate]
+                        if not opponents[a] >> b & 1:
+                            avoiding.append(candidate)
+                    if avoiding:
+                        opponent = avoiding[-1]
+            else:
+                opponent = available[-1]
+            available.remove(opponent)
+            is_bo3 = wins[team1] == limit - 1 or losses[team1] == limit - 1
+            pairings.append((team1, opponent, is_bo3))
+            paired |= (1 << team1) | (1 << opponent)
+
+    leftovers = sorted((i for i in active if not paired >> i & 1), key=seeding_key)
+    while len(leftovers) >= 2:
+        team1 = leftovers.pop(0)
+        met = opponents[team1]
+        non_rematch = [c for c in leftovers if not met >> c & 1]
+        opponent = non_rematch[-1] if non_rematch else leftovers[-1]
+        leftovers.remove(opponent)
+        is_bo3 = ((wins[team1] == limit - 1 and wins[opponent] == limit - 1)
+                  or (losses[team1] == limit - 1 and losses[opponent] == limit - 1))
+        pairings.append((team1, opponent, is_bo3))
+
+    return pairings
+
+
+@dataclass
+class SwissState:
+    """
+    Estado de una fase suiza en arrays compactos. `opponents` incluye todos los partidos
+    (también los pendientes); `played` solo los que tienen ganador, que son los que cuentan para Buchholz.
+    `pending` son los partidos ya programados que aún no tienen ganador.
+    """
+    seeds: list[int]
+    wins: list[int]
+    losses: list[int]
+    opponents: list[int]
+    played: list[int]
+    team_ids: list[int] = field(default_factory=list)  # índice -> Team.id
+    pending: list[Pairing] = field(default_factory=list)
+
+    @classmethod
+    def empty(cls, seeds: list[int], team_ids: list[int] | None = None) -> 'SwissState':
+        n = len(seeds)
+        return cls(list(seeds), [0] * n, [0] * n, [0] * n, [0] * n, list(team_ids or []))
+
+    def copy(self) -> 'SwissState':
+        return SwissState(self.seeds[:], self.wins[:], self.losses[:], self.opponents[:], self.played[:],
+                          self.team_ids[:], self.pending[:])
+
+    def add_match(self, team1: int, team2: int) -> None:
+        self.opponents[team1] |= 1 << team2
+        self.opponents[team2] |= 1 << team1
+
+    def schedule(self, team1: int, team2: int, is_bo3: bool = False) -> None:
+        self.add_match(team1, team2)
+        self.pending.append((team1, team2, is_bo3))
+
+    def record_result(self, winner: int, loser: int) -> None:
+        self.add_match(winner, loser)
+        self.pending = [p for p in self.pending if {p[0], p[1]} != {winner, loser}]
+        self.played[winner] |= 1 << loser
+        self.played[loser] |= 1 << winner
+        self.wins[winner] += 1
+        self.losses[loser] += 1
+
+    def buchholz(self) -> list[int]:
+        return buchholz_scores(self.wins, self.losses, self.played)
+
+    def active_teams(self) -> list[int]:
+        return [i for i in range(len(self.wins)) if self.wins[i] < MAX_WINS_LOSSES and self.losses[i] < MAX_WINS_LOSSES]
+
+    def is_finished(self) -> bool:
+        return len(self.active_teams()) < 2
+
+    def next_round_pairings(self) -> list[Pairing]:
+        if not any(self.opponents):
+            return first_round_pairings(self.seeds)
+        return next_round_pairings(self.wins, self.losses, self.seeds, self.opponents, self.buchholz())
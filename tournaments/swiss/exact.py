@@ -0,0 +1,195 @@
+"""
+Cálculo exacto de las probabilidades de una fase suiza recorriendo todas las rondas restantes.
+
+En vez de enumerar cada secuencia de resultados, se avanza ronda a ronda con un lote de estados
+ponderados por su probabilidad (los mismos arrays que el simulador Monte Carlo):
+
+- Cada ronda se expande en las 2^k combinaciones de resultados de sus k partidos.
+- Los equipos que terminan acumulan su récord final (ponderado) y salen del cálculo.
+- La última ronda (todos los activos en 2-2) no se expande: cada equipo juega un único partido
+  y su probabilidad de 3-2 / 2-3 es directamente la de ese partido.
+
+No se fusionan estados repetidos (memoización): dentro de DEFAULT_MAX_STATES una fase de 16 equipos
+solo se calcula desde la ronda 3. Esa ronda sale de un único estado y sus combinaciones nunca dejan
+a los equipos con el mismo récord (cada partido decide cuál de sus dos equipos sube); tras la 4 solo
+queda la última, que se cierra sin expandir. No hay nada que fusionar. Frente a la enumeración recursiva
+(`naive_swiss_probabilities`) la mejora viene de cerrar la última ronda sin expandirla y de
+emparejar en lote todos los estados de una ronda: unas 20x desde la ronda 4 y unas 100x desde la 3
+(`manage.py swiss_exact_benchmark`).
+
+Requiere NumPy, igual que `montecarlo`.
+"""
+from dataclasses import dataclass
+from itertools import product
+
+import numpy as np
+
+from .engine import MAX_WINS_LOSSES, SwissState
+from .montecarlo import (
+    FINAL_RECORDS, _Batch, _pair_round, load_stage_strengths, qualification_probabilities,
+    seed_strengths, series_probability, stage_probabilities_payload, win_probability_matrix,
+)
+
+# Límite de combinaciones a expandir en una ronda; desde la ronda 3 una fase de 16 equipos
+# necesita como mucho 256 x 64
+DEFAULT_MAX_STATES = 200_000
+
+_RECORD_INDEX = np.full((MAX_WINS_LOSSES + 1, MAX_WINS_LOSSES + 1), -1, dtype=np.int64)
+for _k, (_w, _l) in enumerate(FINAL_RECORDS):
+    _RECORD_INDEX[_w, _l] = _k
+
+
+class TooManyStates(ValueError):
+    """La fase está demasiado lejos del final para el cálculo exacto; usar Monte Carlo."""
+
+
+@dataclass
+class SwissExactResult:
+    record_probabilities: np.ndarray  # (n, len(FINAL_RECORDS))
+    states: int  # estados visitados (uno por combinación de resultados expandida)
+
+    def probabilities(self) -> np.ndarray:
+        return self.record_probabilities
+
+    def qualification_probabilities(self) -> dict:
+        return qualification_probabilities(self.record_probabilities)
+
+
+def _active(batch: _Batch) -> np.ndarray:
+    return (batch.wins < MAX_WINS_LOSSES) & (batch.losses < MAX_WINS_LOSSES)
+
+
+def _accumulate_finished(records, batch: _Batch, weights, finished) -> None:
+    rows, teams = np.nonzero(finished)
+    record = _RECORD_INDEX[batch.wins[rows, teams], batch.losses[rows, teams]]
+    np.add.at(records, (teams, record), weights[rows])
+
+
+def _expand(batch: _Batch, weights, sims, team1, team2, p):
+    """
+    Sustituye cada estado por las 2^k combinaciones de resultados de sus k partidos.
+    Devuelve el nuevo lote, sus pesos y los partidos a aplicar (sims, team1, team2, team1_wins).
+    """
+    order = np.argsort(sims, kind='stable')
+    sims, team1, team2, p = sims[order], team1[order], team2[order], p[order]
+    counts = np.bincount(sims, minlength=len(weights))
+    first_match = np.cumsum(counts) - counts
+
+    parts = []
+    for k in np.unique(counts[counts > 0]):
+        rows = np.flatnonzero(counts == k)
+        outcomes = ((np.arange(1 << k)[:, None] >> np.arange(k)) & 1).astype(bool)  # (2^k, k)
+        matches = np.broadcast_to((first_match[rows, None] + np.arange(k))[:, None, :], (len(rows), 1 << k, k))
+        team1_wins = np.broadcast_to(outcomes, matches.shape)
+        match_p = p[matches]
+        combo_weights = weights[rows, None] * np.where(team1_wins, match_p, 1 - match_p).prod(axis=2)
+        parts.append((np.repeat(rows, 1 << k), matches.reshape(-1, k), team1_wins.reshape(-1, k), combo_weights.reshape(-1)))
+
+    new_rows = np.concatenate([part[0] for part in parts])
+    new_sims, matches, team1_wins, offset = [], [], [], 0
+    for rows, part_matches, part_wins, _ in parts:
+        k = part_matches.shape[1]
+        new_sims.append(np.repeat(np.arange(offset, offset + len(rows)), k))
+        matches.append(part_matches.reshape(-1))
+        team1_wins.append(part_wins.reshape(-1))
+        offset += len(rows)
+    matches = np.concatenate(matches)
+    return (
+        batch.take(new_rows),
+        np.concatenate([part[3] for part in parts]),
+        np.concatenate(new_sims), team1[matches], team2[matches], np.concatenate(team1_wins),
+    )
+
+
+def exact_swiss_stage(state: SwissState, strengths=None, max_states: int = DEFAULT_MAX_STATES) -> SwissExactResult:
+    """
+    Distribución exacta de récords finales de cada equipo desde `state` (partidos pendientes
+    incluidos) con el modelo de probabilidades del simulador.
+    Lanza TooManyStates si alguna ronda supera `max_states` combinaciones de resultados.
+    """
+    probabilities = win_probability_matrix(seed_strengths(state.seeds) if strengths is None else strengths)
+    n = len(state.seeds)
+    batch = _Batch(state, 1)
+    weights = np.ones(1)
+    records = np.zeros((n, len(FINAL_RECORDS)))
+    _accumulate_finished(records, batch, weights, ~_active(batch))
+    explored = 1
+
+    # La primera ronda sale del estado inicial (un solo estado): basta el motor escalar
+    fixed = state.pending or state.next_round_pairings()
+    limit = MAX_WINS_LOSSES - 1
+    winner_record, loser_record = _RECORD_INDEX[MAX_WINS_LOSSES, limit], _RECORD_INDEX[limit, MAX_WINS_LOSSES]
+
+    # Cada ronda elimina o clasifica equipos; el límite solo protege de datos inconsistentes
+    for _ in range(2 * MAX_WINS_LOSSES + 1):
+        if fixed:
+            team1, team2, is_bo3 = (np.asarray(column) for column in zip(*fixed))
+            sims = np.zeros(len(fixed), dtype=np.int64)
+            fixed = None
+        else:
+            sims, team1, team2, is_bo3 = _pair_round(batch)
+        if len(sims) == 0:
+            break
+        p = series_probability(probabilities[team1, team2], is_bo3)
+
+        # Ronda final del estado: todos sus equipos activos están en 2-2 y terminan pase lo que pase
+        active = _active(batch)
+        last_round = (~active | ((batch.wins == limit) & (batch.losses == limit))).all(axis=1)
+        closing = last_round[sims]
+        if closing.any():
+            match_weights = weights[sims[closing]]
+            match_p = p[closing]
+            np.add.at(records[:, winner_record], team1[closing], match_weights * match_p)
+            np.add.at(records[:, loser_record], team1[closing], match_weights * (1 - match_p))
+            np.add.at(records[:, winner_record], team2[closing], match_weights * (1 - match_p))
+            np.add.at(records[:, loser_record], team2[closing], match_weights * match_p)
+            sims, team1, team2, p = sims[~closing], team1[~closing], team2[~closing], p[~closing]
+            if len(sims) == 0:
+                break
+
+        matches_per_state = np.bincount(sims)
+        expanded = int((1 << matches_per_state[matches_per_state > 0]).sum())
+        if expanded > max_states:
+            raise TooManyStates(f"La siguiente ronda tiene {expanded} combinaciones de resultados (máximo {max_states}).")
+        batch, weights, sims, team1, team2, team1_wins = _expand(batch, weights, sims, team1, team2, p)
+        active = _active(batch)
+        batch.apply(sims, team1, team2, team1_wins)
+        _accumulate_finished(records, batch, weights, active & ~_active(batch))
+        explored += len(weights)
+
+    return SwissExactResult(records, explored)
+
+
+def naive_swiss_probabilities(state: SwissState, strengths=None) -> np.ndarray:
+    """
+    Referencia: recorre recursivamente cada secuencia de resultados con el motor, incluida la
+    última ronda. Solo para tests y benchmarks; su coste crece como 2^(partidos restantes).
+    """
+    probabilities = win_probability_matrix(seed_strengths(state.seeds) if strengths is None else strengths)
+    records = np.zeros((len(state.seeds), len(FINAL_RECORDS)))
+
+    def walk(current: SwissState, weight: float, pairings) -> None:
+        if not pairings:
+            for team, record in enumerate(zip(current.wins, current.losses)):
+                records[team, FINAL_RECORDS.index(record)] += weight
+            return
+        chances = [float(series_probability(probabilities[t1, t2], is_bo3)) for t1, t2, is_bo3 in pairings]
+        for outcome in product((True, False), repeat=len(pairings)):
+            following = current.copy()
+            following.pending = []
+            combo_weight = weight
+            for (t1, t2, _), t1_wins, chance in zip(pairings, outcome, chances):
+                following.record_result(*((t1, t2) if t1_wins else (t2, t1)))
+                combo_weight *= chance if t1_wins else 1 - chance
+            walk(following, combo_weight, following.next_round_pairings())
+
+    walk(state, 1.0, state.pending or state.next_round_pairings())
+    return records
+
+
+def exact_stage_probabilities(stage, strengths_by_team: dict | None = None,
+                              max_states: int = DEFAULT_MAX_STATES) -> list[dict]:
+    """Como `montecarlo.simulate_stage_probabilities` pero con probabilidades exactas."""
+    state, stage_teams, strengths = load_stage_strengths(stage, strengths_by_team)
+    result = exact_swiss_stage(state, strengths=strengths, max_states=max_states)
+    return stage_probabilities_payload(stage_teams, result.probabilities())
@@ -0,0 +1,60 @@
+"""
+Carga de una fase suiza desde la base de datos al formato compacto del motor.
+"""
+from django.utils import timezone
+
+from ..models import StageTeam, Match
+from .engine import SwissState
+
+
+def load_stage_state(stage) -> tuple[SwissState, list[StageTeam]]:
+    """
+    Construye el SwissState de una fase (2 consultas) a partir de los W/L de sus StageTeam
+    y del historial de partidos; los partidos sin ganador quedan en `pending`.
+    Devuelve también los StageTeam en el orden de los índices.
+    """
+    stage_teams = list(StageTeam.objects.filter(stage=stage).order_by('initial_seed', 'id'))
+    index_by_team = {st.team_id: i for i, st in enumerate(stage_teams)}
+    state = SwissState.empty(
+        [st.initial_seed for st in stage_teams],
+        [st.team_id for st in stage_teams],
+    )
+    state.wins = [st.wins for st in stage_teams]
+    state.losses = [st.losses for st in stage_teams]
+
+    matches = Match.objects.filter(stage=stage).order_by('round_number', 'id').values_list(
+        'team1_id', 'team2_id', 'winner_id', 'status', 'format'
+    )
+    for team1_id, team2_id, winner_id, status, match_format in matches:
+        team1 = index_by_team.get(team1_id)
+        team2 = index_by_team.get(team2_id)
+        if team1 is None or team2 is None:
+            continue
+        if winner_id:
+            state.add_match(team1, team2)
+            state.played[team1] |= 1 << team2
+            state.played[team2] |= 1 << team1
+        elif status == 'CANCELED':
+            # Cuenta como enfrentamiento previo (igual que en el frontend) pero no se juega
+            state.add_match(team1, team2)
+        else:
+            state.schedule(team1, team2, match_format == 'BO3')
+    return state, stage_teams
+
+
+def recalculate_buchholz_scores(stage) -> int:
+    """
+    Recalcula `StageTeam.buchholz_score` de una fase suiza con los W/L actuales.
+    Solo escribe los StageTeam cuyo Buchholz cambió; devuelve cuántos se actualizaron.
+    """
+    state, stage_teams = load_stage_state(stage)
+    now = timezone.now()
+    changed = []
+    for stage_team, score in zip(stage_teams, state.buchholz()):
+        if stage_team.buchholz_score != score:
+            stage_team.buchholz_score = score
+            stage_team.updated_at = now
+            changed.append(stage_team)
+    if changed:
+        StageTeam.objects.bulk_update(changed, ['buchholz_score', 'updated_at'])
+    return len(changed)
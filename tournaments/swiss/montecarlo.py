@@ -0,0 +1,496 @@
+"""
+Simulador Monte Carlo de fases suizas con arrays NumPy por lotes.
+
+Todas las simulaciones avanzan a la vez: cada ronda se empareja con la misma regla que
+`engine.next_round_pairings` (y el frontend), pero vectorizada sobre el eje de simulaciones,
+y los resultados se sortean con una matriz de probabilidades de victoria.
+
+Coste medido: unos 0,55-0,6 s por 100.000 simulaciones de una fase de 16 equipos desde cero, en
+un núcleo (NumPy 2.x). Algo más de la mitad es emparejar; el resto, aplicar resultados y Buchholz.
+
+Requiere NumPy; las vistas y comandos lo importan de forma diferida.
+"""
+from dataclasses import dataclass
+from functools import lru_cache
+
+import numpy as np
+
+from .engine import MAX_WINS_LOSSES, SwissState, first_round_pairings, next_round_pairings
+
+DEFAULT_SIMULATIONS = 100_000
+
+# Récords finales posibles con MAX_WINS_LOSSES = 3, en el orden en que se devuelven
+FINAL_RECORDS = [(3, 0), (3, 1), (3, 2), (2, 3), (1, 3), (0, 3)]
+
+
+def seed_strengths(seeds) -> np.ndarray:
+    """
+    Fuerza por defecto de cada equipo a partir de su seed (n + 1 - seed): el mejor sembrado es el favorito,
+    igual que en `simulateRoundResults` del frontend (donde siempre gana el de menor seed).
+    """
+    seeds = np.asarray(seeds, dtype=np.float64)
+    return len(seeds) + 1 - seeds
+
+
+def win_probability_matrix(strengths) -> np.ndarray:
+    """P[i, j]: probabilidad de que i gane un mapa a j (modelo de Bradley-Terry)."""
+    strengths = np.asarray(strengths, dtype=np.float64)
+    return strengths[:, None] / (strengths[:, None] + strengths[None, :])
+
+
+def series_probability(p, is_bo3):
+    """Probabilidad de ganar el partido: un mapa en BO1 o dos de tres en BO3, p²(3 - 2p)."""
+    return np.where(is_bo3, p * p * (3 - 2 * p), p)
+
+
+@dataclass
+class SwissSimulationResult:
+    simulations: int
+    record_counts: np.ndarray  # (n, len(FINAL_RECORDS)): veces que cada equipo acabó con cada récord
+
+    def probabilities(self) -> np.ndarray:
+        return self.record_counts / self.simulations
+
+    def qualification_probabilities(self) -> dict:
+        return qualification_probabilities(self.probabilities())
+
+
+def qualification_probabilities(record_probabilities: np.ndarray) -> dict:
+    """Agrega la distribución de récords finales (n, len(FINAL_RECORDS)) en 3-0, clasificación y 0-3."""
+    return {
+        '3-0': record_probabilities[:, 0],
+        'advance': record_probabilities[:, :3].sum(axis=1),
+        '0-3': record_probabilities[:, -1],
+    }
+
+
+def _popcount(masks: np.ndarray) -> np.ndarray:
+    if hasattr(np, 'bitwise_count'):  # NumPy >= 2.0
+        return np.bitwise_count(masks)
+    counts = np.zeros(masks.shape, dtype=np.uint8)
+    for shift in range(0, masks.dtype.itemsize * 8, 8):
+        counts += _BYTE_POPCOUNT[(masks >> shift) & 0xFF]
+    return counts
+
+
+_BYTE_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+class _Batch:
+    """Estado de S simulaciones de una fase con n equipos (índices en orden de seed)."""
+
+    def __init__(self, state: SwissState, simulations: int):
+        n = len(state.seeds)
+        shape = (simulations, n)
+        # Máscaras de rivales en el entero más pequeño que las contenga
+        mask_dtype = np.int16 if n < 16 else np.int32 if n < 32 else np.int64
+        self.seeds = np.asarray(state.seeds, dtype=np.int64)
+        self.wins = np.broadcast_to(np.asarray(state.wins, dtype=np.int16), shape).copy()
+        self.losses = np.broadcast_to(np.asarray(state.losses, dtype=np.int16), shape).copy()
+        self.opponents = np.broadcast_to(np.asarray(state.opponents, dtype=mask_dtype), shape).copy()
+        self.played = np.broadcast_to(np.asarray(state.played, dtype=mask_dtype), shape).copy()
+        self.buchholz = np.broadcast_to(np.asarray(state.buchholz(), dtype=np.int16), shape).copy()
+
+    @property
+    def size(self):
+        return self.wins.shape
+
+    def take(self, rows) -> '_Batch':
+        """Nuevo lote con las filas (simulaciones) indicadas, que pueden repetirse."""
+        batch = _Batch.__new__(_Batch)
+        batch.seeds = self.seeds
+        for name in ('wins', 'losses', 'opponents', 'played', 'buchholz'):
+            setattr(batch, name, getattr(self, name)[rows])
+        return batch
+
+    def play(self, sims, team1, team2, is_bo3, probabilities, rng, teams=None) -> None:
+        """
+        Sortea los partidos (sims[k]: team1[k] vs team2[k]) y actualiza récords, rivales y Buchholz.
+        Cada equipo juega como mucho un partido por llamada. Si los participantes cambian entre
+        simulaciones, `teams[sim, índice]` es la fila de `probabilities` de cada uno.
+        """
+        if teams is not None:
+            team1_rows, team2_rows = teams[sims, team1], teams[sims, team2]
+        else:
+            team1_rows, team2_rows = team1, team2
+        p = series_probability(probabilities[team1_rows, team2_rows], is_bo3)
+        self.apply(sims, team1, team2, rng.random(len(sims)) < p)
+
+    def apply(self, sims, team1, team2, team1_wins) -> None:
+        """Aplica resultados ya decididos (team1_wins[k]) a los partidos sims[k]: team1[k] vs team2[k]."""
+        simulations, n = self.size
+        flat1, flat2 = sims * n + team1, sims * n + team2
+        winners = np.where(team1_wins, flat1, flat2)
+        losers = np.where(team1_wins, flat2, flat1)
+        self.wins.reshape(-1)[winners] += 1
+        self.losses.reshape(-1)[losers] += 1
+
+        # Buchholz incremental: cada rival anterior que ganó suma 1 y cada uno que perdió resta 1;
+        # además se suma el récord (ya actualizado) del rival de esta ronda, salvo si es una revancha
+        # (ese rival ya estaba en `played` y el paso anterior ya lo ha contado)
+        mask_dtype = self.played.dtype
+        rematch = (self.played.reshape(-1)[flat1] >> team2.astype(mask_dtype)) & 1 == 1
+        winner_bits = np.bincount(sims, weights=np.left_shift(1, winners % n), minlength=simulations).astype(mask_dtype)
+        loser_bits = np.bincount(sims, weights=np.left_shift(1, losers % n), minlength=simulations).astype(mask_dtype)
+        self.buchholz += (_popcount(self.played & winner_bits[:, None]).astype(np.int16)
+                          - _popcount(self.played & loser_bits[:, None]).astype(np.int16))
+        diffs = (self.wins - self.losses).reshape(-1)
+        buchholz = self.buchholz.reshape(-1)
+        buchholz[flat1] += np.where(rematch, 0, diffs[flat2])
+        buchholz[flat2] += np.where(rematch, 0, diffs[flat1])
+
+        for flat, other in ((flat1, team2), (flat2, team1)):
+            bit = np.left_shift(1, other).astype(mask_dtype)
+            self.opponents.reshape(-1)[flat] |= bit
+            self.played.reshape(-1)[flat] |= bit
+
+
+def _segment_bounds(keys: np.ndarray):
+    """Para cada posición de `keys` (ordenado por filas), primera y última posición de su grupo."""
+    simulations, n = keys.shape
+    positions = np.broadcast_to(np.arange(n), keys.shape)
+    is_start = np.ones(keys.shape, dtype=bool)
+    is_start[:, 1:] = keys[:, 1:] != keys[:, :-1]
+    is_end = np.ones(keys.shape, dtype=bool)
+    is_end[:, :-1] = is_start[:, 1:]
+    start = np.maximum.accumulate(np.where(is_start, positions, 0), axis=1)
+    end = np.minimum.accumulate(np.where(is_end, positions, n)[:, ::-1], axis=1)[:, ::-1]
+    return start, end
+
+
+def _greedy_pairs(order, unpaired, start, end, opponents_sorted, avoid_last_pair_rematch):
+    """
+    Emparejamiento voraz vectorizado dentro de cada segmento [start, end] de las posiciones ordenadas:
+    el primer equipo libre juega contra el último libre con el que no haya jugado (o el último libre
+    si todos son revancha). Con `avoid_last_pair_rematch`, si quedan 3 rivales se evita dejar una
+    última pareja que sea revancha. Modifica `unpaired` y devuelve (sims, pos1, pos2).
+    """
+    simulations, n = order.shape
+    positions = np.broadcast_to(np.arange(n), order.shape)
+    rows = np.arange(simulations)[:, None]
+    found_sims, found_first, found_second = [], [], []
+
+    for _ in range(n // 2):
+        counts = np.zeros((simulations, n + 1), dtype=np.int16)
+        np.cumsum(unpaired, axis=1, out=counts[:, 1:])
+        before = counts[rows, positions] - counts[rows, start]
+        total = counts[rows, end + 1] - counts[rows, start]
+        is_first = unpaired & (before == 0) & (total >= 2)
+        if not is_first.any():
+            break
+
+        first_pos = np.maximum.accumulate(np.where(is_first, positions, -1), axis=1)
+        in_segment = first_pos >= start
+        candidates = unpaired & ~is_first & in_segment
+        first_opponents = opponents_sorted[rows, np.maximum(first_pos, 0)]
+        rematch = ((first_opponents >> order) & 1).astype(bool)
+        non_rematch = candidates & ~rematch
+
+        last_non_rematch = np.maximum.accumulate(np.where(non_rematch, positions, -1), axis=1)[rows, end]
+        last_candidate = np.maximum.accumulate(np.where(candidates, positions, -1), axis=1)[rows, end]
+        choice = np.where(last_non_rematch >= start, last_non_rematch, last_candidate)
+
+        sims, first = np.nonzero(is_first)
+        chosen = choice[sims, first]
+
+        if avoid_last_pair_rematch:
+            lookahead = total[sims, first] == 4
+            if lookahead.any():
+                chosen = chosen.copy()
+                chosen[lookahead] = _avoid_last_pair_rematch(
+                    order, unpaired, opponents_sorted, sims[lookahead], first[lookahead], end[sims[lookahead], first[lookahead]]
+                )
+
+        unpaired[sims, first] = False
+        unpaired[sims, chosen] = False
+        found_sims.append(sims)
+        found_first.append(first)
+        found_second.append(chosen)
+
+    if not found_sims:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    return np.concatenate(found_sims), np.concatenate(found_first), np.concatenate(found_second)
+
+
+def _avoid_last_pair_rematch(order, unpaired, opponents_sorted, sims, first, end):
+    """
+    Caso de 3 rivales libres (c1 < c2 < c3 por seeding): entre los que no son revancha, el peor
+    sembrado que no deje a los otros dos como revancha; si todos la dejan, el peor sin revancha;
+    si todos son revancha, c3.
+    """
+    n = order.shape[1]
+    positions = np.arange(n)
+    segment = (positions[None, :] > first[:, None]) & (positions[None, :] <= end[:, None]) & unpaired[sims]
+    # Las 3 posiciones libres tras el primero, en orden
+    candidates = np.sort(np.where(segment, positions[None, :], n), axis=1)[:, :3]
+    teams = order[sims[:, None], candidates]
+    opponents = opponents_sorted[sims[:, None], candidates]
+
+    def met(a_opponents, b_team):
+        return ((a_opponents >> b_team) & 1).astype(bool)
+
+    first_opponents = opponents_sorted[sims, first][:, None]
+    non_rematch = ~met(first_opponents, teams)
+    # Pareja que queda si se elige el candidato k
+    remaining_rematch = np.stack([
+        met(opponents[:, 1], teams[:, 2]),
+        met(opponents[:, 0], teams[:, 2]),
+        met(opponents[:, 0], teams[:, 1]),
+    ], axis=1)
+    avoiding = non_rematch & ~remaining_rematch
+
+    k = np.full(len(sims), 2)
+    for options in (non_rematch, avoiding):  # El último criterio que tenga opciones manda
+        has_option = options.any(axis=1)
+        last_option = 2 - np.argmax(options[:, ::-1], axis=1)
+        k = np.where(has_option, last_option, k)
+    return candidates[np.arange(len(sims)), k]
+
+
+@lru_cache(maxsize=None)
+def _group_pairing(size: int, rematch_pattern: int) -> tuple:
+    """
+    Emparejamiento de un grupo de récord de `size` equipos (en orden de seeding) según qué parejas
+    ya se enfrentaron: bit k de `rematch_pattern` = k-ésima pareja (i, j), i < j, en orden lexicográfico.
+    Se resuelve con el motor exacto y se memoriza: hay pocos patrones distintos.
+    """
+    opponents = [0] * size
+    bit = 0
+    for i in range(size):
+        for j in range(i + 1, size):
+            if rematch_pattern >> bit & 1:
+                opponents[i] |= 1 << j
+                opponents[j] |= 1 << i
+            bit += 1
+    pairings = next_round_pairings([0] * size, [0] * size, list(range(size)), opponents, [0] * size)
+    return tuple((team1, team2) for team1, team2, _ in pairings)
+
+
+# Clave de grupo de los equipos eliminados o clasificados (después de todos los activos)
+INACTIVE_GROUP = 1 << 20
+
+
+def _pair_even_groups(sims, members, member_opponents):
+    """
+    Empareja grupos de récord pares del mismo tamaño: members[k] son los equipos del grupo k (de la
+    simulación sims[k]) en orden de seeding y member_opponents[k] sus máscaras de rivales. El
+    resultado solo depende del patrón de revanchas del grupo, que se resuelve con `_group_pairing`.
+    Devuelve (sims, team1, team2).
+    """
+    size = members.shape[1]
+    pattern = np.zeros(len(sims), dtype=np.int64)
+    bit = 0
+    for i in range(size):
+        for j in range(i + 1, size):
+            pattern |= ((member_opponents[:, i] >> members[:, j]) & 1).astype(np.int64) << bit
+            bit += 1
+    patterns, inverse = np.unique(pattern, return_inverse=True)
+    table = np.array([_group_pairing(int(size), int(p)) for p in patterns], dtype=np.int64).reshape(len(patterns), -1, 2)
+    ranks = table[inverse.reshape(-1)]
+    return (
+        np.repeat(sims, ranks.shape[1]),
+        np.take_along_axis(members, ranks[:, :, 0], axis=1).reshape(-1),
+        np.take_along_axis(members, ranks[:, :, 1], axis=1).reshape(-1),
+    )
+
+
+def _concat_pairs(found):
+    if not found:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    return tuple(np.concatenate(parts) for parts in zip(*found))
+
+
+def _pair_uniform_groups(opponents, order, group_row):
+    """
+    Camino rápido de `_pair_round` cuando todas las simulaciones tienen los mismos grupos de récord
+    en las mismas posiciones, lo normal: un grupo par que juega entre sí reparte exactamente la mitad
+    de victorias. Los equipos de cada grupo son entonces columnas consecutivas de `order` y no hace
+    falta calcular los segmentos de cada simulación. Devuelve None si algún grupo es impar.
+    """
+    simulations, n = order.shape
+    bounds = np.flatnonzero(group_row[1:] != group_row[:-1]) + 1
+    groups = [(first, last - first) for first, last in zip([0, *bounds], [*bounds, n]) if group_row[first] != INACTIVE_GROUP]
+    if any(size % 2 for _, size in groups):
+        return None
+    found = []
+    for size in sorted({size for _, size in groups}):
+        # Por simulación y después por grupo, como np.nonzero en el camino general
+        members = np.stack([order[:, first:first + size] for first, group_size in groups if group_size == size], axis=1).reshape(-1, size)
+        sims = np.repeat(np.arange(simulations), len(members) // simulations)
+        found.append(_pair_even_groups(sims, members, opponents[sims[:, None], members]))
+    return _concat_pairs(found)
+
+
+def _pair_round(batch: _Batch):
+    """Empareja la siguiente ronda en todas las simulaciones. Devuelve (sims, team1, team2, is_bo3)."""
+    wins, losses = batch.wins, batch.losses
+    simulations, n = wins.shape
+    active = (wins < MAX_WINS_LOSSES) & (losses < MAX_WINS_LOSSES)
+    buchholz = batch.buchholz.astype(np.int64)
+    limit = MAX_WINS_LOSSES - 1
+
+    # Grupo de récord (l - w, w) y seeding dentro del grupo: (-buchholz, seed). Inactivos al final.
+    group = (losses.astype(np.int64) - wins + 16) * 16 + wins
+    group = np.where(active, group, INACTIVE_GROUP)
+    key = ((group * 256 + (128 - buchholz)) << 16) + batch.seeds[None, :]
+    order = np.argsort(key, axis=1, kind='stable')
+    rows = np.arange(simulations)[:, None]
+    group_sorted = group[rows, order]
+
+    if (group_sorted == group_sorted[:1]).all():
+        pairs = _pair_uniform_groups(batch.opponents, order, group_sorted[0])
+        if pairs is not None:
+            sims, team1, team2 = pairs
+            return sims, team1, team2, (wins[sims, team1] == limit) | (losses[sims, team1] == limit)
+
+    active_sorted = active[rows, order]
+    opponents_sorted = batch.opponents[rows, order]
+    start, end = _segment_bounds(group_sorted)
+
+    positions = np.arange(n)[None, :]
+    group_size = end - start + 1
+    is_group_start = active_sorted & (positions == start)
+    has_odd_group = (is_group_start & (group_size % 2 == 1)).any(axis=1)
+
+    # Con todos los grupos pares, cada grupo se empareja por separado y el resultado solo depende
+    # de su tamaño y de qué parejas del grupo ya se enfrentaron (patrón de revanchas)
+    found = []
+    for size in np.unique(group_size[is_group_start & ~has_odd_group[:, None]]):
+        sims, group_start = np.nonzero(is_group_start & ~has_odd_group[:, None] & (group_size == size))
+        columns = group_start[:, None] + np.arange(size)
+        found.append(_pair_even_groups(sims, order[sims[:, None], columns], opponents_sorted[sims[:, None], columns]))
+    sims, team1, team2 = _concat_pairs(found)
+    is_bo3 = (wins[sims, team1] == limit) | (losses[sims, team1] == limit)
+
+    slow = np.flatnonzero(has_odd_group)
+    if slow.size:
+        slow_sims, slow_team1, slow_team2, slow_bo3 = _pair_greedy(
+            order[slow], active_sorted[slow], start[slow], end[slow], opponents_sorted[slow], wins[slow], losses[slow]
+        )
+        sims = np.concatenate([sims, slow[slow_sims]])
+        team1 = np.concatenate([team1, slow_team1])
+        team2 = np.concatenate([team2, slow_team2])
+        is_bo3 = np.concatenate([is_bo3, slow_bo3])
+    return sims, team1, team2, is_bo3
+
+
+def _pair_greedy(order, active_sorted, start, end, opponents_sorted, wins, losses):
+    """
+    Emparejamiento voraz completo (grupos de récord y después sobrantes) para un subconjunto
+    de simulaciones; se usa cuando hay grupos impares.
+    """
+    limit = MAX_WINS_LOSSES - 1
+    unpaired = active_sorted.copy()
+    sims, pos1, pos2 = _greedy_pairs(order, unpaired, start, end, opponents_sorted, True)
+    team1, team2 = order[sims, pos1], order[sims, pos2]
+    is_bo3 = (wins[sims, team1] == limit) | (losses[sims, team1] == limit)
+
+    if unpaired.any():
+        # Sobrantes de grupos impares: un único segmento con todos los activos, por seeding global
+        active_count = active_sorted.sum(axis=1)
+        left_start = np.zeros_like(start)
+        left_end = np.broadcast_to(np.maximum(active_count - 1, 0)[:, None], start.shape).astype(start.dtype)
+        sims_l, pos1_l, pos2_l = _greedy_pairs(order, unpaired, left_start, left_end, opponents_sorted, False)
+        team1_l, team2_l = order[sims_l, pos1_l], order[sims_l, pos2_l]
+        is_bo3_l = (((wins[sims_l, team1_l] == limit) & (wins[sims_l, team2_l] == limit))
+                    | ((losses[sims_l, team1_l] == limit) & (losses[sims_l, team2_l] == limit)))
+        sims = np.concatenate([sims, sims_l])
+        team1 = np.concatenate([team1, team1_l])
+        team2 = np.concatenate([team2, team2_l])
+        is_bo3 = np.concatenate([is_bo3, is_bo3_l])
+
+    return sims, team1, team2, is_bo3
+
+
+def simulate_swiss_stage(state: SwissState, simulations: int = DEFAULT_SIMULATIONS,
+                         strengths=None, rng=None) -> SwissSimulationResult:
+    """
+    Simula `simulations` veces el resto de una fase suiza desde `state`: primero los partidos
+    pendientes ya programados y después las rondas que falten.
+
+    `strengths` es la fuerza de cada equipo (por índice) para el modelo de Bradley-Terry; por defecto
+    se deriva del seed. `rng` puede ser un numpy Generator o una semilla.
+    """
+    rng = np.random.default_rng(rng)
+    probabilities = win_probability_matrix(seed_strengths(state.seeds) if strengths is None else strengths)
+    batch = play_swiss_stage(state, simulations, probabilities, rng)
+
+    n = len(state.seeds)
+    record_counts = np.zeros((n, len(FINAL_RECORDS)), dtype=np.int64)
+    for k, (wins, losses) in enumerate(FINAL_RECORDS):
+        record_counts[:, k] = ((batch.wins == wins) & (batch.losses == losses)).sum(axis=0)
+    return SwissSimulationResult(simulations, record_counts)
+
+
+def play_swiss_stage(state: SwissState, simulations: int, probabilities, rng, teams=None) -> _Batch:
+    """
+    Juega `simulations` veces el resto de la fase desde `state` (pendientes y después las rondas
+    que falten) y devuelve el lote final. `teams` como en `_Batch.play`.
+    """
+    batch = _Batch(state, simulations)
+    all_sims = np.arange(simulations)
+
+    def play_fixed(pairings):
+        # Los mismos partidos en todas las simulaciones, sorteados en una sola pasada
+        team1, team2, is_bo3 = (np.asarray(column) for column in zip(*pairings))
+        batch.play(np.tile(all_sims, len(pairings)), np.repeat(team1, simulations),
+                   np.repeat(team2, simulations), np.repeat(is_bo3, simulations), probabilities, rng, teams)
+
+    if state.pending:
+        play_fixed(state.pending)
+    elif not any(state.opponents):
+        play_fixed(first_round_pairings(state.seeds))
+
+    # Cada ronda elimina o clasifica equipos; el límite solo protege de datos inconsistentes
+    for _ in range(2 * MAX_WINS_LOSSES):
+        sims, team1, team2, is_bo3 = _pair_round(batch)
+        if len(sims) == 0:
+            break
+        batch.play(sims, team1, team2, is_bo3, probabilities, rng, teams)
+    return batch
+
+
+def simulate_stage_probabilities(stage, simulations: int = DEFAULT_SIMULATIONS,
+                                 strengths_by_team: dict | None = None, rng=None) -> list[dict]:
+    """
+    Simula una Stage suiza de la base de datos y devuelve, por equipo (en orden de seed), sus
+    probabilidades de 3-0, de clasificar y de 0-3 y la distribución de récords finales.
+
+    `strengths_by_team` (Team.id -> fuerza > 0) sustituye la fuerza derivada del seed de esos equipos.
+    """
+    state, stage_teams, strengths = load_stage_strengths(stage, strengths_by_team)
+    result = simulate_swiss_stage(state, simulations, strengths=strengths, rng=rng)
+    return stage_probabilities_payload(stage_teams, result.probabilities())
+
+
+def load_stage_strengths(stage, strengths_by_team: dict | None = None):
+    """
+    Carga el SwissState de una Stage y la fuerza de cada equipo: la derivada del seed salvo los
+    equipos de `strengths_by_team` (Team.id -> fuerza > 0). Devuelve (state, stage_teams, strengths).
+    """
+    from .loader import load_stage_state
+
+    state, stage_teams = load_stage_state(stage)
+    strengths = seed_strengths(state.seeds)
+    for i, team_id in enumerate(state.team_ids):
+        if strengths_by_team and team_id in strengths_by_team:
+            strengths[i] = strengths_by_team[team_id]
+    return state, stage_teams, strengths
+
+
+def stage_probabilities_payload(stage_teams, record_probabilities: np.ndarray) -> list[dict]:
+    """Respuesta por equipo (en el orden de `stage_teams`) a partir de la distribución de récords finales."""
+    qualification = qualification_probabilities(record_probabilities)
+    return [
+        {
+            'team_id': stage_team.team_id,
+            'seed': stage_team.initial_seed,
+            'wins': stage_team.wins,
+            'losses': stage_team.losses,
+            'probabilities': {key: float(values[i]) for key, values in qualification.items()},
+            'records': {f'{w}-{l}': float(record_probabilities[i, k]) for k, (w, l) in enumerate(FINAL_RECORDS)},
+        }
+        for i, stage_team in enumerate(stage_teams)
+    ]
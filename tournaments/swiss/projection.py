@@ -0,0 +1,233 @@
+"""
+Proyección de un torneo completo: todas las fases suizas en orden y después el bracket de playoffs
+de 8 equipos, simulados por lotes con `montecarlo` y repartidos entre procesos.
+
+La promoción entre fases replica el frontend (`recalculateNextPhaseSeedForQualifiedTeams` y
+`generatePlayoffBracket`): los clasificados se ordenan por victorias, derrotas, Buchholz y seed, y
+entran en la siguiente fase detrás de sus equipos ya presentes; en playoffs reciben los seeds 1-8
+y se juegan 1v8, 4v5, 2v7, 3v6, todo en BO3.
+
+`load_tournament_plan` lee la base de datos y devuelve un plan sin Django que se envía a los workers.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from .engine import MAX_WINS_LOSSES, SwissState
+from .montecarlo import play_swiss_stage, series_probability, win_probability_matrix
+
+DEFAULT_CHUNK_SIZE = 5_000
+PLAYOFF_TEAMS = 8
+# Cuartos de final por posición de seed (1v8, 4v5, 2v7, 3v6); semis: QF1-QF2 y QF3-QF4
+QUARTERFINALS = [(0, 7), (3, 4), (1, 6), (2, 5)]
+
+
+@dataclass
+class SwissStagePlan:
+    stage_id: int
+    name: str
+    state: SwissState  # por posición de seed; vacío si la fase recibe clasificados aún por decidir
+    teams: list[int]  # índice global de los participantes ya conocidos, en orden de seed
+    promoted: int = 0  # plazas finales que ocupan los clasificados de la fase anterior
+
+
+@dataclass
+class PlayoffPlan:
+    stage_id: int
+    name: str
+    teams: list[int] = field(default_factory=list)  # índices globales por seed (1-8); vacío si salen de la fase suiza
+    results: list[tuple[int, int, int]] = field(default_factory=list)  # (equipo, equipo, ganador) ya decididos
+
+
+@dataclass
+class TournamentPlan:
+    team_ids: list[int]  # índice global -> Team.id
+    strengths: np.ndarray
+    swiss: list[SwissStagePlan]
+    playoff: PlayoffPlan | None = None
+
+
+@dataclass
+class TournamentProjection:
+    simulations: int
+    team_ids: list[int]
+    stage_ids: list[int]
+    stage_advance: np.ndarray  # (fases suizas, equipos): veces que cada equipo clasificó de cada fase
+    playoff_seeds: np.ndarray  # (equipos, 8): veces que entró a playoffs con cada seed
+    semifinal: np.ndarray
+    final: np.ndarray
+    champion: np.ndarray
+
+    def merge(self, other: 'TournamentProjection') -> 'TournamentProjection':
+        return TournamentProjection(
+            self.simulations + other.simulations, self.team_ids, self.stage_ids,
+            self.stage_advance + other.stage_advance, self.playoff_seeds + other.playoff_seeds,
+            self.semifinal + other.semifinal, self.final + other.final, self.champion + other.champion,
+        )
+
+    def teams_payload(self) -> list[dict]:
+        """Probabilidades por equipo, de más a menos probable campeón."""
+        s = self.simulations
+        teams = [
+            {
+                'team_id': team_id,
+                'champion': float(self.champion[i] / s),
+                'final': float(self.final[i] / s),
+                'semifinal': float(self.semifinal[i] / s),
+                'playoffs': float(self.playoff_seeds[i].sum() / s),
+                'stages': {stage_id: float(self.stage_advance[k, i] / s) for k, stage_id in enumerate(self.stage_ids)},
+                'playoff_seeds': (self.playoff_seeds[i] / s).tolist(),
+            }
+            for i, team_id in enumerate(self.team_ids)
+        ]
+        teams.sort(key=lambda team: (-team['champion'], -team['playoffs']))
+        return teams
+
+
+def _standings(batch) -> np.ndarray:
+    """Posiciones de cada simulación ordenadas por victorias, derrotas, Buchholz y seed."""
+    simulations, n = batch.size
+    wins = batch.wins.astype(np.int64)
+    losses = batch.losses.astype(np.int64)
+    key = ((((MAX_WINS_LOSSES - wins) * 16 + losses) * 1024 + (512 - batch.buchholz)) * 1024) + np.arange(n)
+    return np.argsort(key, axis=1)
+
+
+def _play_series(team1, team2, probabilities, rng, results) -> np.ndarray:
+    """Ganador de cada partido BO3 team1[k] vs team2[k]; los resultados ya decididos se respetan."""
+    team1_wins = rng.random(len(team1)) < series_probability(probabilities[team1, team2], True)
+    for a, b, winner in results:
+        decided = ((team1 == a) & (team2 == b)) | ((team1 == b) & (team2 == a))
+        team1_wins[decided] = team1[decided] == winner
+    return np.where(team1_wins, team1, team2)
+
+
+def simulate_chunk(plan: TournamentPlan, simulations: int, seed) -> TournamentProjection:
+    """Simula `simulations` torneos completos en un único proceso."""
+    rng = np.random.default_rng(seed)
+    probabilities = win_probability_matrix(plan.strengths)
+    num_teams = len(plan.team_ids)
+    rows = np.arange(simulations)[:, None]
+    stage_advance = np.zeros((len(plan.swiss), num_teams), dtype=np.int64)
+    qualified = None
+
+    for k, stage in enumerate(plan.swiss):
+        known = np.broadcast_to(np.asarray(stage.teams, dtype=np.int64), (simulations, len(stage.teams)))
+        if stage.promoted:
+            # Los clasificados que ya estaban en la fase (promovidos en la BD) no ocupan plaza nueva
+            already_in = np.isin(qualified, stage.teams)
+            incoming = np.take_along_axis(qualified, np.argsort(already_in, axis=1, kind='stable'), axis=1)
+            teams = np.concatenate([known, incoming[:, :stage.promoted]], axis=1)
+        else:
+            teams = np.ascontiguousarray(known)
+
+        batch = play_swiss_stage(stage.state, simulations, probabilities, rng, teams)
+        num_qualified = int((batch.wins == MAX_WINS_LOSSES).sum(axis=1).min())
+        qualified = teams[rows, _standings(batch)[:, :num_qualified]]
+        stage_advance[k] = np.bincount(qualified.reshape(-1), minlength=num_teams)
+
+    playoff_seeds = np.zeros((num_teams, PLAYOFF_TEAMS), dtype=np.int64)
+    semifinal = np.zeros(num_teams, dtype=np.int64)
+    final = np.zeros(num_teams, dtype=np.int64)
+    champion = np.zeros(num_teams, dtype=np.int64)
+    if plan.playoff is not None:
+        if plan.playoff.teams:
+            seeds = np.broadcast_to(np.asarray(plan.playoff.teams, dtype=np.int64), (simulations, PLAYOFF_TEAMS))
+        else:
+            seeds = qualified[:, :PLAYOFF_TEAMS]
+        playoff_seeds += np.bincount((seeds * PLAYOFF_TEAMS + np.arange(PLAYOFF_TEAMS)).reshape(-1),
+                                     minlength=num_teams * PLAYOFF_TEAMS).reshape(num_teams, PLAYOFF_TEAMS)
+
+        results = plan.playoff.results
+        quarterfinal_winners = [_play_series(seeds[:, high], seeds[:, low], probabilities, rng, results)
+                                for high, low in QUARTERFINALS]
+        semifinal_winners = [_play_series(quarterfinal_winners[0], quarterfinal_winners[1], probabilities, rng, results),
+                             _play_series(quarterfinal_winners[2], quarterfinal_winners[3], probabilities, rng, results)]
+        winners = _play_series(semifinal_winners[0], semifinal_winners[1], probabilities, rng, results)
+        semifinal += np.bincount(np.concatenate(quarterfinal_winners), minlength=num_teams)
+        final += np.bincount(np.concatenate(semifinal_winners), minlength=num_teams)
+        champion += np.bincount(winners, minlength=num_teams)
+
+    return TournamentProjection(simulations, plan.team_ids, [stage.stage_id for stage in plan.swiss],
+                                stage_advance, playoff_seeds, semifinal, final, champion)
+
+
+def simulate_tournament(plan: TournamentPlan, simulations: int, workers: int = 1, seed=None,
+                        chunk_size: int = DEFAULT_CHUNK_SIZE) -> TournamentProjection:
+    """
+    Simula el torneo `simulations` veces en lotes de `chunk_size` repartidos entre `workers` procesos.
+    Cada lote tiene su propia semilla derivada de `seed` (SeedSequence.spawn), así que con la misma
+    semilla y tamaño de lote el resultado no depende del número de workers.
+    """
+    sizes = [chunk_size] * (simulations // chunk_size)
+    if simulations % chunk_size:
+        sizes.append(simulations % chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    if workers > 1 and len(sizes) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(sizes))) as pool:
+            parts = list(pool.map(simulate_chunk, [plan] * len(sizes), sizes, seeds))
+    else:
+        parts = [simulate_chunk(plan, size, chunk_seed) for size, chunk_seed in zip(sizes, seeds)]
+
+    projection = parts[0]
+    for part in parts[1:]:
+        projection = projection.merge(part)
+    return projection
+
+
+def load_tournament_plan(tournament, strengths_by_team: dict | None = None) -> TournamentPlan:
+    """
+    Construye el plan de simulación de un torneo desde la base de datos.
+
+    Fuerza por defecto: los equipos se ordenan de la última fase a la primera (los invitados a fases
+    posteriores son los mejor sembrados) y por seed dentro de cada fase; el i-ésimo recibe n + 1 - i,
+    como el seed en `montecarlo`. `strengths_by_team` (Team.id -> fuerza) sustituye la de esos equipos.
+    """
+    from ..models import Match, StageTeam
+    from .loader import load_stage_state
+
+    stages = list(tournament.stages.order_by('order'))
+    stage_teams = {}
+    for stage_id, team_id in StageTeam.objects.filter(stage__in=stages).order_by('initial_seed', 'id').values_list('stage_id', 'team_id'):
+        stage_teams.setdefault(stage_id, []).append(team_id)
+
+    team_ids = []
+    for stage in reversed(stages):
+        team_ids.extend(team_id for team_id in stage_teams.get(stage.pk, []) if team_id not in team_ids)
+    index = {team_id: i for i, team_id in enumerate(team_ids)}
+    strengths = len(team_ids) + 1 - np.arange(1, len(team_ids) + 1, dtype=np.float64)
+    for team_id, value in (strengths_by_team or {}).items():
+        if team_id in index:
+            strengths[index[team_id]] = value
+
+    swiss = []
+    playoff = None
+    for stage in stages:
+        existing = stage_teams.get(stage.pk, [])
+        if stage.type == 'SWISS':
+            promoted = 0
+            if swiss:
+                previous = swiss[-1]
+                previous_known = {team_ids[i] for i in previous.teams}
+                qualifiers = (len(previous.teams) + previous.promoted) // 2
+                promoted = qualifiers - sum(team_id in previous_known for team_id in existing)
+            if promoted:
+                state = SwissState.empty(list(range(1, len(existing) + promoted + 1)))
+                swiss.append(SwissStagePlan(stage.pk, stage.name, state, [index[t] for t in existing], promoted))
+            else:
+                state, _ = load_stage_state(stage)
+                swiss.append(SwissStagePlan(stage.pk, stage.name, state, [index[t] for t in state.team_ids]))
+        elif stage.type == 'PLAYOFF':
+            fixed = [index[t] for t in existing] if len(existing) == PLAYOFF_TEAMS else []
+            if not fixed and (not swiss or (len(swiss[-1].teams) + swiss[-1].promoted) // 2 < PLAYOFF_TEAMS):
+                raise ValueError(f"La fase {stage.name} no tiene {PLAYOFF_TEAMS} equipos ni una fase suiza previa que los clasifique.")
+            results = [
+                (index[team1], index[team2], index[winner])
+                for team1, team2, winner in Match.objects.filter(stage=stage, winner__isnull=False)
+                .values_list('team1_id', 'team2_id', 'winner_id')
+                if team1 in index and team2 in index
+            ]
+            playoff = PlayoffPlan(stage.pk, stage.name, fixed, results)
+    return TournamentPlan(team_ids, strengths, swiss, playoff)
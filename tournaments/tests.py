@@ -1,3 +1,1882 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import gc
+import io
+import json
+import random
+import tempfile
+import threading
+import tracemalloc
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+
+from asgiref.sync import sync_to_async
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import fantasy_jobs
+from .admin import FantasyFinalizationJobAdmin, StageAdmin, StageTeamAdmin
+from .fantasy_jobs import _run_in_thread, get_or_create_finalization_job, launch_finalization_job, run_finalization_job
+from .fantasy_logic import (
+    calculate_phase_pick_points, classify_phase_choice, finalize_fantasy_stage_picks, get_low_seed_bonus_teams_ids, get_stage_actual_results,
+    rebuild_provisional_scores, score_phase_pick, score_phase_picks_in_bulk, score_pick_shard,
+)
+from .fantasy_projection import project_phase_picks
+from .leaderboard import leaderboard_page, refresh_leaderboard, refresh_stage_leaderboard, refresh_tournament_leaderboard, sync_leaderboard_entry
+from .models import (
+    Tournament, Team, Stage, StageTeam, Match, UserProfile, FantasyPhasePick, FantasyFinalizationJob, FantasyPlayoffPick,
+    LeaderboardEntry, PhasePickProjection, ProvisionalPhaseScore, RoleFeasibility, ScopedLeaderboardEntry, SortedLeaderboardEntry,
+)
+from .results import rebuild_stage_records, record_match_winner
+from .feasibility import compute_role_feasibility, refresh_role_feasibility, stage_role_feasibility
+from .pick_counts import rebuild_pick_counts, stage_pick_counts
+from .pick_optimizer import optimal_phase_pick
+from .serializers import StageFacts, prefetch_profile_picks
+from .profile_cache import cache_profile, profile_cache_stats, profile_dependencies, read_generations
+from .live import LocalBroadcaster, LiveEvent, RESYNC, SUBSCRIBER_QUEUE_SIZE, get_broadcaster, stream_tournament_events
+from .snapshot import bump_tournament_version, resolve_tournament_slug
+from .swiss import SwissState, buchholz_scores, first_round_pairings, next_round_pairings
+from .swiss import exact, montecarlo
+from .swiss.loader import load_stage_state
+from .swiss.projection import load_tournament_plan, simulate_tournament
+
+
+def create_tournament(name="Test Major", is_live=True):
+    return Tournament.objects.create(
+        name=name,
+        start_date=datetime.date(2025, 6, 1),
+        end_date=datetime.date(2025, 6, 22),
+        location="Austin",
+        is_live=is_live,
+    )
+
+
+def create_swiss_stage(tournament, order, num_teams=16, name=None, teams=None):
+    stage = Stage.objects.create(tournament=tournament, name=name or f"Stage {order}", type='SWISS', order=order)
+    if teams is None:
+        teams = [Team.objects.create(name=f"Team {order}-{i}", region='EU') for i in range(num_teams)]
+    for seed, team in enumerate(teams, start=1):
+        StageTeam.objects.create(stage=stage, team=team, initial_seed=seed)
+    return stage, teams
+
+
+def create_round(stage, round_number, pairs, status='FINISHED'):
+    """Crea un partido por pareja (team1 gana si status es FINISHED)."""
+    matches = []
+    for team1, team2 in pairs:
+        matches.append(Match.objects.create(
+            stage=stage, round_number=round_number, team1=team1, team2=team2, format='BO1',
+            status=status, winner=team1 if status == 'FINISHED' else None,
+        ))
+    return matches
+
+
+class MajorDataSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.tournament = create_tournament()
+
+    def _count_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('tournament-data'))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response.json()
+
+    def test_payload_structure(self):
+        stage, teams = create_swiss_stage(self.tournament, 1, num_teams=4)
+        create_round(stage, 1, [(teams[0], teams[2]), (teams[1], teams[3])])
+        create_round(stage, 2, [(teams[0], teams[1])], status='LIVE')
+
+        _, data = self._count_queries()
+        phase = data["stages"]["phase1"]
+        self.assertEqual([t["seed"] for t in phase["teams"]], [1, 2, 3, 4])
+        self.assertEqual([r["status"] for r in phase["rounds"]], ['completed', 'active'])
+        self.assertEqual(phase["rounds"][0]["matches"][0]["winner"], teams[0].id)
+        self.assertEqual(data["currentStage"], "phase1")
+        self.assertEqual(data["currentRound"], 2)
+
+    def test_query_count_is_flat_in_stages_and_rounds(self):
+        stage, teams = create_swiss_stage(self.tournament, 1)
+        create_round(stage, 1, [(teams[i], teams[i + 8]) for i in range(8)])
+        baseline, _ = self._count_queries()
+        cache.clear()
+
+        for order in (2, 3):
+            stage, teams = create_swiss_stage(self.tournament, order)
+            for round_number in range(1, 4):
+                create_round(stage, round_number, [(teams[i], teams[i + 8]) for i in range(8)])
+        cache.clear()
+        num_queries, data = self._count_queries()
+
+        self.assertEqual(num_queries, baseline)
+        self.assertEqual(len(data["stages"]), 3)
+        self.assertEqual(len(data["stages"]["phase3"]["rounds"]), 3)
+
+
+class MajorDataCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.tournament = create_tournament()
+        self.stage, self.teams = create_swiss_stage(self.tournament, 1, num_teams=4)
+        self.matches = create_round(self.stage, 1, [(self.teams[0], self.teams[2]), (self.teams[1], self.teams[3])], status='PENDING')
+
+    def _get(self, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('tournament-data'), params)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response.json()
+
+    def _assert_served_from_cache(self):
+        self._get()
+        # Solo la consulta de la versión: el payload sale de la caché
+        num_queries, data = self._get()
+        self.assertEqual(num_queries, 1)
+        num_queries, _ = self._get(slug=self.tournament.slug)
+        self.assertEqual(num_queries, 1)
+        return data
+
+    def test_reads_are_served_from_cache_until_a_write(self):
+        self._assert_served_from_cache()
+        version_before = Tournament.objects.get(pk=self.tournament.pk).data_version
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('update-match'), json.dumps({
+                'currentStageIdFromPage': 'phase1', 'roundIndex': 0, 'matchIndex': 0, 'winnerId': self.teams[2].id,
+            }), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+        self.assertGreater(Tournament.objects.get(pk=self.tournament.pk).data_version, version_before)
+        _, data = self._get()
+        self.assertEqual(data["stages"]["phase1"]["rounds"][0]["matches"][0]["winner"], self.teams[2].id)
+        self._assert_served_from_cache()
+
+    def test_bump_from_another_process_is_seen_on_next_read(self):
+        self._assert_served_from_cache()
+        # Como una escritura de otro proceso (p. ej. update_hltv_matches): cambia la BD, no esta caché
+        Match.objects.filter(pk=self.matches[0].pk).update(winner=self.teams[2], status='FINISHED')
+        Tournament.objects.filter(pk=self.tournament.pk).update(data_version=F('data_version') + 1)
+        _, data = self._get()
+        self.assertEqual(data["stages"]["phase1"]["rounds"][0]["matches"][0]["winner"], self.teams[2].id)
+
+    def test_admin_status_action_invalidates_snapshot(self):
+        admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(admin_user)
+        self._assert_served_from_cache()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('admin:tournaments_match_changelist'), {
+                'action': 'mark_as_live', '_selected_action': [self.matches[1].id],
+            })
+        _, data = self._get()
+        self.assertEqual(data["stages"]["phase1"]["rounds"][0]["matches"][1]["status"], 'LIVE')
+
+    def test_stage_team_admin_edit_invalidates_snapshot(self):
+        self._assert_served_from_cache()
+        stage_team = StageTeam.objects.get(stage=self.stage, team=self.teams[0])
+        stage_team.wins = 2
+        with self.captureOnCommitCallbacks(execute=True):
+            StageTeamAdmin(StageTeam, admin.site).save_model(None, stage_team, None, True)
+        _, data = self._get()
+        self.assertEqual(data["stages"]["phase1"]["teams"][0]["wins"], 2)
+
+    def test_tournament_edit_never_moves_version_backwards(self):
+        stale_instance = Tournament.objects.get(pk=self.tournament.pk)
+        bump_tournament_version(self.tournament.pk)
+        bump_tournament_version(self.tournament.pk)
+        current = Tournament.objects.get(pk=self.tournament.pk).data_version
+
+        stale_instance.name = "Renamed Major"
+        with self.captureOnCommitCallbacks(execute=True):
+            stale_instance.save()
+        self.assertEqual(Tournament.objects.get(pk=self.tournament.pk).data_version, current + 1)
+        _, data = self._get()
+        self.assertEqual(data["name"], "Renamed Major")
+
+    def test_tournament_save_keeps_default_save_semantics(self):
+        # update_fields se respeta tal cual: ni relee ni escribe data_version
+        self.tournament.name = "Renamed Major"
+        with self.assertNumQueries(3):  # UPDATE de name + incremento y lectura de la versión
+            self.tournament.save(update_fields=['name'])
+        self.assertEqual(self.tournament.data_version, Tournament.objects.get(pk=self.tournament.pk).data_version)
+
+        # Una fila borrada se vuelve a insertar, como con cualquier otro modelo
+        deleted = Tournament.objects.get(pk=self.tournament.pk)
+        Tournament.objects.filter(pk=deleted.pk).delete()
+        deleted.save()
+        self.assertEqual(Tournament.objects.get(pk=deleted.pk).name, "Renamed Major")
+
+    def test_changing_the_live_slug_forgets_the_cached_one(self):
+        Tournament.objects.filter(pk=self.tournament.pk).update(is_live=True)
+        self.assertEqual(resolve_tournament_slug(), self.tournament.slug)
+        tournament = Tournament.objects.get(pk=self.tournament.pk)
+        tournament.slug = 'renamed-major'
+        tournament.save(update_fields=['slug'])
+        self.assertEqual(resolve_tournament_slug(), 'renamed-major')
+
+
+class FileBasedMajorDataCacheTests(MajorDataCacheTests):
+    def setUp(self):
+        self._cache_dir = tempfile.TemporaryDirectory()
+        self._override = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': self._cache_dir.name,
+        }})
+        self._override.enable()
+        super().setUp()
+
+    def tearDown(self):
+        self._override.disable()
+        self._cache_dir.cleanup()
+        super().tearDown()
+
+
+class MajorDataConditionalRequestTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.tournament = create_tournament()
+        self.stage, self.teams = create_swiss_stage(self.tournament, 1, num_teams=4)
+        self.matches = create_round(self.stage, 1, [(self.teams[0], self.teams[2]), (self.teams[1], self.teams[3])], status='PENDING')
+
+    def _get(self, **headers):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('tournament-data'), headers=headers)
+        return len(ctx.captured_queries), response
+
+    def test_unchanged_data_answers_304_with_one_query(self):
+        _, response = self._get()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response['Cache-Control'])
+        etag = response['ETag']
+
+        num_queries, response = self._get(if_none_match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(num_queries, 1)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+        num_queries, response = self._get(if_modified_since=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(num_queries, 1)
+
+    def test_changed_data_answers_200_with_new_etag(self):
+        _, response = self._get()
+        etag = response['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('update-match'), json.dumps({
+                'currentStageIdFromPage': 'phase1', 'roundIndex': 0, 'matchIndex': 0, 'winnerId': self.teams[0].id,
+            }), content_type='application/json')
+
+        _, response = self._get(if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()["stages"]["phase1"]["rounds"][0]["matches"][0]["winner"], self.teams[0].id)
+
+    def test_deleted_match_changes_etag(self):
+        _, response = self._get()
+        etag = response['ETag']
+        # Un borrado directo no incrementa la versión ni ningún updated_at: lo detectan los conteos
+        Match.objects.filter(pk=self.matches[1].pk).delete()
+
+        _, response = self._get(if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["stages"]["phase1"]["rounds"][0]["matches"]), 1)
+
+
+class MajorDataChangesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.tournament = create_tournament()
+        self.stage, self.teams = create_swiss_stage(self.tournament, 1, num_teams=4)
+        self.matches = create_round(self.stage, 1, [(self.teams[0], self.teams[2]), (self.teams[1], self.teams[3])], status='PENDING')
+
+    def _current_version(self):
+        response = self.client.get(reverse('tournament-data'))
+        return int(response['X-Tournament-Version'])
+
+    def _changes(self, since):
+        response = self.client.get(reverse('tournament-data-changes'), {'since': since})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def _set_winner(self, match_index, winner):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('update-match'), json.dumps({
+                'currentStageIdFromPage': 'phase1', 'roundIndex': 0, 'matchIndex': match_index, 'winnerId': winner.id,
+            }), content_type='application/json')
+
+    def test_returns_only_changed_rows(self):
+        since = self._current_version()
+        self._set_winner(0, self.teams[0])
+
+        data = self._changes(since)
+        self.assertFalse(data["full"])
+        self.assertEqual(data["since"], since)
+        self.assertEqual(data["version"], self._current_version())
+        self.assertEqual([(m["stage"], m["id"], m["winner"]) for m in data["matches"]], [("phase1", self.matches[0].id, self.teams[0].id)])
+        self.assertEqual({t["id"]: (t["wins"], t["losses"]) for t in data["teams"]},
+                         {self.teams[0].id: (1, 0), self.teams[2].id: (0, 1)})
+        self.assertEqual(data["currentStage"], "phase1")
+
+    def test_same_version_is_an_empty_delta(self):
+        since = self._current_version()
+        data = self._changes(since)
+        self.assertFalse(data["full"])
+        self.assertEqual((data["matches"], data["teams"], data["rounds"]), ([], [], []))
+
+    def test_new_round_is_sent_as_changes(self):
+        self._set_winner(0, self.teams[0])
+        self._set_winner(1, self.teams[1])
+        since = self._current_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            new_matches = create_round(self.stage, 2, [(self.teams[0], self.teams[1])], status='PENDING')
+            bump_tournament_version(self.tournament.pk)
+
+        data = self._changes(since)
+        self.assertFalse(data["full"])
+        self.assertEqual([(m["id"], m["roundNumber"]) for m in data["matches"]], [(new_matches[0].id, 2)])
+        self.assertEqual([(r["roundNumber"], r["status"]) for r in data["rounds"]], [(2, 'active')])
+
+    def test_falls_back_to_full_snapshot(self):
+        since = self._current_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            create_swiss_stage(self.tournament, 2, num_teams=4)
+        data = self._changes(since)
+        self.assertTrue(data["full"])
+        self.assertIn("phase2", data["data"]["stages"])
+
+        # Versión desconocida (p. ej. expulsada de la caché)
+        data = self._changes(since - 1000)
+        self.assertTrue(data["full"])
+        self.assertEqual(data["version"], self._current_version())
+
+    def test_invalid_since(self):
+        response = self.client.get(reverse('tournament-data-changes'), {'since': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+
+class LocalBroadcasterTests(TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.broadcaster = LocalBroadcaster()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def _subscribe(self, channel='major'):
+        async def subscribe():
+            return self.broadcaster.subscribe(channel)
+        return self.loop.run_until_complete(subscribe())
+
+    def _next(self, subscription):
+        return self.loop.run_until_complete(subscription.get(timeout=1))
+
+    def test_publish_from_another_thread(self):
+        subscription = self._subscribe()
+        other = self._subscribe('other-major')
+        event = LiveEvent(1, 2, False, b'{}')
+        thread = threading.Thread(target=self.broadcaster.publish, args=('major', event))
+        thread.start()
+        thread.join()
+
+        self.assertIs(self._next(subscription), event)
+        self.assertTrue(other.queue.empty())
+        self.broadcaster.unsubscribe(subscription)
+        self.assertFalse(self.broadcaster.has_subscribers('major'))
+
+    def test_slow_subscriber_is_marked_for_resync(self):
+        subscription = self._subscribe()
+        for version in range(SUBSCRIBER_QUEUE_SIZE + 3):
+            self.broadcaster.publish('major', LiveEvent(version, version + 1, False, b'{}'))
+        self.loop.run_until_complete(asyncio.sleep(0))
+
+        self.assertLessEqual(subscription.queue.qsize(), SUBSCRIBER_QUEUE_SIZE)
+        self.assertIs(self._next(subscription), RESYNC)
+
+    def test_idle_subscribers_memory_is_flat(self):
+        subscriptions = [self._subscribe() for _ in range(2000)]
+        body = json.dumps({"matches": [{"id": i, "status": "LIVE"} for i in range(16)]}).encode()
+
+        def publish_many(count):
+            for version in range(count):
+                self.broadcaster.publish('major', LiveEvent(version, version + 1, False, body))
+                self.loop.run_until_complete(asyncio.sleep(0))
+            gc.collect()
+            return tracemalloc.get_traced_memory()[0]
+
+        tracemalloc.start()
+        try:
+            after_few = publish_many(SUBSCRIBER_QUEUE_SIZE * 2)
+            after_many = publish_many(SUBSCRIBER_QUEUE_SIZE * 20)
+        finally:
+            tracemalloc.stop()
+
+        # Las colas están acotadas y los eventos comparten el mismo body: la memoria no crece con los eventos
+        self.assertLess(after_many - after_few, 64 * 1024)
+        self.assertEqual(self.broadcaster.subscriber_count('major'), len(subscriptions))
+
+
+class LiveStreamTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        get_broadcaster.cache_clear()
+        self.tournament = create_tournament()
+        self.stage, self.teams = create_swiss_stage(self.tournament, 1, num_teams=4)
+        self.matches = create_round(self.stage, 1, [(self.teams[0], self.teams[2]), (self.teams[1], self.teams[3])], status='PENDING')
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+        get_broadcaster.cache_clear()
+
+    def _subscribe(self):
+        async def subscribe():
+            return get_broadcaster().subscribe(self.tournament.slug)
+        return self.loop.run_until_complete(subscribe())
+
+    def _set_winner(self, match_index, winner):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('update-match'), json.dumps({
+                'currentStageIdFromPage': 'phase1', 'roundIndex': 0, 'matchIndex': match_index, 'winnerId': winner.id,
+            }), content_type='application/json')
+
+    def test_change_is_published_once_to_every_subscriber(self):
+        response = self.client.get(reverse('tournament-data'))
+        subscriptions = [self._subscribe() for _ in range(50)]
+        # Versión base que fija el primer stream al conectarse
+        get_broadcaster().last_published[self.tournament.slug] = int(response['X-Tournament-Version'])
+
+        with CaptureQueriesContext(connection) as ctx:
+            self._set_winner(0, self.teams[0])
+        queries_with_subscribers = len(ctx.captured_queries)
+        events = [self.loop.run_until_complete(s.get(timeout=1)) for s in subscriptions]
+
+        self.assertTrue(all(event is events[0] for event in events))
+        data = json.loads(events[0].body)
+        self.assertEqual([m["winner"] for m in data["matches"]], [self.teams[0].id])
+
+        # Sin suscriptores no se calcula ningún delta
+        for subscription in subscriptions:
+            get_broadcaster().unsubscribe(subscription)
+        with CaptureQueriesContext(connection) as ctx:
+            self._set_winner(1, self.teams[1])
+        self.assertLess(len(ctx.captured_queries), queries_with_subscribers)
+
+    async def test_stream_starts_with_snapshot_and_follows_changes(self):
+        response = await self.async_client.get(reverse('tournament-data-stream'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = response.streaming_content
+
+        first = await stream.__anext__()
+        self.assertTrue(first.startswith(b'id: '))
+        self.assertIn(b'event: snapshot', first)
+        version = int(first.split(b'\n')[0][4:])
+
+        await sync_to_async(self._set_winner)(0, self.teams[0])
+        second = await asyncio.wait_for(stream.__anext__(), 1)
+        self.assertIn(b'event: changes', second)
+        payload = json.loads(second.split(b'data: ', 1)[1])
+        self.assertEqual(payload["since"], version)
+        self.assertEqual([m["winner"] for m in payload["matches"]], [self.teams[0].id])
+        await stream.aclose()
+
+    async def test_stream_polls_changes_made_by_another_process(self):
+        events = stream_tournament_events(self.tournament.slug)
+        first = await events.__anext__()
+        version = int(first.split(b'\n')[0][4:])
+
+        def write_from_another_process():
+            # Como update_hltv_matches: cambia la BD y la versión sin pasar por el broadcaster de este proceso
+            Match.objects.filter(pk=self.matches[0].pk).update(winner=self.teams[0], status='FINISHED')
+            Tournament.objects.filter(pk=self.tournament.pk).update(data_version=F('data_version') + 1)
+        await sync_to_async(write_from_another_process)()
+
+        with mock.patch('tournaments.live.POLL_SECONDS', 0.01):
+            second = await asyncio.wait_for(events.__anext__(), 1)
+        self.assertIn(b'event: changes', second)
+        payload = json.loads(second.split(b'data: ', 1)[1])
+        self.assertEqual(payload["since"], version)
+        self.assertEqual([m["winner"] for m in payload["matches"]], [self.teams[0].id])
+        await events.aclose()
+
+    async def test_closing_the_stream_unsubscribes(self):
+        events = stream_tournament_events(self.tournament.slug)
+        self.assertIn(b'event: snapshot', await events.__anext__())
+        self.assertTrue(get_broadcaster().has_subscribers(self.tournament.slug))
+        await events.aclose()
+        self.assertFalse(get_broadcaster().has_subscribers(self.tournament.slug))
+
+    def test_stream_for_unknown_tournament(self):
+        response = self.client.get(reverse('tournament-data-stream'), {'slug': 'missing'})
+        self.assertEqual(response.status_code, 404)
+
+
+class SwissEngineTests(SimpleTestCase):
+    def test_first_round_pairs_top_half_against_bottom_half(self):
+        seeds = [3, 1, 4, 2]
+        self.assertEqual(first_round_pairings(seeds), [(1, 0, False), (3, 2, False)])
+        self.assertEqual(first_round_pairings(list(range(1, 17)))[0], (0, 8, False))
+
+    def test_buchholz_only_counts_decided_matches(self):
+        state = SwissState.empty([1, 2, 3, 4])
+        state.record_result(0, 2)
+        state.record_result(1, 3)
+        state.record_result(0, 1)
+        state.add_match(2, 3)  # Pendiente: no cuenta
+        # Récords: 0 (2-0), 1 (1-1), 2 (0-1), 3 (0-1)
+        self.assertEqual(state.buchholz(), [-1, 1, 2, 0])
+        self.assertEqual(buchholz_scores(state.wins, state.losses, state.played), state.buchholz())
+
+    def test_best_seed_plays_worst_seed_avoiding_rematches(self):
+        wins, losses, seeds, buchholz = [1] * 4, [0] * 4, [1, 2, 3, 4], [0] * 4
+        self.assertEqual(next_round_pairings(wins, losses, seeds, [0, 0, 0, 0], buchholz), [(0, 3, False), (1, 2, False)])
+
+        opponents = [1 << 3, 0, 0, 1 << 0]  # 0 y 3 ya se enfrentaron
+        self.assertEqual(next_round_pairings(wins, losses, seeds, opponents, buchholz), [(0, 2, False), (1, 3, False)])
+
+    def test_avoids_leaving_a_rematch_as_last_pair(self):
+        opponents = [0, 1 << 2, 1 << 1, 0]  # 1 y 2 ya se enfrentaron
+        pairings = next_round_pairings([1] * 4, [0] * 4, [1, 2, 3, 4], opponents, [0] * 4)
+        self.assertEqual(pairings, [(0, 2, False), (1, 3, False)])
+
+    def test_decider_matches_are_bo3_and_finished_teams_sit_out(self):
+        wins, losses = [2, 2, 3, 0, 1, 1], [0, 0, 0, 3, 2, 2]
+        pairings = next_round_pairings(wins, losses, [1, 2, 3, 4, 5, 6], [0] * 6, [0] * 6)
+        self.assertEqual(pairings, [(0, 1, True), (4, 5, True)])
+
+    def test_full_stage_ends_with_eight_qualified(self):
+        state = SwissState.empty(list(range(1, 17)))
+        rounds = 0
+        while not state.is_finished():
+            for team1, team2, _ in state.next_round_pairings():
+                state.record_result(min(team1, team2), max(team1, team2))
+            rounds += 1
+        self.assertEqual(rounds, 5)
+        self.assertEqual(sum(w == 3 for w in state.wins), 8)
+        self.assertEqual(sum(l == 3 for l in state.losses), 8)
+        self.assertTrue(all(bin(mask).count('1') == w + l for mask, w, l in zip(state.opponents, state.wins, state.losses)))
+
+
+class SwissMonteCarloTests(SimpleTestCase):
+    def _random_states(self, n, count, rng):
+        states = []
+        for _ in range(count):
+            state = SwissState.empty(list(range(1, n + 1)))
+            for _ in range(rng.randint(1, 4)):
+                for team1, team2, _ in state.next_round_pairings():
+                    state.record_result(*((team1, team2) if rng.random() < 0.5 else (team2, team1)))
+            states.append(state)
+        return states
+
+    def test_vectorized_round_matches_engine(self):
+        rng = random.Random(7)
+        for n in (8, 12, 16):
+            states = self._random_states(n, 300, rng)
+            batch = montecarlo._Batch(states[0], len(states))
+            for i, state in enumerate(states):
+                batch.wins[i], batch.losses[i] = state.wins, state.losses
+                batch.opponents[i], batch.played[i] = state.opponents, state.played
+                batch.buchholz[i] = state.buchholz()
+
+            sims, team1, team2, is_bo3 = montecarlo._pair_round(batch)
+            pairings = {}
+            for sim, a, b, bo3 in zip(sims.tolist(), team1.tolist(), team2.tolist(), is_bo3.tolist()):
+                pairings.setdefault(sim, set()).add((a, b, bool(bo3)))
+            for i, state in enumerate(states):
+                self.assertEqual(pairings.get(i, set()), set(state.next_round_pairings()))
+
+            # Tras jugar la ronda, el Buchholz incremental coincide con el recalculado
+            probabilities = montecarlo.win_probability_matrix(montecarlo.seed_strengths(states[0].seeds))
+            batch.play(sims, team1, team2, is_bo3, probabilities, np.random.default_rng(0))
+            for i in range(len(states)):
+                self.assertEqual(batch.buchholz[i].tolist(), buchholz_scores(
+                    batch.wins[i].tolist(), batch.losses[i].tolist(), batch.played[i].tolist()))
+
+    def test_uniform_record_groups_match_engine(self):
+        # Mismas rondas jugadas en todas las simulaciones: mismos grupos de récord (camino rápido)
+        rng = random.Random(3)
+        for rounds in (1, 2, 3, 4):
+            states = []
+            for _ in range(200):
+                state = SwissState.empty(list(range(1, 17)))
+                for _ in range(rounds):
+                    for team1, team2, _ in state.next_round_pairings():
+                        state.record_result(*((team1, team2) if rng.random() < 0.5 else (team2, team1)))
+                states.append(state)
+            batch = montecarlo._Batch(states[0], len(states))
+            for i, state in enumerate(states):
+                batch.wins[i], batch.losses[i] = state.wins, state.losses
+                batch.opponents[i], batch.played[i] = state.opponents, state.played
+                batch.buchholz[i] = state.buchholz()
+            sims, team1, team2, is_bo3 = montecarlo._pair_round(batch)
+            pairings = {}
+            for sim, a, b, bo3 in zip(sims.tolist(), team1.tolist(), team2.tolist(), is_bo3.tolist()):
+                pairings.setdefault(sim, set()).add((a, b, bool(bo3)))
+            for i, state in enumerate(states):
+                self.assertEqual(pairings.get(i, set()), set(state.next_round_pairings()))
+
+    def test_record_distribution_is_consistent(self):
+        result = montecarlo.simulate_swiss_stage(SwissState.empty(list(range(1, 17))), 5000, rng=1)
+        self.assertEqual(result.record_counts.sum(), 16 * 5000)
+        # En cada simulación hay exactamente dos 3-0, ocho clasificados y dos 0-3
+        self.assertEqual(result.record_counts[:, 0].sum(), 2 * 5000)
+        self.assertEqual(result.record_counts[:, :3].sum(), 8 * 5000)
+        self.assertEqual(result.record_counts[:, -1].sum(), 2 * 5000)
+        advance = result.qualification_probabilities()['advance']
+        self.assertGreater(advance[0], advance[15])
+
+    def test_decisive_strengths_reproduce_seed_wins_rule(self):
+        # Con fuerzas muy separadas el mejor seed gana siempre, como en simulateRoundResults
+        state = SwissState.empty(list(range(1, 17)))
+        expected = state.copy()
+        while not expected.is_finished():
+            for team1, team2, _ in expected.next_round_pairings():
+                expected.record_result(min(team1, team2), max(team1, team2))
+
+        strengths = [1e6 ** (16 - i) for i in range(16)]
+        result = montecarlo.simulate_swiss_stage(state, 50, strengths=strengths, rng=0)
+        records = [montecarlo.FINAL_RECORDS.index(record) for record in zip(expected.wins, expected.losses)]
+        self.assertEqual(result.record_counts.argmax(axis=1).tolist(), records)
+        self.assertTrue((result.record_counts.max(axis=1) == 50).all())
+
+
+class SwissExactTests(SimpleTestCase):
+    def _state_after(self, rounds, rng):
+        state = SwissState.empty(list(range(1, 17)))
+        for _ in range(rounds):
+            for team1, team2, _ in state.next_round_pairings():
+                state.record_result(*((team1, team2) if rng.random() < 0.5 else (team2, team1)))
+        return state
+
+    def test_matches_naive_enumeration(self):
+        rng = random.Random(5)
+        for rounds in (3, 4):
+            state = self._state_after(rounds, rng)
+            strengths = [rng.uniform(1, 10) for _ in range(16)]
+            result = exact.exact_swiss_stage(state, strengths=strengths)
+            np.testing.assert_allclose(result.record_probabilities, exact.naive_swiss_probabilities(state, strengths), atol=1e-12)
+            np.testing.assert_allclose(result.record_probabilities.sum(axis=1), 1)
+
+    def test_plays_pending_matches_first(self):
+        state = self._state_after(3, random.Random(1))
+        pairings = state.next_round_pairings()
+        state.schedule(*pairings[0])
+        result = exact.exact_swiss_stage(state)
+        np.testing.assert_allclose(result.record_probabilities, exact.naive_swiss_probabilities(state), atol=1e-12)
+
+    def test_agrees_with_monte_carlo(self):
+        state = self._state_after(2, random.Random(3))
+        result = exact.exact_swiss_stage(state)
+        simulated = montecarlo.simulate_swiss_stage(state, 20000, rng=0)
+        np.testing.assert_allclose(simulated.probabilities(), result.record_probabilities, atol=0.02)
+
+    def test_refuses_early_rounds(self):
+        with self.assertRaises(exact.TooManyStates):
+            exact.exact_swiss_stage(SwissState.empty(list(range(1, 17))))
+
+
+class TournamentProjectionTests(TestCase):
+    def setUp(self):
+        self.tournament = create_tournament()
+        self.stage1, self.teams1 = create_swiss_stage(self.tournament, 1)
+        self.stage2, self.invited = create_swiss_stage(self.tournament, 2, num_teams=8)
+        self.playoffs = Stage.objects.create(tournament=self.tournament, name="Playoffs", type='PLAYOFF', order=3)
+
+    def test_promotes_qualifiers_through_every_stage(self):
+        plan = load_tournament_plan(self.tournament)
+        self.assertEqual([(len(stage.teams), stage.promoted) for stage in plan.swiss], [(16, 0), (8, 8)])
+        # Los invitados a la fase 2 son los mejor valorados por defecto
+        self.assertEqual(plan.team_ids[:8], [team.id for team in self.invited])
+
+        projection = simulate_tournament(plan, 3000, seed=7, chunk_size=1000)
+        self.assertEqual(projection.champion.sum(), 3000)
+        self.assertEqual(projection.final.sum(), 2 * 3000)
+        self.assertEqual(projection.stage_advance.sum(axis=1).tolist(), [8 * 3000, 8 * 3000])
+        self.assertEqual(projection.playoff_seeds.sum(axis=0).tolist(), [3000] * 8)
+
+        teams = {team['team_id']: team for team in projection.teams_payload()}
+        self.assertTrue(all(teams[team.id]['stages'][self.stage1.id] == 0 for team in self.invited))
+        self.assertGreater(teams[self.invited[0].id]['champion'], teams[self.teams1[-1].id]['champion'])
+
+    def test_results_do_not_depend_on_worker_count(self):
+        plan = load_tournament_plan(self.tournament)
+        single = simulate_tournament(plan, 2000, workers=1, seed=3, chunk_size=500)
+        parallel = simulate_tournament(plan, 2000, workers=2, seed=3, chunk_size=500)
+        self.assertEqual(single.champion.tolist(), parallel.champion.tolist())
+        self.assertEqual(single.playoff_seeds.tolist(), parallel.playoff_seeds.tolist())
+
+    def test_fixed_playoff_bracket_keeps_decided_matches(self):
+        for seed, team in enumerate(self.invited, start=1):
+            StageTeam.objects.create(stage=self.playoffs, team=team, initial_seed=seed)
+        # Cuarto de final 1v8 ya jugado: gana el seed 8
+        Match.objects.create(stage=self.playoffs, round_number=1, team1=self.invited[0], team2=self.invited[7],
+                             format='BO3', status='FINISHED', winner=self.invited[7])
+
+        plan = load_tournament_plan(self.tournament)
+        self.assertEqual(len(plan.playoff.teams), 8)
+        teams = {team['team_id']: team for team in simulate_tournament(plan, 1000, seed=1).teams_payload()}
+        self.assertEqual(teams[self.invited[7].id]['semifinal'], 1)
+        self.assertEqual(teams[self.invited[0].id]['semifinal'], 0)
+        self.assertEqual(teams[self.invited[0].id]['playoff_seeds'][0], 1)
+
+
+class StageProbabilitiesViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.tournament = create_tournament()
+        self.stage, self.teams = create_swiss_stage(self.tournament, 1)
+        create_round(self.stage, 1, [(self.teams[i], self.teams[i + 8]) for i in range(8)])
+        for i, stage_team in enumerate(StageTeam.objects.filter(stage=self.stage).order_by('initial_seed')):
+            stage_team.wins, stage_team.losses = (1, 0) if i < 8 else (0, 1)
+            stage_team.save()
+        self.url = reverse('stage-probabilities', args=[self.stage.id])
+
+    def test_returns_probabilities_per_team(self):
+        response = self.client.get(self.url, {'simulations': 2000, 'seed': 3})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['simulations'], 2000)
+        self.assertEqual([team['team_id'] for team in data['teams']], [team.id for team in self.teams])
+        winner, loser = data['teams'][0], data['teams'][8]
+        self.assertEqual(winner['probabilities']['0-3'], 0)
+        self.assertEqual(loser['probabilities']['3-0'], 0)
+        self.assertAlmostEqual(sum(winner['records'].values()), 1)
+        self.assertGreater(winner['probabilities']['advance'], loser['probabilities']['advance'])
+
+    def test_results_are_cached_per_version_and_params(self):
+        params = {'simulations': 500, 'seed': 1, 'strengths': f'{self.teams[15].id}:1000'}
+        first = self.client.get(self.url, params).json()
+        self.assertGreater(first['teams'][15]['probabilities']['advance'], 0.5)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(self.url, params).json(), first)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_tournament_version(self.tournament.id)
+        self.assertNotEqual(self.client.get(self.url, params).json()['version'], first['version'])
+
+    def test_exact_method(self):
+        response = self.client.get(self.url, {'method': 'exact'})
+        self.assertEqual(response.status_code, 422)
+
+        create_round(self.stage, 2, [(self.teams[i], self.teams[7 - i]) for i in range(4)] +
+                     [(self.teams[8 + i], self.teams[15 - i]) for i in range(4)])
+        for i, stage_team in enumerate(StageTeam.objects.filter(stage=self.stage).order_by('initial_seed')):
+            stage_team.wins += i in (0, 1, 2, 3, 8, 9, 10, 11)
+            stage_team.losses += i not in (0, 1, 2, 3, 8, 9, 10, 11)
+            stage_team.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_tournament_version(self.tournament.id)
+
+        data = self.client.get(self.url, {'method': 'exact'}).json()
+        self.assertEqual(data['method'], 'exact')
+        self.assertIsNone(data['simulations'])
+        self.assertEqual(data['teams'][0]['probabilities']['0-3'], 0)
+        self.assertAlmostEqual(sum(team['probabilities']['advance'] for team in data['teams']), 8)
+
+    def test_rejects_invalid_parameters(self):
+        for params in ({'method': 'guess'}, {'simulations': 0}, {'simulations': 10 ** 7}, {'seed': 'x'}, {'strengths': '1:-2'}, {'strengths': 'abc'}):
+            self.assertEqual(self.client.get(self.url, params).status_code, 400, params)
+
+        playoff = Stage.objects.create(tournament=self.tournament, name="Playoffs", type='PLAYOFF', order=2)
+        self.assertEqual(self.client.get(reverse('stage-probabilities', args=[playoff.id])).status_code, 400)
+
+
+class BuchholzRecalculationTests(TestCase):
+    def test_update_match_result_recalculates_buchholz(self):
+        tournament = create_tournament()
+        stage, teams = create_swiss_stage(tournament, 1, num_teams=4)
+        create_round(stage, 1, [(teams[0], teams[2]), (teams[1], teams[3])], status='PENDING')
+
+        for match_index, winner in ((0, teams[0]), (1, teams[1])):
+            response = self.client.post(reverse('update-match'), json.dumps({
+                'currentStageIdFromPage': 'phase1', 'roundIndex': 0, 'matchIndex': match_index, 'winnerId': winner.id,
+            }), content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+
+        scores = dict(StageTeam.objects.filter(stage=stage).values_list('team_id', 'buchholz_score'))
+        self.assertEqual(scores, {teams[0].id: -1, teams[1].id: -1, teams[2].id: 1, teams[3].id: 1})
+
+
+class MatchResultDeltaTests(TestCase):
+    def setUp(self):
+        self.tournament = create_tournament()
+        self.stage, self.teams = create_swiss_stage(self.tournament, 1, num_teams=4)
+        self.matches = create_round(self.stage, 1, [(self.teams[0], self.teams[2]), (self.teams[1], self.teams[3])], status='PENDING')
+
+    def records(self):
+        return {team_id: (wins, losses) for team_id, wins, losses in
+                StageTeam.objects.filter(stage=self.stage).values_list('team_id', 'wins', 'losses')}
+
+    def test_flipped_winner_only_touches_the_two_teams(self):
+        t0, t1, t2, t3 = self.teams
+        record_match_winner(self.stage, self.matches[0].id, t0.id)
+        untouched = dict(StageTeam.objects.filter(team__in=[t1, t3]).values_list('team_id', 'updated_at'))
+
+        with CaptureQueriesContext(connection) as queries:
+            record_match_winner(self.stage, self.matches[0].id, t2.id)
+        stage_team_updates = [q['sql'] for q in queries.captured_queries
+                              if q['sql'].startswith('UPDATE') and 'tournaments_stageteam' in q['sql']]
+
+        self.assertEqual(self.records(), {t0.id: (0, 1), t1.id: (0, 0), t2.id: (1, 0), t3.id: (0, 0)})
+        self.assertEqual(dict(StageTeam.objects.filter(team__in=[t1, t3]).values_list('team_id', 'updated_at')), untouched)
+        # Dos UPDATE con F() para W/L y un bulk_update del Buchholz de t0 y t2
+        self.assertEqual(len(stage_team_updates), 3)
+
+    def test_same_winner_is_a_noop(self):
+        record_match_winner(self.stage, self.matches[0].id, self.teams[0].id)
+        before = self.records()
+        with CaptureQueriesContext(connection) as queries:
+            record_match_winner(self.stage, self.matches[0].id, self.teams[0].id)
+        self.assertEqual(self.records(), before)
+        self.assertFalse(any('tournaments_stageteam' in q['sql'] and q['sql'].startswith('UPDATE')
+                             for q in queries.captured_queries))
+
+    def test_rebuild_repairs_corrupted_records(self):
+        t0, t1, t2, t3 = self.teams
+        record_match_winner(self.stage, self.matches[0].id, t0.id)
+        record_match_winner(self.stage, self.matches[1].id, t3.id)
+        StageTeam.objects.filter(team=t1).update(wins=2, losses=0, buchholz_score=5)
+
+        self.assertEqual(rebuild_stage_records(self.stage), 1)
+        self.assertEqual(self.records(), {t0.id: (1, 0), t1.id: (0, 1), t2.id: (0, 1), t3.id: (1, 0)})
+        self.assertEqual(StageTeam.objects.get(team=t1).buchholz_score, 1)
+        self.assertEqual(rebuild_stage_records(self.stage), 0)
+
+
+class _Rollback(Exception):
+    pass
+
+
+class FantasyPhasePicksMixin:
+    """Fase suiza terminada con 25 usuarios y picks aleatorios (algunos ya con puntos)."""
+
+    def setUp(self):
+        self.tournament = create_tournament()
+        self.stage, self.teams = create_swiss_stage(self.tournament, 1)
+        records = [(3, 0), (3, 0), (3, 1), (3, 1), (3, 1), (3, 2), (3, 2), (3, 2),
+                   (2, 3), (2, 3), (2, 3), (1, 3), (1, 3), (1, 3), (0, 3), (0, 3)]
+        # Los 3-0 y parte de los clasificados son de los peores seeds (bonus de underdog)
+        for team, (wins, losses) in zip(reversed(self.teams), records):
+            StageTeam.objects.filter(stage=self.stage, team=team).update(wins=wins, losses=losses)
+
+        rng = random.Random(7)
+        for i in range(25):
+            user = User.objects.create_user(username=f'user{i:02d}')
+            profile = UserProfile.objects.create(user=user, total_fantasy_points=rng.randrange(100))
+            # Algunos picks ya tenían puntos (recálculo)
+            pick = FantasyPhasePick.objects.create(user_profile=profile, stage=self.stage,
+                                                   points_earned=rng.choice([0, 0, 20]))
+            chosen = rng.sample(self.teams, 10)
+            pick.teams_3_0.set(chosen[:2])
+            pick.teams_advance.set(chosen[2:8])
+            pick.teams_0_3.set(chosen[8:])
+
+    def snapshot(self):
+        picks = {pick.pk: (pick.points_earned, pick.team_points_breakdown, pick.is_finalized)
+                 for pick in FantasyPhasePick.objects.filter(stage=self.stage)}
+        profiles = dict(UserProfile.objects.values_list('pk', 'total_fantasy_points'))
+        return picks, profiles
+
+    def expected_snapshot(self):
+        """Resultado del cálculo pick a pick, deshaciendo después sus escrituras."""
+        try:
+            with transaction.atomic():
+                for pick in FantasyPhasePick.objects.filter(stage=self.stage):
+                    UserProfile.objects.filter(pk=pick.user_profile_id).update(
+                        total_fantasy_points=F('total_fantasy_points') - pick.points_earned)
+                    calculate_phase_pick_points(pick.pk)
+                expected = self.snapshot()
+                raise _Rollback
+        except _Rollback:
+            return expected
+
+
+class BulkPhaseScoringTests(FantasyPhasePicksMixin, TestCase):
+    def test_bulk_scoring_matches_per_pick_scoring(self):
+        expected = self.expected_snapshot()
+        result = finalize_fantasy_stage_picks(self.stage.pk)
+        self.assertTrue(result['success'])
+        self.assertEqual(result['successful'], 25)
+        self.assertEqual(self.snapshot(), expected)
+        self.assertTrue(any(breakdown for _, breakdown, _ in expected[0].values()))
+        self.stage.refresh_from_db()
+        self.assertEqual(self.stage.fantasy_status, 'FINALIZED')
+
+    def test_query_count_does_not_grow_with_picks(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(score_phase_picks_in_bulk(self.stage, chunk_size=10), 25)
+        statements = [q['sql'] for q in queries.captured_queries if 'SAVEPOINT' not in q['sql']]
+        # Resultados de la fase (2) y, por lote, SELECT de picks, 3 tablas M2M, UPDATE de picks y
+        # UPDATE de UserProfile; el último SELECT no encuentra más picks
+        self.assertEqual(len(statements), 2 + 3 * 6 + 1)
+        self.assertFalse(FantasyPhasePick.objects.filter(stage=self.stage, is_finalized=False).exists())
+
+
+class ShardedPhaseScoringTests(FantasyPhasePicksMixin, TestCase):
+    def test_shards_score_like_the_serial_engine(self):
+        pick_ids = list(FantasyPhasePick.objects.filter(stage=self.stage).order_by('pk').values_list('pk', flat=True))
+        shards = [score_pick_shard('PHASE', self.stage.pk, pick_ids[0], pick_ids[9]),
+                  score_pick_shard('PHASE', self.stage.pk, pick_ids[10], pick_ids[-1])]
+        self.assertEqual([len(shard) for shard in shards], [10, 15])
+        # Los workers solo leen: nada queda escrito hasta que el coordinador guarda los resultados
+        self.assertFalse(FantasyPhasePick.objects.filter(stage=self.stage, is_finalized=True).exists())
+
+        expected = self.expected_snapshot()
+        sharded = {pick_id: (points, breakdown, True) for shard in shards for pick_id, _, points, breakdown in shard}
+        self.assertEqual(sharded, expected[0])
+
+
+    def test_open_transaction_falls_back_to_serial_scoring(self):
+        expected = self.expected_snapshot()
+        # TestCase envuelve cada test en una transacción: los workers no verían estos picks
+        with mock.patch('concurrent.futures.ProcessPoolExecutor') as pool:
+            self.assertEqual(score_phase_picks_in_bulk(self.stage, chunk_size=10, workers=2), 25)
+        pool.assert_not_called()
+        self.assertEqual(self.snapshot(), expected)
+
+
+# Sin transacción de test los on_commit se ejecutan al momento: nada de hilos en segundo plano
+@override_settings(FANTASY_JOBS_IN_BACKGROUND=False)
+class ParallelPhaseScoringTests(FantasyPhasePicksMixin, TransactionTestCase):
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest("Los workers necesitan una base de tests en fichero")
+        super().setUp()
+
+    def test_workers_score_like_the_serial_engine(self):
+        expected = self.expected_snapshot()
+        self.assertEqual(score_phase_picks_in_bulk(self.stage, chunk_size=10, workers=2), 25)
+        self.assertEqual(self.snapshot(), expected)
+
+
+class FantasyFinalizationJobTests(FantasyPhasePicksMixin, TestCase):
+    def test_crashed_job_resumes_without_double_counting(self):
+        expected = self.expected_snapshot()
+        job = get_or_create_finalization_job(self.stage, chunk_size=10)
+        real_score = fantasy_jobs.score_phase_picks_in_bulk
+
+        def crash_on_second_chunk(stage, chunk_size, after_pk, on_chunk, workers):
+            def checkpoint(last_pk, count):
+                on_chunk(last_pk, count)
+                if job.processed_picks > chunk_size:
+                    raise RuntimeError("proceso interrumpido")
+            return real_score(stage, chunk_size, after_pk, checkpoint, workers)
+
+        with mock.patch.object(fantasy_jobs, 'score_phase_picks_in_bulk', crash_on_second_chunk):
+            with self.assertRaises(RuntimeError):
+                run_finalization_job(job)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed_picks, job.total_picks), ('FAILED', 10, 25))
+        self.assertEqual(FantasyPhasePick.objects.filter(stage=self.stage, is_finalized=True).count(), 10)
+
+        resumed = get_or_create_finalization_job(self.stage)
+        self.assertEqual(resumed.pk, job.pk)
+        run_finalization_job(resumed)
+        resumed.refresh_from_db()
+        self.assertEqual((resumed.status, resumed.processed_picks, resumed.total_picks), ('COMPLETED', 25, 25))
+        self.assertEqual(self.snapshot(), expected)
+        self.stage.refresh_from_db()
+        self.assertEqual(self.stage.fantasy_status, 'FINALIZED')
+
+    def test_command_reports_progress(self):
+        out = io.StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('process_fantasy_results', stage_id=self.stage.pk, chunk_size=10, stdout=out)
+        output = out.getvalue()
+        self.assertIn('10/25 (40%)', output)
+        self.assertIn('25/25 picks', output)
+        self.assertIn('picks/s', output)
+
+    @override_settings(FANTASY_JOBS_IN_BACKGROUND=False)
+    def test_admin_action_runs_finalization_job(self):
+        Stage.objects.filter(pk=self.stage.pk).update(fantasy_status='LOCKED')
+        stage_admin = StageAdmin(Stage, admin.site)
+        stage_admin.message_user = mock.Mock()
+        stage_admin.finalize_all_fantasy_picks_for_stage(None, Stage.objects.filter(pk=self.stage.pk))
+
+        job = FantasyFinalizationJob.objects.get(stage=self.stage)
+        self.assertEqual((job.kind, job.status, job.processed_picks), ('PHASE', 'COMPLETED', 25))
+        self.assertFalse(FantasyPhasePick.objects.filter(stage=self.stage, is_finalized=False).exists())
+        self.assertEqual(FantasyFinalizationJobAdmin(FantasyFinalizationJob, admin.site).progress(job), '25/25 (100%)')
+
+    @override_settings(FANTASY_JOBS_IN_BACKGROUND=False)
+    def test_admin_action_reports_a_failed_job(self):
+        Stage.objects.filter(pk=self.stage.pk).update(fantasy_status='LOCKED')
+        stage_admin = StageAdmin(Stage, admin.site)
+        stage_admin.message_user = mock.Mock()
+        with mock.patch('tournaments.fantasy_jobs.score_phase_picks_in_bulk', side_effect=RuntimeError('sin conexión')):
+            stage_admin.finalize_all_fantasy_picks_for_stage(None, Stage.objects.filter(pk=self.stage.pk))
+
+        job = FantasyFinalizationJob.objects.get(stage=self.stage)
+        self.assertEqual((job.status, job.error), ('FAILED', 'sin conexión'))
+        messages = [(call.args[1], call.kwargs.get('level')) for call in stage_admin.message_user.call_args_list]
+        self.assertIn('sin conexión', messages[0][0])
+        self.assertEqual(messages[0][1], 'error')
+        self.assertFalse(any('lanzado' in message for message, _ in messages))
+
+    def test_background_job_errors_are_logged(self):
+        # También los que no llegan a guardarse en el job (aquí, un job que no existe)
+        with mock.patch('tournaments.fantasy_jobs.connection'), \
+                self.assertLogs('tournaments.fantasy_jobs', level='ERROR') as logs:
+            _run_in_thread(0)
+        self.assertIn('#0', logs.output[0])
+        self.assertIn('DoesNotExist', logs.output[0])
+
+    def test_second_launch_does_not_start_the_job_twice(self):
+        job = get_or_create_finalization_job(self.stage)
+        stale = FantasyFinalizationJob.objects.get(pk=job.pk)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertTrue(launch_finalization_job(job))
+            # Otra petición que leyó el job antes de que se reclamara
+            self.assertFalse(launch_finalization_job(stale))
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(FantasyFinalizationJob.objects.get(pk=job.pk).status, 'RUNNING')
+
+    def test_dead_running_job_is_resumed_once(self):
+        job = get_or_create_finalization_job(self.stage)
+        FantasyFinalizationJob.objects.filter(pk=job.pk).update(status='RUNNING')
+        job_admin = FantasyFinalizationJobAdmin(FantasyFinalizationJob, admin.site)
+        job_admin.message_user = mock.Mock()
+        running = FantasyFinalizationJob.objects.filter(pk=job.pk)
+        stale = running.get()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertFalse(launch_finalization_job(stale))  # Sin reanudar, un RUNNING no se toca
+            job_admin.resume_jobs(None, running)
+            self.assertFalse(launch_finalization_job(stale, resume_running=True))
+        self.assertEqual(len(callbacks), 1)
+
+class ProvisionalPhaseScoreTests(FantasyPhasePicksMixin, TestCase):
+    def provisional(self):
+        return {row['pick_id']: row for row in ProvisionalPhaseScore.objects.filter(stage=self.stage)
+                .values('pick_id', 'earned_points', 'max_points', 'earned_picks', 'possible_picks', 'dead_picks')}
+
+    def test_classify_phase_choice(self):
+        self.assertEqual(classify_phase_choice('3-0', 2, 0), 'possible')
+        self.assertEqual(classify_phase_choice('3-0', 3, 0), 'earned')
+        self.assertEqual(classify_phase_choice('3-0', 2, 1), 'dead')
+        self.assertEqual(classify_phase_choice('advance', 2, 0), 'possible')
+        self.assertEqual(classify_phase_choice('advance', 3, 0), 'dead')
+        self.assertEqual(classify_phase_choice('advance', 3, 2), 'earned')
+        self.assertEqual(classify_phase_choice('advance', 2, 3), 'dead')
+        self.assertEqual(classify_phase_choice('0-3', 0, 2), 'possible')
+        self.assertEqual(classify_phase_choice('0-3', 0, 3), 'earned')
+        self.assertEqual(classify_phase_choice('0-3', 1, 2), 'dead')
+
+    def test_finished_stage_earns_the_final_points(self):
+        picks, _ = self.expected_snapshot()
+        self.assertEqual(rebuild_provisional_scores(self.stage), 25)
+        for pick_id, row in self.provisional().items():
+            self.assertEqual(round(row['earned_points']), picks[pick_id][0])
+            self.assertEqual(row['earned_points'], row['max_points'])
+            self.assertEqual((row['possible_picks'], row['earned_picks'] + row['dead_picks']), (0, 10))
+
+    def test_match_results_update_scores_incrementally(self):
+        StageTeam.objects.filter(stage=self.stage).update(wins=0, losses=0)
+        rebuild_provisional_scores(self.stage)
+        self.assertTrue(all(row['possible_picks'] == 10 and row['earned_points'] == 0 for row in self.provisional().values()))
+
+        rng = random.Random(3)
+        records = {team.id: [0, 0] for team in self.teams}
+        matches = []
+        for round_number in range(1, 6):
+            alive = [team for team in self.teams if max(records[team.id]) < 3]
+            rng.shuffle(alive)
+            for team1, team2 in zip(alive[::2], alive[1::2]):
+                match = create_round(self.stage, round_number, [(team1, team2)], status='PENDING')[0]
+                winner, loser = rng.sample([team1, team2], 2)
+                record_match_winner(self.stage, match.id, winner.id)
+                records[winner.id][0] += 1
+                records[loser.id][1] += 1
+                matches.append((match, loser))
+        # Un admin corrige un resultado ya cargado
+        match, loser = matches[-1]
+        record_match_winner(self.stage, match.id, loser.id)
+
+        incremental = self.provisional()
+        self.assertTrue(any(row['earned_points'] for row in incremental.values()))
+        rebuild_provisional_scores(self.stage)
+        self.assertEqual(incremental, self.provisional())
+
+    @override_settings(FANTASY_JOBS_IN_BACKGROUND=False)
+    def test_leaderboard_shows_live_points(self):
+        Stage.objects.filter(pk=self.stage.pk).update(fantasy_status='OPEN')
+        with self.captureOnCommitCallbacks(execute=True):
+            StageAdmin(Stage, admin.site).set_fantasy_status_locked(mock.Mock(), Stage.objects.filter(pk=self.stage.pk))
+        self.assertEqual(ProvisionalPhaseScore.objects.filter(stage=self.stage).count(), 25)
+
+        expected = {}
+        for row in ProvisionalPhaseScore.objects.filter(stage=self.stage).values('user_profile__user__username', 'earned_points'):
+            expected[row['user_profile__user__username']] = round(row['earned_points'])
+        refresh_leaderboard()
+        response = self.client.get(reverse('fantasy-leaderboard'))
+        live = {entry['username']: entry['provisional_points'] for entry in response.json()['results']}
+        self.assertEqual(live, expected)
+
+        # ?sort=live es un rango de la clasificación materializada: tamaño, rango y perfiles de la página
+        with self.assertNumQueries(3):
+            data = self.client.get(reverse('fantasy-leaderboard'), {'sort': 'live'}).json()
+        ordered = sorted(ProvisionalPhaseScore.objects.values_list('earned_points', 'user_profile_id', 'user_profile__user__username'),
+                         key=lambda row: (-row[0], row[1]))
+        self.assertEqual(data['count'], 25)
+        self.assertEqual([(row['username'], row['provisional_points']) for row in data['results']],
+                         [(username, round(points)) for points, _, username in ordered])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            StageAdmin(Stage, admin.site).set_fantasy_status_open(mock.Mock(), Stage.objects.filter(pk=self.stage.pk))
+        response = self.client.get(reverse('fantasy-leaderboard'))
+        self.assertEqual({entry['provisional_points'] for entry in response.json()['results']}, {0})
+
+    @override_settings(FANTASY_JOBS_IN_BACKGROUND=False)
+    def test_match_results_reorder_the_live_board_after_commit(self):
+        StageTeam.objects.filter(stage=self.stage).update(wins=0, losses=0)
+        # Un resultado más decide un 3-0 y un 0-3
+        StageTeam.objects.filter(stage=self.stage, team__in=[self.teams[15], self.teams[14]]).update(wins=2)
+        StageTeam.objects.filter(stage=self.stage, team__in=[self.teams[0], self.teams[1]]).update(losses=2)
+        Stage.objects.filter(pk=self.stage.pk).update(fantasy_status='LOCKED')
+        with self.captureOnCommitCallbacks(execute=True):
+            rebuild_provisional_scores(self.stage)
+        self.assertEqual(set(SortedLeaderboardEntry.objects.filter(sort='live').values_list('points', flat=True)), {0})
+
+        matches = create_round(self.stage, 1, [(self.teams[15], self.teams[0]), (self.teams[14], self.teams[1])], status='PENDING')
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as queries:
+                for match in matches:
+                    record_match_winner(self.stage, match.id, match.team1_id)
+            # Dentro de la petición no se reordena nada: solo los UPDATE de los picks afectados
+            self.assertFalse(any('tournaments_sortedleaderboardentry' in q['sql'] for q in queries.captured_queries))
+        live = dict(ProvisionalPhaseScore.objects.values_list('user_profile_id', 'earned_points'))
+        entries = list(SortedLeaderboardEntry.objects.filter(sort='live').order_by('position').values_list('user_profile_id', 'points'))
+        self.assertEqual(entries, sorted(((profile_id, float(points)) for profile_id, points in live.items()), key=lambda row: (-row[1], row[0])))
+        self.assertGreater(entries[0][1], 0)
+
+
+class PhasePickProjectionTests(FantasyPhasePicksMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        # La fase empieza de cero: la proyección simula las cinco rondas
+        StageTeam.objects.filter(stage=self.stage).update(wins=0, losses=0)
+        Stage.objects.filter(pk=self.stage.pk).update(fantasy_status='LOCKED')
+
+    def test_matrix_projection_matches_scoring_each_simulation(self):
+        self.assertEqual(project_phase_picks(self.stage, simulations=300, rng=11), 25)
+
+        # Las mismas 300 simulaciones, puntuadas pick a pick con el cálculo definitivo
+        state, _ = load_stage_state(self.stage)
+        strengths = montecarlo.seed_strengths(state.seeds)
+        batch = montecarlo.play_swiss_stage(state, 300, montecarlo.win_probability_matrix(strengths), np.random.default_rng(11))
+        bonus_ids = get_stage_actual_results(self.stage)['low_seed_bonus']
+        simulated_results = []
+        for wins, losses in zip(batch.wins, batch.losses):
+            records = {team_id: (w, l) for team_id, w, l in zip(state.team_ids, wins, losses)}
+            simulated_results.append({
+                '3-0': {team_id for team_id, record in records.items() if record == (3, 0)},
+                'advance': {team_id for team_id, (w, l) in records.items() if w == 3 and l > 0},
+                '0-3': {team_id for team_id, record in records.items() if record == (0, 3)},
+                'low_seed_bonus': bonus_ids,
+            })
+
+        for pick in FantasyPhasePick.objects.filter(stage=self.stage).prefetch_related('teams_3_0', 'teams_advance', 'teams_0_3'):
+            choices = [{team.id for team in teams.all()} for teams in (pick.teams_3_0, pick.teams_advance, pick.teams_0_3)]
+            points = np.array([score_phase_pick(*choices, actual)[0] for actual in simulated_results])
+            projection = PhasePickProjection.objects.get(pick=pick)
+            self.assertAlmostEqual(projection.expected_points, points.mean(), places=6)
+            self.assertEqual([projection.p10_points, projection.p90_points], list(np.percentile(points, [10, 90])))
+            self.assertEqual(projection.simulations, 300)
+
+    @override_settings(FANTASY_JOBS_IN_BACKGROUND=False)
+    def test_projection_is_exposed_and_sortable(self):
+        project_phase_picks(self.stage, simulations=200, rng=5)
+        profile = UserProfile.objects.get(user__username='user03')
+        projection = PhasePickProjection.objects.get(user_profile=profile)
+
+        self.client.force_login(profile.user)
+        response = self.client.get(reverse('manage-fantasy-phase-picks', args=[self.stage.pk]))
+        self.assertEqual(response.json()['projection']['expected_points'], round(projection.expected_points, 1))
+        self.assertLessEqual(response.json()['projection']['p10_points'], response.json()['projection']['p90_points'])
+
+        # La proyección deja ordenada la columna: ?sort=projected es un rango como el global
+        self.client.logout()
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('fantasy-leaderboard'), {'sort': 'projected'})
+        projected = [entry['projected_points'] for entry in response.json()['results']]
+        self.assertEqual(projected, sorted(projected, reverse=True))
+        expected = {p.user_profile.user.username: round(p.user_profile.total_fantasy_points + p.expected_points, 1)
+                    for p in PhasePickProjection.objects.select_related('user_profile__user')}
+        self.assertEqual({entry['username']: entry['projected_points'] for entry in response.json()['results']}, expected)
+
+        # Al reabrir la fase su proyección deja de contar y la columna vuelve a los totales
+        with self.captureOnCommitCallbacks(execute=True):
+            StageAdmin(Stage, admin.site).set_fantasy_status_open(mock.Mock(), Stage.objects.filter(pk=self.stage.pk))
+        self.assertEqual(set(SortedLeaderboardEntry.objects.filter(sort='projected').values_list('user_profile_id', 'points')),
+                         set(UserProfile.objects.values_list('pk', 'total_fantasy_points')))
+
+
+class MaterializedLeaderboardTests(TestCase):
+    def setUp(self):
+        points = [50, 80, 50, 10, 80, 0, 50]
+        self.profiles = [UserProfile.objects.create(user=User.objects.create_user(username=f'player{i}'), total_fantasy_points=p)
+                         for i, p in enumerate(points)]
+
+    def test_refresh_stores_dense_rank_and_position(self):
+        self.assertEqual(refresh_leaderboard(), 7)
+        entries = [(entry.user_profile.user.username, entry.total_fantasy_points, entry.rank, entry.position)
+                   for entry in LeaderboardEntry.objects.select_related('user_profile__user').order_by('position')]
+        self.assertEqual(entries, [
+            ('player1', 80, 1, 1), ('player4', 80, 1, 2),
+            ('player0', 50, 2, 3), ('player2', 50, 2, 4), ('player6', 50, 2, 5),
+            ('player3', 10, 3, 6), ('player5', 0, 4, 7),
+        ])
+        # Una nueva reconstrucción sustituye las entradas anteriores
+        UserProfile.objects.filter(pk=self.profiles[5].pk).update(total_fantasy_points=100)
+        refresh_leaderboard()
+        self.assertEqual([(e.user_profile_id, e.rank) for e in leaderboard_page(1, page_size=2)],
+                         [(self.profiles[5].pk, 1), (self.profiles[1].pk, 2)])
+
+    @mock.patch('tournaments.api_views.LEADERBOARD_PAGE_SIZE', 3)
+    def test_pages_match_the_previous_ordering(self):
+        refresh_leaderboard()
+        ordered = list(UserProfile.objects.order_by('-total_fantasy_points', 'pk').values_list('user__username', flat=True))
+        usernames, url = [], reverse('fantasy-leaderboard')
+        while url:
+            with self.assertNumQueries(3):  # tamaño, rango de la página y perfiles de la página
+                data = self.client.get(url).json()
+            self.assertEqual(data['count'], 7)
+            usernames += [entry['username'] for entry in data['results']]
+            url = data['next']
+        self.assertEqual(usernames, ordered)
+        self.assertEqual(self.client.get(reverse('fantasy-leaderboard'), {'page': 4}).status_code, 404)
+
+    def test_around_user_window_and_percentile(self):
+        refresh_leaderboard()
+        with self.assertNumQueries(4):  # entrada del usuario, tamaño, ventana y fin de su puesto
+            data = self.client.get(reverse('fantasy-leaderboard-around', args=['player2']), {'k': 1}).json()
+        self.assertEqual((data['me']['username'], data['me']['rank'], data['me']['position']), ('player2', 2, 4))
+        self.assertEqual([row['username'] for row in data['above']], ['player0'])
+        self.assertEqual([row['username'] for row in data['below']], ['player6'])
+        # Con menos puntos que player2 (empatado con player0 y player6) solo quedan player3 y player5
+        self.assertEqual((data['count'], data['percentile']), (7, 28.57))
+
+        self.client.force_login(self.profiles[1].user)
+        data = self.client.get(reverse('fantasy-leaderboard-around-me'), {'k': 2}).json()
+        self.assertEqual(data['above'], [])
+        self.assertEqual([row['username'] for row in data['below']], ['player4', 'player0'])
+        self.assertEqual(data['percentile'], round(100 * 5 / 7, 2))
+        self.assertEqual(self.client.get(reverse('fantasy-leaderboard-around', args=['nobody'])).status_code, 404)
+
+    def test_finalization_and_current_user_rank(self):
+        stage, teams = create_swiss_stage(create_tournament(), 1)
+        StageTeam.objects.filter(stage=stage, team=teams[0]).update(wins=3, losses=0)
+        pick = FantasyPhasePick.objects.create(user_profile=self.profiles[3], stage=stage)
+        pick.teams_3_0.set([teams[0]])
+
+        finalize_fantasy_stage_picks(stage.pk)
+        self.client.force_login(self.profiles[3].user)
+        response = self.client.get(reverse('current-user-profile'))
+        self.assertEqual((response.json()['total_fantasy_points'], response.json()['rank']), (25, 3))
+
+    def test_profile_created_after_a_refresh_is_listed(self):
+        refresh_leaderboard()
+        # Empatado a 0 con el último (player5): va después por antigüedad, aunque su username sea anterior
+        user = User.objects.create_user(username='aab')
+        with CaptureQueriesContext(connection) as queries:
+            UserProfile.objects.create(user=user)
+        self.assertFalse(any(q['sql'].startswith('DELETE') for q in queries.captured_queries))
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(reverse('current-user-profile')).json()['rank'], 4)
+        data = self.client.get(reverse('fantasy-leaderboard-around-me'), {'k': 1}).json()
+        self.assertEqual((data['me']['position'], data['count']), (8, 8))
+        self.assertEqual([row['username'] for row in data['above']], ['player5'])
+        self.assertEqual(list(LeaderboardEntry.objects.values_list('user_profile', 'rank', 'position')),
+                         [(entry.user_profile_id, entry.rank, entry.position) for entry in self.rebuilt_entries()])
+
+    @override_settings(FANTASY_JOBS_IN_BACKGROUND=False)
+    def test_profile_with_more_points_waits_for_the_next_rebuild(self):
+        refresh_leaderboard()
+        with self.captureOnCommitCallbacks() as callbacks:
+            veteran = UserProfile.objects.create(user=User.objects.create_user(username='veteran'), total_fantasy_points=60)
+        # save() no reconstruye: solo programa una reconstrucción tras confirmar
+        self.assertFalse(LeaderboardEntry.objects.filter(pk=veteran.pk).exists())
+        for callback in callbacks:
+            callback()
+        ordered = list(UserProfile.objects.order_by('-total_fantasy_points', 'pk').values_list('user__username', flat=True))
+        data = self.client.get(reverse('fantasy-leaderboard'), {'page': 1}).json()
+        self.assertEqual([row['username'] for row in data['results']], ordered)
+        self.assertEqual(data['count'], 8)
+
+    def test_concurrent_new_profile_retries_the_append(self):
+        refresh_leaderboard()
+        rookie = UserProfile.objects.create(user=User.objects.create_user(username='rookie'))
+        LeaderboardEntry.objects.filter(pk=rookie.pk).delete()
+        real_create = LeaderboardEntry.objects.create
+        attempts = []
+
+        def conflict_on_first_attempt(**kwargs):
+            attempts.append(kwargs['position'])
+            if len(attempts) == 1:
+                # Otro perfil nuevo tomó la misma posición a la vez
+                raise IntegrityError("UNIQUE constraint failed: tournaments_leaderboardentry.position")
+            return real_create(**kwargs)
+        with CaptureQueriesContext(connection) as queries:
+            with mock.patch.object(LeaderboardEntry.objects, 'create', side_effect=conflict_on_first_attempt):
+                sync_leaderboard_entry(rookie)
+        self.assertEqual(attempts, [8, 8])
+        self.assertEqual(LeaderboardEntry.objects.get(pk=rookie.pk).position, 8)
+        self.assertFalse(any(q['sql'].startswith('DELETE') for q in queries.captured_queries))
+
+    @override_settings(FANTASY_JOBS_IN_BACKGROUND=False)
+    def test_saving_new_points_refreshes_the_leaderboard_after_commit(self):
+        refresh_leaderboard()
+        profile = self.profiles[5]
+        profile.total_fantasy_points = 90
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as queries:
+                profile.save()
+            self.assertFalse(any(q['sql'].startswith('DELETE') for q in queries.captured_queries))
+        data = self.client.get(reverse('fantasy-leaderboard')).json()
+        self.assertEqual((data['results'][0]['username'], data['results'][0]['total_fantasy_points']), ('player5', 90))
+        self.assertEqual(LeaderboardEntry.objects.get(pk=profile.pk).rank, 1)
+
+    def rebuilt_entries(self):
+        """Las entradas que dejaría una reconstrucción completa, deshaciéndola después."""
+        try:
+            with transaction.atomic():
+                refresh_leaderboard()
+                entries = list(LeaderboardEntry.objects.order_by('position'))
+                raise _Rollback
+        except _Rollback:
+            return entries
+
+
+class ScopedLeaderboardTests(FantasyPhasePicksMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            finalize_fantasy_stage_picks(self.stage.pk)
+
+    def expected_board(self, points_by_username):
+        ordered = sorted(points_by_username.items(), key=lambda item: (-item[1], item[0]))
+        distinct = sorted(set(points_by_username.values()), reverse=True)
+        return [(username, points, distinct.index(points) + 1) for username, points in ordered]
+
+    def test_stage_board_is_built_at_finalization(self):
+        points = dict(FantasyPhasePick.objects.filter(stage=self.stage).values_list('user_profile__user__username', 'points_earned'))
+        entries = ScopedLeaderboardEntry.objects.filter(stage=self.stage).select_related('user_profile__user').order_by('position')
+        self.assertEqual([(e.user_profile.user.username, e.points, e.rank) for e in entries], self.expected_board(points))
+        self.assertEqual([e.position for e in entries], list(range(1, 26)))
+
+        data = self.client.get(reverse('stage-fantasy-leaderboard', args=[self.stage.pk])).json()
+        self.assertEqual((data['count'], data['next']), (25, None))
+        self.assertEqual([(row['username'], row['points'], row['rank']) for row in data['results']], self.expected_board(points))
+        self.assertEqual(self.client.get(reverse('stage-fantasy-leaderboard', args=[self.stage.pk]), {'page': 2}).status_code, 404)
+
+    def test_tournament_board_adds_playoff_points(self):
+        profile = UserProfile.objects.get(user__username='user05')
+        FantasyPlayoffPick.objects.create(user_profile=profile, tournament=self.tournament, points_earned=500, is_finalized=True)
+        refresh_tournament_leaderboard(self.tournament.pk)
+
+        points = dict(FantasyPhasePick.objects.filter(stage=self.stage).values_list('user_profile__user__username', 'points_earned'))
+        points['user05'] += 500
+        response = self.client.get(reverse('tournament-fantasy-leaderboard', args=[self.tournament.pk]))
+        data = response.json()
+        self.assertEqual(data['count'], 25)
+        self.assertEqual([(row['username'], row['points'], row['rank']) for row in data['results']], self.expected_board(points))
+
+    def test_pages_are_cached_until_the_next_finalization(self):
+        url = reverse('stage-fantasy-leaderboard', args=[self.stage.pk])
+        first = self.client.get(url).json()
+        with self.assertNumQueries(1):  # solo la comprobación de que la fase existe
+            self.assertEqual(self.client.get(url).json(), first)
+
+        leader = FantasyPhasePick.objects.get(stage=self.stage, user_profile__user__username=first['results'][0]['username'])
+        FantasyPhasePick.objects.filter(pk=leader.pk).update(points_earned=999)
+        self.assertEqual(self.client.get(url).json(), first)
+        with self.captureOnCommitCallbacks(execute=True):
+            refresh_stage_leaderboard(self.stage)
+        self.assertEqual(self.client.get(url).json()['results'][0]['points'], 999)
+
+
+class PickCountTests(TestCase):
+    def setUp(self):
+        self.tournament = create_tournament()
+        self.stage, self.teams = create_swiss_stage(self.tournament, 1)
+        self.users = [User.objects.create_user(username=f'picker{i}') for i in range(6)]
+        for user in self.users:
+            UserProfile.objects.create(user=user)
+
+    def save_picks(self, user, teams):
+        self.client.force_login(user)
+        response = self.client.post(reverse('manage-fantasy-phase-picks', args=[self.stage.pk]), {
+            'teams_3_0_ids': [team.id for team in teams[:2]],
+            'teams_advance_ids': [team.id for team in teams[2:8]],
+            'teams_0_3_ids': [team.id for team in teams[8:10]],
+        }, content_type='application/json')
+        self.assertIn(response.status_code, (200, 201))
+
+    def test_saves_keep_counts_in_sync_with_the_picks(self):
+        rng = random.Random(4)
+        for user in self.users + self.users[:3]:  # los tres primeros cambian sus picks
+            self.save_picks(user, rng.sample(self.teams, 10))
+        live = stage_pick_counts(self.stage)
+        rebuild_pick_counts(self.stage)
+        self.assertEqual(live, stage_pick_counts(self.stage))
+        self.assertEqual(sum(sum(roles.values()) for roles in live.values()), 6 * 10)
+
+        response = self.client.get(reverse('stage-fantasy-info', args=[self.stage.pk]))
+        self.assertEqual(response.json()['pick_counts'], live)
+
+    def test_save_cost_does_not_depend_on_the_number_of_users(self):
+        first, second = self.teams[:10], self.teams[6:16]
+        self.save_picks(self.users[0], first)
+        self.save_picks(self.users[1], second)
+        with CaptureQueriesContext(connection) as few:
+            self.save_picks(self.users[0], second)
+        self.save_picks(self.users[0], first)
+        for user in self.users[2:]:
+            self.save_picks(user, second)
+        with CaptureQueriesContext(connection) as more:
+            self.save_picks(self.users[0], second)
+        self.assertEqual(len(few.captured_queries), len(more.captured_queries))
+        self.assertEqual(stage_pick_counts(self.stage)[str(self.teams[6].id)], {'3-0': 6})
+
+
+class PickOptimizerTests(TestCase):
+    def test_matches_brute_force(self):
+        import itertools
+        rng = random.Random(11)
+        slots = {'3-0': 1, 'advance': 2, '0-3': 1}
+        for _ in range(20):
+            values = {team_id: {category: rng.random() * 10 for category in slots} for team_id in range(7)}
+            best = max(
+                sum(values[team_id][category] for team_id, category in zip(teams, ['3-0', 'advance', 'advance', '0-3']))
+                for teams in itertools.permutations(values, 4)
+            )
+            picks, expected = optimal_phase_pick(values, slots)
+            self.assertAlmostEqual(expected, best)
+            self.assertEqual({category: len(teams) for category, teams in picks.items()}, slots)
+            self.assertAlmostEqual(sum(values[t][c] for c, teams in picks.items() for t in teams), expected)
+
+    def test_sixteen_teams_is_interactive(self):
+        import time
+        rng = random.Random(5)
+        values = {team_id: {category: rng.random() * 20 for category in ('3-0', 'advance', '0-3')} for team_id in range(16)}
+        started = time.perf_counter()
+        picks, _ = optimal_phase_pick(values)
+        self.assertLess(time.perf_counter() - started, 0.05)
+        chosen = [team_id for teams in picks.values() for team_id in teams]
+        self.assertEqual((len(picks['3-0']), len(picks['advance']), len(picks['0-3'])), (2, 6, 2))
+        self.assertEqual(len(set(chosen)), 10)
+
+    def test_endpoint_suggests_a_valid_pick(self):
+        tournament = create_tournament()
+        stage, teams = create_swiss_stage(tournament, 1)
+        for i, stage_team in enumerate(StageTeam.objects.filter(stage=stage).order_by('initial_seed')):
+            stage_team.wins, stage_team.losses = (2, 0) if i < 4 else (0, 2) if i >= 12 else (1, 1)
+            stage_team.save()
+        response = self.client.get(reverse('stage-optimal-picks', args=[stage.id]), {'simulations': 2000, 'seed': 1})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(set(data['teams_3_0_ids']) <= {team.id for team in teams[:4]})
+        self.assertTrue(set(data['teams_0_3_ids']) <= {team.id for team in teams[12:]})
+        self.assertEqual(len(set(data['teams_3_0_ids'] + data['teams_advance_ids'] + data['teams_0_3_ids'])), 10)
+        self.assertGreater(data['expected_points'], 0)
+
+        # Con las mismas probabilidades que el endpoint de probabilidades
+        probabilities = self.client.get(reverse('stage-probabilities', args=[stage.id]), {'simulations': 2000, 'seed': 1}).json()
+        self.assertEqual(probabilities['version'], data['version'])
+
+
+class StageFactsSerializerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='facts')
+        self.profile = UserProfile.objects.create(user=self.user)
+        self.client.force_login(self.user)
+
+    def swiss_queries(self, num_teams):
+        tournament = create_tournament(name=f"Major {num_teams}")
+        stage, teams = create_swiss_stage(tournament, 1, num_teams=num_teams)
+        StageTeam.objects.filter(stage=stage, team=teams[0]).update(wins=1)
+        pick = FantasyPhasePick.objects.create(user_profile=self.profile, stage=stage)
+        pick.teams_3_0.set(teams[:2])
+        pick.teams_advance.set(teams[2:num_teams - 2])
+        pick.teams_0_3.set(teams[-2:])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('stage-fantasy-info', args=[stage.pk]))
+        self.assertEqual(response.status_code, 200)
+        return len(queries.captured_queries), response.json(), teams
+
+    def test_bonus_ties_are_broken_the_same_everywhere(self):
+        tournament = create_tournament()
+        stage, teams = create_swiss_stage(tournament, 1)
+        # Seeds repetidos: el octavo puesto del bonus lo decide el desempate
+        StageTeam.objects.filter(stage=stage, team__in=teams[6:]).update(initial_seed=7)
+        expected = set(sorted(team.id for team in teams[6:])[-8:])
+        self.assertEqual(get_low_seed_bonus_teams_ids(stage), expected)
+        FantasyPhasePick.objects.create(user_profile=self.profile, stage=stage)
+        context = {}
+        prefetch_profile_picks(self.profile, context)
+        self.assertEqual(StageFacts.for_stage(context, stage).bonus_ids, expected)
+        self.assertEqual(StageFacts(stage).bonus_ids, expected)
+
+    def test_stage_info_query_count_does_not_depend_on_teams(self):
+        few, _, _ = self.swiss_queries(8)
+        many, data, teams = self.swiss_queries(16)
+        self.assertEqual(few, many)
+
+        by_id = {team['id']: team for team in data['teams']}
+        self.assertEqual(by_id[teams[0].id]['seed'], 1)
+        self.assertEqual(by_id[teams[0].id]['current_wins'], 1)
+        self.assertFalse(by_id[teams[0].id]['is_bonus_active'])
+        self.assertTrue(by_id[teams[-1].id]['is_bonus_active'])
+        zero_three = {team['id']: team for team in data['user_pick']['teams_0_3_details']}
+        self.assertFalse(zero_three[teams[-1].id]['is_bonus_active'])
+        self.assertEqual(zero_three[teams[-1].id]['seed'], 16)
+        self.assertFalse(zero_three[teams[-1].id]['is_role_impossible'])
+        three_zero = {team['id']: team for team in data['user_pick']['teams_3_0_details']}
+        self.assertFalse(three_zero[teams[0].id]['is_role_impossible'])
+
+    def test_playoff_picks_mark_eliminated_teams(self):
+        tournament = create_tournament()
+        playoffs = Stage.objects.create(tournament=tournament, name="Playoffs", type='PLAYOFF', order=3)
+        teams = [Team.objects.create(name=f"Playoff {i}", region='EU') for i in range(8)]
+        for seed, team in enumerate(teams, start=1):
+            StageTeam.objects.create(stage=playoffs, team=team, initial_seed=seed)
+        create_round(playoffs, 1, [(teams[i], teams[7 - i]) for i in range(4)])
+        create_round(playoffs, 2, [(teams[0], teams[1]), (teams[2], teams[3])], status='PENDING')
+        pick = FantasyPlayoffPick.objects.create(user_profile=self.profile, tournament=tournament, final_winner=teams[5])
+        pick.quarter_final_winners.set([teams[0], teams[1], teams[2], teams[7]])
+        pick.semi_final_winners.set([teams[0], teams[2]])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('manage-fantasy-playoff-picks', args=[tournament.pk]))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        impossible = {team['id']: team['is_role_impossible'] for team in data['quarter_final_winners_details']}
+        self.assertEqual(impossible, {teams[0].id: False, teams[1].id: False, teams[2].id: False, teams[7].id: True})
+        self.assertEqual([team['is_role_impossible'] for team in data['semi_final_winners_details']], [False, False])
+        self.assertTrue(data['final_winner_details']['is_role_impossible'])
+        self.assertEqual(data['final_winner_details']['seed'], 6)
+        # Una consulta de partidos y otra de StageTeam para toda la fase, no por equipo
+        match_queries = [q for q in queries.captured_queries if 'tournaments_match' in q['sql']]
+        self.assertEqual(len(match_queries), 1)
+
+
+class RoleFeasibilityTests(TestCase):
+    def setUp(self):
+        self.tournament = create_tournament()
+        self.playoffs = Stage.objects.create(tournament=self.tournament, name="Playoffs", type='PLAYOFF', order=3)
+        self.teams = [Team.objects.create(name=f"Playoff {i}", region='EU') for i in range(8)]
+        for seed, team in enumerate(self.teams, start=1):
+            StageTeam.objects.create(stage=self.playoffs, team=team, initial_seed=seed)
+        self.quarter_finals = create_round(self.playoffs, 1, [(self.teams[i], self.teams[7 - i]) for i in range(4)], status='PENDING')
+
+    def test_match_results_refresh_the_stored_table(self):
+        record_match_winner(self.playoffs, self.quarter_finals[0].id, self.teams[7].id)
+        stored = stage_role_feasibility(self.playoffs)
+        self.assertEqual(stored, compute_role_feasibility(self.playoffs))
+        self.assertEqual(RoleFeasibility.objects.filter(stage=self.playoffs).count(), 8 * 4)
+        self.assertEqual(stored[self.teams[0].id], {'qf_winner': False, 'sf_winner': False, 'final_winner': False, 'in_playoffs': False})
+        self.assertEqual(stored[self.teams[7].id], {'qf_winner': True, 'sf_winner': True, 'final_winner': True, 'in_playoffs': True})
+        # Con cuartos sin terminar, nadie más queda descartado
+        self.assertTrue(stored[self.teams[1].id]['qf_winner'])
+
+        for match, winner in zip(self.quarter_finals[1:], self.teams[1:4]):
+            record_match_winner(self.playoffs, match.id, winner.id)
+        semi_final = create_round(self.playoffs, 2, [(self.teams[7], self.teams[1])], status='PENDING')[0]
+        record_match_winner(self.playoffs, semi_final.id, self.teams[7].id)
+        record_match_winner(self.playoffs, semi_final.id, self.teams[1].id)  # Corrección del resultado
+        stored = stage_role_feasibility(self.playoffs)
+        self.assertEqual(stored[self.teams[7].id]['sf_winner'], False)
+        # Con la otra semifinal sin jugar (sin ganador), ganarla aún es posible
+        create_round(self.playoffs, 2, [(self.teams[2], self.teams[3])], status='PENDING')
+        refresh_role_feasibility(self.playoffs)
+        stored = stage_role_feasibility(self.playoffs)
+        self.assertEqual(stored[self.teams[2].id], {'qf_winner': True, 'sf_winner': True, 'final_winner': True, 'in_playoffs': True})
+        self.assertFalse(stored[self.teams[6].id]['sf_winner'])
+
+    def test_swiss_roles(self):
+        stage, teams = create_swiss_stage(self.tournament, 1, num_teams=4)
+        create_round(stage, 1, [(teams[0], teams[1]), (teams[2], teams[3])], status='PENDING')
+        match = Match.objects.filter(stage=stage, team1=teams[0]).get()
+        record_match_winner(stage, match.id, teams[0].id)
+        stored = stage_role_feasibility(stage)
+        self.assertEqual(stored[teams[0].id], {'3-0': True, 'advance': True, '0-3': False})
+        self.assertEqual(stored[teams[1].id], {'3-0': False, 'advance': True, '0-3': True})
+
+    def test_swiss_result_rewrites_only_the_match_teams(self):
+        stage, teams = create_swiss_stage(self.tournament, 1, num_teams=4)
+        matches = create_round(stage, 1, [(teams[0], teams[1]), (teams[2], teams[3])], status='PENDING')
+        refresh_role_feasibility(stage)
+        untouched = set(RoleFeasibility.objects.filter(stage=stage, team__in=teams[2:]).values_list('pk', flat=True))
+        record_match_winner(stage, matches[0].id, teams[1].id)
+        self.assertEqual(stage_role_feasibility(stage), compute_role_feasibility(stage))
+        self.assertEqual(set(RoleFeasibility.objects.filter(stage=stage, team__in=teams[2:]).values_list('pk', flat=True)), untouched)
+
+    def test_admin_status_actions_refresh_the_stored_table(self):
+        # Resultado escrito sin pasar por record_match_winner: la tabla guardada queda atrasada
+        Match.objects.filter(pk=self.quarter_finals[0].pk).update(winner=self.teams[7])
+        refresh_role_feasibility(self.playoffs)
+        Match.objects.filter(pk=self.quarter_finals[1].pk).update(winner=self.teams[6])
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        self.client.post(reverse('admin:tournaments_match_changelist'), {
+            'action': 'mark_as_finished', '_selected_action': [self.quarter_finals[1].id],
+        })
+        stored = stage_role_feasibility(self.playoffs)
+        self.assertEqual(stored, compute_role_feasibility(self.playoffs))
+        self.assertFalse(stored[self.teams[1].id]['qf_winner'])
+
+    def test_serializer_reads_the_stored_table(self):
+        for match, winner in zip(self.quarter_finals, self.teams[:4]):
+            record_match_winner(self.playoffs, match.id, winner.id)
+        user = User.objects.create_user(username='chips')
+        profile = UserProfile.objects.create(user=user)
+        pick = FantasyPlayoffPick.objects.create(user_profile=profile, tournament=self.tournament, final_winner=self.teams[6])
+        pick.quarter_final_winners.set(self.teams[:3] + [self.teams[7]])
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(reverse('manage-fantasy-playoff-picks', args=[self.tournament.pk])).json()
+        impossible = {team['id']: team['is_role_impossible'] for team in data['quarter_final_winners_details']}
+        self.assertEqual(impossible, {self.teams[0].id: False, self.teams[1].id: False, self.teams[2].id: False, self.teams[7].id: True})
+        self.assertTrue(data['final_winner_details']['is_role_impossible'])
+        self.assertFalse([q for q in queries.captured_queries if 'tournaments_match' in q['sql']])
+
+
+    def test_other_playoff_roles_are_impossible_only_after_a_loss(self):
+        for match, winner in zip(self.quarter_finals, self.teams[:4]):
+            record_match_winner(self.playoffs, match.id, winner.id)
+        outsider = Team.objects.create(name="Sin playoffs", region='EU')
+        facts = StageFacts(self.playoffs)
+        # Semifinales aún sin crear: los ganadores de cuartos siguen en playoffs
+        self.assertFalse(facts.is_role_impossible(self.teams[0].id, 'playoff_participant'))
+        self.assertTrue(facts.is_role_impossible(self.teams[7].id, 'playoff_participant'))
+        self.assertFalse(facts.is_role_impossible(outsider.id, 'playoff_participant'))
+
+class PublicProfilePrefetchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='streamer')
+        self.profile = UserProfile.objects.create(user=self.user)
+
+    def add_tournament(self, name, num_stages):
+        tournament = create_tournament(name=name)
+        for order in range(1, num_stages + 1):
+            stage, teams = create_swiss_stage(tournament, order)
+            create_round(stage, 1, [(teams[i], teams[15 - i]) for i in range(8)])
+            if order == 1:
+                refresh_role_feasibility(stage)  # El resto sin filas: se calculan al vuelo
+            pick = FantasyPhasePick.objects.create(user_profile=self.profile, stage=stage)
+            pick.teams_3_0.set(teams[:2])
+            pick.teams_advance.set(teams[2:8])
+            pick.teams_0_3.set(teams[-2:])
+        playoffs = Stage.objects.create(tournament=tournament, name="Playoffs", type='PLAYOFF', order=num_stages + 1)
+        for seed, team in enumerate(teams[:8], start=1):
+            StageTeam.objects.create(stage=playoffs, team=team, initial_seed=seed)
+        create_round(playoffs, 1, [(teams[i], teams[7 - i]) for i in range(4)])
+        pick = FantasyPlayoffPick.objects.create(user_profile=self.profile, tournament=tournament, final_winner=teams[0])
+        pick.quarter_final_winners.set(teams[:4])
+        pick.semi_final_winners.set(teams[:2])
+
+    def get_profile(self):
+        cache.clear()  # Se mide el renderizado, no la caché de perfiles
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('user-fantasy-profile', args=['streamer']))
+        self.assertEqual(response.status_code, 200)
+        return response.json(), len(queries.captured_queries)
+
+    def test_query_count_does_not_depend_on_the_number_of_stages(self):
+        self.add_tournament("Major 1", 1)
+        _, few = self.get_profile()
+        self.add_tournament("Major 2", 3)
+        data, many = self.get_profile()
+        self.assertEqual(few, many)
+        # Perfil + como mucho 7 del prefetch, más la de las fases de las que depende la caché
+        self.assertLessEqual(many, 9)
+        self.assertEqual(len(data['phase_picks']), 4)
+        self.assertEqual(len(data['playoff_picks']), 2)
+
+    def test_matches_per_pick_rendering(self):
+        from .serializers import FantasyPhasePickSerializer, FantasyPlayoffPickSerializer
+        self.add_tournament("Major 1", 2)
+        data, _ = self.get_profile()
+        phase_picks = FantasyPhasePick.objects.filter(user_profile=self.profile).order_by('stage__order')
+        playoff_picks = FantasyPlayoffPick.objects.filter(user_profile=self.profile)
+        self.assertEqual(data['phase_picks'], json.loads(json.dumps(FantasyPhasePickSerializer(phase_picks, many=True, context={}).data, default=str)))
+        self.assertEqual(data['playoff_picks'], json.loads(json.dumps(FantasyPlayoffPickSerializer(playoff_picks, many=True, context={}).data, default=str)))
+
+
+class ProfileCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='popular')
+        self.profile = UserProfile.objects.create(user=self.user)
+        self.tournament = create_tournament()
+        self.stage, self.teams = create_swiss_stage(self.tournament, 1)
+        self.other_stage, self.other_teams = create_swiss_stage(self.tournament, 2)
+        self.matches = create_round(self.stage, 1, [(self.teams[i], self.teams[15 - i]) for i in range(8)], status='PENDING')
+        self.other_matches = create_round(self.other_stage, 1, [(self.other_teams[i], self.other_teams[15 - i]) for i in range(8)], status='PENDING')
+        self.save_picks(self.teams[:10])
+        self.url = reverse('user-fantasy-profile', args=['popular'])
+
+    def save_picks(self, teams):
+        self.client.force_login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('manage-fantasy-phase-picks', args=[self.stage.pk]), {
+                'teams_3_0_ids': [team.id for team in teams[:2]],
+                'teams_advance_ids': [team.id for team in teams[2:8]],
+                'teams_0_3_ids': [team.id for team in teams[8:10]],
+            }, content_type='application/json')
+        self.assertIn(response.status_code, (200, 201))
+        self.client.logout()
+
+    def get(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries.captured_queries)
+
+    def test_repeated_views_are_served_from_the_cache(self):
+        first, _ = self.get()
+        second, queries = self.get()
+        self.assertEqual(first['X-Profile-Cache'], 'MISS')
+        self.assertEqual(second['X-Profile-Cache'], 'HIT')
+        self.assertEqual(queries, 0)
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(profile_cache_stats(), {'hits': 1, 'misses': 1})
+
+    def test_invalidated_by_own_picks_and_picked_stages_only(self):
+        self.get()
+        self.save_picks(self.teams[6:16])
+        response, _ = self.get()
+        self.assertEqual(response['X-Profile-Cache'], 'MISS')
+        self.assertEqual({team['id'] for team in response.json()['phase_picks'][0]['teams_3_0_details']}, {self.teams[6].id, self.teams[7].id})
+
+        # Un resultado de una fase que no eligió no lo invalida
+        with self.captureOnCommitCallbacks(execute=True):
+            record_match_winner(self.other_stage, self.other_matches[0].id, self.other_teams[0].id)
+        self.assertEqual(self.get()[0]['X-Profile-Cache'], 'HIT')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            record_match_winner(self.stage, self.matches[0].id, self.teams[15].id)
+        response, _ = self.get()
+        self.assertEqual(response['X-Profile-Cache'], 'MISS')
+        zero_three = {team['id']: team for team in response.json()['phase_picks'][0]['teams_0_3_details']}
+        self.assertTrue(zero_three[self.teams[15].id]['is_role_impossible'])
+        self.assertEqual(zero_three[self.teams[15].id]['current_wins'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.stage.fantasy_status = 'LOCKED'
+            self.stage.save()
+        self.assertEqual(self.get()[0]['X-Profile-Cache'], 'MISS')
+
+    def test_changes_while_rendering_are_not_cached(self):
+        generations = read_generations(*profile_dependencies('popular'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.stage.save()  # Llega mientras se renderiza
+        cache_profile('popular', {'stale': True}, generations)
+        self.assertEqual(self.get()[0]['X-Profile-Cache'], 'MISS')
+
+    def test_change_during_first_fill_is_not_cached(self):
+        def read_then_change(*args):
+            generations = read_generations(*args)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.stage.save()
+            return generations
+
+        with mock.patch('tournaments.api_views.read_generations', side_effect=read_then_change):
+            self.assertEqual(self.get()[0]['X-Profile-Cache'], 'MISS')
+        self.assertEqual(self.get()[0]['X-Profile-Cache'], 'MISS')
+        self.assertEqual(self.get()[0]['X-Profile-Cache'], 'HIT')
+
+    def test_evicted_generation_never_validates_a_stale_entry(self):
+        self.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            record_match_winner(self.stage, self.matches[7].id, self.teams[8].id)
+        # La generación nueva se expulsa de la caché (p. ej. por MAX_ENTRIES)
+        cache.delete(f'fantasy-profile:stage:{self.stage.pk}:generation')
+        response, _ = self.get()
+        self.assertEqual(response['X-Profile-Cache'], 'MISS')
+        zero_three = {team['id']: team for team in response.json()['phase_picks'][0]['teams_0_3_details']}
+        self.assertEqual(zero_three[self.teams[8].id]['current_wins'], 1)
+
+    def test_bulk_finalization_invalidates_profiles(self):
+        self.get()
+        profile_key = f'fantasy-profile:profile:{self.profile.pk}:generation'
+        before = cache.get(profile_key)
+        with self.captureOnCommitCallbacks(execute=True):
+            score_phase_picks_in_bulk(self.stage, chunk_size=10)
+        self.assertNotEqual(cache.get(profile_key), before)
+        response, _ = self.get()
+        self.assertEqual(response['X-Profile-Cache'], 'MISS')
+        self.assertTrue(response.json()['phase_picks'][0]['is_finalized'])
+
+
+class FastSerializerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='fast', email='fast@example.com')
+        self.profile = UserProfile.objects.create(user=self.user, twitch_username='fast_tv', total_fantasy_points=12)
+        self.tournament = create_tournament()
+        self.stage, self.teams = create_swiss_stage(self.tournament, 1)
+        StageTeam.objects.filter(stage=self.stage, team__in=self.teams[:3]).update(wins=2, losses=1)
+        pick = FantasyPhasePick.objects.create(
+            user_profile=self.profile, stage=self.stage, is_finalized=True,
+            team_points_breakdown={str(self.teams[-1].pk): 7, str(self.teams[0].pk): 3},
+        )
+        pick.teams_3_0.set([self.teams[-1], self.teams[0]])
+        pick.teams_advance.set(self.teams[2:8])
+        pick.teams_0_3.set(self.teams[8:10])
+        PhasePickProjection.objects.create(pick=pick, stage=self.stage, user_profile=self.profile, expected_points=11.26,
+                                           p10_points=4.4, p90_points=17.6, simulations=1000)
+
+        playoffs = Stage.objects.create(tournament=self.tournament, name="Playoffs", type='PLAYOFF', order=2)
+        for seed, team in enumerate(self.teams[:8], start=1):
+            StageTeam.objects.create(stage=playoffs, team=team, initial_seed=seed)
+        create_round(playoffs, 1, [(self.teams[i], self.teams[7 - i]) for i in range(4)])
+        playoff_pick = FantasyPlayoffPick.objects.create(user_profile=self.profile, tournament=self.tournament,
+                                                         final_winner=self.teams[6], team_points_breakdown={})
+        playoff_pick.quarter_final_winners.set([self.teams[3], self.teams[0], self.teams[5], self.teams[1]])
+        playoff_pick.semi_final_winners.set([self.teams[0], self.teams[1]])
+
+    def render_both(self, url):
+        with override_settings(FANTASY_FAST_SERIALIZERS=False):
+            drf = self.client.get(url)
+        with override_settings(FANTASY_FAST_SERIALIZERS=True):
+            fast = self.client.get(url)
+        self.assertEqual(drf.status_code, 200)
+        self.assertEqual(fast.status_code, 200)
+        return drf.content, fast.content
+
+    def test_fast_path_renders_identical_json(self):
+        urls = [reverse('stage-fantasy-info', args=[self.stage.pk]),
+                reverse('tournament-playoff-fantasy-info', args=[self.tournament.pk])]
+        for authenticated in (False, True):
+            if authenticated:
+                self.client.force_login(self.user)
+            for url in urls:
+                with self.subTest(url=url, authenticated=authenticated):
+                    drf, fast = self.render_both(url)
+                    self.assertEqual(drf, fast)
+
+        stage_info = json.loads(self.render_both(urls[0])[1])
+        self.assertEqual(stage_info['user_pick']['projection']['expected_points'], 11.3)
+        self.assertEqual([team['points_earned'] for team in stage_info['user_pick']['teams_3_0_details']], [3, 7])
+        playoff_info = json.loads(self.render_both(urls[1])[1])
+        self.assertEqual(playoff_info['user_pick']['final_winner_details']['id'], self.teams[6].pk)
+        self.assertTrue(playoff_info['user_pick']['final_winner_details']['is_role_impossible'])
+
+    def test_fast_path_without_pick(self):
+        FantasyPhasePick.objects.all().delete()
+        FantasyPlayoffPick.objects.all().delete()
+        self.client.force_login(self.user)
+        for url in (reverse('stage-fantasy-info', args=[self.stage.pk]),
+                    reverse('tournament-playoff-fantasy-info', args=[self.tournament.pk])):
+            drf, fast = self.render_both(url)
+            self.assertEqual(drf, fast)
+            self.assertIsNone(json.loads(fast)['user_pick'])
@@ -5,7 +5,8 @@ from .auth_views import twitch_login, twitch_callback
 from .api_views import (
     ManageFantasyPhasePicksView, StageFantasyInfoView,
     ManageFantasyPlayoffPicksView, FantasyLeaderboardView,
-    UserFantasyProfileView, CurrentUserProfileView, TournamentFantasyPlayoffInfoView
+    UserFantasyProfileView, CurrentUserProfileView, TournamentFantasyPlayoffInfoView,
+    StageProbabilitiesView, StageOptimalPicksView, ScopedLeaderboardView, LeaderboardAroundView
 )
 
 # router = DefaultRouter() # No se usa
@@ -14,6 +15,8 @@ urlpatterns = [
     # path('', include(router.urls)), # No se usa
     path('tournaments/', views.list_tournaments, name='list-tournaments'),
     path('tournament/data/', views.get_major_data, name='tournament-data'),
+    path('tournament/data/changes/', views.get_major_data_changes_since, name='tournament-data-changes'),
+    path('tournament/data/stream/', views.stream_major_data, name='tournament-data-stream'),
     path('tournament/update-match/', views.update_match_result, name='update-match'),
     
     path('auth/twitch/login/', twitch_login, name='twitch-login'),
@@ -21,12 +24,18 @@ urlpatterns = [
 
     # Fantasy API
     path('stage/<int:stage_id>/fantasy-info/', StageFantasyInfoView.as_view(), name='stage-fantasy-info'),
+    path('stage/<int:stage_id>/probabilities/', StageProbabilitiesView.as_view(), name='stage-probabilities'),
+    path('stage/<int:stage_id>/optimal-picks/', StageOptimalPicksView.as_view(), name='stage-optimal-picks'),
     path('fantasy/stage/<int:stage_id>/picks/', ManageFantasyPhasePicksView.as_view(), name='manage-fantasy-phase-picks'),
     
     path('tournament/<int:tournament_id>/playoff-fantasy-info/', TournamentFantasyPlayoffInfoView.as_view(), name='tournament-playoff-fantasy-info'),
     path('fantasy/tournament/<int:tournament_id>/playoff-picks/', ManageFantasyPlayoffPicksView.as_view(), name='manage-fantasy-playoff-picks'),
 
     path('fantasy/leaderboard/', FantasyLeaderboardView.as_view(), name='fantasy-leaderboard'),
+    path('fantasy/leaderboard/around-me/', LeaderboardAroundView.as_view(), name='fantasy-leaderboard-around-me'),
+    path('fantasy/leaderboard/around/<str:username>/', LeaderboardAroundView.as_view(), name='fantasy-leaderboard-around'),
+    path('fantasy/leaderboard/stage/<int:scope_id>/', ScopedLeaderboardView.as_view(scope='stage'), name='stage-fantasy-leaderboard'),
+    path('fantasy/leaderboard/tournament/<int:scope_id>/', ScopedLeaderboardView.as_view(scope='tournament'), name='tournament-fantasy-leaderboard'),
     path('fantasy/profile/<str:username>/', UserFantasyProfileView.as_view(), name='user-fantasy-profile'),
     path('me/', CurrentUserProfileView.as_view(), name='current-user-profile'),
 ] 
\ No newline at end of file
@@ -3,195 +3,101 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.db.models import F, Q
-from django.http import JsonResponse, HttpRequest
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, HttpRequest, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 from django.views.decorators.http import require_http_methods
 from .models import Tournament, Team, Stage, StageTeam, Match
+from .live import stream_tournament_events
+from .results import record_match_winner
+from .snapshot import (
+    resolve_tournament_slug, get_major_data_snapshot, get_major_data_validators, get_major_data_changes,
+    get_tournament_version, bump_tournament_version
+)
 import json
 
 @require_http_methods(["GET"])
 def get_major_data(request):
-    tournament_slug = request.GET.get('slug')
-    if tournament_slug:
-        try:
-            tournament = Tournament.objects.get(slug=tournament_slug)
-        except Tournament.DoesNotExist:
+    requested_slug = request.GET.get('slug')
+    tournament_slug = resolve_tournament_slug(requested_slug)
+    if not tournament_slug:
+        return JsonResponse({"error": "No live tournament found"}, status=404)
+
+    validators = None
+    if request.META.get('HTTP_IF_NONE_MATCH') or request.META.get('HTTP_IF_MODIFIED_SINCE'):
+        # Petición condicional: se revalida con una única consulta agregada y, si nada cambió,
+        # se responde 304 sin construir ni leer el payload
+        validators = get_major_data_validators(tournament_slug)
+        if validators is None:
             return JsonResponse({"error": "Tournament not found"}, status=404)
-    else:
-        tournament = Tournament.objects.filter(is_live=True).order_by('-created_at').first()
-        if not tournament:
-            return JsonResponse({"error": "No live tournament found"}, status=404)
-
-    response_data = {
-        "name": tournament.name,
-        "tournamentType": tournament.tournament_type,
-        "swissRulesType": tournament.swiss_rules_type,
-        "isLive": tournament.is_live,
-        "stages": {},
-        # currentStage y currentRound se determinarán dinámicamente más abajo
-    }
-
-    stages_ordered = tournament.stages.all().order_by('order')
-    for stage_order_idx, stage in enumerate(stages_ordered):
-        stage_key = f"phase{stage.order}"
-        
-        stage_teams_queryset = StageTeam.objects.filter(stage=stage).select_related('team').order_by('initial_seed')
-        teams_data_for_stage = []
-        for st in stage_teams_queryset:
-            teams_data_for_stage.append({
-                "id": st.team.id,
-                "name": st.team.name,
-                "logo": st.team.logo,
-                "seed": st.initial_seed,
-                "region": st.team.region,
-                "wins": st.wins,
-                "losses": st.losses,
-                "buchholzScore": st.buchholz_score,
-            })
-
-        stage_data = {
-            "id": stage.id,
-            "name": stage.name,
-            "type": stage.type,
-            "fantasyStatus": stage.fantasy_status,
-            "teams": teams_data_for_stage,
-            "rounds": [],
-            "order": stage.order
-        }
-
-        # Procesar partidos de la etapa usando la lógica proporcionada por el usuario
-        matches_in_stage = Match.objects.filter(stage=stage).select_related('team1', 'team2', 'winner').order_by('round_number', 'id')
-        
-        for match in matches_in_stage:
-            round_number = match.round_number
-            
-            # Asegurarse de que existe el array para esta ronda
-            while len(stage_data["rounds"]) < round_number:
-                stage_data["rounds"].append({
-                    "roundNumber": len(stage_data["rounds"]) + 1,
-                    "matches": [],
-                    "status": "pending" # Default status
-                })
-            
-            # Construir match_data como lo especificó el usuario
-            match_data = {
-                "id": match.id, # Añadido el ID del partido, que es útil
-                "team1Id": match.team1.id if match.team1 else 0, # Usar ID directamente
-                "team2Id": match.team2.id if match.team2 else 0, # Usar ID directamente
-                "winner": match.winner.id if match.winner else None,
-                "team1Score": match.team1_score if match.team1_score is not None else 0,
-                "team2Score": match.team2_score if match.team2_score is not None else 0,
-                "format": match.format,
-                "status": match.status,
-                "map1_team1_score": match.map1_team1_score if match.map1_team1_score is not None else None,
-                "map1_team2_score": match.map1_team2_score if match.map1_team2_score is not None else None,
-                "map2_team1_score": match.map2_team1_score if match.map2_team1_score is not None else None,
-                "map2_team2_score": match.map2_team2_score if match.map2_team2_score is not None else None,
-                "map3_team1_score": match.map3_team1_score if match.map3_team1_score is not None else None,
-                "map3_team2_score": match.map3_team2_score if match.map3_team2_score is not None else None,
-                "hltvMatchId": match.hltv_match_id if match.hltv_match_id is not None else None,
-                # Para mantener compatibilidad con la simulación que espera objetos team completos,
-                # podríamos añadir aquí los datos completos de team1 y team2 si es necesario,
-                # pero el tipo Match en hltvTypes.ts solo pide team1Id y team2Id.
-                # Por ahora, seguimos la estructura del usuario y hltvTypes.ts.
-                # Si la simulación falla, esto podría necesitar ajuste para incluir objetos team completos.
-            }
-            stage_data["rounds"][round_number - 1]["matches"].append(match_data)
-
-        # Determinar el estado de la ronda (lógica del usuario adaptada)
-        for rd_idx, round_detail in enumerate(stage_data["rounds"]):
-            all_matches_in_round_finished = True
-            any_match_live = False
-            has_populated_matches = False
-
-            if not round_detail["matches"]:
-                all_matches_in_round_finished = False
-            else:
-                has_populated_matches = True
-                for m_data in round_detail["matches"]:
-                    if m_data['status'] != 'FINISHED':
-                        all_matches_in_round_finished = False
-                    if m_data['status'] == 'LIVE':
-                        any_match_live = True
-            
-            if all_matches_in_round_finished and has_populated_matches:
-                stage_data["rounds"][rd_idx]["status"] = 'completed'
-            elif any_match_live:
-                stage_data["rounds"][rd_idx]["status"] = 'active'
-            else:
-                # Si es la primera ronda con partidos y no está live/completed, debería ser active
-                if rd_idx == 0 and has_populated_matches and not any_match_live and not all_matches_in_round_finished:
-                     stage_data["rounds"][rd_idx]["status"] = 'active'
-                # Si una ronda anterior no está completada, las siguientes deben ser pending
-                elif rd_idx > 0 and stage_data["rounds"][rd_idx-1]["status"] != 'completed':
-                     stage_data["rounds"][rd_idx]["status"] = 'pending'
-                # Si tiene partidos y no cumple otra condición, por defecto active (si no es la primera)
-                elif has_populated_matches and rd_idx > 0 :
-                     stage_data["rounds"][rd_idx]["status"] = 'active'
-                # Si no tiene partidos o es la primera ronda sin partidos, se mantiene 'pending' (default)
-                else:
-                     stage_data["rounds"][rd_idx]["status"] = 'pending'
-
-
-        response_data["stages"][stage_key] = stage_data
-
-    # Determinar currentStage y currentRound global para el torneo
-    determined_current_stage_key = None
-    determined_current_round_number = 1
-
-    # Iterar sobre las fases en su orden numérico (phase1, phase2, ...)
-    # Usamos stage_order_idx de la enumeración de stages_ordered
-    sorted_stage_keys = [f"phase{s.order}" for s in stages_ordered]
+        not_modified = get_conditional_response(
+            request, etag=validators['etag'], last_modified=validators['last_modified']
+        )
+        if not_modified is not None:
+            return _with_major_data_validators(not_modified, validators)
+
+    # El payload se sirve desde la caché versionada; solo se reconstruye cuando cambia la versión del torneo
+    snapshot = get_major_data_snapshot(tournament_slug, validators)
+    if snapshot is None:
+        return JsonResponse({"error": "Tournament not found"}, status=404)
+    return _with_major_data_validators(HttpResponse(snapshot['body'], content_type='application/json'), snapshot)
 
-    for stage_key_iter in sorted_stage_keys:
-        if stage_key_iter not in response_data["stages"]: continue # Saltar si la fase no tiene datos (improbable aquí)
-        
-        stage_info_iter = response_data["stages"][stage_key_iter]
-        is_stage_fully_completed = True # Asumir que sí hasta encontrar una ronda no completada
-        
-        found_active_round_in_this_stage = False
-        for round_detail_iter in stage_info_iter["rounds"]:
-            if round_detail_iter["status"] == 'active':
-                determined_current_stage_key = stage_key_iter
-                determined_current_round_number = round_detail_iter["roundNumber"]
-                found_active_round_in_this_stage = True
-                break
-            if round_detail_iter["status"] != 'completed':
-                is_stage_fully_completed = False
-        
-        if found_active_round_in_this_stage:
-            break # Ya encontramos la fase y ronda activa global
+@require_http_methods(["GET"])
+def get_major_data_changes_since(request):
+    """
+    Cambios de partidos, StageTeams y estados de ronda desde la versión `since` que ya tiene el cliente
+    (cabecera X-Tournament-Version de tournament/data/). Si no se puede servir un delta
+    se devuelve el snapshot completo con "full": true.
+    """
+    try:
+        since = int(request.GET['since'])
+    except (KeyError, ValueError):
+        return JsonResponse({"error": "Parameter 'since' must be an integer version"}, status=400)
 
-        # Si no hay ronda activa pero la fase no está completa, esta es la fase actual
-        if not is_stage_fully_completed and not determined_current_stage_key:
-            determined_current_stage_key = stage_key_iter
-            # Tomar la primera ronda de esta fase como la actual (o la primera no completada)
-            first_round_in_stage_found = False
-            for rd_detail_iter_for_num in stage_info_iter["rounds"]:
-                if rd_detail_iter_for_num["status"] != 'completed':
-                     determined_current_round_number = rd_detail_iter_for_num["roundNumber"]
-                     first_round_in_stage_found = True
-                     break
-            if not first_round_in_stage_found and stage_info_iter["rounds"]: # Todos completados, tomar el último
-                determined_current_round_number = stage_info_iter["rounds"][-1]["roundNumber"]
-            elif not stage_info_iter["rounds"]: # Sin rondas, default a 1
-                determined_current_round_number = 1
+    tournament_slug = resolve_tournament_slug(request.GET.get('slug'))
+    if not tournament_slug:
+        return JsonResponse({"error": "No live tournament found"}, status=404)
 
+    changes = get_major_data_changes(tournament_slug, since)
+    if changes is None:
+        return JsonResponse({"error": "Tournament not found"}, status=404)
+    response = HttpResponse(changes['body'], content_type='application/json')
+    response['X-Tournament-Version'] = str(changes['version'])
+    patch_cache_control(response, no_cache=True)
+    return response
 
-    if not determined_current_stage_key and sorted_stage_keys: # Si no se encontró activa, y hay fases
-        determined_current_stage_key = sorted_stage_keys[0] # Tomar la primera fase
-        if response_data["stages"][determined_current_stage_key]["rounds"]:
-            determined_current_round_number = response_data["stages"][determined_current_stage_key]["rounds"][0]["roundNumber"]
-        else: # Sin rondas en la primera fase
-            determined_current_round_number = 1
-    elif not sorted_stage_keys: # No hay fases en absoluto
-        determined_current_stage_key = "phase1" # Fallback
-        determined_current_round_number = 1
+@require_http_methods(["GET"])
+async def stream_major_data(request):
+    """
+    Stream SSE con los cambios del torneo (eventos `snapshot` y `changes`, con el mismo JSON que
+    tournament/data/changes/). Al reconectar, EventSource envía Last-Event-ID y solo se
+    mandan los cambios desde esa versión. Requiere servir la app por ASGI (backend/asgi.py).
+    """
+    since = request.headers.get('Last-Event-ID') or request.GET.get('since')
+    try:
+        since = int(since) if since is not None else None
+    except ValueError:
+        return JsonResponse({"error": "Parameter 'since' must be an integer version"}, status=400)
+
+    tournament_slug = await sync_to_async(resolve_tournament_slug)(request.GET.get('slug'))
+    if not tournament_slug:
+        return JsonResponse({"error": "No live tournament found"}, status=404)
+    if await sync_to_async(get_tournament_version)(tournament_slug) is None:
+        return JsonResponse({"error": "Tournament not found"}, status=404)
 
+    response = StreamingHttpResponse(stream_tournament_events(tournament_slug, since), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Evitar que nginx acumule los eventos
+    return response
 
-    response_data["currentStage"] = determined_current_stage_key
-    response_data["currentRound"] = determined_current_round_number
-    
-    return JsonResponse(response_data)
+def _with_major_data_validators(response, validators):
+    response['X-Tournament-Version'] = str(validators['version'])
+    response['ETag'] = validators['etag']
+    response['Last-Modified'] = http_date(validators['last_modified'])
+    # no-cache: el navegador puede guardar la respuesta pero debe revalidarla en cada sondeo
+    patch_cache_control(response, no_cache=True)
+    return response
 
 @require_http_methods(["GET"])
 def list_tournaments(request):
@@ -269,46 +175,18 @@ def update_match_result(request):
             # return JsonResponse({"error": "Match already finished with a different winner."}, status=409) # Conflict
         
         winner_team = Team.objects.get(id=winner_team_id)
-        match_to_update.winner = winner_team
-        match_to_update.status = 'FINISHED'
-        
+
         # Actualizar scores (esto es opcional, el frontend podría no enviarlos)
         # Si el frontend envía scores, usarlos:
         # team1_score = data.get('team1Score') 
         # team2_score = data.get('team2Score')
         # if team1_score is not None: match_to_update.team1_score = team1_score
         # if team2_score is not None: match_to_update.team2_score = team2_score
-        match_to_update.save()
-        
-        # Recalcular W/L para todos los StageTeam de esta fase
-        all_stage_teams_in_stage = StageTeam.objects.filter(stage=stage)
-        stage_teams_map = {st.team_id: st for st in all_stage_teams_in_stage}
-
-        for st_team_obj in stage_teams_map.values(): # Resetear antes de recalcular
-            st_team_obj.wins = 0
-            st_team_obj.losses = 0
-
-        for m_in_stage in Match.objects.filter(stage=stage, status='FINISHED'):
-            if m_in_stage.winner_id:
-                if m_in_stage.winner_id in stage_teams_map:
-                    stage_teams_map[m_in_stage.winner_id].wins += 1
-                
-                loser_id = None
-                if m_in_stage.team1_id == m_in_stage.winner_id:
-                    loser_id = m_in_stage.team2_id
-                elif m_in_stage.team2_id == m_in_stage.winner_id:
-                    loser_id = m_in_stage.team1_id
-                
-                if loser_id and loser_id in stage_teams_map:
-                    stage_teams_map[loser_id].losses += 1
-        
-        for st_team_obj_to_save in stage_teams_map.values():
-            st_team_obj_to_save.save()
+        # Solo se ajustan los W/L de los dos equipos del partido (ver tournaments/results.py);
+        # el recálculo completo queda para la acción de reparación del admin
+        match_to_update = record_match_winner(stage, match_to_update.id, winner_team.id)
 
-        # Opcional: recalcular Buchholz si es necesario y la lógica está disponible
-        # from .utils import recalculate_buchholz_scores
-        # if stage.type == 'SWISS':
-        # recalculate_buchholz_scores(stage)
+        bump_tournament_version(tournament.id)
 
         # Devolver una respuesta. Es mejor que el frontend vuelva a llamar a get_major_data.
         # Devolver solo un OK o el partido actualizado.